@@ -24,6 +24,7 @@ urlpatterns = [
     path("admin/", admin.site.urls),
     path("ping", flight_feed_views.ping),
     path("signing_public_key", flight_feed_views.public_key_view),
+    path("tiles/<int:z>/<int:x>/<int:y>", flight_feed_views.get_vector_tile),
     path("flight_stream/", include("flight_feed_operations.urls")),
     path("rid/", include("rid_operations.urls")),
     path("scd/", include("scd_operations.urls")),
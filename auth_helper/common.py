@@ -5,12 +5,19 @@ import redis
 from dotenv import find_dotenv, load_dotenv
 from walrus import Database
 
+from common.data_definitions import (
+    FLIGHT_OPINT_INDEX_CHANGES_KEY,
+    FLIGHT_OPINT_INDEX_KEY,
+    FLIGHT_OPINT_INDEX_VERSION_KEY,
+    FLIGHT_OPINT_KEY,
+)
+
 load_dotenv(find_dotenv())
 logger = logging.getLogger("django")
 
 
-def get_redis():
-    # A method to get the redis instance and is used globally
+def get_redis(decode_responses: bool = True):
+    # A method to get the redis instance and is used globally, set decode_responses to False to read binary (e.g. compressed) values
     redis_host = env.get("REDIS_HOST", "redis")
     redis_port = env.get("REDIS_PORT", 6379)
     redis_password = env.get("REDIS_PASSWORD", None)
@@ -21,10 +28,10 @@ def get_redis():
             port=redis_port,
             password=redis_password,
             charset="utf-8",
-            decode_responses=True,
+            decode_responses=decode_responses,
         )
     else:
-        r = redis.Redis(host=redis_host, port=redis_port, charset="utf-8", decode_responses=True)
+        r = redis.Redis(host=redis_host, port=redis_port, charset="utf-8", decode_responses=decode_responses)
 
     return r
 
@@ -84,6 +91,10 @@ class RedisHelper:
                 decode_responses=True,
             )
 
-        all_opints = r.keys(pattern="flight_opint.*")
-        for opint in all_opints:
-            r.delete(opint)
+        # The local operational intents are tracked in the index hash, removing the index keys makes every process reload an empty index
+        all_operation_ids = r.hkeys(FLIGHT_OPINT_INDEX_KEY)
+        pipe = r.pipeline(transaction=True)
+        for operation_id in all_operation_ids:
+            pipe.delete(FLIGHT_OPINT_KEY + operation_id)
+        pipe.delete(FLIGHT_OPINT_INDEX_KEY, FLIGHT_OPINT_INDEX_CHANGES_KEY, FLIGHT_OPINT_INDEX_VERSION_KEY)
+        pipe.execute()
@@ -0,0 +1,43 @@
+import json
+from typing import List, Optional, Tuple
+
+from django.db.models import Q
+from shapely.geometry import shape
+from shapely.ops import unary_union
+
+# The numeric bounding box columns that are kept in sync with the comma separated bounds of flight declarations and GeoFences
+BBOX_FIELDS = ["min_lon", "min_lat", "max_lon", "max_lat"]
+
+
+def parse_bounds(bounds: Optional[str]) -> Optional[Tuple[float, float, float, float]]:
+    """Parse the stored comma separated bounds (min lon, min lat, max lon, max lat), None is returned if the bounds are missing or cannot be parsed"""
+    try:
+        min_lon, min_lat, max_lon, max_lat = [float(i) for i in bounds.split(",")]
+    except (AttributeError, ValueError):
+        return None
+    return min_lon, min_lat, max_lon, max_lat
+
+
+def get_geo_json_bounds(geo_json: Optional[str]) -> Optional[str]:
+    """The comma separated bounds of all the features of a stored GeoJSON FeatureCollection, None is returned if the GeoJSON is missing or cannot be parsed"""
+    try:
+        all_shapes = [shape(feature["geometry"]) for feature in json.loads(geo_json)["features"]]
+    except (TypeError, KeyError, ValueError, AttributeError):
+        return None
+    if not all_shapes:
+        return None
+    return ",".join(str(i) for i in unary_union(all_shapes).bounds)
+
+
+def set_bbox_from_bounds(instance) -> None:
+    """Set the numeric bounding box columns of a model instance from its bounds, this is done when the instance is saved and before it is written with
+    bulk_create"""
+    parsed_bounds = parse_bounds(instance.bounds)
+    for field_name, value in zip(BBOX_FIELDS, parsed_bounds or (None,) * 4):
+        setattr(instance, field_name, value)
+
+
+def view_box_filter(view_box: List[float]) -> Q:
+    """A filter for rows whose bounding box intersects the view box (min lon, min lat, max lon, max lat), this is a plain comparison of the indexed bounding
+    box columns so it runs in the database on every backend"""
+    return Q(min_lon__lte=view_box[2], max_lon__gte=view_box[0], min_lat__lte=view_box[3], max_lat__gte=view_box[1])
@@ -43,4 +43,39 @@ VALID_OPERATIONAL_INTENT_STATES = ["Accepted", "Activated", "Nonconforming", "Co
 
 
 FLIGHT_OPINT_KEY = "flight_opint."
+# The operation id of a operational intent reference created by Argon Server is stored under this prefix followed by the id of the reference in the DSS
+OPINT_FLIGHTREF_KEY = "opint_flightref."
+
+# The bounds and time extents of local operational intents are kept in a hash, every change increments the version counter and is appended to the change stream
+FLIGHT_OPINT_INDEX_KEY = "flight_opint_index"
+FLIGHT_OPINT_INDEX_VERSION_KEY = "flight_opint_index_version"
+FLIGHT_OPINT_INDEX_CHANGES_KEY = "flight_opint_index_changes"
+
+# Operational intent details received from peer USSes are cached under this prefix along with the OVN they were retrieved at
+PEER_OPINT_DETAILS_KEY = "peer_opint_details."
+
+# The latest operational intent version notified to each subscriber is kept under the sequence prefix and deliveries per subscriber and operational intent are serialised with the
+# delivery lock, in-flight requests are tracked per host and delivery outcomes are counted in the metrics hash
+PEER_USS_NOTIFICATION_SEQUENCE_KEY = "peer_uss_notification_sequence."
+PEER_USS_NOTIFICATION_DELIVERY_LOCK_KEY = "peer_uss_notification_delivery_lock."
+PEER_USS_NOTIFICATION_HOST_SLOTS_KEY = "peer_uss_notification_host_slots."
+PEER_USS_NOTIFICATION_METRICS_KEY = "peer_uss_notification_metrics"
+PEER_USS_NOTIFICATION_LAG_KEY = "peer_uss_notification_lag_ms"
+
+# Every change to a GeoFence adds its id to the change stream and increments this version, processes compare it with the version of their in memory GeoFence
+# index to know when to replay the changes
+GEOFENCE_INDEX_VERSION_KEY = "geofence_index_version"
+GEOFENCE_INDEX_CHANGES_KEY = "geofence_index_changes"
+# The same for the in memory index of active flight declarations used for deconfliction
+FLIGHT_DECLARATION_INDEX_VERSION_KEY = "flight_declaration_index_version"
+FLIGHT_DECLARATION_INDEX_CHANGES_KEY = "flight_declaration_index_changes"
+
+# Rendered vector tiles are cached under this prefix followed by z/x/y, the tiles cached at every zoom level are tracked in a set (prefix followed by the zoom
+# level) so that the tiles under a changed object can be removed, the traffic layer of a tile is cached separately for a few seconds
+VECTOR_TILE_KEY = "vector_tile."
+VECTOR_TILE_ZOOM_KEYS_KEY = "vector_tile_keys."
+VECTOR_TILE_TRAFFIC_KEY = "vector_tile_traffic."
+# Removing a tile increments its generation (prefix followed by z/x/y), a rendered tile is only cached if the generation did not change while it was rendered
+VECTOR_TILE_GENERATION_KEY = "vector_tile_generation."
+
 RESPONSE_CONTENT_TYPE = "application/json"
@@ -2,15 +2,28 @@ import json
 import logging
 import os
 from dataclasses import asdict
-from typing import List, Union
+from typing import Dict, List, Union
 from uuid import uuid4
 
 import arrow
+from django.db import transaction
 from django.db.utils import IntegrityError
 from dotenv import find_dotenv, load_dotenv
 
+from common.bounds_helper import set_bbox_from_bounds
+from common.delta_sync_helper import record_changes
+from common.vector_tile_helper import invalidate_tiles
 from conformance_monitoring_operations.models import TaskScheduler
-from flight_declaration_operations.models import FlightAuthorization, FlightDeclaration
+from flight_declaration_operations.flight_declarations_rtree_helper import (
+    get_flight_declaration_index,
+)
+from flight_declaration_operations.models import (
+    FlightAuthorization,
+    FlightDeclaration,
+    FlightDeclarationChange,
+    FlightOperationTracking,
+)
+from flight_declaration_operations.utils import set_operational_intent_geojson
 from scd_operations.data_definitions import FlightDeclarationCreationPayload
 from scd_operations.scd_data_definitions import PartialCreateOperationalIntentReference
 
@@ -151,6 +164,40 @@ class ArgonServerDatabaseWriter:
         except IntegrityError:
             return False
 
+    def create_flight_declarations_in_bulk(self, flight_declarations: List[FlightDeclaration], rejection_notes: Dict[str, str]) -> None:
+        """Write new flight declarations with their flight authorizations and state history in a single transaction, declarations in the rejected state (8) get
+        a second history entry with the reason they were rejected, rejection_notes maps the declaration ids to these reasons. bulk_create does not send the save signals so the GeoJSON and the bounding box are computed here and the declarations index is updated once the transaction is committed
+        """
+        all_tracking_entries = []
+        for flight_declaration in flight_declarations:
+            set_operational_intent_geojson(flight_declaration=flight_declaration)
+            set_bbox_from_bounds(flight_declaration)
+            all_tracking_entries.append(
+                FlightOperationTracking(
+                    flight_declaration=flight_declaration,
+                    notes="Created Declaration",
+                    deltas={"original_state": "start", "new_state": "0"},
+                )
+            )
+            if flight_declaration.state == 8:
+                all_tracking_entries.append(
+                    FlightOperationTracking(
+                        flight_declaration=flight_declaration,
+                        notes=rejection_notes.get(str(flight_declaration.id), "Rejected by Argon Server"),
+                        deltas={"original_state": "0", "new_state": "8"},
+                    )
+                )
+
+        with transaction.atomic():
+            FlightDeclaration.objects.bulk_create(flight_declarations)
+            FlightAuthorization.objects.bulk_create(
+                [FlightAuthorization(declaration=flight_declaration) for flight_declaration in flight_declarations]
+            )
+            FlightOperationTracking.objects.bulk_create(all_tracking_entries)
+            transaction.on_commit(lambda: get_flight_declaration_index().update_flight_declarations(flight_declarations=flight_declarations))
+            transaction.on_commit(lambda: invalidate_tiles([flight_declaration.bounds for flight_declaration in flight_declarations]))
+            record_changes(FlightDeclarationChange, [flight_declaration.id for flight_declaration in flight_declarations], is_new=True)
+
     def create_flight_authorization(self, flight_declaration_id: str) -> bool:
         try:
             flight_declaration = FlightDeclaration.objects.get(id=flight_declaration_id)
@@ -167,7 +214,8 @@ class ArgonServerDatabaseWriter:
         try:
             flight_declaration = FlightDeclaration.objects.get(id=flight_declaration_id)
             flight_declaration.latest_telemetry_datetime = now
-            flight_declaration.save()
+            # updated_at is left as is, it versions the cached geometry of the declaration which the telemetry does not change
+            flight_declaration.save(update_fields=["latest_telemetry_datetime"])
             return True
         except FlightDeclaration.DoesNotExist:
             return False
@@ -188,7 +236,6 @@ class ArgonServerDatabaseWriter:
         try:
             flight_declaration = FlightDeclaration.objects.get(id=flight_declaration_id)
             flight_declaration.operational_intent = json.dumps(asdict(operational_intent))
-            # TODO: Convert the updated operational intent to GeoJSON
             flight_declaration.save()
             return True
         except Exception:
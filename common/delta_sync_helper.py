@@ -0,0 +1,81 @@
+import zlib
+from os import environ as env
+from typing import Iterable, List, Optional, Tuple
+
+from django.db import connection, transaction
+from dotenv import find_dotenv, load_dotenv
+from rest_framework.response import Response
+
+load_dotenv(find_dotenv())
+
+# The maximum number of changes returned by one request of the delta sync, clients keep requesting while has_more is set
+DELTA_SYNC_PAGE_SIZE = int(env.get("DELTA_SYNC_PAGE_SIZE", 1000))
+
+
+def lock_change_log(change_model) -> None:
+    """Serialize the writers of a change log until the end of the current transaction. The ids of the log are the cursors of the clients and are handed out
+    when the entries are inserted, without the lock a small write could take a higher id and commit while a large import is still inserting lower ids, a
+    client syncing in between would move its cursor past the import. With the lock the entries become visible in the order of their ids. SQLite already
+    serializes writing transactions"""
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_xact_lock(%s)", [zlib.crc32(change_model._meta.db_table.encode("utf-8"))])
+
+
+def record_changes(change_model, record_ids: Iterable, is_deleted: bool = False, is_new: bool = False) -> None:
+    """Move the records to the head of the change log, the older entries of the records are removed so that the log holds at most one entry per record and a
+    deleted record keeps a tombstone entry. The entries of new records are written without looking for older entries. Call this in the transaction that
+    changed the records so that the entries are committed or rolled back with them, the lock of the change log is held until then"""
+    record_ids = list(record_ids)
+    if not record_ids:
+        return
+    with transaction.atomic():
+        lock_change_log(change_model)
+        if not is_new:
+            change_model.objects.filter(record_id__in=record_ids).delete()
+        change_model.objects.bulk_create(
+            [change_model(record_id=record_id, is_deleted=is_deleted) for record_id in record_ids], batch_size=DELTA_SYNC_PAGE_SIZE
+        )
+
+
+def parse_change_cursor(cursor: Optional[str]) -> Optional[int]:
+    """The cursor is the id of the last change a client has seen, a missing cursor starts from the beginning of the log. None is returned for invalid cursors"""
+    if cursor in [None, ""]:
+        return 0
+    try:
+        parsed_cursor = int(cursor)
+    except ValueError:
+        return None
+    return parsed_cursor if parsed_cursor >= 0 else None
+
+
+def get_changes_since(change_model, cursor: int, limit: int = DELTA_SYNC_PAGE_SIZE) -> Tuple[List, int, bool]:
+    """Read the changes after the cursor in the order they were made, this is a range scan of the primary key. The changes, the cursor to send in the next
+    request and whether there are more changes are returned"""
+    all_changes = list(change_model.objects.filter(id__gt=cursor).order_by("id")[: limit + 1])
+    has_more = len(all_changes) > limit
+    all_changes = all_changes[:limit]
+    next_cursor = all_changes[-1].id if all_changes else cursor
+    return all_changes, next_cursor, has_more
+
+
+def get_delta_sync_response(request, change_model, queryset, serializer_class, serializer_context: Optional[dict] = None) -> Response:
+    """Build the response of a delta sync endpoint, the records of the queryset that were created or updated after the cursor are serialized in full and
+    only the ids of deleted records are sent"""
+    cursor = parse_change_cursor(request.query_params.get("cursor"))
+    if cursor is None:
+        return Response({"message": "The cursor must be a non negative integer returned by a previous request"}, status=400)
+
+    all_changes, next_cursor, has_more = get_changes_since(change_model, cursor)
+    changed_record_ids = [change.record_id for change in all_changes if not change.is_deleted]
+    deleted_record_ids = [str(change.record_id) for change in all_changes if change.is_deleted]
+    changed_records = queryset.filter(id__in=changed_record_ids) if changed_record_ids else queryset.none()
+    return Response(
+        {
+            "cursor": next_cursor,
+            "has_more": has_more,
+            "changed": serializer_class(changed_records, many=True, context=serializer_context or {}).data,
+            "deleted": deleted_record_ids,
+        },
+        status=200,
+    )
@@ -0,0 +1,76 @@
+import json
+import logging
+import threading
+from collections import OrderedDict
+from os import environ as env
+from typing import Callable, Dict, List, Optional, Tuple
+
+from dotenv import find_dotenv, load_dotenv
+from shapely.geometry import box, shape
+from shapely.geometry.base import BaseGeometry
+from shapely.ops import unary_union
+from shapely.prepared import PreparedGeometry, prep
+
+load_dotenv(find_dotenv())
+
+logger = logging.getLogger("django")
+
+PREPARED_GEOMETRY_CACHE_SIZE = int(env.get("PREPARED_GEOMETRY_CACHE_SIZE", 5000))
+
+
+def geo_json_to_shape(geo_json: Optional[str], bounds: str, feature_buffer: float = 0) -> BaseGeometry:
+    """Parse a stored GeoJSON FeatureCollection in to a single shape, the features are optionally buffered (in degrees) the same way as when the object was created.
+    If the GeoJSON is missing or cannot be parsed the bounding box is returned so that the object is still treated as a conflict"""
+    try:
+        all_shapes = [shape(feature["geometry"]) for feature in json.loads(geo_json)["features"]]
+        if feature_buffer:
+            all_shapes = [s.buffer(feature_buffer) for s in all_shapes]
+        return unary_union(all_shapes)
+    except (TypeError, KeyError, ValueError, AttributeError) as e:
+        logger.info("Could not parse the stored GeoJSON ({error}), using the bounds for exact intersection checks".format(error=e))
+        return box(*[float(i) for i in bounds.split(",")])
+
+
+class PreparedGeometryCache:
+    """A per-process least recently used cache of prepared shapely geometries, entries are keyed by the id of the object and are only used while the updated_at of the
+    object matches the one the geometry was built from so a changed object is parsed again"""
+
+    def __init__(self, max_size: int = PREPARED_GEOMETRY_CACHE_SIZE):
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        self.entries: "OrderedDict[str, Tuple[str, PreparedGeometry]]" = OrderedDict()
+
+    def get(self, object_id: str, updated_at: str) -> Optional[PreparedGeometry]:
+        with self.lock:
+            cached = self.entries.get(object_id)
+            if cached is None or cached[0] != updated_at:
+                return None
+            self.entries.move_to_end(object_id)
+            return cached[1]
+
+    def set(self, object_id: str, updated_at: str, geometry: BaseGeometry) -> PreparedGeometry:
+        prepared_geometry = prep(geometry)
+        with self.lock:
+            self.entries[object_id] = (updated_at, prepared_geometry)
+            self.entries.move_to_end(object_id)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+        return prepared_geometry
+
+    def get_prepared_geometries(
+        self, versions: Dict[str, str], load_geometries: Callable[[List[str]], Dict[str, Tuple[str, BaseGeometry]]]
+    ) -> Dict[str, PreparedGeometry]:
+        """Get the prepared geometries of the objects in versions (id -> updated_at), the geometries that are not cached (or are stale) are loaded in a single call of
+        load_geometries which returns id -> (updated_at, geometry) for the ids it is given"""
+        prepared_geometries = {}
+        missing_ids = []
+        for object_id, updated_at in versions.items():
+            prepared_geometry = self.get(object_id=object_id, updated_at=updated_at)
+            if prepared_geometry is None:
+                missing_ids.append(object_id)
+            else:
+                prepared_geometries[object_id] = prepared_geometry
+        if missing_ids:
+            for object_id, (updated_at, geometry) in load_geometries(missing_ids).items():
+                prepared_geometries[object_id] = self.set(object_id=object_id, updated_at=updated_at, geometry=geometry)
+        return prepared_geometries
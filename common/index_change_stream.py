@@ -0,0 +1,88 @@
+from typing import Callable, List, Tuple
+
+from auth_helper.common import get_redis
+
+# Number of changes retained in a change stream, a process that falls further behind reloads its index from the database
+INDEX_MAX_CHANGES = 10000
+# Replaying more changed records than this one by one is no cheaper than reloading the index, larger batches ask all processes to reload instead
+INDEX_MAX_BATCH_CHANGES = 1000
+
+RELOAD_CHANGE = "*"
+
+
+class IndexChangeStream:
+    """Records the ids of the records changed in the database in a Redis stream along with a version counter, so that the per-process in memory indexes built from
+    the database replay only the records changed by other processes instead of reloading the whole table. A index compares the version counter with the version it
+    has applied before a query and reloads only the first time, after Redis was flushed, after it fell too far behind the stream or when a bulk change asked for it.
+    The index serialises the calls to sync with its own lock."""
+
+    def __init__(self, version_key: str, changes_key: str, max_changes: int = INDEX_MAX_CHANGES):
+        self.r = get_redis()
+        self.version_key = version_key
+        self.changes_key = changes_key
+        self.max_changes = max_changes
+        self.applied_version = None
+        self.last_change_id = "0-0"
+
+    def get_version(self) -> int:
+        return int(self.r.get(self.version_key) or 0)
+
+    def record_changes(self, record_ids: List[str]) -> None:
+        """Record created, updated or deleted records, this should be called once the transaction that changed them has been committed"""
+        if not record_ids:
+            return
+        if len(record_ids) > INDEX_MAX_BATCH_CHANGES:
+            self.record_reload()
+            return
+        pipe = self.r.pipeline(transaction=True)
+        for record_id in record_ids:
+            pipe.xadd(self.changes_key, {"record_id": str(record_id)}, maxlen=self.max_changes, approximate=True)
+        pipe.incr(self.version_key)
+        pipe.execute()
+
+    def record_reload(self) -> None:
+        """Ask all processes to reload their index, use after records are changed in bulk without signals (e.g. QuerySet.update)"""
+        pipe = self.r.pipeline(transaction=True)
+        pipe.xadd(self.changes_key, {"record_id": RELOAD_CHANGE}, maxlen=self.max_changes, approximate=True)
+        pipe.incr(self.version_key)
+        pipe.execute()
+
+    def parse_change_id(self, change_id: str) -> Tuple[int, int]:
+        ms, seq = change_id.split("-")
+        return int(ms), int(seq)
+
+    def is_change_stream_trimmed(self) -> bool:
+        """Check if changes this process has not applied yet have already been trimmed from the change stream. If the stream was empty when the index was loaded
+        all the changes since are unapplied, these have only been trimmed once the stream has grown to its maximum length"""
+        if self.last_change_id == "0-0":
+            return self.r.xlen(self.changes_key) >= self.max_changes
+        first_change = self.r.xrange(self.changes_key, count=1)
+        if not first_change:
+            return True
+        return self.parse_change_id(first_change[0][0]) > self.parse_change_id(self.last_change_id)
+
+    def get_last_change_id(self) -> str:
+        last_change = self.r.xrevrange(self.changes_key, count=1)
+        return last_change[0][0] if last_change else "0-0"
+
+    def sync(self, reload: Callable[[], None], apply_changes: Callable[[List[str]], None]) -> None:
+        """Bring the index up to date, reload rebuilds the index from the database and apply_changes updates the given records in it from the database"""
+        current_version = self.get_version()
+        if current_version == self.applied_version:
+            return
+        if self.applied_version is None or current_version < self.applied_version or self.is_change_stream_trimmed():
+            # Read the last change id before the database so that changes made in between are replayed (applying a change twice is harmless)
+            last_change_id = self.get_last_change_id()
+            reload()
+        else:
+            ms, seq = self.parse_change_id(self.last_change_id)
+            all_changes = self.r.xrange(self.changes_key, min="%d-%d" % (ms, seq + 1))
+            last_change_id = all_changes[-1][0] if all_changes else self.last_change_id
+            changed_record_ids = list(dict.fromkeys(change["record_id"] for _, change in all_changes))
+            if RELOAD_CHANGE in changed_record_ids:
+                reload()
+            elif changed_record_ids:
+                apply_changes(changed_record_ids)
+        # Only advance once the changes have been applied, if loading from the database failed they are applied again on the next query
+        self.last_change_id = last_change_id
+        self.applied_version = current_version
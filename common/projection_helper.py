@@ -0,0 +1,28 @@
+from functools import lru_cache
+
+import numpy as np
+import shapely.geometry
+from pyproj import Transformer
+
+WGS84_EPSG_CODE = 4326
+
+
+def get_utm_epsg_code(lng: float, lat: float) -> int:
+    """Returns the EPSG code of the WGS84 / UTM zone (https://en.wikipedia.org/wiki/Universal_Transverse_Mercator_coordinate_system) that contains the point"""
+    zone = min(int((lng + 180) // 6) + 1, 60)
+    return (32600 if lat >= 0 else 32700) + zone
+
+
+@lru_cache(maxsize=128)
+def get_transformer(from_epsg_code: int, to_epsg_code: int) -> Transformer:
+    """Building a Transformer is expensive, they are cached per pair of coordinate reference systems and reused for the life of the process"""
+    return Transformer.from_crs(from_epsg_code, to_epsg_code, always_xy=True)
+
+
+def buffer_point_in_meters(point: shapely.geometry.Point, radius: float) -> shapely.geometry.Polygon:
+    """Buffer a lat / lon point by a radius in meters, the buffer is computed in the UTM zone of the point and converted back to lat / lon"""
+    epsg_code = get_utm_epsg_code(lng=point.x, lat=point.y)
+    utm_x, utm_y = get_transformer(WGS84_EPSG_CODE, epsg_code).transform(point.x, point.y)
+    buffered_circle = np.asarray(shapely.geometry.Point(utm_x, utm_y).buffer(radius).exterior.coords)
+    lngs, lats = get_transformer(epsg_code, WGS84_EPSG_CODE).transform(buffered_circle[:, 0], buffered_circle[:, 1])
+    return shapely.geometry.Polygon(np.column_stack((lngs, lats)))
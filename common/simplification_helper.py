@@ -0,0 +1,163 @@
+import json
+import logging
+from os import environ as env
+from typing import List, Optional
+
+from dotenv import find_dotenv, load_dotenv
+from rest_framework.exceptions import ValidationError
+from shapely.geometry import JOIN_STYLE, Polygon, box, mapping, shape
+from shapely.geometry.base import BaseGeometry
+
+load_dotenv(find_dotenv())
+
+logger = logging.getLogger("django")
+
+# The simplified versions stored with GeoFences and operational intents, the tolerance of each level of detail is in degrees (about 11 m and 110 m)
+LEVELS_OF_DETAIL = {"medium": 0.0001, "low": 0.001}
+FULL_DETAIL = "full"
+# The number of pixels across the viewport of a typical display, the level of detail of a viewport is the coarsest one whose tolerance is below a pixel
+VIEWPORT_PIXELS = 1000
+# The maximum number of vertices of a polygon sent to the DSS, larger outlines are simplified and if needed split until every part fits
+DSS_MAX_POLYGON_VERTICES = int(env.get("DSS_MAX_POLYGON_VERTICES", 100))
+# The most an outline sent to the DSS may grow when it is simplified (in degrees), this is the buffer of the features of a flight declaration
+DSS_MAX_OUTLINE_GROWTH = 0.0005
+# The depth of the halving of outlines that are too large, the parts that are still too large at this depth are replaced by their bounding box
+MAX_SPLIT_DEPTH = 16
+
+
+def simplify_covering(geometry: BaseGeometry, tolerance: float) -> Optional[BaseGeometry]:
+    """Simplify a polygonal geometry so that the simplified outline still covers the original, the geometry is grown by the tolerance (at most twice the
+    tolerance) before it is simplified so that the removed vertices fall inside. None is returned if no simplified outline covers the original"""
+    for grow_factor in [1, 2]:
+        simplified = geometry.buffer(tolerance * grow_factor, join_style=JOIN_STYLE.mitre).simplify(tolerance, preserve_topology=True)
+        if simplified.covers(geometry):
+            return simplified
+    return None
+
+
+def simplify_containing(geometry: BaseGeometry, tolerance: float) -> BaseGeometry:
+    """Simplify a polygonal geometry so that the simplified outline still covers the original, the convex hull is used if no simplified outline covers the
+    original. Points and lines are returned unchanged"""
+    if geometry.is_empty or geometry.geom_type not in ["Polygon", "MultiPolygon"]:
+        return geometry
+    simplified = simplify_covering(geometry, tolerance)
+    return simplified if simplified is not None else geometry.convex_hull
+
+
+def count_vertices(polygon: Polygon) -> int:
+    """The number of vertices of the exterior of a polygon, the closing vertex is not counted"""
+    return len(polygon.exterior.coords) - 1
+
+
+def get_polygons(geometry: BaseGeometry) -> List[Polygon]:
+    """The polygons of a geometry, the points and lines of a collection e.g. where a polygon touches a cut are dropped"""
+    if geometry.geom_type == "Polygon":
+        return [] if geometry.is_empty else [geometry]
+    if geometry.geom_type in ["MultiPolygon", "GeometryCollection"]:
+        return [polygon for part in geometry.geoms for polygon in get_polygons(part)]
+    return []
+
+
+def split_polygon(polygon: Polygon, max_vertices: int, depth: int = 0) -> List[Polygon]:
+    """Halve a polygon across the longer side of its bounding box until every part has at most max_vertices vertices, the parts together cover the polygon.
+    Holes are filled since only the exterior of a outline is sent to the DSS"""
+    polygon = Polygon(polygon.exterior)
+    if count_vertices(polygon) <= max_vertices:
+        return [polygon]
+    if depth >= MAX_SPLIT_DEPTH:
+        return [box(*polygon.bounds)]
+    min_x, min_y, max_x, max_y = polygon.bounds
+    if max_x - min_x >= max_y - min_y:
+        middle = (min_x + max_x) / 2
+        all_halves = [box(min_x, min_y, middle, max_y), box(middle, min_y, max_x, max_y)]
+    else:
+        middle = (min_y + max_y) / 2
+        all_halves = [box(min_x, min_y, max_x, middle), box(min_x, middle, max_x, max_y)]
+    all_parts = []
+    for half in all_halves:
+        for part in get_polygons(polygon.intersection(half)):
+            all_parts.extend(split_polygon(part, max_vertices=max_vertices, depth=depth + 1))
+    return all_parts
+
+
+def cap_polygon_vertices(polygon: Polygon, max_vertices: int = DSS_MAX_POLYGON_VERTICES, max_growth: float = DSS_MAX_OUTLINE_GROWTH) -> List[Polygon]:
+    """Cover a polygon with polygons of at most max_vertices vertices each. The polygon is simplified with a growing tolerance so that it grows by at most
+    max_growth, a outline that is still too large is split in to parts instead of being replaced by a larger shape"""
+    if count_vertices(polygon) <= max_vertices:
+        return [polygon]
+    smallest_outline = polygon
+    tolerance = min(LEVELS_OF_DETAIL.values()) / 10
+    # The outline grows by up to twice the tolerance
+    while tolerance * 2 <= max_growth:
+        simplified = simplify_covering(polygon, tolerance)
+        if simplified is not None and simplified.geom_type == "Polygon":
+            if count_vertices(simplified) <= max_vertices:
+                return [simplified]
+            if count_vertices(simplified) < count_vertices(smallest_outline):
+                smallest_outline = simplified
+        tolerance *= 2
+    return split_polygon(smallest_outline, max_vertices=max_vertices)
+
+
+def simplify_feature_collection(geo_json: dict, tolerance: float) -> dict:
+    """Simplify the geometry of every feature of a GeoJSON FeatureCollection, the properties of the features are kept"""
+    all_features = []
+    for feature in geo_json["features"]:
+        simplified_geometry = simplify_containing(shape(feature["geometry"]), tolerance)
+        all_features.append({**feature, "geometry": mapping(simplified_geometry)})
+    return {**geo_json, "features": all_features}
+
+
+def compute_levels_of_detail(geo_json: Optional[str]) -> Optional[str]:
+    """Compute the simplified versions of a stored GeoJSON FeatureCollection for every level of detail, None is returned if the GeoJSON is missing or cannot
+    be parsed so that the full GeoJSON is always served"""
+    try:
+        parsed_geo_json = json.loads(geo_json)
+        return json.dumps({level: simplify_feature_collection(parsed_geo_json, tolerance) for level, tolerance in LEVELS_OF_DETAIL.items()})
+    except (TypeError, KeyError, ValueError, AttributeError) as e:
+        logger.info("Could not simplify the GeoJSON ({error}), the full GeoJSON will be served".format(error=e))
+        return None
+
+
+def get_level_of_detail(detail: Optional[str], view_port: List[float]) -> Optional[str]:
+    """Select the level of detail of a response, a detail parameter is used as is and otherwise the level is picked from the span of the viewport. None
+    means the full GeoJSON and a ValueError is raised for a unknown detail"""
+    if detail:
+        if detail == FULL_DETAIL:
+            return None
+        if detail not in LEVELS_OF_DETAIL:
+            raise ValueError("The detail must be one of {levels}".format(levels=", ".join([FULL_DETAIL, *LEVELS_OF_DETAIL])))
+        return detail
+    if not view_port:
+        return None
+    pixel_size = max(view_port[2] - view_port[0], view_port[3] - view_port[1]) / VIEWPORT_PIXELS
+    coarsest_level = None
+    for level, tolerance in sorted(LEVELS_OF_DETAIL.items(), key=lambda item: item[1]):
+        if tolerance <= pixel_size:
+            coarsest_level = level
+    return coarsest_level
+
+
+def select_level_of_detail(simplified_geo_json: Optional[str], level_of_detail: Optional[str]) -> Optional[dict]:
+    """Return the stored GeoJSON of the level of detail, None is returned if the full GeoJSON is selected or the simplified versions have not been computed"""
+    if level_of_detail is None or not simplified_geo_json:
+        return None
+    return json.loads(simplified_geo_json).get(level_of_detail)
+
+
+class LevelOfDetailMixin:
+    """Add the level of detail selected by the detail and view query parameters to the serializer context of a list view, a unknown detail is a
+    validation error"""
+
+    def get_requested_level_of_detail(self) -> Optional[str]:
+        view = self.request.query_params.get("view", None)
+        view_port = [float(i) for i in view.split(",")] if view else []
+        try:
+            return get_level_of_detail(self.request.query_params.get("detail", None), view_port)
+        except ValueError as e:
+            raise ValidationError({"message": str(e)})
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context["level_of_detail"] = self.get_requested_level_of_detail()
+        return context
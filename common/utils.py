@@ -1,5 +1,30 @@
 import json
-from dataclasses import asdict, is_dataclass
+import logging
+from dataclasses import asdict, fields, is_dataclass
+from enum import Enum
+from os import environ as env
+from typing import Any, Iterable, Iterator
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse, StreamingHttpResponse
+from dotenv import find_dotenv, load_dotenv
+
+from .data_definitions import RESPONSE_CONTENT_TYPE
+
+try:
+    import orjson
+except ImportError:  # orjson is an optional, faster backend
+    orjson = None
+
+load_dotenv(find_dotenv())
+logger = logging.getLogger("django")
+
+JSON_RENDERER_BACKEND = env.get("JSON_RENDERER_BACKEND", "json")
+# The number of rows fetched per database round trip and the size of the chunks written by streaming responses
+STREAMING_QUERYSET_CHUNK_SIZE = int(env.get("STREAMING_QUERYSET_CHUNK_SIZE", 500))
+STREAMING_RESPONSE_BUFFER_SIZE = 64 * 1024
+FEATURE_COLLECTION_PREFIX = b'{"type": "FeatureCollection", "features": ['
+FEATURE_COLLECTION_SUFFIX = b"]}"
 
 
 class EnhancedJSONEncoder(json.JSONEncoder):
@@ -7,3 +32,69 @@ class EnhancedJSONEncoder(json.JSONEncoder):
         if is_dataclass(o):
             return asdict(o)
         return super().default(o)
+
+
+class DataclassJSONEncoder(DjangoJSONEncoder):
+    """A encoder that expands dataclasses and enums lazily while the structure is being written, unlike asdict no intermediate deep copy of the object is made"""
+
+    def default(self, o):
+        if is_dataclass(o) and not isinstance(o, type):
+            return {f.name: getattr(o, f.name) for f in fields(o)}
+        if isinstance(o, Enum):
+            return o.value
+        return super().default(o)
+
+
+def _orjson_default(o):
+    # orjson natively handles dataclasses, enums, datetimes and UUIDs, everything else (e.g. Decimal) falls back to the Django encoder
+    return DataclassJSONEncoder().default(o)
+
+
+def render_json(data: Any, backend: str = None) -> bytes:
+    """Encode a dataclass (or any JSON compatible structure holding dataclasses / enums) directly to bytes in one pass.
+    The default "json" backend produces output that is byte-for-byte identical to JsonResponse(json.loads(json.dumps(asdict(data)))), the optional "orjson" backend
+    is considerably faster but writes compact separators."""
+    backend = backend or JSON_RENDERER_BACKEND
+    if backend == "orjson" and orjson is not None:
+        return orjson.dumps(data, default=_orjson_default)
+    return json.dumps(data, cls=DataclassJSONEncoder).encode("utf-8")
+
+
+class DataclassJsonResponse(HttpResponse):
+    """A drop in replacement for JsonResponse that accepts dataclasses and renders them to bytes without the dump / load / dump round trip"""
+
+    def __init__(self, data: Any, **kwargs):
+        kwargs.setdefault("content_type", RESPONSE_CONTENT_TYPE)
+        super().__init__(content=render_json(data), **kwargs)
+
+
+def stream_json_array(items: Iterable[Any], prefix: bytes = b"[", suffix: bytes = b"]") -> Iterator[bytes]:
+    """Encode the items one by one as the elements of a JSON array, the output is written in chunks of about STREAMING_RESPONSE_BUFFER_SIZE bytes so only the
+    current chunk and item are held in memory. The prefix and suffix can be set to stream the array in to a enclosing object e.g. a FeatureCollection
+    """
+    separator = b"," if JSON_RENDERER_BACKEND == "orjson" and orjson is not None else b", "
+    buffer = bytearray(prefix)
+    is_first_item = True
+    for item in items:
+        if not is_first_item:
+            buffer += separator
+        buffer += render_json(item)
+        is_first_item = False
+        if len(buffer) >= STREAMING_RESPONSE_BUFFER_SIZE:
+            yield bytes(buffer)
+            buffer.clear()
+    buffer += suffix
+    yield bytes(buffer)
+
+
+class StreamingJsonResponse(StreamingHttpResponse):
+    """A response that writes a JSON array of the items as they are produced, use it with a QuerySet.iterator() so that the size of the result does not
+    change the memory used by the worker"""
+
+    def __init__(self, items: Iterable[Any], prefix: bytes = b"[", suffix: bytes = b"]", **kwargs):
+        kwargs.setdefault("content_type", RESPONSE_CONTENT_TYPE)
+        super().__init__(streaming_content=stream_json_array(items, prefix=prefix, suffix=suffix), **kwargs)
+
+
+if JSON_RENDERER_BACKEND == "orjson" and orjson is None:
+    logger.warning("JSON_RENDERER_BACKEND is set to orjson but the orjson package is not installed, falling back to the standard library encoder")
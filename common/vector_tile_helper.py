@@ -0,0 +1,336 @@
+import logging
+import math
+from os import environ as env
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import arrow
+from dotenv import find_dotenv, load_dotenv
+from redis.exceptions import WatchError
+from shapely.geometry import box
+from shapely.geometry.base import BaseGeometry
+from shapely.ops import transform
+
+from auth_helper.common import get_redis
+from flight_declaration_operations.models import FlightDeclaration
+from geo_fence_operations.models import GeoFence
+
+from .bounds_helper import parse_bounds, view_box_filter
+from .data_definitions import (
+    ACTIVE_OPERATIONAL_STATES,
+    VECTOR_TILE_GENERATION_KEY,
+    VECTOR_TILE_KEY,
+    VECTOR_TILE_TRAFFIC_KEY,
+    VECTOR_TILE_ZOOM_KEYS_KEY,
+)
+from .geometry_cache import geo_json_to_shape
+from .projection_helper import WGS84_EPSG_CODE, get_transformer
+
+try:
+    import mapbox_vector_tile
+except ImportError:  # mapbox-vector-tile is optional, without it the tile end point is not available
+    mapbox_vector_tile = None
+
+load_dotenv(find_dotenv())
+
+logger = logging.getLogger("django")
+
+WEB_MERCATOR_EPSG_CODE = 3857
+WEB_MERCATOR_ORIGIN = 20037508.342789244
+MAX_MERCATOR_LATITUDE = 85.0511287798
+TILE_EXTENT = 4096
+# Geometries are clipped to the tile grown by this many tile units on every side so that lines and outlines continue across tile edges
+TILE_BUFFER = 64
+VECTOR_TILE_MAX_ZOOM = 22
+VECTOR_TILE_CONTENT_TYPE = "application/vnd.mapbox-vector-tile"
+
+VECTOR_TILE_MAX_CACHED_ZOOM = int(env.get("VECTOR_TILE_MAX_CACHED_ZOOM", 16))
+VECTOR_TILE_CACHE_TTL_SECS = int(env.get("VECTOR_TILE_CACHE_TTL_SECS", 3600))
+VECTOR_TILE_SIMPLIFICATION_PIXELS = float(env.get("VECTOR_TILE_SIMPLIFICATION_PIXELS", 1))
+TRAFFIC_TILE_CACHE_TTL_SECS = int(env.get("TRAFFIC_TILE_CACHE_TTL_SECS", 2))
+TRAFFIC_DENSITY_WINDOW_SECS = int(env.get("TRAFFIC_DENSITY_WINDOW_SECS", 60))
+TRAFFIC_DENSITY_GRID_SIZE = 16
+
+
+def is_valid_tile(z: int, x: int, y: int) -> bool:
+    return 0 <= z <= VECTOR_TILE_MAX_ZOOM and 0 <= x < 2**z and 0 <= y < 2**z
+
+
+def get_tile_mercator_bounds(z: int, x: int, y: int) -> Tuple[float, float, float, float]:
+    """The bounds of a XYZ tile in Web Mercator meters (min x, min y, max x, max y)"""
+    tile_size = 2 * WEB_MERCATOR_ORIGIN / 2**z
+    min_x = -WEB_MERCATOR_ORIGIN + x * tile_size
+    max_y = WEB_MERCATOR_ORIGIN - y * tile_size
+    return min_x, max_y - tile_size, min_x + tile_size, max_y
+
+
+def get_tile_lonlat_bounds(z: int, x: int, y: int) -> List[float]:
+    """The bounds of a XYZ tile in lat / lon in the order of the stored bounds (min lon, min lat, max lon, max lat)"""
+
+    def tile_latitude(tile_y: int) -> float:
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * tile_y / 2**z))))
+
+    return [x / 2**z * 360 - 180, tile_latitude(y + 1), (x + 1) / 2**z * 360 - 180, tile_latitude(y)]
+
+
+def get_tile_range(bounds: Tuple[float, float, float, float], z: int) -> Tuple[int, int, int, int]:
+    """The range of tiles (min x, min y, max x, max y) at zoom level z that cover the lat / lon bounds"""
+    min_lon, min_lat, max_lon, max_lat = bounds
+    num_tiles = 2**z
+
+    def tile_x(lon: float) -> int:
+        return min(max(int((lon + 180) / 360 * num_tiles), 0), num_tiles - 1)
+
+    def tile_y(lat: float) -> int:
+        lat_rad = math.radians(min(max(lat, -MAX_MERCATOR_LATITUDE), MAX_MERCATOR_LATITUDE))
+        return min(max(int((1 - math.asinh(math.tan(lat_rad)) / math.pi) / 2 * num_tiles), 0), num_tiles - 1)
+
+    return tile_x(min_lon), tile_y(max_lat), tile_x(max_lon), tile_y(min_lat)
+
+
+def to_web_mercator(geometry: BaseGeometry) -> BaseGeometry:
+    return transform(get_transformer(WGS84_EPSG_CODE, WEB_MERCATOR_EPSG_CODE).transform, geometry)
+
+
+class VectorTileRenderer:
+    """Render Mapbox Vector Tiles of the GeoFences, the active operational intents of flight declarations and the density of live air traffic. The GeoFence
+    and operational intent layers are cached in Redis per tile until one of the objects under the tile changes, the traffic layer is cached for a few seconds
+    """
+
+    def __init__(self, z: int, x: int, y: int):
+        self.z = z
+        self.x = x
+        self.y = y
+        self.mercator_bounds = get_tile_mercator_bounds(z, x, y)
+        self.lonlat_bounds = get_tile_lonlat_bounds(z, x, y)
+        tile_size = self.mercator_bounds[2] - self.mercator_bounds[0]
+        self.clip_box = box(*self.mercator_bounds).buffer(tile_size * TILE_BUFFER / TILE_EXTENT, join_style=2)
+        # Vertices closer than about a pixel at this zoom level are not visible, geometries are simplified accordingly
+        self.simplification_tolerance = tile_size / 256 * VECTOR_TILE_SIMPLIFICATION_PIXELS
+        self.r = get_redis(decode_responses=False)
+
+    def prepare_geometry(self, geometry: BaseGeometry) -> Optional[BaseGeometry]:
+        """Project a lat / lon geometry, simplify it for the zoom level of the tile and clip it to the tile, None is returned if nothing is left"""
+        prepared_geometry = to_web_mercator(geometry).simplify(self.simplification_tolerance, preserve_topology=True).intersection(self.clip_box)
+        return None if prepared_geometry.is_empty else prepared_geometry
+
+    def get_geo_fence_features(self) -> List[dict]:
+        now = arrow.now().isoformat()
+        all_geo_fences = (
+            GeoFence.objects.filter(view_box_filter(self.lonlat_bounds), is_test_dataset=False, end_datetime__gte=now)
+            .only("id", "name", "raw_geo_fence", "bounds", "upper_limit", "lower_limit", "status", "start_datetime", "end_datetime")
+            .iterator()
+        )
+        all_features = []
+        for geo_fence in all_geo_fences:
+            geometry = self.prepare_geometry(geo_json_to_shape(geo_fence.raw_geo_fence, bounds=geo_fence.bounds))
+            if geometry is None:
+                continue
+            all_features.append(
+                {
+                    "geometry": geometry,
+                    "properties": {
+                        "id": str(geo_fence.id),
+                        "name": geo_fence.name,
+                        "upper_limit": float(geo_fence.upper_limit),
+                        "lower_limit": float(geo_fence.lower_limit),
+                        "status": geo_fence.status,
+                        "start_datetime": arrow.get(geo_fence.start_datetime).isoformat(),
+                        "end_datetime": arrow.get(geo_fence.end_datetime).isoformat(),
+                    },
+                }
+            )
+        return all_features
+
+    def get_operational_intent_features(self) -> List[dict]:
+        all_flight_declarations = (
+            FlightDeclaration.objects.filter(view_box_filter(self.lonlat_bounds), state__in=ACTIVE_OPERATIONAL_STATES)
+            .only("id", "state", "originating_party", "operational_intent_geojson", "bounds", "start_datetime", "end_datetime")
+            .iterator()
+        )
+        all_features = []
+        for flight_declaration in all_flight_declarations:
+            geometry = self.prepare_geometry(geo_json_to_shape(flight_declaration.operational_intent_geojson, bounds=flight_declaration.bounds))
+            if geometry is None:
+                continue
+            all_features.append(
+                {
+                    "geometry": geometry,
+                    "properties": {
+                        "id": str(flight_declaration.id),
+                        "state": flight_declaration.state,
+                        "originating_party": flight_declaration.originating_party,
+                        "start_datetime": arrow.get(flight_declaration.start_datetime).isoformat(),
+                        "end_datetime": arrow.get(flight_declaration.end_datetime).isoformat(),
+                    },
+                }
+            )
+        return all_features
+
+    def get_traffic_density_features(self) -> List[dict]:
+        """The number of aircraft observed in the last TRAFFIC_DENSITY_WINDOW_SECS in each cell of a grid over the tile, the latest observation of every
+        aircraft is read from the observations stream without consuming it"""
+        window_start_ms = int((arrow.now().timestamp() - TRAFFIC_DENSITY_WINDOW_SECS) * 1000)
+        all_messages = self.r.xrevrange("all_observations", max="+", min=str(window_start_ms))
+        min_lon, min_lat, max_lon, max_lat = self.lonlat_bounds
+        latest_positions = {}
+        for _, message in all_messages:
+            try:
+                icao_address = message[b"icao_address"].decode("utf-8")
+                lon_dd, lat_dd = float(message[b"lon_dd"]), float(message[b"lat_dd"])
+            except (KeyError, ValueError):
+                continue
+            # The messages are read from the newest so the first one of a aircraft is its latest position
+            if icao_address not in latest_positions:
+                latest_positions[icao_address] = (lon_dd, lat_dd)
+
+        all_positions_in_tile = [p for p in latest_positions.values() if min_lon <= p[0] <= max_lon and min_lat <= p[1] <= max_lat]
+        if not all_positions_in_tile:
+            return []
+        projected_x, projected_y = get_transformer(WGS84_EPSG_CODE, WEB_MERCATOR_EPSG_CODE).transform(
+            [p[0] for p in all_positions_in_tile], [p[1] for p in all_positions_in_tile]
+        )
+        cell_counts: Dict[Tuple[int, int], int] = {}
+        tile_min_x, tile_min_y, tile_max_x, _ = self.mercator_bounds
+        cell_size = (tile_max_x - tile_min_x) / TRAFFIC_DENSITY_GRID_SIZE
+        for point_x, point_y in zip(projected_x, projected_y):
+            cell = (
+                min(int((point_x - tile_min_x) / cell_size), TRAFFIC_DENSITY_GRID_SIZE - 1),
+                min(int((point_y - tile_min_y) / cell_size), TRAFFIC_DENSITY_GRID_SIZE - 1),
+            )
+            cell_counts[cell] = cell_counts.get(cell, 0) + 1
+
+        return [
+            {
+                "geometry": box(
+                    tile_min_x + cell_x * cell_size,
+                    tile_min_y + cell_y * cell_size,
+                    tile_min_x + (cell_x + 1) * cell_size,
+                    tile_min_y + (cell_y + 1) * cell_size,
+                ),
+                "properties": {"count": count},
+            }
+            for (cell_x, cell_y), count in cell_counts.items()
+        ]
+
+    def encode(self, layers: List[dict]) -> bytes:
+        layers = [layer for layer in layers if layer["features"]]
+        if not layers:
+            return b""
+        return mapbox_vector_tile.encode(layers, default_options={"quantize_bounds": self.mercator_bounds, "extents": TILE_EXTENT})
+
+    def get_cache_key(self) -> str:
+        return VECTOR_TILE_KEY + "{z}/{x}/{y}".format(z=self.z, x=self.x, y=self.y)
+
+    def get_generation_key(self) -> str:
+        return VECTOR_TILE_GENERATION_KEY + "{z}/{x}/{y}".format(z=self.z, x=self.x, y=self.y)
+
+    def get_cache_ttl(self, all_features: List[dict]) -> int:
+        """The tile is cached until the first of its objects ends so that ended objects are not drawn, at most for VECTOR_TILE_CACHE_TTL_SECS"""
+        now = arrow.now()
+        all_remaining_secs = [(arrow.get(feature["properties"]["end_datetime"]) - now).total_seconds() for feature in all_features]
+        return max(1, int(min([secs for secs in all_remaining_secs if secs > 0] + [VECTOR_TILE_CACHE_TTL_SECS])))
+
+    def cache_tile(self, tile: bytes, generation: Optional[bytes], ttl: int) -> None:
+        """Cache the rendered tile unless the tile has been removed from the cache (and its generation incremented) while it was rendered, the tile
+        would otherwise show the objects as they were before the change"""
+        generation_key = self.get_generation_key()
+        with self.r.pipeline() as pipe:
+            try:
+                pipe.watch(generation_key)
+                if pipe.get(generation_key) != generation:
+                    return
+                pipe.multi()
+                pipe.set(self.get_cache_key(), tile, ex=ttl)
+                pipe.execute()
+            except WatchError:
+                pass
+
+    def render_airspace_layers(self) -> bytes:
+        """The encoded GeoFence and operational intent layers of the tile, they are read from the cache if the tile has not changed since it was rendered"""
+        is_cached_zoom = self.z <= VECTOR_TILE_MAX_CACHED_ZOOM
+        generation = None
+        if is_cached_zoom:
+            cached_tile = self.r.get(self.get_cache_key())
+            if cached_tile is not None:
+                return cached_tile
+            # The tile is tracked before it is rendered so that a change of a object under it while it is rendered increments its generation
+            zoom_keys_key = VECTOR_TILE_ZOOM_KEYS_KEY + str(self.z)
+            pipe = self.r.pipeline()
+            pipe.sadd(zoom_keys_key, "{x}/{y}".format(x=self.x, y=self.y))
+            pipe.expire(zoom_keys_key, VECTOR_TILE_CACHE_TTL_SECS)
+            pipe.get(self.get_generation_key())
+            _, _, generation = pipe.execute()
+
+        all_geo_fence_features = self.get_geo_fence_features()
+        all_operational_intent_features = self.get_operational_intent_features()
+        tile = self.encode(
+            [
+                {"name": "geo_fences", "features": all_geo_fence_features},
+                {"name": "operational_intents", "features": all_operational_intent_features},
+            ]
+        )
+        if is_cached_zoom:
+            self.cache_tile(tile=tile, generation=generation, ttl=self.get_cache_ttl(all_geo_fence_features + all_operational_intent_features))
+        return tile
+
+    def render_traffic_layer(self) -> bytes:
+        traffic_key = VECTOR_TILE_TRAFFIC_KEY + "{z}/{x}/{y}".format(z=self.z, x=self.x, y=self.y)
+        cached_layer = self.r.get(traffic_key)
+        if cached_layer is not None:
+            return cached_layer
+        layer = self.encode([{"name": "traffic_density", "features": self.get_traffic_density_features()}])
+        self.r.set(traffic_key, layer, ex=TRAFFIC_TILE_CACHE_TTL_SECS)
+        return layer
+
+    def render(self) -> bytes:
+        # A tile is a list of layers, so separately encoded tiles are joined into a single tile by concatenating them
+        return self.render_airspace_layers() + self.render_traffic_layer()
+
+
+def remove_tile(pipe, z: int, tile: str) -> None:
+    """Queue the removal of a cached tile, incrementing its generation stops a render of the tile that started before the change from being cached"""
+    generation_key = VECTOR_TILE_GENERATION_KEY + "{z}/{tile}".format(z=z, tile=tile)
+    pipe.delete(VECTOR_TILE_KEY + "{z}/{tile}".format(z=z, tile=tile))
+    pipe.incr(generation_key)
+    pipe.expire(generation_key, VECTOR_TILE_CACHE_TTL_SECS)
+
+
+def invalidate_tiles(all_bounds: Iterable[str]) -> None:
+    """Remove the cached tiles that cover any of the (comma separated) bounds at every cached zoom level, this is called when a GeoFence or flight
+    declaration is changed"""
+    all_parsed_bounds = [b for b in (parse_bounds(bounds) for bounds in all_bounds) if b is not None]
+    if not all_parsed_bounds:
+        return
+    r = get_redis()
+    pipe = r.pipeline()
+    for z in range(VECTOR_TILE_MAX_CACHED_ZOOM + 1):
+        pipe.smembers(VECTOR_TILE_ZOOM_KEYS_KEY + str(z))
+    all_cached_tiles = pipe.execute()
+
+    pipe = r.pipeline()
+    for z, cached_tiles in enumerate(all_cached_tiles):
+        if not cached_tiles:
+            continue
+        all_tile_ranges = [get_tile_range(bounds, z) for bounds in all_parsed_bounds]
+        for cached_tile in cached_tiles:
+            x, y = [int(i) for i in cached_tile.split("/")]
+            if any(min_x <= x <= max_x and min_y <= y <= max_y for min_x, min_y, max_x, max_y in all_tile_ranges):
+                remove_tile(pipe=pipe, z=z, tile=cached_tile)
+                pipe.srem(VECTOR_TILE_ZOOM_KEYS_KEY + str(z), cached_tile)
+    pipe.execute()
+
+
+def invalidate_all_tiles() -> None:
+    """Remove all cached tiles, use after objects are changed in bulk (e.g. a GeoZone import)"""
+    r = get_redis()
+    pipe = r.pipeline()
+    for z in range(VECTOR_TILE_MAX_CACHED_ZOOM + 1):
+        pipe.smembers(VECTOR_TILE_ZOOM_KEYS_KEY + str(z))
+    all_cached_tiles = pipe.execute()
+
+    pipe = r.pipeline()
+    for z, cached_tiles in enumerate(all_cached_tiles):
+        for cached_tile in cached_tiles:
+            remove_tile(pipe=pipe, z=z, tile=cached_tile)
+        pipe.delete(VECTOR_TILE_ZOOM_KEYS_KEY + str(z))
+    pipe.execute()
@@ -76,6 +76,17 @@ def process_telemetry_conformance_message(sender, **kwargs):
         new_state = 3
         event = "ua_exits_coordinated_op_intent"
 
+    elif non_conformance_state_code == "C8":
+        geo_fence_breached_msg = (
+            "The telemetry location provided for operation {flight_declaration_id}, is within an active GeoFence. C8 check failed.".format(
+                flight_declaration_id=flight_declaration_id
+            )
+        )
+        logger.error(geo_fence_breached_msg)
+        my_operation_notification.send_conformance_status_notification(message=geo_fence_breached_msg, level="error")
+        new_state = 3
+        event = "ua_exits_coordinated_op_intent"
+
     # The operation is non-conforming, need to update the operational intent in the dss and notify peer USSP
     if event:
         my_argon_server_database_reader = ArgonServerDatabaseReader()
@@ -1,12 +1,11 @@
-import json
 import logging
 
 from django.core.management.base import BaseCommand, CommandError
 from dotenv import find_dotenv, load_dotenv
 
-from auth_helper.common import get_redis
 from common.database_operations import ArgonServerDatabaseReader
 from scd_operations.dss_scd_helper import SCDOperations
+from scd_operations.opint_repository import OperationalIntentsRepository
 
 load_dotenv(find_dotenv())
 ENV_FILE = find_dotenv()
@@ -56,15 +55,11 @@ class Command(BaseCommand):
         flight_authorization = my_database_reader.get_flight_authorization_by_flight_declaration_obj(flight_declaration=flight_declaration)
         dss_operational_intent_ref_id = flight_authorization.dss_operational_intent_id
 
-        r = get_redis()
+        my_operational_intents_repository = OperationalIntentsRepository()
+        op_int_summary = my_operational_intents_repository.get_operational_intent_summary(operation_id=flight_declaration_id)
 
-        flight_opint = "flight_opint." + str(flight_declaration_id)
-
-        if r.exists(flight_opint):
-            op_int_details_raw = r.get(flight_opint)
-            op_int_details = json.loads(op_int_details_raw)
-            reference_full = op_int_details["success_response"]["operational_intent_reference"]
-            stored_ovn = reference_full["ovn"]
+        if op_int_summary:
+            stored_ovn = op_int_summary.ovn
             try:
                 flight_declaration_id = options["flight_declaration_id"]
             except Exception as e:
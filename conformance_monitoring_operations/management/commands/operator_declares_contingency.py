@@ -7,8 +7,7 @@ from django.core.management.base import BaseCommand, CommandError
 from dotenv import find_dotenv, load_dotenv
 from shapely.geometry import Point
 
-from auth_helper.common import get_redis
-from common.data_definitions import FLIGHT_OPINT_KEY, OPERATION_STATES
+from common.data_definitions import OPERATION_STATES
 from common.database_operations import ArgonServerDatabaseReader
 from conformance_monitoring_operations.data_definitions import PolygonAltitude
 from flight_declaration_operations.utils import OperationalIntentsConverter
@@ -17,6 +16,7 @@ from scd_operations.dss_scd_helper import (
     OperationalIntentReferenceHelper,
     SCDOperations,
 )
+from scd_operations.opint_repository import OperationalIntentsRepository
 from scd_operations.scd_data_definitions import Polygon, Volume4D
 
 load_dotenv(find_dotenv())
@@ -62,13 +62,12 @@ class Command(BaseCommand):
         my_operational_intent_parser = OperationalIntentReferenceHelper()
         stream_ops = flight_stream_helper.StreamHelperOps()
         obs_helper = flight_stream_helper.ObservationReadOperations()
-        r = get_redis()
+        my_operational_intents_repository = OperationalIntentsRepository()
 
         flight_declaration_id = options["flight_declaration_id"]
         if not flight_declaration_id:
             raise CommandError("Incomplete command, Flight Declaration ID not provided")
 
-        flight_opint = FLIGHT_OPINT_KEY + str(flight_declaration_id)
         flight_declaration = my_database_reader.get_flight_declaration_by_id(flight_declaration_id=flight_declaration_id)
         if not flight_declaration:
             raise CommandError(
@@ -78,7 +77,7 @@ class Command(BaseCommand):
         current_state_str = OPERATION_STATES[current_state][1]
 
         # Update the volume to create a new off-nominal volume
-        if not r.exists(flight_opint):
+        if not my_operational_intents_repository.operational_intent_exists(operation_id=flight_declaration_id):
             raise CommandError(
                 "Flight Declaration with ID {flight_declaration_id} does not exist in the cached database".format(
                     flight_declaration_id=flight_declaration_id
@@ -1,4 +1,3 @@
-import json
 import logging
 from os import environ as env
 from typing import List
@@ -8,13 +7,13 @@ from django.core.management.base import BaseCommand, CommandError
 from dotenv import find_dotenv, load_dotenv
 from shapely.geometry import Point, Polygon
 
-from auth_helper.common import get_redis
 from common.data_definitions import OPERATION_STATES
 from common.database_operations import ArgonServerDatabaseReader
 from conformance_monitoring_operations.data_definitions import PolygonAltitude
 from flight_declaration_operations.utils import OperationalIntentsConverter
 from flight_feed_operations import flight_stream_helper
 from scd_operations.dss_scd_helper import SCDOperations
+from scd_operations.opint_repository import OperationalIntentsRepository
 from scd_operations.scd_data_definitions import (
     OperationalIntentReferenceDSSResponse,
     Time,
@@ -89,15 +88,11 @@ class Command(BaseCommand):
         current_state = flight_declaration.state
         current_state_str = OPERATION_STATES[current_state][1]
 
-        r = get_redis()
-
-        flight_opint = "flight_opint." + str(flight_declaration_id)
+        my_operational_intents_repository = OperationalIntentsRepository()
         # Update the volume to create a new volume
+        op_int_details = my_operational_intents_repository.get_operational_intent(operation_id=flight_declaration_id)
 
-        if r.exists(flight_opint):
-            op_int_details_raw = r.get(flight_opint)
-            op_int_details = json.loads(op_int_details_raw)
-
+        if op_int_details:
             reference_full = op_int_details["success_response"]["operational_intent_reference"]
             dss_response_subscribers = op_int_details["success_response"]["subscribers"]
             details_full = op_int_details["operational_intent_details"]
@@ -247,14 +242,9 @@ class Command(BaseCommand):
                     )
                     logger.debug(new_volume_4d)
 
-                    r = get_redis()
-
-                    flight_opint = "flight_opint." + str(flight_declaration_id)
-
-                    if r.exists(flight_opint):
-                        op_int_details_raw = r.get(flight_opint)
-                        op_int_details = json.loads(op_int_details_raw)
+                    op_int_details = my_operational_intents_repository.get_operational_intent(operation_id=flight_declaration_id)
 
+                    if op_int_details:
                         reference_full = op_int_details["success_response"]["operational_intent_reference"]
                         dss_response_subscribers = op_int_details["success_response"]["subscribers"]
                         details_full = op_int_details["operational_intent_details"]
@@ -1,14 +1,13 @@
-import json
 import logging
 from os import environ as env
 
 from django.core.management.base import BaseCommand, CommandError
 from dotenv import find_dotenv, load_dotenv
 
-from auth_helper.common import get_redis
 from common.data_definitions import OPERATION_STATES
 from common.database_operations import ArgonServerDatabaseReader
 from scd_operations.dss_scd_helper import SCDOperations
+from scd_operations.opint_repository import OperationalIntentsRepository
 from scd_operations.scd_data_definitions import (
     OperationalIntentReferenceDSSResponse,
     Time,
@@ -70,14 +69,10 @@ class Command(BaseCommand):
 
         operational_intent_id = flight_authorization.dss_operational_intent_id
 
-        r = get_redis()
-
-        flight_opint = "flight_opint." + str(flight_declaration_id)
-
-        if r.exists(flight_opint):
-            op_int_details_raw = r.get(flight_opint)
-            op_int_details = json.loads(op_int_details_raw)
+        my_operational_intents_repository = OperationalIntentsRepository()
+        op_int_details = my_operational_intents_repository.get_operational_intent(operation_id=flight_declaration_id)
 
+        if op_int_details:
             reference_full = op_int_details["success_response"]["operational_intent_reference"]
             dss_response_subscribers = op_int_details["success_response"]["subscribers"]
             details_full = op_int_details["operational_intent_details"]
@@ -141,6 +136,13 @@ class Command(BaseCommand):
                 )
 
                 if operational_update_response.status == 200:
+                    new_operational_intent_reference = operational_update_response.dss_response.operational_intent_reference
+                    my_operational_intents_repository.update_operational_intent_reference(
+                        operation_id=flight_declaration_id,
+                        ovn=new_operational_intent_reference.ovn,
+                        version=new_operational_intent_reference.version,
+                        state=new_operational_intent_reference.state,
+                    )
                     logger.info(
                         "Successfully updated operational intent status for {operational_intent_id} on the DSS".format(
                             operational_intent_id=operational_intent_id
@@ -1 +1,104 @@
-# Create your tests here.
+import arrow
+from django.test import TestCase
+
+from flight_declaration_operations.models import FlightAuthorization
+from flight_declaration_operations.tests import create_flight_declaration
+from geo_fence_operations.geozone_import_helper import import_geo_zone_features
+from geo_fence_operations.models import GeoFence
+from geo_fence_operations.rtree_geo_fence_helper import get_geo_fence_index
+from geo_fence_operations.tests import create_geo_fence, get_ed_269_feature, get_ed_269_geometry
+from scd_operations.scd_data_definitions import LatLngPoint
+
+from .conformance_state_helper import ConformanceChecksList
+from .utils import ArgonServerConformanceEngine
+
+
+class GeoFenceBreachTests(TestCase):
+    def setUp(self):
+        # The index of this process outlives the rolled back GeoFences of earlier tests, it is loaded again from the database
+        self.geo_fence_index = get_geo_fence_index()
+        self.geo_fence_index.invalidate()
+        self.geo_fence_index.sync()
+
+    def create_geo_fence(self, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            return create_geo_fence(**kwargs)
+
+    def get_breached_ids(self, lng: float = 7.475, lat: float = 46.975, altitude_m_wgs_84: float = 100, at=None) -> set:
+        all_breached = self.geo_fence_index.get_breached_geo_fences(lng=lng, lat=lat, altitude_m_wgs_84=altitude_m_wgs_84, at=at or arrow.now())
+        return {geo_fence["geo_fence_id"] for geo_fence in all_breached}
+
+    def test_position_inside_a_geo_fence_is_a_breach(self):
+        geo_fence = self.create_geo_fence()
+        self.assertEqual(self.get_breached_ids(), {str(geo_fence.id)})
+        self.assertEqual(self.get_breached_ids(lng=7.485), set())
+
+    def test_altitude_limits_are_compared_for_wgs84(self):
+        geo_fence = self.create_geo_fence(lower_limit=50, upper_limit=150)
+        self.assertEqual(self.get_breached_ids(altitude_m_wgs_84=100), {str(geo_fence.id)})
+        self.assertEqual(self.get_breached_ids(altitude_m_wgs_84=200), set())
+        self.assertEqual(self.get_breached_ids(altitude_m_wgs_84=20), set())
+
+    def test_whole_column_of_agl_geo_fences_is_a_breach(self):
+        geo_fence = self.create_geo_fence(lower_limit=50, upper_limit=150, altitude_ref=1)
+        self.assertEqual(self.get_breached_ids(altitude_m_wgs_84=600), {str(geo_fence.id)})
+
+    def test_inactive_geo_fences_are_not_a_breach(self):
+        self.create_geo_fence()
+        self.assertEqual(self.get_breached_ids(at=arrow.now().shift(hours=2)), set())
+        self.assertEqual(self.get_breached_ids(at=arrow.now().shift(hours=-2)), set())
+
+    def test_geo_fences_that_are_not_ready_are_not_a_breach(self):
+        for status in [0, 3, 4, 5, 6]:
+            self.create_geo_fence(status=status)
+        self.assertEqual(self.get_breached_ids(), set())
+
+    def test_imported_geo_zones_are_checked_with_their_limits(self):
+        geo_zone_feature = get_ed_269_feature([get_ed_269_geometry(7.47, 46.97, 7.48, 46.98, lower_limit=300, upper_limit=500, uom_dimensions="FT")])
+        with self.captureOnCommitCallbacks(execute=True):
+            import_geo_zone_features([geo_zone_feature], is_test_dataset=False)
+        geo_fence_id = str(GeoFence.objects.get(name="Test GeoZone").id)
+        self.assertEqual(self.get_breached_ids(altitude_m_wgs_84=120), {geo_fence_id})
+        self.assertEqual(self.get_breached_ids(altitude_m_wgs_84=200), set())
+        self.assertEqual(self.get_breached_ids(altitude_m_wgs_84=50), set())
+
+    def test_imported_geo_zones_above_ground_level_are_a_breach_of_the_whole_column(self):
+        geo_zone_feature = get_ed_269_feature(
+            [
+                get_ed_269_geometry(
+                    7.47, 46.97, 7.48, 46.98, lower_limit=0, upper_limit=120, lower_vertical_reference="AGL", upper_vertical_reference="AGL"
+                )
+            ]
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            import_geo_zone_features([geo_zone_feature], is_test_dataset=False)
+        self.assertEqual(self.get_breached_ids(altitude_m_wgs_84=600), {str(GeoFence.objects.get(name="Test GeoZone").id)})
+
+    def test_test_dataset_geo_fences_are_not_a_breach(self):
+        self.create_geo_fence(is_test_dataset=True)
+        self.assertEqual(self.get_breached_ids(), set())
+
+
+class TelemetryConformanceGeoFenceTests(TestCase):
+    def setUp(self):
+        self.geo_fence_index = get_geo_fence_index()
+        self.geo_fence_index.invalidate()
+        self.geo_fence_index.sync()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.flight_declaration = create_flight_declaration(min_lon=7.46, min_lat=46.96, max_lon=7.49, max_lat=46.99, state=2)
+            FlightAuthorization.objects.create(declaration=self.flight_declaration)
+            create_geo_fence()
+
+    def check_conformance(self, lng: float, lat: float):
+        return ArgonServerConformanceEngine().is_operation_conformant_via_telemetry(
+            flight_declaration_id=str(self.flight_declaration.id),
+            aircraft_id=self.flight_declaration.aircraft_id,
+            telemetry_location=LatLngPoint(lat=lat, lng=lng),
+            altitude_m_wgs_84=100,
+        )
+
+    def test_telemetry_inside_a_geo_fence_fails_the_c8_check(self):
+        self.assertEqual(self.check_conformance(lng=7.475, lat=46.975), ConformanceChecksList.C8)
+
+    def test_telemetry_outside_geo_fences_is_conformant(self):
+        self.assertIs(self.check_conformance(lng=7.465, lat=46.965), True)
@@ -10,6 +10,7 @@ from shapely.geometry import Polygon as Plgn
 
 from common.database_operations import ArgonServerDatabaseReader
 from conformance_monitoring_operations.data_definitions import PolygonAltitude
+from geo_fence_operations.rtree_geo_fence_helper import get_geo_fence_index
 from scd_operations.scd_data_definitions import LatLngPoint
 
 from .conformance_state_helper import ConformanceChecksList
@@ -152,7 +153,16 @@ class ArgonServerConformanceEngine:
             return ConformanceChecksList.C7a
 
         # C8 check Check if aircraft is not breaching any active Geofences
-        # TODO
+        breached_geo_fences = get_geo_fence_index().get_breached_geo_fences(lng=lng, lat=lat, altitude_m_wgs_84=altitude_m_wgs_84, at=now)
+        try:
+            assert not breached_geo_fences
+        except AssertionError:
+            logger.info(
+                "Operation {flight_declaration_id} is breaching the GeoFences {geo_fence_ids}".format(
+                    flight_declaration_id=flight_declaration_id, geo_fence_ids=", ".join(i["geo_fence_id"] for i in breached_geo_fences)
+                )
+            )
+            return ConformanceChecksList.C8
         return True
 
     def check_flight_authorization_conformance(self, flight_declaration_id: str) -> bool:
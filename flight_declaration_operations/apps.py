@@ -14,6 +14,9 @@ class FlightDeclarationOperationsConfig(AppConfig):
     name = "flight_declaration_operations"
 
     def ready(self):
+        # Keep the in memory index of active flight declarations up to date with saved and deleted declarations
+        from . import signals  # noqa: F401
+
         amqp_connection_url = env.get("AMQP_URL", 0)
 
         if amqp_connection_url:
@@ -34,6 +34,21 @@ class FlightDeclarationRequest:
     state: int
 
 
+@dataclass
+class FlightDeclarationSubmission:
+    """A validated flight declaration submitted via the API"""
+
+    flight_declaration_geo_json: dict
+    features: List[shape]
+    type_of_operation: int
+    aircraft_id: str
+    originating_party: str
+    submitted_by: Optional[str]
+    approved_by: Optional[str]
+    start_datetime: str
+    end_datetime: str
+
+
 @dataclass
 class Altitude:
     meters: int
@@ -58,3 +73,26 @@ class HTTP404Response:
 @dataclass
 class HTTP400Response:
     message: str
+
+
+@dataclass
+class FlightDeclarationBulkCreateItemResponse:
+    """The result of a single declaration in a bulk submission, the position of the declaration in the submitted list is in index. Declarations that are not valid
+    are not created and have no id or state"""
+
+    index: int
+    id: Optional[str]
+    message: str
+    is_approved: bool
+    state: Optional[int]
+
+
+@dataclass
+class FlightDeclarationBulkCreateResponse:
+    """Hold data for a bulk submission response, the results are in the order the declarations were submitted"""
+
+    message: str
+    submitted: int
+    created: int
+    rejected: int
+    results: List[FlightDeclarationBulkCreateItemResponse]
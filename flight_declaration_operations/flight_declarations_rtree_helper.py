@@ -1,66 +1,220 @@
-import hashlib
-from typing import List, Union
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, List, Tuple, Union
 
 import arrow
-from django.db.models import QuerySet
 from rtree import index
+from shapely.geometry.base import BaseGeometry
+from shapely.prepared import prep
 
-from auth_helper.common import get_redis
+from common.data_definitions import (
+    ACTIVE_OPERATIONAL_STATES,
+    FLIGHT_DECLARATION_INDEX_CHANGES_KEY,
+    FLIGHT_DECLARATION_INDEX_VERSION_KEY,
+)
+from common.geometry_cache import PreparedGeometryCache, geo_json_to_shape
+from common.index_change_stream import IndexChangeStream
 
 from .models import FlightDeclaration
+from .utils import DECLARATION_FEATURE_BUFFER
 
+logger = logging.getLogger("django")
 
-class FlightDeclarationRTreeIndexFactory:
-    def __init__(self, index_name: str):
-        self.r = get_redis()
-        self.idx = index.Index(index_name)
+DateLike = Union[str, datetime, arrow.Arrow]
 
-    def add_box_to_index(
-        self,
-        id: int,
-        flight_declaration_id: str,
-        view: List[float],
-        start_date: str,
-        end_date: str,
-    ):
+
+class FlightDeclarationIndex:
+    """A long lived, per-process in memory three dimensional (longitude, latitude, time) index of the active flight declarations. The index is updated from the
+    FlightDeclaration save / delete signals: a declaration is added when it is saved in one of the ACTIVE_OPERATIONAL_STATES and removed when it leaves them or is
+    deleted. Every change records the id of the declaration in a change stream in Redis, before the next query every process reads only the declarations changed
+    since the last change it has applied from the database. A deconfliction check is a single query of the index and does not depend on the number of
+    declarations in the database."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.idx = self.create_index()
+        self.entries = {}  # flight_declaration_id -> (enumerated_id, coordinates)
+        self.next_enumerated_id = 0
+        self.change_stream = IndexChangeStream(version_key=FLIGHT_DECLARATION_INDEX_VERSION_KEY, changes_key=FLIGHT_DECLARATION_INDEX_CHANGES_KEY)
+        self.geometry_cache = PreparedGeometryCache()
+
+    def create_index(self) -> index.Index:
+        p = index.Property()
+        p.dimension = 3
+        return index.Index(properties=p)
+
+    def get_version(self) -> int:
+        return self.change_stream.get_version()
+
+    def get_coordinates(self, view: List[float], start_datetime: DateLike, end_datetime: DateLike) -> tuple:
+        return (view[0], view[1], arrow.get(start_datetime).timestamp(), view[2], view[3], arrow.get(end_datetime).timestamp())
+
+    def _insert(self, flight_declaration_id: str, bounds: str, start_datetime: DateLike, end_datetime: DateLike, updated_at: DateLike) -> None:
+        self._remove(flight_declaration_id)
+        try:
+            view = [float(i) for i in bounds.split(",")]
+        except (AttributeError, ValueError):
+            logger.error(
+                "Flight declaration {flight_declaration_id} has invalid bounds {bounds}, it is not indexed".format(
+                    flight_declaration_id=flight_declaration_id, bounds=bounds
+                )
+            )
+            return
+        coordinates = self.get_coordinates(view=view, start_datetime=start_datetime, end_datetime=end_datetime)
         metadata = {
-            "start_date": start_date,
-            "end_date": end_date,
+            "start_date": arrow.get(start_datetime).isoformat(),
+            "end_date": arrow.get(end_datetime).isoformat(),
             "flight_declaration_id": flight_declaration_id,
+            "updated_at": arrow.get(updated_at).isoformat(),
         }
-        self.idx.insert(id=id, coordinates=(view[0], view[1], view[2], view[3]), obj=metadata)
-
-    def delete_from_index(self, enumerated_id: int, view: List[float]):
-        self.idx.delete(id=enumerated_id, coordinates=(view[0], view[1], view[2], view[3]))
-
-    def generate_flight_declaration_index(self, all_flight_declarations: Union[QuerySet, List[FlightDeclaration]]) -> None:
-        """This method generates a rTree index of currently active operational indexes"""
-
-        present = arrow.now()
-        start_date = present.shift(days=-1)
-        end_date = present.shift(days=1)
-        for fence_idx, flight_declaration in enumerate(all_flight_declarations):
-            declaration_idx_str = str(flight_declaration.id)
-            flight_declaration_id = int(hashlib.sha256(declaration_idx_str.encode("utf-8")).hexdigest(), 16) % 10**8
-            view = [float(i) for i in flight_declaration.bounds.split(",")]
-            self.add_box_to_index(
-                id=flight_declaration_id,
-                flight_declaration_id=declaration_idx_str,
-                view=view,
-                start_date=start_date.isoformat(),
-                end_date=end_date.isoformat(),
+        enumerated_id = self.next_enumerated_id
+        self.next_enumerated_id += 1
+        self.idx.insert(id=enumerated_id, coordinates=coordinates, obj=metadata)
+        self.entries[flight_declaration_id] = (enumerated_id, coordinates)
+
+    def _remove(self, flight_declaration_id: str) -> None:
+        existing = self.entries.pop(flight_declaration_id, None)
+        if existing:
+            enumerated_id, coordinates = existing
+            self.idx.delete(id=enumerated_id, coordinates=coordinates)
+
+    def get_flight_declarations(self):
+        return FlightDeclaration.objects.only("id", "bounds", "start_datetime", "end_datetime", "updated_at", "state")
+
+    def _apply_flight_declaration(self, flight_declaration: FlightDeclaration) -> None:
+        flight_declaration_id = str(flight_declaration.id)
+        if flight_declaration.state in ACTIVE_OPERATIONAL_STATES:
+            self._insert(
+                flight_declaration_id=flight_declaration_id,
+                bounds=flight_declaration.bounds,
+                start_datetime=flight_declaration.start_datetime,
+                end_datetime=flight_declaration.end_datetime,
+                updated_at=flight_declaration.updated_at,
+            )
+        else:
+            self._remove(flight_declaration_id)
+
+    def _reload(self) -> None:
+        self.idx = self.create_index()
+        self.entries = {}
+        self.next_enumerated_id = 0
+        for flight_declaration in self.get_flight_declarations().filter(state__in=ACTIVE_OPERATIONAL_STATES).iterator():
+            self._apply_flight_declaration(flight_declaration)
+        logger.info("Loaded {num_declarations} active flight declarations in to the index".format(num_declarations=len(self.entries)))
+
+    def _apply_changes(self, flight_declaration_ids: List[str]) -> None:
+        """Read the changed declarations from the database, the ones that no longer exist have been deleted"""
+        changed_declarations = {
+            str(flight_declaration.id): flight_declaration
+            for flight_declaration in self.get_flight_declarations().filter(id__in=flight_declaration_ids)
+        }
+        for flight_declaration_id in flight_declaration_ids:
+            if flight_declaration_id in changed_declarations:
+                self._apply_flight_declaration(changed_declarations[flight_declaration_id])
+            else:
+                self._remove(flight_declaration_id)
+
+    def sync(self) -> None:
+        """Apply the flight declarations changed by any process since the index was last brought up to date"""
+        with self.lock:
+            self.change_stream.sync(reload=self._reload, apply_changes=self._apply_changes)
+
+    def update_flight_declaration(self, flight_declaration: FlightDeclaration) -> None:
+        """Record a created or updated flight declaration, this is called from the post_save signal once the transaction has been committed. Declarations that
+        are not in a active state are removed from the index"""
+        self.change_stream.record_changes([str(flight_declaration.id)])
+
+    def update_flight_declarations(self, flight_declarations: List[FlightDeclaration]) -> None:
+        """Record several created or updated flight declarations, use this after bulk_create which does not send the save signals"""
+        self.change_stream.record_changes([str(flight_declaration.id) for flight_declaration in flight_declarations])
+
+    def remove_flight_declaration(self, flight_declaration_id: str) -> None:
+        """Record a deleted flight declaration, this is called from the post_delete signal once the transaction has been committed"""
+        self.change_stream.record_changes([str(flight_declaration_id)])
+
+    def invalidate(self) -> None:
+        """Force all processes to rebuild their index, use after flight declarations are changed in bulk without signals (e.g. QuerySet.update)"""
+        self.change_stream.record_reload()
+
+    def get_conflicting_declarations(self, view_box: List[float], start_datetime: DateLike, end_datetime: DateLike) -> List[dict]:
+        """Returns the metadata of the active flight declarations whose bounds intersect the view box and whose time window overlaps the period"""
+        self.sync()
+        coordinates = self.get_coordinates(view=view_box, start_datetime=start_datetime, end_datetime=end_datetime)
+        with self.lock:
+            return [n.object for n in self.idx.intersection(coordinates, objects=True)]
+
+    def load_geometries(self, flight_declaration_ids: List[str]) -> Dict[str, Tuple[str, BaseGeometry]]:
+        all_declarations = FlightDeclaration.objects.filter(id__in=flight_declaration_ids).only(
+            "id", "flight_declaration_raw_geojson", "bounds", "updated_at"
+        )
+        return {
+            str(flight_declaration.id): (
+                arrow.get(flight_declaration.updated_at).isoformat(),
+                geo_json_to_shape(
+                    flight_declaration.flight_declaration_raw_geojson, bounds=flight_declaration.bounds, feature_buffer=DECLARATION_FEATURE_BUFFER
+                ),
             )
+            for flight_declaration in all_declarations
+        }
+
+    def filter_intersecting_declarations(self, candidates: List[dict], geometry: BaseGeometry) -> List[dict]:
+        """Refine the bounding box candidates returned by the index to the declarations whose (buffered) geometry intersects the given geometry, the prepared
+        geometries of the declarations are cached until the declaration is updated"""
+        if not candidates:
+            return []
+        prepared_geometries = self.geometry_cache.get_prepared_geometries(
+            versions={c["flight_declaration_id"]: c["updated_at"] for c in candidates}, load_geometries=self.load_geometries
+        )
+        return [
+            c
+            for c in candidates
+            if c["flight_declaration_id"] in prepared_geometries and prepared_geometries[c["flight_declaration_id"]].intersects(geometry)
+        ]
+
+
+class FlightDeclarationBatchIndex:
+    """A temporary three dimensional (longitude, latitude, time) index of the declarations accepted so far in a bulk submission, it is used to deconflict the
+    declarations of a batch against each other before they are written to the database"""
+
+    def __init__(self):
+        p = index.Property()
+        p.dimension = 3
+        self.idx = index.Index(properties=p)
+        self.prepared_geometries = []
+
+    def get_coordinates(self, view: List[float], start_datetime: DateLike, end_datetime: DateLike) -> tuple:
+        return (view[0], view[1], arrow.get(start_datetime).timestamp(), view[2], view[3], arrow.get(end_datetime).timestamp())
+
+    def add_declaration(
+        self, batch_position: int, view: List[float], start_datetime: DateLike, end_datetime: DateLike, geometry: BaseGeometry
+    ) -> None:
+        enumerated_id = len(self.prepared_geometries)
+        self.prepared_geometries.append((batch_position, prep(geometry)))
+        self.idx.insert(id=enumerated_id, coordinates=self.get_coordinates(view=view, start_datetime=start_datetime, end_datetime=end_datetime))
+
+    def get_conflicting_declarations(
+        self, view_box: List[float], start_datetime: DateLike, end_datetime: DateLike, geometry: BaseGeometry
+    ) -> List[int]:
+        """Returns the positions in the batch of the declarations that overlap the view box and period and whose geometry intersects the given geometry"""
+        coordinates = self.get_coordinates(view=view_box, start_datetime=start_datetime, end_datetime=end_datetime)
+        conflicting_positions = []
+        for enumerated_id in self.idx.intersection(coordinates):
+            batch_position, prepared_geometry = self.prepared_geometries[enumerated_id]
+            if prepared_geometry.intersects(geometry):
+                conflicting_positions.append(batch_position)
+        return sorted(conflicting_positions)
+
 
-    def clear_rtree_index(self):
-        """Method to delete all boxes from the index"""
-        all_declarations = FlightDeclaration.objects.all()
-        for declaration_idx, declaration in enumerate(all_declarations):
-            declaration_idx_str = str(declaration.id)
-            declaration_id = int(hashlib.sha256(declaration_idx_str.encode("utf-8")).hexdigest(), 16) % 10**8
-            view = [float(i) for i in declaration.bounds.split(",")]
+_flight_declaration_index = None
+_flight_declaration_index_lock = threading.Lock()
 
-            self.delete_from_index(enumerated_id=declaration_id, view=view)
 
-    def check_box_intersection(self, view_box: List[float]):
-        intersections = [n.object for n in self.idx.intersection((view_box[0], view_box[1], view_box[2], view_box[3]), objects=True)]
-        return intersections
+def get_flight_declaration_index() -> FlightDeclarationIndex:
+    """Returns the active flight declarations index of this process"""
+    global _flight_declaration_index
+    if _flight_declaration_index is None:
+        with _flight_declaration_index_lock:
+            if _flight_declaration_index is None:
+                _flight_declaration_index = FlightDeclarationIndex()
+    return _flight_declaration_index
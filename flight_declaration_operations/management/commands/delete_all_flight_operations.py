@@ -1,13 +1,12 @@
-import json
-
 from django.core.management.base import BaseCommand
 
-from auth_helper.common import RedisHelper, get_redis
+from auth_helper.common import RedisHelper
 from common.database_operations import (
     ArgonServerDatabaseReader,
     ArgonServerDatabaseWriter,
 )
 from scd_operations import dss_scd_helper
+from scd_operations.opint_repository import OperationalIntentsRepository
 
 
 class Command(BaseCommand):
@@ -37,7 +36,7 @@ class Command(BaseCommand):
         dry_run = options["dry_run"]
         clear_dss = options["dss"]
 
-        r = get_redis()
+        my_operational_intents_repository = OperationalIntentsRepository()
         dry_run = 1 if dry_run == "1" else 0
         my_database_reader = ArgonServerDatabaseReader()
         my_database_writer = ArgonServerDatabaseWriter()
@@ -54,11 +53,9 @@ class Command(BaseCommand):
                         print("Clearing operational intent id  %s in the DSS..." % dss_op_int_id)
                         my_scd_dss_helper = dss_scd_helper.SCDOperations()
                         # Get the OVN
-                        op_int_details_key = "flight_opint." + str(f_a.declaration_id)
-                        op_int_details_raw = r.get(op_int_details_key)
-                        if op_int_details_raw:
-                            op_int_details = json.loads(op_int_details_raw)
-                            ovn = op_int_details["success_response"]["operational_intent_reference"]["ovn"]
+                        op_int_summary = my_operational_intents_repository.get_operational_intent_summary(operation_id=str(f_a.declaration_id))
+                        if op_int_summary:
+                            ovn = op_int_summary.ovn
                             my_scd_dss_helper.delete_operational_intent(ovn=ovn, dss_operational_intent_ref_id=dss_op_int_id)
 
                         # Remove the conformance monitoring periodic job
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from scd_operations.opint_repository import OperationalIntentsRepository
+
+
+class Command(BaseCommand):
+    help = "This command converts the operational intents stored in Redis before they were stored as hashes to the current layout, run it once after upgrading"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "-d",
+            "--dry_run",
+            dest="dry_run",
+            metavar="Set if this is a dry run",
+            default="1",
+            help="Set if it is a dry run",
+        )
+
+    def handle(self, *args, **options):
+        dry_run = 1 if options["dry_run"] == "1" else 0
+
+        my_operational_intents_repository = OperationalIntentsRepository()
+        if dry_run:
+            all_legacy_keys = my_operational_intents_repository.get_legacy_keys()
+            for key in all_legacy_keys:
+                print("Dry Run : Converting legacy key %s" % key)
+            print("Dry Run : %s legacy keys found" % len(all_legacy_keys))
+        else:
+            migrated_count = my_operational_intents_repository.migrate_legacy_keys()
+            print("Converted %s legacy keys" % migrated_count)
@@ -0,0 +1,77 @@
+# Generated by Django 5.1.3 on 2026-10-19 11:17
+
+import json
+
+import numpy as np
+import shapely.geometry
+from django.db import migrations, models
+from pyproj import Transformer
+
+# The conversion of the operational intent is copied here so that later changes to the converter do not change this migration
+WGS84_EPSG_CODE = 4326
+
+
+def buffer_point_in_meters(point, radius: float):
+    zone = min(int((point.x + 180) // 6) + 1, 60)
+    epsg_code = (32600 if point.y >= 0 else 32700) + zone
+    utm_x, utm_y = Transformer.from_crs(WGS84_EPSG_CODE, epsg_code, always_xy=True).transform(point.x, point.y)
+    buffered_circle = np.asarray(shapely.geometry.Point(utm_x, utm_y).buffer(radius).exterior.coords)
+    lngs, lats = Transformer.from_crs(epsg_code, WGS84_EPSG_CODE, always_xy=True).transform(buffered_circle[:, 0], buffered_circle[:, 1])
+    return shapely.geometry.Polygon(np.column_stack((lngs, lats)))
+
+
+def convert_stored_operational_intent_to_geo_json(operational_intent: str) -> dict:
+    geo_json = {"type": "FeatureCollection", "features": []}
+    for volume in json.loads(operational_intent)["volumes"]:
+        properties = {"time_start": volume["time_start"]["value"], "time_end": volume["time_end"]["value"]}
+        outline_polygon = volume["volume"].get("outline_polygon")
+        if outline_polygon is not None:
+            polygon = shapely.geometry.Polygon([[vertex["lng"], vertex["lat"]] for vertex in outline_polygon["vertices"]])
+            geometry = shapely.geometry.mapping(shapely.geometry.polygon.orient(polygon))
+            geo_json["features"].append({"type": "Feature", "properties": properties, "geometry": geometry})
+        outline_circle = volume["volume"].get("outline_circle")
+        if outline_circle:
+            center_point = shapely.geometry.Point(outline_circle["center"]["lng"], outline_circle["center"]["lat"])
+            geometry = shapely.geometry.mapping(buffer_point_in_meters(center_point, radius=outline_circle["radius"]["value"]))
+            geo_json["features"].append({"type": "Feature", "properties": properties, "geometry": geometry})
+    return geo_json
+
+
+def compute_operational_intent_geojson(apps, schema_editor):
+    FlightDeclaration = apps.get_model("flight_declaration_operations", "FlightDeclaration")
+    all_declarations = FlightDeclaration.objects.filter(operational_intent_geojson__isnull=True).only("id", "operational_intent")
+    batch = []
+    for flight_declaration in all_declarations.iterator(chunk_size=500):
+        try:
+            flight_declaration.operational_intent_geojson = json.dumps(
+                convert_stored_operational_intent_to_geo_json(flight_declaration.operational_intent)
+            )
+        except (KeyError, TypeError, ValueError):
+            # Leave declarations with a operational intent that cannot be parsed, the GeoJSON is computed when they are read
+            continue
+        batch.append(flight_declaration)
+        if len(batch) == 500:
+            FlightDeclaration.objects.bulk_update(batch, ["operational_intent_geojson"])
+            batch = []
+    if batch:
+        FlightDeclaration.objects.bulk_update(batch, ["operational_intent_geojson"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("flight_declaration_operations", "0008_alter_flightdeclaration_aircraft_id"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="flightdeclaration",
+            name="operational_intent_geojson",
+            field=models.TextField(
+                blank=True,
+                help_text="The GeoJSON of the volumes of the operational intent, this is computed when the operational intent is saved",
+                null=True,
+            ),
+        ),
+        migrations.RunPython(compute_operational_intent_geojson, migrations.RunPython.noop),
+    ]
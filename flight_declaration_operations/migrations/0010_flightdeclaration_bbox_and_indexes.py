@@ -0,0 +1,74 @@
+# Generated by Django 5.1.3 on 2026-10-19 11:20
+
+from django.db import migrations, models
+
+
+# The conversion of the bounds is copied here so that later changes to the bounds helper do not change this migration
+BBOX_FIELDS = ["min_lon", "min_lat", "max_lon", "max_lat"]
+
+
+def parse_bounds(bounds):
+    try:
+        min_lon, min_lat, max_lon, max_lat = [float(i) for i in bounds.split(",")]
+    except (AttributeError, ValueError):
+        return None
+    return min_lon, min_lat, max_lon, max_lat
+
+
+def set_bbox_from_bounds(instance) -> None:
+    parsed_bounds = parse_bounds(instance.bounds)
+    for field_name, value in zip(BBOX_FIELDS, parsed_bounds or (None,) * 4):
+        setattr(instance, field_name, value)
+
+
+def set_bounding_boxes(apps, schema_editor):
+    FlightDeclaration = apps.get_model("flight_declaration_operations", "FlightDeclaration")
+    all_declarations = FlightDeclaration.objects.filter(min_lon__isnull=True).only("id", "bounds")
+    batch = []
+    for flight_declaration in all_declarations.iterator(chunk_size=500):
+        set_bbox_from_bounds(flight_declaration)
+        batch.append(flight_declaration)
+        if len(batch) == 500:
+            FlightDeclaration.objects.bulk_update(batch, BBOX_FIELDS)
+            batch = []
+    if batch:
+        FlightDeclaration.objects.bulk_update(batch, BBOX_FIELDS)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("flight_declaration_operations", "0009_flightdeclaration_operational_intent_geojson"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="flightdeclaration",
+            name="min_lon",
+            field=models.FloatField(blank=True, help_text="The bounding box of the declaration, this is set from the bounds when it is saved", null=True),
+        ),
+        migrations.AddField(
+            model_name="flightdeclaration",
+            name="min_lat",
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="flightdeclaration",
+            name="max_lon",
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="flightdeclaration",
+            name="max_lat",
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="flightdeclaration",
+            index=models.Index(fields=["start_datetime", "end_datetime", "state"], name="flight_decl_period_state_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="flightdeclaration",
+            index=models.Index(fields=["min_lon", "max_lon", "min_lat", "max_lat"], name="flight_decl_bbox_idx"),
+        ),
+        migrations.RunPython(set_bounding_boxes, migrations.RunPython.noop),
+    ]
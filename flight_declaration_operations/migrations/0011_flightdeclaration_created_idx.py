@@ -0,0 +1,17 @@
+# Generated by Django 5.1.3 on 2026-10-19 11:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("flight_declaration_operations", "0010_flightdeclaration_bbox_and_indexes"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="flightdeclaration",
+            index=models.Index(fields=["-created_at", "-id"], name="flight_decl_created_idx"),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.1.3 on 2026-10-19 12:10
+
+from django.db import migrations, models
+
+
+def record_existing_flight_declarations(apps, schema_editor):
+    FlightDeclaration = apps.get_model("flight_declaration_operations", "FlightDeclaration")
+    FlightDeclarationChange = apps.get_model("flight_declaration_operations", "FlightDeclarationChange")
+    batch = []
+    for flight_declaration_id in FlightDeclaration.objects.order_by("created_at").values_list("id", flat=True).iterator(chunk_size=500):
+        batch.append(FlightDeclarationChange(record_id=flight_declaration_id))
+        if len(batch) == 500:
+            FlightDeclarationChange.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        FlightDeclarationChange.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("flight_declaration_operations", "0011_flightdeclaration_created_idx"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="FlightDeclarationChange",
+            fields=[
+                ("id", models.BigAutoField(primary_key=True, serialize=False)),
+                (
+                    "record_id",
+                    models.UUIDField(
+                        help_text="The id of the changed declaration, this is not a foreign key so that the tombstone outlives the declaration"
+                    ),
+                ),
+                ("is_deleted", models.BooleanField(default=False)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "indexes": [models.Index(fields=["record_id"], name="flight_decl_change_record_idx")],
+            },
+        ),
+        migrations.RunPython(record_existing_flight_declarations, migrations.RunPython.noop),
+    ]
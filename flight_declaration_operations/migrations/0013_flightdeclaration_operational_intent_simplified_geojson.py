@@ -0,0 +1,74 @@
+# Generated by Django 5.1.3 on 2026-10-19 12:30
+
+import json
+
+from django.db import migrations, models
+from shapely.geometry import JOIN_STYLE, mapping, shape
+
+# The simplification is copied here so that later changes to the simplification helper do not change this migration
+LEVELS_OF_DETAIL = {"medium": 0.0001, "low": 0.001}
+
+
+def simplify_containing(geometry, tolerance: float):
+    if geometry.is_empty or geometry.geom_type not in ["Polygon", "MultiPolygon"]:
+        return geometry
+    for grow_factor in [1, 2]:
+        simplified = geometry.buffer(tolerance * grow_factor, join_style=JOIN_STYLE.mitre).simplify(tolerance, preserve_topology=True)
+        if simplified.covers(geometry):
+            return simplified
+    return geometry.convex_hull
+
+
+def simplify_feature_collection(geo_json: dict, tolerance: float) -> dict:
+    all_features = []
+    for feature in geo_json["features"]:
+        simplified_geometry = simplify_containing(shape(feature["geometry"]), tolerance)
+        all_features.append({**feature, "geometry": mapping(simplified_geometry)})
+    return {**geo_json, "features": all_features}
+
+
+def compute_levels_of_detail(geo_json):
+    try:
+        parsed_geo_json = json.loads(geo_json)
+        return json.dumps({level: simplify_feature_collection(parsed_geo_json, tolerance) for level, tolerance in LEVELS_OF_DETAIL.items()})
+    except (TypeError, KeyError, ValueError, AttributeError):
+        return None
+
+
+def compute_simplified_geojson(apps, schema_editor):
+    FlightDeclaration = apps.get_model("flight_declaration_operations", "FlightDeclaration")
+    all_declarations = FlightDeclaration.objects.filter(
+        operational_intent_geojson__isnull=False, operational_intent_simplified_geojson__isnull=True
+    ).only("id", "operational_intent_geojson")
+    batch = []
+    for flight_declaration in all_declarations.iterator(chunk_size=500):
+        flight_declaration.operational_intent_simplified_geojson = compute_levels_of_detail(flight_declaration.operational_intent_geojson)
+        if flight_declaration.operational_intent_simplified_geojson is None:
+            # Declarations without a valid GeoJSON are always served in full
+            continue
+        batch.append(flight_declaration)
+        if len(batch) == 500:
+            FlightDeclaration.objects.bulk_update(batch, ["operational_intent_simplified_geojson"])
+            batch = []
+    if batch:
+        FlightDeclaration.objects.bulk_update(batch, ["operational_intent_simplified_geojson"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("flight_declaration_operations", "0012_flightdeclarationchange"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="flightdeclaration",
+            name="operational_intent_simplified_geojson",
+            field=models.TextField(
+                blank=True,
+                help_text="The simplified versions of the GeoJSON of the operational intent for each level of detail, this is computed with the GeoJSON",
+                null=True,
+            ),
+        ),
+        migrations.RunPython(compute_simplified_geojson, migrations.RunPython.noop),
+    ]
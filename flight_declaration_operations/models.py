@@ -21,6 +21,20 @@ class FlightDeclaration(models.Model):
         help_text="At the moment, only Visual Line of Sight (VLOS) and Beyond Visual Line of Sight (BVLOS) operations are supported, for other types of operations, please issue a pull-request",
     )
     bounds = models.CharField(max_length=140)
+    min_lon = models.FloatField(null=True, blank=True, help_text="The bounding box of the declaration, this is set from the bounds when it is saved")
+    min_lat = models.FloatField(null=True, blank=True)
+    max_lon = models.FloatField(null=True, blank=True)
+    max_lat = models.FloatField(null=True, blank=True)
+    operational_intent_geojson = models.TextField(
+        null=True,
+        blank=True,
+        help_text="The GeoJSON of the volumes of the operational intent, this is computed when the operational intent is saved",
+    )
+    operational_intent_simplified_geojson = models.TextField(
+        null=True,
+        blank=True,
+        help_text="The simplified versions of the GeoJSON of the operational intent for each level of detail, this is computed with the GeoJSON",
+    )
     aircraft_id = models.CharField(
         max_length=256,
         help_text="Specify the ID of the aircraft for this declaration",
@@ -52,6 +66,35 @@ class FlightDeclaration(models.Model):
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["start_datetime", "end_datetime", "state"], name="flight_decl_period_state_idx"),
+            models.Index(fields=["min_lon", "max_lon", "min_lat", "max_lat"], name="flight_decl_bbox_idx"),
+            models.Index(fields=["-created_at", "-id"], name="flight_decl_created_idx"),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Keep the stored operational intent to know if the GeoJSON has to be computed again when the declaration is saved
+        instance._stored_operational_intent = instance.__dict__.get("operational_intent")
+        instance._stored_state = instance.__dict__.get("state")
+        instance._stored_bounds = instance.__dict__.get("bounds")
+        return instance
+
+    def is_operational_intent_geojson_stale(self) -> bool:
+        """The GeoJSON has to be computed if it has not been computed yet or if the operational intent has changed since the declaration was loaded"""
+        if "operational_intent" in self.get_deferred_fields():
+            return False
+        return self.__dict__.get("operational_intent_geojson") is None or self.operational_intent != getattr(self, "_stored_operational_intent", None)
+
+    def is_map_changed(self) -> bool:
+        """The declaration is drawn differently on the map if it is new or its operational intent, state or bounds have changed since it was loaded"""
+        return (
+            self._state.adding
+            or self.is_operational_intent_geojson_stale()
+            or self.state != getattr(self, "_stored_state", None)
+            or ("bounds" not in self.get_deferred_fields() and self.bounds != getattr(self, "_stored_bounds", None))
+        )
 
     def add_state_history_entry(self, original_state: int, new_state: int, notes: str = "", **kwargs):
         """Add a history tracking entry for this FlightDeclaration.
@@ -140,3 +183,24 @@ class FlightOperationTracking(models.Model):
 
     def __str__(self):
         return str(self.flight_declaration) if self.flight_declaration else ""
+
+
+class FlightDeclarationChange(models.Model):
+    """A entry in the change log of flight declarations, the id increases with every change and is the cursor of the delta sync. Only the latest change of a
+    declaration is kept, a deleted declaration keeps a tombstone entry"""
+
+    id = models.BigAutoField(primary_key=True)
+    record_id = models.UUIDField(
+        help_text="The id of the changed declaration, this is not a foreign key so that the tombstone outlives the declaration"
+    )
+    is_deleted = models.BooleanField(default=False)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["record_id"], name="flight_decl_change_record_idx"),
+        ]
+
+    def __str__(self):
+        return str(self.record_id)
@@ -1,13 +1,82 @@
-import math
+import uuid
 
-from rest_framework.pagination import PageNumberPagination
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor, CursorPagination
 from rest_framework.response import Response
 
 
-class StandardResultsSetPagination(PageNumberPagination):
-    page = 1
+class KeysetResultsSetPagination(CursorPagination):
+    """Keyset pagination on the creation time and id of the rows (newest first), the next / previous links carry the (created_at, id) of the last / first row
+    of the page so every page is a range scan of the (-created_at, -id) index and no COUNT or OFFSET query is run, also when many rows share a creation time
+    e.g. after a bulk import"""
+
     page_size = 10
     page_size_query_param = "page_size"
+    max_page_size = 1000
+    ordering = ("-created_at", "-id")
+
+    def encode_position(self, instance) -> str:
+        return "{created_at}|{id}".format(created_at=instance.created_at.isoformat(), id=instance.id)
+
+    def decode_position(self, position: str):
+        try:
+            created_at, record_id = position.split("|")
+            created_at = parse_datetime(created_at)
+            record_id = uuid.UUID(record_id)
+        except (AttributeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if created_at is None:
+            raise NotFound(self.invalid_cursor_message)
+        return created_at, record_id
+
+    def get_keyset_filter(self, position: str, reverse: bool) -> Q:
+        """The rows after the position in the direction of the page, the id breaks the ties between rows created at the same time"""
+        created_at, record_id = self.decode_position(position)
+        if reverse:
+            return Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=record_id)
+        return Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=record_id)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.cursor = self.decode_cursor(request)
+        is_reversed = self.cursor is not None and self.cursor.reverse
+        position = self.cursor.position if self.cursor is not None else None
+
+        queryset = queryset.order_by("created_at", "id") if is_reversed else queryset.order_by(*self.ordering)
+        if position is not None:
+            queryset = queryset.filter(self.get_keyset_filter(position, reverse=is_reversed))
+
+        # One extra row tells if there is a following page
+        results = list(queryset[: self.page_size + 1])
+        has_following_position = len(results) > self.page_size
+        self.page = results[: self.page_size]
+        if is_reversed:
+            self.page.reverse()
+            self.has_next = position is not None
+            self.has_previous = has_following_position
+        else:
+            self.has_next = has_following_position
+            self.has_previous = position is not None
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        position = self.encode_position(self.page[-1]) if self.page else self.cursor.position
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=position))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        position = self.encode_position(self.page[0]) if self.page else self.cursor.position
+        return self.encode_cursor(Cursor(offset=0, reverse=True, position=position))
 
     def get_paginated_response(self, data):
         return Response(
@@ -16,10 +85,7 @@ class StandardResultsSetPagination(PageNumberPagination):
                     "next": self.get_next_link(),
                     "previous": self.get_previous_link(),
                 },
-                "total": self.page.paginator.count,
-                "page": math.ceil(int(self.request.GET.get("page", 1))),  # can not set default = self.page
-                "pages": int(math.ceil(self.page.paginator.count / self.page_size)),
-                "page_size": int(self.request.GET.get("page_size", self.page_size)),
+                "page_size": self.page_size,
                 "results": data,
             }
         )
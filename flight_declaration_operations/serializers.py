@@ -1,18 +1,16 @@
 import json
-from typing import List
 
 from rest_framework import serializers
 
 from common.data_definitions import OPERATION_STATES, OPERATOR_EVENT_LOOKUP
 from common.database_operations import ArgonServerDatabaseReader
+from common.simplification_helper import select_level_of_detail
 from conformance_monitoring_operations.conformance_checks_handler import (
     FlightOperationConformanceHelper,
 )
-from scd_operations.dss_scd_helper import OperationalIntentReferenceHelper
-from scd_operations.scd_data_definitions import Volume4D
 
 from .models import FlightDeclaration
-from .utils import OperationalIntentsConverter
+from .utils import convert_stored_operational_intent_to_geo_json
 
 
 class FlightDeclarationSerializer(serializers.ModelSerializer):
@@ -21,16 +19,14 @@ class FlightDeclarationSerializer(serializers.ModelSerializer):
     flight_declaration_raw_geojson = serializers.SerializerMethodField()
 
     def get_flight_declaration_geojson(self, obj):
-        o = json.loads(obj.operational_intent)
-        volumes = o["volumes"]
-        volumes_list: List[Volume4D] = []
-        my_operational_intent_parser = OperationalIntentReferenceHelper()
-        for v in volumes:
-            parsed_volume = my_operational_intent_parser.parse_volume_to_volume4D(v)
-            volumes_list.append(parsed_volume)
-        my_operational_intent_converter = OperationalIntentsConverter()
-        my_operational_intent_converter.convert_operational_intent_to_geo_json(volumes=volumes_list)
-        return my_operational_intent_converter.geo_json
+        level_of_detail = self.context.get("level_of_detail")
+        if level_of_detail:
+            simplified_geojson = select_level_of_detail(obj.operational_intent_simplified_geojson, level_of_detail)
+            if simplified_geojson is not None:
+                return simplified_geojson
+        if obj.operational_intent_geojson:
+            return json.loads(obj.operational_intent_geojson)
+        return convert_stored_operational_intent_to_geo_json(obj.operational_intent)
 
     def get_flight_declaration_raw_geojson(self, obj):
         return json.loads(obj.flight_declaration_raw_geojson)
@@ -57,6 +53,27 @@ class FlightDeclarationSerializer(serializers.ModelSerializer):
         )
 
 
+class FlightDeclarationSummarySerializer(serializers.ModelSerializer):
+    """A lightweight representation of a flight declaration for list views, it has no operational intent or GeoJSON so the list queryset only loads these
+    fields"""
+
+    class Meta:
+        model = FlightDeclaration
+        fields = (
+            "id",
+            "originating_party",
+            "type_of_operation",
+            "state",
+            "is_approved",
+            "start_datetime",
+            "end_datetime",
+            "bounds",
+            "approved_by",
+            "submitted_by",
+            "created_at",
+        )
+
+
 class FlightDeclarationApprovalSerializer(serializers.ModelSerializer):
     class Meta:
         model = FlightDeclaration
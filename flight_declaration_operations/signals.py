@@ -0,0 +1,81 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from common.bounds_helper import get_geo_json_bounds, set_bbox_from_bounds
+from common.delta_sync_helper import record_changes
+from common.vector_tile_helper import invalidate_tiles
+
+from .flight_declarations_rtree_helper import get_flight_declaration_index
+from .models import FlightDeclaration, FlightDeclarationChange
+from .utils import set_operational_intent_geojson
+
+# Saves that only update these fields are not shown by the API and do not change the index or the change log, e.g. the time of the latest telemetry
+UNLISTED_FIELDS = {"latest_telemetry_datetime", "updated_at"}
+
+
+def is_unlisted_save(update_fields) -> bool:
+    return bool(update_fields) and set(update_fields) <= UNLISTED_FIELDS
+
+
+@receiver(pre_save, sender=FlightDeclaration)
+def check_map_changed(sender, instance: FlightDeclaration, **kwargs):
+    """Record if the vector tiles under the declaration have to be rendered again, this runs before the GeoJSON is computed and resets the stored operational
+    intent. Saves that only change e.g. the telemetry timestamp leave the tiles untouched"""
+    instance._is_map_changed = instance.is_map_changed()
+
+
+@receiver(pre_save, sender=FlightDeclaration)
+def update_operational_intent_geojson(sender, instance: FlightDeclaration, **kwargs):
+    """Compute the GeoJSON of the operational intent when it changes so that it does not have to be computed every time the declaration is read"""
+    set_operational_intent_geojson(flight_declaration=instance)
+
+
+@receiver(pre_save, sender=FlightDeclaration)
+def update_flight_declaration_bbox(sender, instance: FlightDeclaration, **kwargs):
+    """Keep the bounding box columns used by the viewport filters in sync with the bounds of the declaration"""
+    set_bbox_from_bounds(instance)
+
+
+@receiver(post_save, sender=FlightDeclaration)
+def update_flight_declaration_index(sender, instance: FlightDeclaration, update_fields=None, **kwargs):
+    """Add, update or remove the declaration in the active flight declarations index depending on its state, once the transaction has been committed.
+    Telemetry timestamp updates leave the index untouched so they do not make every other process reload it"""
+    if is_unlisted_save(update_fields):
+        return
+    transaction.on_commit(lambda: get_flight_declaration_index().update_flight_declaration(flight_declaration=instance))
+
+
+@receiver(post_save, sender=FlightDeclaration)
+def invalidate_flight_declaration_tiles(sender, instance: FlightDeclaration, **kwargs):
+    """Remove the cached vector tiles under the old and new location of the declaration once the transaction has been committed if it is drawn
+    differently"""
+    if getattr(instance, "_is_map_changed", True):
+        # The tiles at the previous location and under the operational intent, which can extend beyond the bounds, are drawn differently too
+        all_bounds = [instance.bounds, getattr(instance, "_stored_bounds", None), get_geo_json_bounds(instance.operational_intent_geojson)]
+        instance._stored_state = instance.state
+        instance._stored_bounds = instance.bounds
+        transaction.on_commit(lambda: invalidate_tiles(all_bounds))
+
+
+@receiver(post_delete, sender=FlightDeclaration)
+def remove_from_flight_declaration_index(sender, instance: FlightDeclaration, **kwargs):
+    """Remove a deleted declaration from the active flight declarations index once the transaction has been committed"""
+    flight_declaration_id = str(instance.id)
+    all_bounds = [instance.bounds, get_geo_json_bounds(instance.operational_intent_geojson)]
+    transaction.on_commit(lambda: get_flight_declaration_index().remove_flight_declaration(flight_declaration_id=flight_declaration_id))
+    transaction.on_commit(lambda: invalidate_tiles(all_bounds))
+
+
+@receiver(post_save, sender=FlightDeclaration)
+def record_flight_declaration_change(sender, instance: FlightDeclaration, created: bool, update_fields=None, **kwargs):
+    """Add the declaration to the change log read by the delta sync in the transaction that saved it"""
+    if is_unlisted_save(update_fields):
+        return
+    record_changes(FlightDeclarationChange, [instance.id], is_new=created)
+
+
+@receiver(post_delete, sender=FlightDeclaration)
+def record_flight_declaration_deletion(sender, instance: FlightDeclaration, **kwargs):
+    """Replace the change log entry of a deleted declaration with a tombstone in the transaction that deleted it"""
+    record_changes(FlightDeclarationChange, [instance.id], is_deleted=True)
@@ -1,6 +1,5 @@
 import json
 import logging
-from dataclasses import asdict
 from datetime import timedelta
 from os import environ as env
 
@@ -9,7 +8,6 @@ from dacite import from_dict
 from dotenv import find_dotenv, load_dotenv
 
 from argon_server.celery import app
-from auth_helper.common import get_redis
 from common.data_definitions import OPERATION_STATES
 from common.database_operations import (
     ArgonServerDatabaseReader,
@@ -21,13 +19,13 @@ from conformance_monitoring_operations.conformance_checks_handler import (
 from notification_operations.data_definitions import FlightDeclarationUpdateMessage
 from notification_operations.notification_helper import NotificationFactory
 from scd_operations.opint_helper import DSSOperationalIntentsCreator
+from scd_operations.opint_repository import OperationalIntentsRepository
 from scd_operations.scd_data_definitions import (
     NotifyPeerUSSPostPayload,
     OperationalIntentDetailsUSSResponse,
     OperationalIntentStorage,
     OperationalIntentUSSDetails,
     SubscriptionState,
-    SuccessfulOperationalIntentFlightIDStorage,
 )
 
 logger = logging.getLogger("django")
@@ -39,7 +37,6 @@ load_dotenv(find_dotenv())
 def submit_flight_declaration_to_dss_async(flight_declaration_id: str):
     my_dss_opint_creator = DSSOperationalIntentsCreator(flight_declaration_id)
     my_database_reader = ArgonServerDatabaseReader()
-    r = get_redis()
     my_database_writer = ArgonServerDatabaseWriter()
 
     start_end_time_validated = my_dss_opint_creator.validate_flight_declaration_start_end_time()
@@ -132,19 +129,18 @@ def submit_flight_declaration_to_dss_async(flight_declaration_id: str):
             )
             # Store flight ID
             delta = timedelta(seconds=10800)
-            flight_opint = "flight_opint." + str(flight_declaration_id)
-            r.set(flight_opint, json.dumps(asdict(operational_intent_full_details)))
-            r.expire(name=flight_opint, time=delta)
-
-            # Store the details of the operational intent reference
-            flight_op_int_storage = SuccessfulOperationalIntentFlightIDStorage(
+            my_operational_intents_repository = OperationalIntentsRepository()
+            my_operational_intents_repository.set_operational_intent(
                 operation_id=str(flight_declaration_id),
+                operational_intent=operational_intent_full_details,
+                expires_in=delta,
+            )
+            # Store the details of the operational intent reference
+            my_operational_intents_repository.set_operation_id(
                 operational_intent_id=created_opint,
+                operation_id=str(flight_declaration_id),
+                expires_in=delta,
             )
-
-            opint_flightref = "opint_flightref." + created_opint
-            r.set(opint_flightref, json.dumps(asdict(flight_op_int_storage)))
-            r.expire(name=opint_flightref, time=delta)
             logger.info("Changing operation state..")
             original_state = flight_declaration.state
             accepted_state = OPERATION_STATES[1][0]
@@ -1 +1,307 @@
-# Create your tests here.
+import json
+import math
+from os import environ as env
+from unittest import mock
+
+import arrow
+import jwt
+from django.test import TestCase
+
+from common.database_operations import ArgonServerDatabaseWriter
+from common.simplification_helper import DSS_MAX_POLYGON_VERTICES
+
+from .flight_declarations_rtree_helper import FlightDeclarationIndex, get_flight_declaration_index
+from .models import FlightDeclaration, FlightDeclarationChange, FlightOperationTracking
+from .utils import OperationalIntentsConverter
+
+
+def get_operational_intent(min_lon: float, min_lat: float, max_lon: float, max_lat: float, start_datetime: str, end_datetime: str) -> str:
+    # The outlines of stored operational intents are closed, the first vertex is repeated at the end
+    vertices = [
+        {"lng": lng, "lat": lat} for lng, lat in [(min_lon, min_lat), (max_lon, min_lat), (max_lon, max_lat), (min_lon, max_lat), (min_lon, min_lat)]
+    ]
+    return json.dumps(
+        {
+            "volumes": [
+                {
+                    "volume": {
+                        "outline_polygon": {"vertices": vertices},
+                        "altitude_lower": {"value": 0, "reference": "W84", "units": "M"},
+                        "altitude_upper": {"value": 120, "reference": "W84", "units": "M"},
+                    },
+                    "time_start": {"format": "RFC3339", "value": start_datetime},
+                    "time_end": {"format": "RFC3339", "value": end_datetime},
+                }
+            ],
+            "priority": 0,
+            "state": "Accepted",
+            "off_nominal_volumes": [],
+        }
+    )
+
+
+def create_flight_declaration(
+    min_lon: float = 7.47, min_lat: float = 46.97, max_lon: float = 7.48, max_lat: float = 46.98, state: int = 1
+) -> FlightDeclaration:
+    now = arrow.now()
+    start_datetime, end_datetime = now.shift(hours=-1).isoformat(), now.shift(hours=1).isoformat()
+    flight_declaration = FlightDeclaration(
+        operational_intent=get_operational_intent(min_lon, min_lat, max_lon, max_lat, start_datetime, end_datetime),
+        bounds=",".join(str(i) for i in [min_lon, min_lat, max_lon, max_lat]),
+        aircraft_id="Test aircraft",
+        state=state,
+        start_datetime=start_datetime,
+        end_datetime=end_datetime,
+    )
+    flight_declaration.save()
+    return flight_declaration
+
+
+class FlightDeclarationIndexTests(TestCase):
+    view_box = [7.4, 46.9, 7.5, 47.0]
+
+    def setUp(self):
+        # The index of this process outlives the rolled back declarations of earlier tests, it is loaded again from the database
+        self.flight_declaration_index = get_flight_declaration_index()
+        self.flight_declaration_index.invalidate()
+        self.flight_declaration_index.sync()
+
+    def get_conflicting_ids(self, flight_declaration_index: FlightDeclarationIndex = None) -> set:
+        flight_declaration_index = flight_declaration_index or self.flight_declaration_index
+        now = arrow.now()
+        all_conflicts = flight_declaration_index.get_conflicting_declarations(self.view_box, now.shift(minutes=-5), now.shift(minutes=5))
+        return {conflict["flight_declaration_id"] for conflict in all_conflicts}
+
+    def test_active_declarations_are_indexed(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            accepted_declaration = create_flight_declaration()
+            create_flight_declaration(state=0)
+            create_flight_declaration(min_lon=8.54, min_lat=47.37, max_lon=8.55, max_lat=47.38)
+        self.assertEqual(self.get_conflicting_ids(), {str(accepted_declaration.id)})
+
+    def test_declarations_leaving_the_active_states_are_removed(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            flight_declaration = create_flight_declaration()
+        self.assertIn(str(flight_declaration.id), self.get_conflicting_ids())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            flight_declaration.state = 5
+            flight_declaration.save()
+        self.assertNotIn(str(flight_declaration.id), self.get_conflicting_ids())
+
+    def test_deleted_declarations_are_removed(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            flight_declaration = create_flight_declaration()
+        flight_declaration_id = str(flight_declaration.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            flight_declaration.delete()
+        self.assertNotIn(flight_declaration_id, self.get_conflicting_ids())
+
+    def test_other_processes_replay_the_changed_declarations(self):
+        other_process_index = FlightDeclarationIndex()
+        self.assertEqual(self.get_conflicting_ids(other_process_index), set())
+        with self.captureOnCommitCallbacks(execute=True):
+            flight_declaration = create_flight_declaration()
+        with mock.patch.object(other_process_index, "_reload", wraps=other_process_index._reload) as reload:
+            self.assertEqual(self.get_conflicting_ids(other_process_index), {str(flight_declaration.id)})
+            with self.captureOnCommitCallbacks(execute=True):
+                flight_declaration.state = 5
+                flight_declaration.save()
+            self.assertEqual(self.get_conflicting_ids(other_process_index), set())
+        reload.assert_not_called()
+
+    def test_declarations_changed_without_signals_are_replayed(self):
+        other_process_index = FlightDeclarationIndex()
+        with self.captureOnCommitCallbacks(execute=True):
+            flight_declaration = create_flight_declaration(state=0)
+        self.assertEqual(self.get_conflicting_ids(other_process_index), set())
+        # Like bulk_create, QuerySet.update does not send the save signals
+        FlightDeclaration.objects.filter(id=flight_declaration.id).update(state=1)
+        self.flight_declaration_index.update_flight_declarations(flight_declarations=[flight_declaration])
+        with mock.patch.object(other_process_index, "_reload", wraps=other_process_index._reload) as reload:
+            self.assertEqual(self.get_conflicting_ids(other_process_index), {str(flight_declaration.id)})
+        reload.assert_not_called()
+
+    def test_index_is_reloaded_when_the_change_stream_was_trimmed(self):
+        other_process_index = FlightDeclarationIndex()
+        other_process_index.sync()
+        with self.captureOnCommitCallbacks(execute=True):
+            flight_declaration = create_flight_declaration()
+        with mock.patch.object(other_process_index.change_stream, "is_change_stream_trimmed", return_value=True):
+            with mock.patch.object(other_process_index, "_reload", wraps=other_process_index._reload) as reload:
+                self.assertIn(str(flight_declaration.id), self.get_conflicting_ids(other_process_index))
+        reload.assert_called_once()
+
+    def test_telemetry_updates_leave_the_index_untouched(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            flight_declaration = create_flight_declaration()
+        version = self.flight_declaration_index.get_version()
+        updated_at = FlightDeclaration.objects.get(id=flight_declaration.id).updated_at
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            ArgonServerDatabaseWriter().update_telemetry_timestamp(flight_declaration_id=str(flight_declaration.id))
+        self.assertEqual(callbacks, [])
+        self.assertEqual(self.flight_declaration_index.get_version(), version)
+        self.assertEqual(FlightDeclaration.objects.get(id=flight_declaration.id).updated_at, updated_at)
+        self.assertIn(str(flight_declaration.id), self.get_conflicting_ids())
+
+
+class OperationalIntentsConverterTests(TestCase):
+    def test_stored_outline_is_not_capped(self):
+        all_coordinates = [[7.4 + i * 0.0002, 46.9 + 0.01 * math.sin(i / 15)] for i in range(2000)]
+        geo_json = {
+            "type": "FeatureCollection",
+            "features": [
+                {
+                    "type": "Feature",
+                    "properties": {"min_altitude": {"meters": 0, "datum": "agl"}, "max_altitude": {"meters": 120, "datum": "agl"}},
+                    "geometry": {"type": "LineString", "coordinates": all_coordinates},
+                }
+            ],
+        }
+        all_volumes = OperationalIntentsConverter().convert_geo_json_to_volume_4_d(
+            geo_json_fc=geo_json, start_datetime="2026-10-19T10:00:00Z", end_datetime="2026-10-19T11:00:00Z"
+        )
+        self.assertEqual(len(all_volumes), 1)
+        self.assertGreater(len(all_volumes[0].volume.outline_polygon.vertices), DSS_MAX_POLYGON_VERTICES)
+
+
+def get_flight_declaration_submission(min_lon: float = 7.47, min_lat: float = 46.97, max_lon: float = 7.48, max_lat: float = 46.98) -> dict:
+    now = arrow.now()
+    outline = [[min_lon, min_lat], [max_lon, min_lat], [max_lon, max_lat], [min_lon, max_lat], [min_lon, min_lat]]
+    return {
+        "originating_party": "Test operator",
+        "start_datetime": now.shift(minutes=10).isoformat(),
+        "end_datetime": now.shift(minutes=40).isoformat(),
+        "type_of_operation": 1,
+        "aircraft_id": "Test aircraft",
+        "flight_declaration_geo_json": {
+            "type": "FeatureCollection",
+            "features": [
+                {
+                    "type": "Feature",
+                    "properties": {"min_altitude": {"meters": 0, "datum": "agl"}, "max_altitude": {"meters": 120, "datum": "agl"}},
+                    "geometry": {"type": "Polygon", "coordinates": [outline]},
+                }
+            ],
+        },
+    }
+
+
+@mock.patch.dict(env, {"BYPASS_AUTH_TOKEN_VERIFICATION": "1", "USSP_NETWORK_ENABLED": "0"})
+class SetFlightDeclarationsBulkTests(TestCase):
+    def setUp(self):
+        token = jwt.encode({"aud": "testflight.argonserver.com", "scope": "argonserver.write"}, "secret", algorithm="HS256")
+        self.headers = {"HTTP_AUTHORIZATION": "Bearer {token}".format(token=token)}
+        # The index of this process outlives the rolled back declarations of earlier tests, it is loaded again from the database
+        get_flight_declaration_index().invalidate()
+        group_patcher = mock.patch("flight_declaration_operations.views.group")
+        self.group = group_patcher.start()
+        self.addCleanup(group_patcher.stop)
+
+    def post_bulk(self, all_submissions: list) -> dict:
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                "/flight_declaration_ops/set_flight_declarations_bulk",
+                data=json.dumps({"flight_declarations": all_submissions}),
+                content_type="application/json",
+                **self.headers,
+            )
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_results_are_in_the_order_of_submission(self):
+        bulk_response = self.post_bulk(
+            [get_flight_declaration_submission(), {"aircraft_id": "Incomplete"}, get_flight_declaration_submission(8.54, 47.37, 8.55, 47.38)]
+        )
+        self.assertEqual([result["index"] for result in bulk_response["results"]], [0, 1, 2])
+        self.assertEqual([result["state"] for result in bulk_response["results"]], [1, None, 1])
+        self.assertEqual((bulk_response["submitted"], bulk_response["created"], bulk_response["rejected"]), (3, 2, 0))
+
+    def test_invalid_declarations_are_reported_but_not_created(self):
+        invalid_submission = get_flight_declaration_submission()
+        invalid_submission["end_datetime"] = arrow.now().shift(days=5).isoformat()
+        bulk_response = self.post_bulk([invalid_submission, {"aircraft_id": "Incomplete"}])
+        self.assertEqual([result["id"] for result in bulk_response["results"]], [None, None])
+        self.assertTrue(all(result["message"] for result in bulk_response["results"]))
+        self.assertEqual(FlightDeclaration.objects.count(), 0)
+        self.group.assert_not_called()
+
+    def test_conflicts_within_the_request_reject_the_later_declarations(self):
+        bulk_response = self.post_bulk(
+            [
+                get_flight_declaration_submission(),
+                get_flight_declaration_submission(),
+                get_flight_declaration_submission(7.475, 46.975, 7.485, 46.985),
+            ]
+        )
+        self.assertEqual([result["state"] for result in bulk_response["results"]], [1, 8, 8])
+        self.assertIn("the declaration(s) at [0] of this request", bulk_response["results"][1]["message"])
+        self.assertEqual(bulk_response["rejected"], 2)
+        # Every rejected declaration records its own reason in its history
+        for result in bulk_response["results"][1:]:
+            notes = FlightOperationTracking.objects.filter(flight_declaration_id=result["id"], deltas__new_state="8").values_list("notes", flat=True)
+            self.assertEqual(list(notes), [result["message"]])
+
+    def test_conflicts_with_existing_operations_are_recorded(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            create_flight_declaration()
+        bulk_response = self.post_bulk([get_flight_declaration_submission()])
+        result = bulk_response["results"][0]
+        self.assertEqual(result["state"], 8)
+        self.assertIn("1 existing operation(s)", result["message"])
+        notes = FlightOperationTracking.objects.filter(flight_declaration_id=result["id"], deltas__new_state="8").values_list("notes", flat=True)
+        self.assertEqual(list(notes), [result["message"]])
+
+    def test_created_declarations_are_prepared_like_saved_ones(self):
+        bulk_response = self.post_bulk([get_flight_declaration_submission()])
+        flight_declaration = FlightDeclaration.objects.get(id=bulk_response["results"][0]["id"])
+        self.assertIsNotNone(flight_declaration.operational_intent_geojson)
+        self.assertEqual(
+            [flight_declaration.min_lon, flight_declaration.min_lat, flight_declaration.max_lon, flight_declaration.max_lat],
+            [float(i) for i in flight_declaration.bounds.split(",")],
+        )
+        self.assertTrue(FlightDeclarationChange.objects.filter(record_id=flight_declaration.id, is_deleted=False).exists())
+        now = arrow.now()
+        all_conflicts = get_flight_declaration_index().get_conflicting_declarations([7.4, 46.9, 7.5, 47.0], now, now.shift(hours=1))
+        self.assertIn(str(flight_declaration.id), {conflict["flight_declaration_id"] for conflict in all_conflicts})
+        self.group.assert_called_once()
+
+
+@mock.patch.dict(env, {"BYPASS_AUTH_TOKEN_VERIFICATION": "1"})
+class KeysetResultsSetPaginationTests(TestCase):
+    def setUp(self):
+        token = jwt.encode({"aud": "testflight.argonserver.com", "scope": "argonserver.read"}, "secret", algorithm="HS256")
+        self.headers = {"HTTP_AUTHORIZATION": "Bearer {token}".format(token=token)}
+        with self.captureOnCommitCallbacks(execute=True):
+            all_flight_declarations = [create_flight_declaration() for _ in range(5)]
+        # A bulk create writes many rows in the same instant, the id orders the rows created at the same time
+        FlightDeclaration.objects.filter(id__in=[flight_declaration.id for flight_declaration in all_flight_declarations[1:]]).update(
+            created_at=arrow.now().shift(minutes=-1).datetime
+        )
+        self.all_ids = [str(i) for i in FlightDeclaration.objects.order_by("-created_at", "-id").values_list("id", flat=True)]
+
+    def get_page(self, url: str) -> dict:
+        response = self.client.get(url, **self.headers)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_pages_are_walked_forward_and_back(self):
+        all_pages = [self.get_page("/flight_declaration_ops/flight_declaration?summary=true&page_size=2")]
+        while all_pages[-1]["links"]["next"]:
+            all_pages.append(self.get_page(all_pages[-1]["links"]["next"]))
+        self.assertEqual(
+            [[result["id"] for result in page["results"]] for page in all_pages], [self.all_ids[0:2], self.all_ids[2:4], self.all_ids[4:]]
+        )
+        self.assertIsNone(all_pages[0]["links"]["previous"])
+
+        previous_page = self.get_page(all_pages[-1]["links"]["previous"])
+        self.assertEqual([result["id"] for result in previous_page["results"]], self.all_ids[2:4])
+        first_page = self.get_page(previous_page["links"]["previous"])
+        self.assertEqual([result["id"] for result in first_page["results"]], self.all_ids[0:2])
+        self.assertIsNone(first_page["links"]["previous"])
+        self.assertEqual(first_page["links"]["next"], all_pages[0]["links"]["next"])
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get("/flight_declaration_ops/flight_declaration?cursor=cD1ub3QtYS1wb3NpdGlvbg%3D%3D", **self.headers)
+        self.assertEqual(response.status_code, 404)
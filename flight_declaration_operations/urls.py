@@ -20,7 +20,10 @@ from . import views as flight_declaration_views
 
 urlpatterns = [
     path("set_flight_declaration", flight_declaration_views.set_flight_declaration),
+    path("set_flight_declarations_bulk", flight_declaration_views.set_flight_declarations_bulk),
     path("flight_declaration", flight_declaration_views.FlightDeclarationCreateList.as_view()),
+    path("flight_declaration/export", flight_declaration_views.FlightDeclarationExport.as_view()),
+    path("flight_declaration/changes", flight_declaration_views.FlightDeclarationChanges.as_view()),
     path(
         "flight_declaration/<uuid:pk>",
         flight_declaration_views.FlightDeclarationDetail.as_view(),
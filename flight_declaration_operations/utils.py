@@ -1,14 +1,16 @@
+import json
 from dataclasses import asdict
-from os import environ as env
 from typing import List
 
 import shapely.geometry
 from dotenv import find_dotenv, load_dotenv
 from geojson import FeatureCollection
-from pyproj import Proj
 from shapely.geometry import Point, Polygon, shape
 from shapely.ops import unary_union
 
+from common.projection_helper import buffer_point_in_meters
+from common.simplification_helper import compute_levels_of_detail
+from scd_operations.dss_scd_helper import OperationalIntentReferenceHelper
 from scd_operations.scd_data_definitions import (
     Altitude,
     LatLngPoint,
@@ -21,33 +23,18 @@ ENV_FILE = find_dotenv()
 if ENV_FILE:
     load_dotenv(ENV_FILE)
 
+# The features of a flight declaration are buffered by this distance (in degrees) when they are converted to operational intent volumes
+DECLARATION_FEATURE_BUFFER = 0.0005
+
 
 class OperationalIntentsConverter:
     """A class to convert a operational intent in to GeoJSON"""
 
     def __init__(self):
         self.geo_json = {"type": "FeatureCollection", "features": []}
-        self.utm_zone = env.get("UTM_ZONE", "54N")  # Default Zone for Switzerland
 
         self.all_features = []
 
-    def utm_converter(self, shapely_shape: shapely.geometry, inverse: bool = False) -> shapely.geometry.shape:
-        """A helper function to convert from lat / lon to UTM coordinates for buffering. tracks. This is the UTM projection (https://en.wikipedia.org/wiki/Universal_Transverse_Mercator_coordinate_system), we use Zone 54N which encompasses Japan, this zone has to be set for each locale / city. Adapted from https://gis.stackexchange.com/questions/325926/buffering-geometry-with-points-in-wgs84-using-shapely"""
-
-        proj = Proj(proj="utm", zone=self.utm_zone, ellps="WGS84", datum="WGS84")
-
-        geo_interface = shapely_shape.__geo_interface__
-        point_or_polygon = geo_interface["type"]
-        coordinates = geo_interface["coordinates"]
-        if point_or_polygon == "Polygon":
-            new_coordinates = [[proj(*point, inverse=inverse) for point in linring] for linring in coordinates]
-        elif point_or_polygon == "Point":
-            new_coordinates = proj(*coordinates, inverse=inverse)
-        else:
-            raise RuntimeError("Unexpected geo_interface type: {}".format(point_or_polygon))
-
-        return shapely.geometry.shape({"type": point_or_polygon, "coordinates": tuple(new_coordinates)})
-
     def convert_operational_intent_to_geo_json(self, volumes: List[Volume4D]):
         for volume in volumes:
             geo_json_features = self._convert_operational_intent_to_geojson_feature(volume)
@@ -79,7 +66,8 @@ class OperationalIntentsConverter:
             max_altitude = feature["properties"]["max_altitude"]["meters"]
             min_altitude = feature["properties"]["min_altitude"]["meters"]
             s = shape(geom)
-            buffed_s = s.buffer(0.0005)
+            # The exact buffered outline is stored, the extents sent to the DSS are capped at DSS_MAX_POLYGON_VERTICES when the payload is built
+            buffed_s = s.buffer(DECLARATION_FEATURE_BUFFER)
             self.all_features.append(buffed_s)
             # feature_union = unary_union(all_shapes)
             # # TODO: build a better flightplan
@@ -158,8 +146,12 @@ class OperationalIntentsConverter:
 
         return volume_4_d
 
+    def get_geo_json_shape(self) -> shapely.geometry.base.BaseGeometry:
+        """The union of the buffered features of the converted GeoJSON"""
+        return unary_union(self.all_features)
+
     def get_geo_json_bounds(self) -> str:
-        combined_features = unary_union(self.all_features)
+        combined_features = self.get_geo_json_shape()
         bnd_tuple = combined_features.bounds
         bounds = ",".join(["{:.7f}".format(x) for x in bnd_tuple])
 
@@ -194,9 +186,7 @@ class OperationalIntentsConverter:
             outline_circle = v["outline_circle"]
             circle_radius = outline_circle["radius"]["value"]
             center_point = Point(outline_circle["center"]["lng"], outline_circle["center"]["lat"])
-            utm_center = self.utm_converter(shapely_shape=center_point)
-            buffered_circle = utm_center.buffer(circle_radius)
-            converted_circle = self.utm_converter(buffered_circle, inverse=True)
+            converted_circle = buffer_point_in_meters(point=center_point, radius=circle_radius)
             self.all_features.append(converted_circle)
 
             outline_c = shapely.geometry.mapping(converted_circle)
@@ -210,3 +200,24 @@ class OperationalIntentsConverter:
             geo_json_features.append(circle_feature)
 
         return geo_json_features
+
+
+def convert_stored_operational_intent_to_geo_json(operational_intent: str) -> dict:
+    """Generate the GeoJSON of the volumes of the operational intent stored with a flight declaration"""
+    o = json.loads(operational_intent)
+    my_operational_intent_parser = OperationalIntentReferenceHelper()
+    volumes_list: List[Volume4D] = [my_operational_intent_parser.parse_volume_to_volume4D(v) for v in o["volumes"]]
+    my_operational_intent_converter = OperationalIntentsConverter()
+    my_operational_intent_converter.convert_operational_intent_to_geo_json(volumes=volumes_list)
+    return my_operational_intent_converter.geo_json
+
+
+def set_operational_intent_geojson(flight_declaration) -> None:
+    """Compute and set the GeoJSON of a flight declaration and its simplified versions if its operational intent has changed, this is done when the
+    declaration is saved and before it is written with bulk_create"""
+    if flight_declaration.is_operational_intent_geojson_stale():
+        flight_declaration.operational_intent_geojson = json.dumps(
+            convert_stored_operational_intent_to_geo_json(flight_declaration.operational_intent)
+        )
+        flight_declaration.operational_intent_simplified_geojson = compute_levels_of_detail(flight_declaration.operational_intent_geojson)
+        flight_declaration._stored_operational_intent = flight_declaration.operational_intent
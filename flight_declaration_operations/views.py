@@ -3,9 +3,10 @@ import json
 import logging
 from dataclasses import asdict
 from os import environ as env
-from typing import List
+from typing import List, Optional, Union
 
 import arrow
+from celery import group
 from django.http import Http404, HttpResponse, JsonResponse
 from django.utils.decorators import method_decorator
 from dotenv import find_dotenv, load_dotenv
@@ -14,8 +15,10 @@ from rest_framework.decorators import api_view
 from shapely.geometry import shape
 
 from auth_helper.utils import requires_scopes
+from common.bounds_helper import view_box_filter
+from common.delta_sync_helper import get_delta_sync_response
+from common.simplification_helper import LevelOfDetailMixin, select_level_of_detail
 from common.data_definitions import (
-    ACTIVE_OPERATIONAL_STATES,
     ARGONSERVER_READ_SCOPE,
     ARGONSERVER_WRITE_SCOPE,
     RESPONSE_CONTENT_TYPE,
@@ -24,8 +27,13 @@ from common.database_operations import (
     ArgonServerDatabaseReader,
     ArgonServerDatabaseWriter,
 )
+from common.utils import (
+    FEATURE_COLLECTION_PREFIX,
+    FEATURE_COLLECTION_SUFFIX,
+    STREAMING_QUERYSET_CHUNK_SIZE,
+    StreamingJsonResponse,
+)
 from geo_fence_operations import rtree_geo_fence_helper
-from geo_fence_operations.models import GeoFence
 from scd_operations.dss_scd_helper import (
     OperationalIntentReferenceHelper,
     SCDOperations,
@@ -33,29 +41,41 @@ from scd_operations.dss_scd_helper import (
 
 from .data_definitions import (
     Altitude,
+    FlightDeclarationBulkCreateItemResponse,
+    FlightDeclarationBulkCreateResponse,
     FlightDeclarationCreateResponse,
     FlightDeclarationRequest,
+    FlightDeclarationSubmission,
     HTTP400Response,
     HTTP404Response,
 )
-from .flight_declarations_rtree_helper import FlightDeclarationRTreeIndexFactory
-from .models import FlightDeclaration
-from .pagination import StandardResultsSetPagination
+from .flight_declarations_rtree_helper import (
+    FlightDeclarationBatchIndex,
+    get_flight_declaration_index,
+)
+from .models import FlightDeclaration, FlightDeclarationChange
+from .pagination import KeysetResultsSetPagination
 from .serializers import (
     FlightDeclarationApprovalSerializer,
     FlightDeclarationSerializer,
     FlightDeclarationStateSerializer,
+    FlightDeclarationSummarySerializer,
 )
 from .tasks import (
     send_operational_update_message,
     submit_flight_declaration_to_dss_async,
 )
-from .utils import OperationalIntentsConverter
+from .utils import (
+    OperationalIntentsConverter,
+    convert_stored_operational_intent_to_geo_json,
+)
 
 load_dotenv(find_dotenv())
 
 logger = logging.getLogger("django")
 
+FLIGHT_DECLARATION_BULK_MAX_SIZE = int(env.get("FLIGHT_DECLARATION_BULK_MAX_SIZE", 100))
+
 
 print("Flight Declaration Operations Views Loaded")
 
@@ -80,17 +100,8 @@ class FlightDeclarationDelete(generics.DestroyAPIView):
             return HttpResponse(status=status.HTTP_404_NOT_FOUND)
 
 
-@api_view(["POST"])
-@requires_scopes([ARGONSERVER_WRITE_SCOPE])
-def set_flight_declaration(request):
-    try:
-        assert request.headers["Content-Type"] == RESPONSE_CONTENT_TYPE
-    except AssertionError:
-        msg = {"message": "Unsupported Media Type"}
-        return JsonResponse(msg, status=415, mimetype=RESPONSE_CONTENT_TYPE)
-    else:
-        req = request.data
-
+def parse_flight_declaration_submission(req: dict, now: arrow.Arrow) -> Union[FlightDeclarationSubmission, HTTP400Response]:
+    """Validate a flight declaration submitted to the API and parse it, if it is not valid a HTTP400Response with the reason is returned"""
     try:
         assert req.keys() >= {
             "originating_party",
@@ -101,33 +112,23 @@ def set_flight_declaration(request):
             "aircraft_id",
         }
 
-    except AssertionError:
-        msg = json.dumps(
-            {
-                "message": "Not all necessary fields were provided. Aircraft ID, Originating Party, Start Datetime, End Datetime, Flight Declaration and Type of operation must be provided."
-            }
+    except (AssertionError, AttributeError):
+        return HTTP400Response(
+            message="Not all necessary fields were provided. Aircraft ID, Originating Party, Start Datetime, End Datetime, Flight Declaration and Type of operation must be provided."
         )
-        return HttpResponse(msg, status=400)
-
-    try:
-        flight_declaration_geo_json = req["flight_declaration_geo_json"]
-    except KeyError:
-        msg = json.dumps({"message": "A valid flight declaration as specified by the A flight declaration protocol must be submitted."})
-        return HttpResponse(msg, status=400)
-
-    my_database_writer = ArgonServerDatabaseWriter()
-    USSP_NETWORK_ENABLED = int(env.get("USSP_NETWORK_ENABLED", 0))
 
+    flight_declaration_geo_json = req["flight_declaration_geo_json"]
     submitted_by = None if "submitted_by" not in req else req["submitted_by"]
     approved_by = None if "approved_by" not in req else req["approved_by"]
-    is_approved = False
     type_of_operation = 0 if "type_of_operation" not in req else req["type_of_operation"]
     originating_party = "No Flight Information" if "originating_party" not in req else req["originating_party"]
     aircraft_id = req["aircraft_id"]
-    now = arrow.now()
 
-    start_datetime = now.isoformat() if "start_datetime" not in req else arrow.get(req["start_datetime"]).isoformat()
-    end_datetime = now.isoformat() if "end_datetime" not in req else arrow.get(req["end_datetime"]).isoformat()
+    try:
+        start_datetime = now.isoformat() if "start_datetime" not in req else arrow.get(req["start_datetime"]).isoformat()
+        end_datetime = now.isoformat() if "end_datetime" not in req else arrow.get(req["end_datetime"]).isoformat()
+    except (arrow.parser.ParserError, TypeError, ValueError):
+        return HTTP400Response(message="The start and end datetime of a flight declaration must be valid RFC3339 date times.")
 
     two_days_from_now = now.shift(days=2)
 
@@ -136,38 +137,77 @@ def set_flight_declaration(request):
     e_datetime = arrow.get(end_datetime)
 
     if s_datetime < now or e_datetime < now or e_datetime > two_days_from_now or s_datetime > two_days_from_now:
-        msg = json.dumps({"message": "A flight declaration cannot have a start / end time in the past or after two days from current time."})
-        return HttpResponse(msg, status=400)
+        return HTTP400Response(message="A flight declaration cannot have a start / end time in the past or after two days from current time.")
     all_features = []
 
-    for feature in flight_declaration_geo_json["features"]:
-        geometry = feature["geometry"]
-        s = shape(geometry)
-        if s.is_valid:
-            all_features.append(s)
-        else:
-            op = json.dumps(
-                {
-                    "message": "Error in processing the submitted GeoJSON: every Feature in a GeoJSON FeatureCollection must have a valid geometry, please check your submitted FeatureCollection"
-                }
-            )
-            return HttpResponse(op, status=400, content_type=RESPONSE_CONTENT_TYPE)
+    try:
+        for feature in flight_declaration_geo_json["features"]:
+            geometry = feature["geometry"]
+            s = shape(geometry)
+            if s.is_valid:
+                all_features.append(s)
+            else:
+                return HTTP400Response(
+                    message="Error in processing the submitted GeoJSON: every Feature in a GeoJSON FeatureCollection must have a valid geometry, please check your submitted FeatureCollection"
+                )
 
-        props = feature["properties"]
-        try:
-            assert "min_altitude" in props
-            assert "max_altitude" in props
-        except AssertionError:
-            op = json.dumps(
-                {
-                    "message": "Error in processing the submitted GeoJSON every Feature in a GeoJSON FeatureCollection must have a min_altitude and max_altitude data structure"
-                }
-            )
-            return HttpResponse(op, status=400, content_type=RESPONSE_CONTENT_TYPE)
-        else:
-            min_altitude = Altitude(meters=props["min_altitude"]["meters"], datum=props["min_altitude"]["datum"])
-            max_altitude = Altitude(meters=props["max_altitude"]["meters"], datum=props["max_altitude"]["datum"])
-            logging.debug(min_altitude, max_altitude)
+            props = feature["properties"]
+            try:
+                assert "min_altitude" in props
+                assert "max_altitude" in props
+            except AssertionError:
+                return HTTP400Response(
+                    message="Error in processing the submitted GeoJSON every Feature in a GeoJSON FeatureCollection must have a min_altitude and max_altitude data structure"
+                )
+            else:
+                min_altitude = Altitude(meters=props["min_altitude"]["meters"], datum=props["min_altitude"]["datum"])
+                max_altitude = Altitude(meters=props["max_altitude"]["meters"], datum=props["max_altitude"]["datum"])
+                logging.debug(min_altitude, max_altitude)
+    except (KeyError, TypeError, ValueError, AttributeError):
+        return HTTP400Response(message="A valid flight declaration as specified by the A flight declaration protocol must be submitted.")
+
+    return FlightDeclarationSubmission(
+        flight_declaration_geo_json=flight_declaration_geo_json,
+        features=all_features,
+        type_of_operation=type_of_operation,
+        aircraft_id=aircraft_id,
+        originating_party=originating_party,
+        submitted_by=submitted_by,
+        approved_by=approved_by,
+        start_datetime=start_datetime,
+        end_datetime=end_datetime,
+    )
+
+
+@api_view(["POST"])
+@requires_scopes([ARGONSERVER_WRITE_SCOPE])
+def set_flight_declaration(request):
+    try:
+        assert request.headers["Content-Type"] == RESPONSE_CONTENT_TYPE
+    except AssertionError:
+        msg = {"message": "Unsupported Media Type"}
+        return JsonResponse(msg, status=415, mimetype=RESPONSE_CONTENT_TYPE)
+    else:
+        req = request.data
+
+    now = arrow.now()
+    flight_declaration_submission = parse_flight_declaration_submission(req=req, now=now)
+    if isinstance(flight_declaration_submission, HTTP400Response):
+        return HttpResponse(json.dumps(asdict(flight_declaration_submission)), status=400, content_type=RESPONSE_CONTENT_TYPE)
+
+    my_database_writer = ArgonServerDatabaseWriter()
+    USSP_NETWORK_ENABLED = int(env.get("USSP_NETWORK_ENABLED", 0))
+
+    flight_declaration_geo_json = flight_declaration_submission.flight_declaration_geo_json
+    all_features = flight_declaration_submission.features
+    submitted_by = flight_declaration_submission.submitted_by
+    approved_by = flight_declaration_submission.approved_by
+    is_approved = False
+    type_of_operation = flight_declaration_submission.type_of_operation
+    originating_party = flight_declaration_submission.originating_party
+    aircraft_id = flight_declaration_submission.aircraft_id
+    start_datetime = flight_declaration_submission.start_datetime
+    end_datetime = flight_declaration_submission.end_datetime
 
     # Default state is Processing if working with a DSS, otherwise it is Accepted
     declaration_state = 0 if USSP_NETWORK_ENABLED else 1
@@ -194,50 +234,34 @@ def set_flight_declaration(request):
 
     logger.info("Checking intersections with Geofences..")
     view_box = [float(i) for i in bounds.split(",")]
+    declaration_shape = my_operational_intent_converter.get_geo_json_shape()
 
-    fence_within_timelimits = GeoFence.objects.filter(start_datetime__lte=start_datetime, end_datetime__gte=end_datetime).exists()
-    all_relevant_fences = []
-    if fence_within_timelimits:
-        all_fences_within_timelimits = GeoFence.objects.filter(start_datetime__lte=start_datetime, end_datetime__gte=end_datetime)
-        INDEX_NAME = "geofence_idx"
-        my_rtree_helper = rtree_geo_fence_helper.GeoFenceRTreeIndexFactory(index_name=INDEX_NAME)
-        my_rtree_helper.generate_geo_fence_index(all_fences=all_fences_within_timelimits)
-        all_relevant_fences = my_rtree_helper.check_box_intersection(view_box=view_box)
-        relevant_id_set = []
-        for i in all_relevant_fences:
-            relevant_id_set.append(i["geo_fence_id"])
-
-        my_rtree_helper.clear_rtree_index()
-        logger.info("Geofence intersections checked, found {num_intersections} fences".format(num_intersections=len(relevant_id_set)))
-        if all_relevant_fences:
-            is_approved = 0
-            declaration_state = 8
-
-    all_relevant_declarations = []
-    existing_declaration_within_timelimits = FlightDeclaration.objects.filter(
-        start_datetime__lte=end_datetime, end_datetime__gte=start_datetime, state__in=ACTIVE_OPERATIONAL_STATES
-    ).exists()
-    if existing_declaration_within_timelimits:
-        all_declarations_within_timelimits = FlightDeclaration.objects.filter(
-            start_datetime__lte=end_datetime, end_datetime__gte=start_datetime, state__in=ACTIVE_OPERATIONAL_STATES
-        )
-        INDEX_NAME = "flight_declaration_idx"
-        my_fd_rtree_helper = FlightDeclarationRTreeIndexFactory(index_name=INDEX_NAME)
-        my_fd_rtree_helper.generate_flight_declaration_index(all_flight_declarations=all_declarations_within_timelimits)
-        all_relevant_declarations = my_fd_rtree_helper.check_box_intersection(view_box=view_box)
-        relevant_id_set = []
-        for i in all_relevant_declarations:
-            relevant_id_set.append(i["flight_declaration_id"])
-        my_fd_rtree_helper.clear_rtree_index()
-        logger.info(
-            "Flight Declaration intersections checked, found {all_relevant_declarations} declarations".format(
-                all_relevant_declarations=len(relevant_id_set)
-            )
+    my_geo_fence_index = rtree_geo_fence_helper.get_geo_fence_index()
+    all_candidate_fences = my_geo_fence_index.get_geo_fences_active_during(
+        view_box=view_box, start_datetime=start_datetime, end_datetime=end_datetime
+    )
+    all_relevant_fences = my_geo_fence_index.filter_intersecting_geo_fences(candidates=all_candidate_fences, geometry=declaration_shape)
+    logger.info("Geofence intersections checked, found {num_intersections} fences".format(num_intersections=len(all_relevant_fences)))
+    if all_relevant_fences:
+        is_approved = 0
+        declaration_state = 8
+
+    my_flight_declaration_index = get_flight_declaration_index()
+    all_candidate_declarations = my_flight_declaration_index.get_conflicting_declarations(
+        view_box=view_box, start_datetime=start_datetime, end_datetime=end_datetime
+    )
+    all_relevant_declarations = my_flight_declaration_index.filter_intersecting_declarations(
+        candidates=all_candidate_declarations, geometry=declaration_shape
+    )
+    logger.info(
+        "Flight Declaration intersections checked, found {all_relevant_declarations} declarations".format(
+            all_relevant_declarations=len(all_relevant_declarations)
         )
-        if all_relevant_declarations:
-            logger.info("Setting state as rejected...")
-            is_approved = 0
-            declaration_state = 8
+    )
+    if all_relevant_declarations:
+        logger.info("Setting state as rejected...")
+        is_approved = 0
+        declaration_state = 8
 
     flight_declaration = FlightDeclaration(
         operational_intent=json.dumps(asdict(parital_op_int_ref)),
@@ -302,6 +326,166 @@ def set_flight_declaration(request):
     return HttpResponse(op, status=200, content_type=RESPONSE_CONTENT_TYPE)
 
 
+@api_view(["POST"])
+@requires_scopes([ARGONSERVER_WRITE_SCOPE])
+def set_flight_declarations_bulk(request):
+    """Submit several flight declarations in one request. Every declaration is deconflicted against the geofences, the existing operations and the declarations
+    submitted before it in the same request, a declaration that conflicts is created in the rejected state. The declarations are written in a single transaction
+    and the results are returned in the order of submission"""
+    try:
+        assert request.headers["Content-Type"] == RESPONSE_CONTENT_TYPE
+    except AssertionError:
+        msg = {"message": "Unsupported Media Type"}
+        return JsonResponse(msg, status=415)
+
+    all_submissions = request.data.get("flight_declarations") if isinstance(request.data, dict) else None
+    if not isinstance(all_submissions, list) or not all_submissions:
+        msg = json.dumps({"message": "A list of flight declarations must be provided in the flight_declarations field."})
+        return HttpResponse(msg, status=400, content_type=RESPONSE_CONTENT_TYPE)
+    if len(all_submissions) > FLIGHT_DECLARATION_BULK_MAX_SIZE:
+        msg = json.dumps(
+            {
+                "message": "A maximum of {max_size} flight declarations can be submitted in one request.".format(
+                    max_size=FLIGHT_DECLARATION_BULK_MAX_SIZE
+                )
+            }
+        )
+        return HttpResponse(msg, status=400, content_type=RESPONSE_CONTENT_TYPE)
+
+    my_database_writer = ArgonServerDatabaseWriter()
+    USSP_NETWORK_ENABLED = int(env.get("USSP_NETWORK_ENABLED", 0))
+    now = arrow.now()
+
+    my_geo_fence_index = rtree_geo_fence_helper.get_geo_fence_index()
+    my_flight_declaration_index = get_flight_declaration_index()
+    my_batch_index = FlightDeclarationBatchIndex()
+
+    all_results = []
+    all_flight_declarations = []
+    all_rejection_notes = {}
+    for batch_position, submission in enumerate(all_submissions):
+        flight_declaration_submission = parse_flight_declaration_submission(req=submission, now=now)
+        if isinstance(flight_declaration_submission, HTTP400Response):
+            all_results.append(
+                FlightDeclarationBulkCreateItemResponse(
+                    index=batch_position, id=None, message=flight_declaration_submission.message, is_approved=False, state=None
+                )
+            )
+            continue
+
+        start_datetime = flight_declaration_submission.start_datetime
+        end_datetime = flight_declaration_submission.end_datetime
+        my_operational_intent_converter = OperationalIntentsConverter()
+        parital_op_int_ref = my_operational_intent_converter.create_partial_operational_intent_ref(
+            geo_json_fc=flight_declaration_submission.flight_declaration_geo_json,
+            start_datetime=start_datetime,
+            end_datetime=end_datetime,
+            priority=0,
+        )
+        bounds = my_operational_intent_converter.get_geo_json_bounds()
+        view_box = [float(i) for i in bounds.split(",")]
+        declaration_shape = my_operational_intent_converter.get_geo_json_shape()
+
+        all_candidate_fences = my_geo_fence_index.get_geo_fences_active_during(
+            view_box=view_box, start_datetime=start_datetime, end_datetime=end_datetime
+        )
+        all_relevant_fences = my_geo_fence_index.filter_intersecting_geo_fences(candidates=all_candidate_fences, geometry=declaration_shape)
+        all_candidate_declarations = my_flight_declaration_index.get_conflicting_declarations(
+            view_box=view_box, start_datetime=start_datetime, end_datetime=end_datetime
+        )
+        all_relevant_declarations = my_flight_declaration_index.filter_intersecting_declarations(
+            candidates=all_candidate_declarations, geometry=declaration_shape
+        )
+        all_conflicting_positions = my_batch_index.get_conflicting_declarations(
+            view_box=view_box, start_datetime=start_datetime, end_datetime=end_datetime, geometry=declaration_shape
+        )
+
+        all_conflicts = []
+        if all_relevant_fences:
+            all_conflicts.append("{num_fences} geofence(s)".format(num_fences=len(all_relevant_fences)))
+        if all_relevant_declarations:
+            all_conflicts.append("{num_declarations} existing operation(s)".format(num_declarations=len(all_relevant_declarations)))
+        if all_conflicting_positions:
+            all_conflicts.append("the declaration(s) at {positions} of this request".format(positions=all_conflicting_positions))
+
+        if all_conflicts:
+            declaration_state = 8
+            message = "Rejected by Argon Server because of time / space conflicts with " + ", ".join(all_conflicts)
+        else:
+            # Default state is Processing if working with a DSS, otherwise it is Accepted
+            declaration_state = 0 if USSP_NETWORK_ENABLED else 1
+            message = "Submitted Flight Declaration"
+            my_batch_index.add_declaration(
+                batch_position=batch_position, view=view_box, start_datetime=start_datetime, end_datetime=end_datetime, geometry=declaration_shape
+            )
+
+        flight_declaration = FlightDeclaration(
+            operational_intent=json.dumps(asdict(parital_op_int_ref)),
+            bounds=bounds,
+            type_of_operation=flight_declaration_submission.type_of_operation,
+            aircraft_id=flight_declaration_submission.aircraft_id,
+            submitted_by=flight_declaration_submission.submitted_by,
+            is_approved=False,
+            start_datetime=start_datetime,
+            end_datetime=end_datetime,
+            originating_party=flight_declaration_submission.originating_party,
+            flight_declaration_raw_geojson=json.dumps(flight_declaration_submission.flight_declaration_geo_json),
+            state=declaration_state,
+        )
+        all_flight_declarations.append(flight_declaration)
+        if declaration_state == 8:
+            all_rejection_notes[str(flight_declaration.id)] = message
+        all_results.append(
+            FlightDeclarationBulkCreateItemResponse(
+                index=batch_position, id=str(flight_declaration.id), message=message, is_approved=False, state=declaration_state
+            )
+        )
+
+    if all_flight_declarations:
+        my_database_writer.create_flight_declarations_in_bulk(
+            flight_declarations=all_flight_declarations,
+            rejection_notes=all_rejection_notes,
+        )
+
+        all_update_messages = []
+        all_dss_submissions = []
+        for flight_declaration in all_flight_declarations:
+            flight_declaration_id = str(flight_declaration.id)
+            all_update_messages.append(
+                send_operational_update_message.s(
+                    flight_declaration_id=flight_declaration_id, message_text="Flight Declaration created..", level="info"
+                )
+            )
+            if flight_declaration.state == 8:
+                self_deconfliction_failed_msg = "Self deconfliction failed for operation {operation_id} did not pass self-deconfliction, there are existing operations declared in the area".format(
+                    operation_id=flight_declaration_id
+                )
+                all_update_messages.append(
+                    send_operational_update_message.s(
+                        flight_declaration_id=flight_declaration_id, message_text=self_deconfliction_failed_msg, level="error"
+                    )
+                )
+            elif flight_declaration.state == 0 and USSP_NETWORK_ENABLED:
+                all_dss_submissions.append(submit_flight_declaration_to_dss_async.s(flight_declaration_id=flight_declaration_id))
+
+        # The messages and DSS submissions of the whole request are published together
+        group(all_update_messages).apply_async()
+        if all_dss_submissions:
+            group(all_dss_submissions).apply_async()
+
+    num_rejected = len([f for f in all_flight_declarations if f.state == 8])
+    bulk_creation_response = FlightDeclarationBulkCreateResponse(
+        message="Submitted {num_created} Flight Declarations".format(num_created=len(all_flight_declarations)),
+        submitted=len(all_submissions),
+        created=len(all_flight_declarations),
+        rejected=num_rejected,
+        results=all_results,
+    )
+
+    op = json.dumps(asdict(bulk_creation_response))
+    return HttpResponse(op, status=200, content_type=RESPONSE_CONTENT_TYPE)
+
+
 @method_decorator(requires_scopes([ARGONSERVER_WRITE_SCOPE]), name="dispatch")
 class FlightDeclarationApproval(mixins.UpdateModelMixin, generics.GenericAPIView):
     queryset = FlightDeclaration.objects.all()
@@ -382,19 +566,30 @@ def network_flight_declaration_details(request, flight_declaration_id):
         logger.info("The received data from peer USS had errors and failed validation checks..")
         operational_intent_geojson = []
 
-    # return opints as GeoJSON
-    return HttpResponse(
-        json.dumps(operational_intent_geojson),
+    # return opints as GeoJSON, the features are encoded as they are written
+    if not operational_intent_geojson:
+        return StreamingJsonResponse([], status=200)
+    return StreamingJsonResponse(
+        operational_intent_geojson["features"],
+        prefix=FEATURE_COLLECTION_PREFIX,
+        suffix=FEATURE_COLLECTION_SUFFIX,
         status=200,
-        content_type="application/json",
     )
 
 
 @method_decorator(requires_scopes([ARGONSERVER_READ_SCOPE]), name="dispatch")
-class FlightDeclarationCreateList(mixins.ListModelMixin, generics.GenericAPIView):
+class FlightDeclarationCreateList(LevelOfDetailMixin, mixins.ListModelMixin, generics.GenericAPIView):
     queryset = FlightDeclaration.objects.all()
     serializer_class = FlightDeclarationSerializer
-    pagination_class = StandardResultsSetPagination
+    pagination_class = KeysetResultsSetPagination
+
+    def is_summary_requested(self) -> bool:
+        return self.request.query_params.get("summary", "").lower() in ["1", "true"]
+
+    def get_serializer_class(self):
+        if self.request.method == "GET" and self.is_summary_requested():
+            return FlightDeclarationSummarySerializer
+        return self.serializer_class
 
     def get_relevant_flight_declaration(self, start_date, end_date, view_port: List[float]):
         present = arrow.now()
@@ -405,24 +600,9 @@ class FlightDeclarationCreateList(mixins.ListModelMixin, generics.GenericAPIView
         else:
             s_date = present.shift(days=-1)
             e_date = present.shift(days=1)
-        all_fd_within_timelimits = FlightDeclaration.objects.filter(start_datetime__gte=s_date.isoformat(), end_datetime__lte=e_date.isoformat())
-
-        logger.info("Found %s flight declarations" % len(all_fd_within_timelimits))
+        filtered_relevant_fd = FlightDeclaration.objects.filter(start_datetime__gte=s_date.isoformat(), end_datetime__lte=e_date.isoformat())
         if view_port:
-            INDEX_NAME = "opint_idx"
-            my_rtree_helper = FlightDeclarationRTreeIndexFactory(index_name=INDEX_NAME)
-            my_rtree_helper.generate_flight_declaration_index(all_flight_declarations=all_fd_within_timelimits)
-
-            all_relevant_fences = my_rtree_helper.check_box_intersection(view_box=view_port)
-            relevant_id_set = []
-            for i in all_relevant_fences:
-                relevant_id_set.append(i["flight_declaration_id"])
-
-            my_rtree_helper.clear_rtree_index()
-            filtered_relevant_fd = FlightDeclaration.objects.filter(id__in=relevant_id_set)
-
-        else:
-            filtered_relevant_fd = all_fd_within_timelimits
+            filtered_relevant_fd = filtered_relevant_fd.filter(view_box_filter(view_port))
 
         return filtered_relevant_fd
 
@@ -436,6 +616,9 @@ class FlightDeclarationCreateList(mixins.ListModelMixin, generics.GenericAPIView
             view_port = [float(i) for i in view.split(",")]
 
         responses = self.get_relevant_flight_declaration(view_port=view_port, start_date=start_date, end_date=end_date)
+        if self.is_summary_requested():
+            # The operational intent and GeoJSON columns are large and not part of the summary
+            responses = responses.only(*FlightDeclarationSummarySerializer.Meta.fields)
         return responses
 
     def get(self, request, *args, **kwargs):
@@ -551,48 +734,34 @@ class FlightDeclarationCreateList(mixins.ListModelMixin, generics.GenericAPIView
 
         logger.info("Checking intersections with Geofences..")
         view_box = [float(i) for i in bounds.split(",")]
+        declaration_shape = my_operational_intent_converter.get_geo_json_shape()
 
-        fence_within_timelimits = GeoFence.objects.filter(start_datetime__lte=start_datetime, end_datetime__gte=end_datetime).exists()
-        all_relevant_fences = []
-        if fence_within_timelimits:
-            all_fences_within_timelimits = GeoFence.objects.filter(start_datetime__lte=start_datetime, end_datetime__gte=end_datetime)
-            INDEX_NAME = "geofence_idx"
-            my_rtree_helper = rtree_geo_fence_helper.GeoFenceRTreeIndexFactory(index_name=INDEX_NAME)
-            my_rtree_helper.generate_geo_fence_index(all_fences=all_fences_within_timelimits)
-            all_relevant_fences = my_rtree_helper.check_box_intersection(view_box=view_box)
-            relevant_id_set = []
-            for i in all_relevant_fences:
-                relevant_id_set.append(i["geo_fence_id"])
-
-            my_rtree_helper.clear_rtree_index()
-            logger.info("Geofence intersections checked, found {num_intersections} fences".format(num_intersections=len(relevant_id_set)))
-            if all_relevant_fences:
-                is_approved = 0
-                declaration_state = 8
-
-        all_relevant_declarations = []
-        existing_declaration_within_timelimits = FlightDeclaration.objects.filter(
-            start_datetime__lte=end_datetime, end_datetime__gte=start_datetime
-        ).exists()
-        if existing_declaration_within_timelimits:
-            all_declarations_within_timelimits = FlightDeclaration.objects.filter(start_datetime__lte=end_datetime, end_datetime__gte=start_datetime)
-            INDEX_NAME = "flight_declaration_idx"
-            my_fd_rtree_helper = FlightDeclarationRTreeIndexFactory(index_name=INDEX_NAME)
-            my_fd_rtree_helper.generate_flight_declaration_index(all_flight_declarations=all_declarations_within_timelimits)
-            all_relevant_declarations = my_fd_rtree_helper.check_box_intersection(view_box=view_box)
-            relevant_id_set = []
-            for i in all_relevant_declarations:
-                relevant_id_set.append(i["flight_declaration_id"])
-            my_fd_rtree_helper.clear_rtree_index()
-            logger.info(
-                "Flight Declaration intersections checked, found {all_relevant_declarations} declarations".format(
-                    all_relevant_declarations=len(relevant_id_set)
-                )
+        my_geo_fence_index = rtree_geo_fence_helper.get_geo_fence_index()
+        all_candidate_fences = my_geo_fence_index.get_geo_fences_active_during(
+            view_box=view_box, start_datetime=start_datetime, end_datetime=end_datetime
+        )
+        all_relevant_fences = my_geo_fence_index.filter_intersecting_geo_fences(candidates=all_candidate_fences, geometry=declaration_shape)
+        logger.info("Geofence intersections checked, found {num_intersections} fences".format(num_intersections=len(all_relevant_fences)))
+        if all_relevant_fences:
+            is_approved = 0
+            declaration_state = 8
+
+        my_flight_declaration_index = get_flight_declaration_index()
+        all_candidate_declarations = my_flight_declaration_index.get_conflicting_declarations(
+            view_box=view_box, start_datetime=start_datetime, end_datetime=end_datetime
+        )
+        all_relevant_declarations = my_flight_declaration_index.filter_intersecting_declarations(
+            candidates=all_candidate_declarations, geometry=declaration_shape
+        )
+        logger.info(
+            "Flight Declaration intersections checked, found {all_relevant_declarations} declarations".format(
+                all_relevant_declarations=len(all_relevant_declarations)
             )
-            if all_relevant_declarations:
-                logger.info("Setting state as rejected...")
-                is_approved = 0
-                declaration_state = 8
+        )
+        if all_relevant_declarations:
+            logger.info("Setting state as rejected...")
+            is_approved = 0
+            declaration_state = 8
 
         flight_declaration = FlightDeclaration(
             operational_intent=json.dumps(asdict(parital_op_int_ref)),
@@ -654,3 +823,59 @@ class FlightDeclarationCreateList(mixins.ListModelMixin, generics.GenericAPIView
 
         op = json.dumps(asdict(creation_response))
         return HttpResponse(op, status=200, content_type=RESPONSE_CONTENT_TYPE)
+
+
+def iterate_flight_declaration_features(all_flight_declarations, level_of_detail: Optional[str] = None):
+    """Yield the GeoJSON features of the operational intent of each declaration at the level of detail with the id and state of the declaration added to
+    their properties"""
+    for flight_declaration in all_flight_declarations:
+        geo_json = select_level_of_detail(flight_declaration.operational_intent_simplified_geojson, level_of_detail) if level_of_detail else None
+        if geo_json is None and flight_declaration.operational_intent_geojson:
+            geo_json = json.loads(flight_declaration.operational_intent_geojson)
+        elif geo_json is None:
+            geo_json = convert_stored_operational_intent_to_geo_json(flight_declaration.operational_intent)
+        for feature in geo_json["features"]:
+            feature["properties"] = {
+                **(feature.get("properties") or {}),
+                "flight_declaration_id": str(flight_declaration.id),
+                "state": flight_declaration.state,
+            }
+            yield feature
+
+
+@method_decorator(requires_scopes([ARGONSERVER_READ_SCOPE]), name="dispatch")
+class FlightDeclarationExport(FlightDeclarationCreateList):
+    """Export the operational intents of the declarations matching the list filters as one GeoJSON FeatureCollection, the rows are read in chunks and the
+    features are written as they are encoded"""
+
+    http_method_names = ["get", "options"]
+
+    def get(self, request, *args, **kwargs):
+        level_of_detail = self.get_requested_level_of_detail()
+        all_flight_declarations = (
+            self.get_queryset()
+            .only("id", "state", "operational_intent", "operational_intent_geojson", "operational_intent_simplified_geojson")
+            .iterator(chunk_size=STREAMING_QUERYSET_CHUNK_SIZE)
+        )
+        return StreamingJsonResponse(
+            iterate_flight_declaration_features(all_flight_declarations, level_of_detail=level_of_detail),
+            prefix=FEATURE_COLLECTION_PREFIX,
+            suffix=FEATURE_COLLECTION_SUFFIX,
+            status=200,
+        )
+
+
+@method_decorator(requires_scopes([ARGONSERVER_READ_SCOPE]), name="dispatch")
+class FlightDeclarationChanges(FlightDeclarationCreateList):
+    """Return the declarations created, updated or deleted after the change cursor of the client, a client without a cursor gets every declaration. The
+    response carries the cursor for the next request so a client that refreshes often only transfers what has changed"""
+
+    http_method_names = ["get", "options"]
+
+    def get(self, request, *args, **kwargs):
+        all_flight_declarations = FlightDeclaration.objects.all()
+        if self.is_summary_requested():
+            all_flight_declarations = all_flight_declarations.only(*FlightDeclarationSummarySerializer.Meta.fields)
+        return get_delta_sync_response(
+            request, FlightDeclarationChange, all_flight_declarations, self.get_serializer_class(), self.get_serializer_context()
+        )
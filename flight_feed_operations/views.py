@@ -7,7 +7,7 @@ from typing import List
 
 import arrow
 import shapely.geometry
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse
 from django.utils.decorators import method_decorator
 from django.views.generic import TemplateView
 from dotenv import find_dotenv, load_dotenv
@@ -18,6 +18,12 @@ from rest_framework.decorators import api_view
 from auth_helper.utils import requires_scopes
 from common.data_definitions import ARGONSERVER_READ_SCOPE, ARGONSERVER_WRITE_SCOPE
 from common.database_operations import ArgonServerDatabaseReader
+from common.vector_tile_helper import (
+    VECTOR_TILE_CONTENT_TYPE,
+    VectorTileRenderer,
+    is_valid_tile,
+    mapbox_vector_tile,
+)
 from rid_operations import view_port_ops
 from rid_operations.data_definitions import (
     RIDAircraftState,
@@ -224,6 +230,19 @@ def get_air_traffic(request):
         )
 
 
+@api_view(["GET"])
+@requires_scopes([ARGONSERVER_READ_SCOPE])
+def get_vector_tile(request, z: int, x: int, y: int):
+    """A Mapbox Vector Tile with the GeoFences, the active operational intents and the density of live air traffic in the z / x / y tile"""
+    if mapbox_vector_tile is None:
+        return JsonResponse({"message": "Vector tiles are not available, the mapbox-vector-tile package is not installed"}, status=501)
+    if not is_valid_tile(z, x, y):
+        return JsonResponse({"message": "A incorrect tile was requested"}, status=400)
+
+    my_tile_renderer = VectorTileRenderer(z=z, x=x, y=y)
+    return HttpResponse(my_tile_renderer.render(), status=200, content_type=VECTOR_TILE_CONTENT_TYPE)
+
+
 @api_view(["GET"])
 @requires_scopes([ARGONSERVER_READ_SCOPE])
 def start_opensky_feed(request):
@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class GeoFenceOperationsConfig(AppConfig):
     name = "geo_fence_operations"
+
+    def ready(self):
+        # Keep the in memory GeoFence index up to date with saved and deleted GeoFences
+        from . import signals  # noqa: F401
@@ -1,11 +1,16 @@
 import json
 import logging
-from functools import partial
-from typing import List
+from functools import lru_cache
+from typing import List, Optional, Tuple
 
-import pyproj
-from shapely.geometry import Point, mapping
-from shapely.ops import transform
+import arrow
+import numpy as np
+from pyproj import Transformer
+from shapely.geometry import Point, Polygon, mapping, shape
+from shapely.ops import unary_union
+
+from common.projection_helper import WGS84_EPSG_CODE
+from common.simplification_helper import compute_levels_of_detail
 
 from .data_definitions import (
     ED269Geometry,
@@ -17,7 +22,6 @@ from .data_definitions import (
 )
 
 logger = logging.getLogger("django")
-proj_wgs84 = pyproj.Proj("+proj=longlat +datum=WGS84")
 
 
 class GeoZoneParser:
@@ -99,12 +103,109 @@ class GeoZoneParser:
         return ParseValidateResponse(all_zones=all_zones_valid, feature_list=processed_geo_zone_features)
 
 
-def geodesic_point_buffer(lat, lon, km):
-    # Azimuthal equidistant projection
-    aeqd_proj = "+proj=aeqd +lat_0={lat} +lon_0={lon} +x_0=0 +y_0=0"
-    project = partial(pyproj.transform, pyproj.Proj(aeqd_proj.format(lat=lat, lon=lon)), proj_wgs84)
-    buf = Point(0, 0).buffer(km * 1000)  # distance in metres
-    return transform(project, buf)
+@lru_cache(maxsize=1024)
+def get_aeqd_transformer(lat: float, lon: float) -> Transformer:
+    """A Transformer from the azimuthal equidistant projection centred on the point to lat / lon, it is cached per centre since building it is expensive"""
+    aeqd_proj = "+proj=aeqd +lat_0={lat} +lon_0={lon} +x_0=0 +y_0=0 +datum=WGS84".format(lat=lat, lon=lon)
+    return Transformer.from_crs(aeqd_proj, WGS84_EPSG_CODE, always_xy=True)
+
+
+def geodesic_point_buffer(lat, lon, km) -> Polygon:
+    """Buffer a lat / lon point by a distance in km, the circle is built in the azimuthal equidistant projection of the point and all of its vertices are
+    converted back to lat / lon in a single vectorized call"""
+    buffered_circle = np.asarray(Point(0, 0).buffer(km * 1000).exterior.coords)  # distance in metres
+    lngs, lats = get_aeqd_transformer(lat, lon).transform(buffered_circle[:, 0], buffered_circle[:, 1])
+    return Polygon(np.column_stack((lngs, lats)))
+
+
+def get_applicability_period(applicability: List[dict]) -> Tuple[Optional[str], Optional[str]]:
+    """The earliest start and latest end of the ED-269 applicability periods of a GeoZone, None is returned for a bound that is not set (e.g. permanent zones)
+    or cannot be parsed"""
+    try:
+        all_starts = [arrow.get(a["startDateTime"]) for a in applicability if a.get("startDateTime")]
+        all_ends = [arrow.get(a["endDateTime"]) for a in applicability if a.get("endDateTime")]
+    except (TypeError, ValueError, AttributeError):
+        return None, None
+    return (min(all_starts).isoformat() if all_starts else None, max(all_ends).isoformat() if all_ends else None)
+
+
+# The altitude_ref of a GeoFence for each ED-269 vertical reference, only limits referenced to WGS84 can be compared with the altitude of telemetry
+ED269_VERTICAL_REFERENCES = {"WGS84": 0, "AGL": 1, "AMSL": 2}
+# A unknown vertical reference cannot be compared with the altitude of telemetry either
+ED269_UNKNOWN_VERTICAL_REFERENCE = 1
+FEET_TO_METRES = 0.3048
+# The limits of a GeoFence are stored with four integer digits (in metres), higher limits e.g. the upper limit of a zone up to FL660 are capped
+MAX_ALTITUDE_LIMIT_M = 9999.99
+
+
+def convert_ed_269_limit_to_metres(limit: float, uom_dimensions: str) -> float:
+    """Convert a ED-269 limit to metres, the unit of the limits of a geometry is either M or FT"""
+    limit_m = float(limit) * FEET_TO_METRES if str(uom_dimensions).upper() == "FT" else float(limit)
+    return round(max(-MAX_ALTITUDE_LIMIT_M, min(limit_m, MAX_ALTITUDE_LIMIT_M)), 2)
+
+
+def get_ed_269_geometry_limits(geometry: ED269Geometry) -> Tuple[float, float, int]:
+    """The lower limit, upper limit (in metres) and altitude_ref of a ED-269 geometry, the altitude_ref is WGS84 only if both limits are referenced to WGS84"""
+    all_altitude_refs = [
+        ED269_VERTICAL_REFERENCES.get(str(reference).upper(), ED269_UNKNOWN_VERTICAL_REFERENCE)
+        for reference in [geometry.lowerVerticalReference, geometry.upperVerticalReference]
+    ]
+    altitude_ref = next((altitude_ref for altitude_ref in all_altitude_refs if altitude_ref != 0), 0)
+    return (
+        convert_ed_269_limit_to_metres(geometry.lowerLimit, geometry.uomDimensions),
+        convert_ed_269_limit_to_metres(geometry.upperLimit, geometry.uomDimensions),
+        altitude_ref,
+    )
+
+
+def prepare_geo_zone_features(raw_features: List[dict]) -> List[dict]:
+    """Validate a chunk of raw ED-269 features and compute what is stored for each of them: the parsed GeoZone, its horizontal projections as a GeoJSON
+    FeatureCollection, its simplified versions and their bounds, and the attributes used by the GeoZone check filters. This does not use the database so chunks can be prepared in worker processes, a KeyError is raised if a feature is
+    missing a mandatory field"""
+    my_geo_zone_parser = GeoZoneParser(geo_zone={"features": raw_features})
+    parse_response = my_geo_zone_parser.parse_validate_geozone()
+
+    all_prepared_features = []
+    for geo_zone_feature in parse_response.feature_list:
+        fc = {"type": "FeatureCollection", "features": []}
+        all_shapes = []
+        all_limits = []
+        for g in geo_zone_feature.geometry:
+            # The limits of every geometry are kept with its horizontal projection, the GeoFence holds the envelope of all of them
+            lower_limit, upper_limit, altitude_ref = get_ed_269_geometry_limits(g)
+            all_limits.append((lower_limit, upper_limit, altitude_ref))
+            properties = {"lower_limit": lower_limit, "upper_limit": upper_limit, "altitude_ref": altitude_ref}
+            fc["features"].append({"type": "Feature", "properties": properties, "geometry": g["horizontalProjection"]})
+            all_shapes.append(shape(g["horizontalProjection"]))
+        raw_geo_fence = json.dumps(fc)
+        prepared_feature = {
+            "geozone": json.dumps(geo_zone_feature),
+            "raw_geo_fence": raw_geo_fence,
+            "simplified_geo_fence": compute_levels_of_detail(raw_geo_fence),
+            "bounds": ",".join([str(x) for x in unary_union(all_shapes).bounds]),
+            "name": geo_zone_feature.name,
+            "upper_limit": max((upper_limit for _, upper_limit, _ in all_limits), default=MAX_ALTITUDE_LIMIT_M),
+            "lower_limit": min((lower_limit for lower_limit, _, _ in all_limits), default=0),
+            # The limits of the zone can only be compared with WGS84 altitudes if all of its geometries are referenced to WGS84
+            "altitude_ref": next((altitude_ref for _, _, altitude_ref in all_limits if altitude_ref != 0), 0),
+            "restriction": geo_zone_feature.restriction,
+            "u_space_class": geo_zone_feature.uSpaceClass,
+        }
+        # The time applicability of the zone replaces the default validity of the GeoFence when it is set
+        start_datetime, end_datetime = get_applicability_period(geo_zone_feature.applicability)
+        if start_datetime:
+            prepared_feature["start_datetime"] = start_datetime
+        if end_datetime:
+            prepared_feature["end_datetime"] = end_datetime
+        all_prepared_features.append(prepared_feature)
+    return all_prepared_features
+
+
+def set_simplified_geo_fence(geo_fence) -> None:
+    """Compute and set the simplified versions of the GeoJSON of a GeoFence if it has changed, this is done when the GeoFence is saved"""
+    if geo_fence.is_simplified_geo_fence_stale():
+        geo_fence.simplified_geo_fence = compute_levels_of_detail(geo_fence.raw_geo_fence)
+        geo_fence._stored_raw_geo_fence = geo_fence.raw_geo_fence
 
 
 def validate_geo_zone(geo_zone) -> bool:
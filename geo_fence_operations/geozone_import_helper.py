@@ -0,0 +1,125 @@
+import json
+import logging
+import os
+from collections import deque
+from itertools import islice
+from os import environ as env
+from typing import IO, Callable, Iterable, Iterator, List, Optional
+
+import arrow
+import requests
+from billiard import Pool
+from django.db import transaction
+from dotenv import find_dotenv, load_dotenv
+
+from common.bounds_helper import set_bbox_from_bounds
+from common.delta_sync_helper import record_changes
+from common.vector_tile_helper import invalidate_all_tiles
+
+from .common import prepare_geo_zone_features
+from .models import GeoFence, GeoFenceChange
+from .rtree_geo_fence_helper import get_geo_fence_index
+
+try:
+    import ijson
+except ImportError:  # ijson is in the requirements, if it is missing the downloaded file is parsed in one go
+    ijson = None
+
+load_dotenv(find_dotenv())
+
+logger = logging.getLogger("django")
+
+GEOZONE_IMPORT_CHUNK_SIZE = int(env.get("GEOZONE_IMPORT_CHUNK_SIZE", 1000))
+GEOZONE_DOWNLOAD_TIMEOUT_SECS = int(env.get("GEOZONE_DOWNLOAD_TIMEOUT_SECS", 60))
+GEOZONE_IMPORT_PROCESSES = int(env.get("GEOZONE_IMPORT_PROCESSES", os.cpu_count() or 1))
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+def download_to_file(url: str, destination: IO[bytes]) -> None:
+    """Stream the body of the url in to a open file, the download is never held in memory. A HTTPError is raised if the server does not return a 2xx status"""
+    with requests.get(url, stream=True, timeout=GEOZONE_DOWNLOAD_TIMEOUT_SECS) as response:
+        response.raise_for_status()
+        for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+            destination.write(chunk)
+    destination.flush()
+
+
+def iterate_geo_zone_features(source: IO[bytes]) -> Iterator[dict]:
+    """Yield the raw features of a ED-269 GeoZone file one at a time, with ijson installed only the current feature is held in memory"""
+    if ijson is not None:
+        yield from ijson.items(source, "features.item", use_float=True)
+    else:
+        yield from json.load(source)["features"]
+
+
+def chunked(items: Iterable, chunk_size: int) -> Iterator[list]:
+    all_items = iter(items)
+    while chunk := list(islice(all_items, chunk_size)):
+        yield chunk
+
+
+def iterate_prepared_geo_zone_chunks(raw_features: Iterable[dict]) -> Iterator[List[dict]]:
+    """Prepare the features in chunks of GEOZONE_IMPORT_CHUNK_SIZE across a pool of GEOZONE_IMPORT_PROCESSES worker processes, the chunks are yielded in order.
+    At most two chunks per worker are in flight so memory stays bounded. The pool is a billiard pool, unlike a multiprocessing pool it can be started from the
+    daemonic worker processes of the Celery prefork pool where the imports run. With a single process the chunks are prepared in this process"""
+    all_chunks = chunked(raw_features, GEOZONE_IMPORT_CHUNK_SIZE)
+    if GEOZONE_IMPORT_PROCESSES <= 1:
+        for raw_features_chunk in all_chunks:
+            yield prepare_geo_zone_features(raw_features_chunk)
+        return
+
+    max_in_flight = 2 * GEOZONE_IMPORT_PROCESSES
+    pool = Pool(processes=GEOZONE_IMPORT_PROCESSES)
+    try:
+        in_flight = deque()
+        for raw_features_chunk in all_chunks:
+            in_flight.append(pool.apply_async(prepare_geo_zone_features, (raw_features_chunk,)))
+            if len(in_flight) >= max_in_flight:
+                yield in_flight.popleft().get()
+        while in_flight:
+            yield in_flight.popleft().get()
+        pool.close()
+    except BaseException:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+
+def import_geo_zone_features(raw_features: Iterable[dict], is_test_dataset: bool, report_progress: Optional[Callable[[int], None]] = None) -> int:
+    """Prepare the features in parallel chunks and write them with bulk_create in a single transaction so that a failed import leaves no partial dataset,
+    report_progress is called with the number of GeoFences written so far after every chunk. The imported GeoFences are added to the GeoFence index of all
+    processes and the cached vector tiles are removed once the import is committed, the GeoFences are added to the change log in the same transaction. The number of
+    GeoFences written is returned"""
+    start_time = arrow.now()
+    end_time = start_time.shift(years=1)
+    num_imported = 0
+    imported_geo_fence_ids = []
+    with transaction.atomic():
+        for prepared_features_chunk in iterate_prepared_geo_zone_chunks(raw_features):
+            all_geo_fences = []
+            for prepared_feature in prepared_features_chunk:
+                geo_fence = GeoFence(
+                    **{
+                        "start_datetime": start_time.isoformat(),
+                        "end_datetime": end_time.isoformat(),
+                        "is_test_dataset": is_test_dataset,
+                        "status": GeoFence.READY,
+                        **prepared_feature,
+                    }
+                )
+                # bulk_create does not send the save signals
+                set_bbox_from_bounds(geo_fence)
+                all_geo_fences.append(geo_fence)
+            GeoFence.objects.bulk_create(all_geo_fences)
+            imported_geo_fence_ids.extend(geo_fence.id for geo_fence in all_geo_fences)
+            num_imported += len(all_geo_fences)
+            logger.info("Imported %s geozone features.." % num_imported)
+            if report_progress:
+                report_progress(num_imported)
+        transaction.on_commit(lambda: get_geo_fence_index().upsert_geo_fences(geo_fence_ids=imported_geo_fence_ids))
+        transaction.on_commit(invalidate_all_tiles)
+        if not is_test_dataset:
+            # Test datasets are not sent by the delta sync
+            record_changes(GeoFenceChange, imported_geo_fence_ids, is_new=True)
+    return num_imported
@@ -0,0 +1,74 @@
+# Generated by Django 5.1.3 on 2026-10-19 11:20
+
+from django.db import migrations, models
+
+
+# The conversion of the bounds is copied here so that later changes to the bounds helper do not change this migration
+BBOX_FIELDS = ["min_lon", "min_lat", "max_lon", "max_lat"]
+
+
+def parse_bounds(bounds):
+    try:
+        min_lon, min_lat, max_lon, max_lat = [float(i) for i in bounds.split(",")]
+    except (AttributeError, ValueError):
+        return None
+    return min_lon, min_lat, max_lon, max_lat
+
+
+def set_bbox_from_bounds(instance) -> None:
+    parsed_bounds = parse_bounds(instance.bounds)
+    for field_name, value in zip(BBOX_FIELDS, parsed_bounds or (None,) * 4):
+        setattr(instance, field_name, value)
+
+
+def set_bounding_boxes(apps, schema_editor):
+    GeoFence = apps.get_model("geo_fence_operations", "GeoFence")
+    all_geo_fences = GeoFence.objects.filter(min_lon__isnull=True).only("id", "bounds")
+    batch = []
+    for geo_fence in all_geo_fences.iterator(chunk_size=500):
+        set_bbox_from_bounds(geo_fence)
+        batch.append(geo_fence)
+        if len(batch) == 500:
+            GeoFence.objects.bulk_update(batch, BBOX_FIELDS)
+            batch = []
+    if batch:
+        GeoFence.objects.bulk_update(batch, BBOX_FIELDS)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("geo_fence_operations", "0003_geofence_message_geofence_status"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="geofence",
+            name="min_lon",
+            field=models.FloatField(blank=True, help_text="The bounding box of the GeoFence, this is set from the bounds when it is saved", null=True),
+        ),
+        migrations.AddField(
+            model_name="geofence",
+            name="min_lat",
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="geofence",
+            name="max_lon",
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="geofence",
+            name="max_lat",
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="geofence",
+            index=models.Index(fields=["start_datetime", "end_datetime", "status"], name="geofence_period_status_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="geofence",
+            index=models.Index(fields=["min_lon", "max_lon", "min_lat", "max_lat"], name="geofence_bbox_idx"),
+        ),
+        migrations.RunPython(set_bounding_boxes, migrations.RunPython.noop),
+    ]
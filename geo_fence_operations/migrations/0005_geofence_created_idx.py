@@ -0,0 +1,17 @@
+# Generated by Django 5.1.3 on 2026-10-19 11:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("geo_fence_operations", "0004_geofence_bbox_and_indexes"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="geofence",
+            index=models.Index(fields=["-created_at", "-id"], name="geofence_created_idx"),
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.1.3 on 2026-10-19 11:40
+
+import json
+
+from django.db import migrations, models
+
+
+def set_geozone_attributes(apps, schema_editor):
+    GeoFence = apps.get_model("geo_fence_operations", "GeoFence")
+    all_geo_zones = GeoFence.objects.filter(geozone__isnull=False).only("id", "geozone")
+    batch = []
+    for geo_fence in all_geo_zones.iterator(chunk_size=500):
+        try:
+            geo_zone = json.loads(geo_fence.geozone)
+        except (TypeError, ValueError):
+            continue
+        if not isinstance(geo_zone, dict):
+            continue
+        geo_fence.restriction = geo_zone.get("restriction")
+        geo_fence.u_space_class = geo_zone.get("uSpaceClass")
+        batch.append(geo_fence)
+        if len(batch) == 500:
+            GeoFence.objects.bulk_update(batch, ["restriction", "u_space_class"])
+            batch = []
+    if batch:
+        GeoFence.objects.bulk_update(batch, ["restriction", "u_space_class"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("geo_fence_operations", "0005_geofence_created_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="geofence",
+            name="restriction",
+            field=models.CharField(
+                blank=True, help_text="The restriction of a ED-269 GeoZone, this is set when the GeoZone is imported", max_length=20, null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="geofence",
+            name="u_space_class",
+            field=models.CharField(
+                blank=True, help_text="The U-space class of a ED-269 GeoZone, this is set when the GeoZone is imported", max_length=100, null=True
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="geofence",
+            index=models.Index(fields=["is_test_dataset", "restriction"], name="geofence_restriction_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="geofence",
+            index=models.Index(fields=["is_test_dataset", "u_space_class"], name="geofence_u_space_class_idx"),
+        ),
+        migrations.RunPython(set_geozone_attributes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.1.3 on 2026-10-19 12:10
+
+from django.db import migrations, models
+
+
+def record_existing_geo_fences(apps, schema_editor):
+    GeoFence = apps.get_model("geo_fence_operations", "GeoFence")
+    GeoFenceChange = apps.get_model("geo_fence_operations", "GeoFenceChange")
+    batch = []
+    for geo_fence_id in GeoFence.objects.order_by("created_at").values_list("id", flat=True).iterator(chunk_size=500):
+        batch.append(GeoFenceChange(record_id=geo_fence_id))
+        if len(batch) == 500:
+            GeoFenceChange.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        GeoFenceChange.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("geo_fence_operations", "0006_geofence_restriction_u_space_class"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="GeoFenceChange",
+            fields=[
+                ("id", models.BigAutoField(primary_key=True, serialize=False)),
+                (
+                    "record_id",
+                    models.UUIDField(help_text="The id of the changed GeoFence, this is not a foreign key so that the tombstone outlives the GeoFence"),
+                ),
+                ("is_deleted", models.BooleanField(default=False)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "indexes": [models.Index(fields=["record_id"], name="geofence_change_record_idx")],
+            },
+        ),
+        migrations.RunPython(record_existing_geo_fences, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 5.1.3 on 2026-10-19 12:30
+
+import json
+
+from django.db import migrations, models
+from shapely.geometry import JOIN_STYLE, mapping, shape
+
+# The simplification is copied here so that later changes to the simplification helper do not change this migration
+LEVELS_OF_DETAIL = {"medium": 0.0001, "low": 0.001}
+
+
+def simplify_containing(geometry, tolerance: float):
+    if geometry.is_empty or geometry.geom_type not in ["Polygon", "MultiPolygon"]:
+        return geometry
+    for grow_factor in [1, 2]:
+        simplified = geometry.buffer(tolerance * grow_factor, join_style=JOIN_STYLE.mitre).simplify(tolerance, preserve_topology=True)
+        if simplified.covers(geometry):
+            return simplified
+    return geometry.convex_hull
+
+
+def simplify_feature_collection(geo_json: dict, tolerance: float) -> dict:
+    all_features = []
+    for feature in geo_json["features"]:
+        simplified_geometry = simplify_containing(shape(feature["geometry"]), tolerance)
+        all_features.append({**feature, "geometry": mapping(simplified_geometry)})
+    return {**geo_json, "features": all_features}
+
+
+def compute_levels_of_detail(geo_json):
+    try:
+        parsed_geo_json = json.loads(geo_json)
+        return json.dumps({level: simplify_feature_collection(parsed_geo_json, tolerance) for level, tolerance in LEVELS_OF_DETAIL.items()})
+    except (TypeError, KeyError, ValueError, AttributeError):
+        return None
+
+
+def compute_simplified_geo_fences(apps, schema_editor):
+    GeoFence = apps.get_model("geo_fence_operations", "GeoFence")
+    all_geo_fences = GeoFence.objects.filter(simplified_geo_fence__isnull=True).only("id", "raw_geo_fence")
+    batch = []
+    for geo_fence in all_geo_fences.iterator(chunk_size=500):
+        geo_fence.simplified_geo_fence = compute_levels_of_detail(geo_fence.raw_geo_fence)
+        if geo_fence.simplified_geo_fence is None:
+            # GeoFences without a valid GeoJSON are always served in full
+            continue
+        batch.append(geo_fence)
+        if len(batch) == 500:
+            GeoFence.objects.bulk_update(batch, ["simplified_geo_fence"])
+            batch = []
+    if batch:
+        GeoFence.objects.bulk_update(batch, ["simplified_geo_fence"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("geo_fence_operations", "0007_geofencechange"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="geofence",
+            name="simplified_geo_fence",
+            field=models.TextField(
+                blank=True,
+                help_text="The simplified versions of the GeoJSON for each level of detail, this is computed when the GeoJSON is saved",
+                null=True,
+            ),
+        ),
+        migrations.RunPython(compute_simplified_geo_fences, migrations.RunPython.noop),
+    ]
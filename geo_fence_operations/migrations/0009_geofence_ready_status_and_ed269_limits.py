@@ -0,0 +1,63 @@
+# Generated by Django 5.1.3 on 2026-10-19 16:10
+
+import json
+
+from django.db import migrations
+
+# The conversion of the ED-269 limits is copied here so that later changes to the import do not change this migration
+ED269_VERTICAL_REFERENCES = {"WGS84": 0, "AGL": 1, "AMSL": 2}
+ED269_UNKNOWN_VERTICAL_REFERENCE = 1
+FEET_TO_METRES = 0.3048
+MAX_ALTITUDE_LIMIT_M = 9999.99
+
+
+def convert_limit_to_metres(limit, uom_dimensions) -> float:
+    limit_m = float(limit) * FEET_TO_METRES if str(uom_dimensions).upper() == "FT" else float(limit)
+    return round(max(-MAX_ALTITUDE_LIMIT_M, min(limit_m, MAX_ALTITUDE_LIMIT_M)), 2)
+
+
+def get_geo_zone_limits(geozone: str):
+    all_lower_limits, all_upper_limits, all_altitude_refs = [], [], []
+    for geometry in json.loads(geozone)["geometry"]:
+        all_lower_limits.append(convert_limit_to_metres(geometry["lowerLimit"], geometry["uomDimensions"]))
+        all_upper_limits.append(convert_limit_to_metres(geometry["upperLimit"], geometry["uomDimensions"]))
+        for reference in [geometry["lowerVerticalReference"], geometry["upperVerticalReference"]]:
+            all_altitude_refs.append(ED269_VERTICAL_REFERENCES.get(str(reference).upper(), ED269_UNKNOWN_VERTICAL_REFERENCE))
+    if not all_lower_limits:
+        return None
+    return min(all_lower_limits), max(all_upper_limits), next((altitude_ref for altitude_ref in all_altitude_refs if altitude_ref != 0), 0)
+
+
+def set_ready_status_and_geo_zone_limits(apps, schema_editor):
+    GeoFence = apps.get_model("geo_fence_operations", "GeoFence")
+    # GeoFences were never moved out of Activating, the stored ones are in use
+    GeoFence.objects.filter(status=0).update(status=1)
+
+    # The limits of imported GeoZones were not read from their geometries
+    all_geo_zones = GeoFence.objects.filter(geozone__isnull=False).only("id", "geozone")
+    batch = []
+    for geo_fence in all_geo_zones.iterator(chunk_size=500):
+        try:
+            limits = get_geo_zone_limits(geo_fence.geozone)
+        except (TypeError, KeyError, ValueError):
+            continue
+        if limits is None:
+            continue
+        geo_fence.lower_limit, geo_fence.upper_limit, geo_fence.altitude_ref = limits
+        batch.append(geo_fence)
+        if len(batch) == 500:
+            GeoFence.objects.bulk_update(batch, ["lower_limit", "upper_limit", "altitude_ref"])
+            batch = []
+    if batch:
+        GeoFence.objects.bulk_update(batch, ["lower_limit", "upper_limit", "altitude_ref"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("geo_fence_operations", "0008_geofence_simplified_geo_fence"),
+    ]
+
+    operations = [
+        migrations.RunPython(set_ready_status_and_geo_zone_limits, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.1.3 on 2026-10-19 17:20
+
+from django.db import migrations
+
+
+def remove_test_dataset_changes(apps, schema_editor):
+    GeoFence = apps.get_model("geo_fence_operations", "GeoFence")
+    GeoFenceChange = apps.get_model("geo_fence_operations", "GeoFenceChange")
+    # Test datasets are not sent by the delta sync, their entries were recorded before they were left out of the change log
+    GeoFenceChange.objects.filter(record_id__in=GeoFence.objects.filter(is_test_dataset=True).values("id")).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("geo_fence_operations", "0009_geofence_ready_status_and_ed269_limits"),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_test_dataset_changes, migrations.RunPython.noop),
+    ]
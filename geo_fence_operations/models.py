@@ -22,10 +22,17 @@ class GeoFence(models.Model):
         (5, _("Rejected")),
         (6, _("Error")),
     )
+    # A GeoFence is Ready once it has been stored, only Ready GeoFences are checked by the conformance monitoring
+    READY = 1
 
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
 
     raw_geo_fence = models.TextField(blank=True, null=True, help_text="Set a GeoJSON as a GeoFence")
+    simplified_geo_fence = models.TextField(
+        blank=True,
+        null=True,
+        help_text="The simplified versions of the GeoJSON for each level of detail, this is computed when the GeoJSON is saved",
+    )
 
     geozone = models.TextField(help_text="Set a ED-269 Compliant GeoZone", blank=True, null=True)
 
@@ -34,8 +41,19 @@ class GeoFence(models.Model):
 
     altitude_ref = models.IntegerField(choices=ALTITUDE_REF, default=0)
 
+    restriction = models.CharField(
+        max_length=20, blank=True, null=True, help_text="The restriction of a ED-269 GeoZone, this is set when the GeoZone is imported"
+    )
+    u_space_class = models.CharField(
+        max_length=100, blank=True, null=True, help_text="The U-space class of a ED-269 GeoZone, this is set when the GeoZone is imported"
+    )
+
     name = models.CharField(max_length=50)
     bounds = models.CharField(max_length=140)
+    min_lon = models.FloatField(null=True, blank=True, help_text="The bounding box of the GeoFence, this is set from the bounds when it is saved")
+    min_lat = models.FloatField(null=True, blank=True)
+    max_lon = models.FloatField(null=True, blank=True)
+    max_lat = models.FloatField(null=True, blank=True)
 
     status = models.IntegerField(choices=STATUS_CODES, default=0)
     message = models.CharField(max_length=140, help_text="Set the status regarding the availability of the dataset", blank=True, null=True)
@@ -51,8 +69,51 @@ class GeoFence(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["start_datetime", "end_datetime", "status"], name="geofence_period_status_idx"),
+            models.Index(fields=["min_lon", "max_lon", "min_lat", "max_lat"], name="geofence_bbox_idx"),
+            models.Index(fields=["-created_at", "-id"], name="geofence_created_idx"),
+            models.Index(fields=["is_test_dataset", "restriction"], name="geofence_restriction_idx"),
+            models.Index(fields=["is_test_dataset", "u_space_class"], name="geofence_u_space_class_idx"),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Keep the stored GeoJSON to know if the simplified versions have to be computed again when the GeoFence is saved
+        instance._stored_raw_geo_fence = instance.__dict__.get("raw_geo_fence")
+        # Keep the stored bounds so that the cached vector tiles at the previous location are removed when the GeoFence is moved
+        instance._stored_bounds = instance.__dict__.get("bounds")
+        return instance
+
+    def is_simplified_geo_fence_stale(self) -> bool:
+        """The simplified versions have to be computed if they have not been computed yet or if the GeoJSON has changed since the GeoFence was loaded"""
+        if "raw_geo_fence" in self.get_deferred_fields():
+            return False
+        return self.__dict__.get("simplified_geo_fence") is None or self.raw_geo_fence != getattr(self, "_stored_raw_geo_fence", None)
+
     def __unicode__(self):
         return self.name
 
     def __str__(self):
         return self.name
+
+
+class GeoFenceChange(models.Model):
+    """A entry in the change log of GeoFences, the id increases with every change and is the cursor of the delta sync. Only the latest change of a GeoFence is
+    kept, a deleted GeoFence keeps a tombstone entry"""
+
+    id = models.BigAutoField(primary_key=True)
+    record_id = models.UUIDField(help_text="The id of the changed GeoFence, this is not a foreign key so that the tombstone outlives the GeoFence")
+    is_deleted = models.BooleanField(default=False)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["record_id"], name="geofence_change_record_idx"),
+        ]
+
+    def __str__(self):
+        return str(self.record_id)
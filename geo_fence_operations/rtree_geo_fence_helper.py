@@ -1,67 +1,200 @@
-import hashlib
-from typing import List, Union
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple, Union
 
 import arrow
-from django.db.models import QuerySet
 from rtree import index
+from shapely.geometry import Point
+from shapely.geometry.base import BaseGeometry
 
-from auth_helper.common import get_redis
+from common.data_definitions import GEOFENCE_INDEX_CHANGES_KEY, GEOFENCE_INDEX_VERSION_KEY
+from common.geometry_cache import PreparedGeometryCache, geo_json_to_shape
+from common.index_change_stream import IndexChangeStream
 
 from .models import GeoFence
 
+logger = logging.getLogger("django")
 
-class GeoFenceRTreeIndexFactory:
-    def __init__(self, index_name: str):
-        self.idx = index.Index(index_name)
-        self.r = get_redis()
+DateLike = Union[str, datetime, arrow.Arrow]
 
-    def add_box_to_index(
+
+class GeoFenceIndex:
+    """A long lived, per-process in memory index of the bounds of all GeoFences. The GeoFence save / delete signals record the id of every changed GeoFence in a
+    change stream in Redis, before the next query every process reads only the GeoFences changed since the last change it has applied from the database. The
+    whole table is only loaded the first time and when the process fell too far behind the change stream. Queries are answered from the index alone.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.idx = index.Index()
+        self.entries = {}  # geo_fence_id -> (enumerated_id, view, metadata)
+        self.next_enumerated_id = 0
+        self.change_stream = IndexChangeStream(version_key=GEOFENCE_INDEX_VERSION_KEY, changes_key=GEOFENCE_INDEX_CHANGES_KEY)
+        self.geometry_cache = PreparedGeometryCache()
+
+    def get_version(self) -> int:
+        return self.change_stream.get_version()
+
+    def _insert(
         self,
-        id: int,
         geo_fence_id: str,
-        view: List[float],
-        start_date: str,
-        end_date: str,
-    ):
+        bounds: str,
+        start_datetime: DateLike,
+        end_datetime: DateLike,
+        is_test_dataset: bool,
+        updated_at: DateLike,
+        upper_limit: float,
+        lower_limit: float,
+        altitude_ref: int,
+        status: int,
+    ) -> None:
+        self._remove(geo_fence_id)
+        try:
+            view = [float(i) for i in bounds.split(",")]
+        except (AttributeError, ValueError):
+            logger.error("GeoFence {geo_fence_id} has invalid bounds {bounds}, it is not indexed".format(geo_fence_id=geo_fence_id, bounds=bounds))
+            return
         metadata = {
-            "start_date": start_date,
-            "end_date": end_date,
             "geo_fence_id": geo_fence_id,
+            "start_timestamp": arrow.get(start_datetime).timestamp(),
+            "end_timestamp": arrow.get(end_datetime).timestamp(),
+            "is_test_dataset": bool(is_test_dataset),
+            "updated_at": arrow.get(updated_at).isoformat(),
+            "upper_limit": float(upper_limit),
+            "lower_limit": float(lower_limit),
+            "altitude_ref": altitude_ref,
+            "status": status,
         }
-        self.idx.insert(id=id, coordinates=(view[0], view[1], view[2], view[3]), obj=metadata)
-
-    def delete_from_index(self, enumerated_id: int, view: List[float]):
-        self.idx.delete(id=enumerated_id, coordinates=(view[0], view[1], view[2], view[3]))
-
-    def generate_geo_fence_index(self, all_fences: Union[QuerySet, List[GeoFence]]) -> None:
-        """This method generates a rTree index of currently active operational indexes"""
-
-        present = arrow.now()
-        start_date = present.shift(days=-1)
-        end_date = present.shift(days=1)
-        for fence_idx, fence in enumerate(all_fences):
-            fence_idx_str = str(fence.id)
-            fence_id = int(hashlib.sha256(fence_idx_str.encode("utf-8")).hexdigest(), 16) % 10**8
-            view = [float(i) for i in fence.bounds.split(",")]
-            self.add_box_to_index(
-                id=fence_id,
-                geo_fence_id=fence_idx_str,
-                view=view,
-                start_date=start_date.isoformat(),
-                end_date=end_date.isoformat(),
-            )
-
-    def clear_rtree_index(self):
-        """Method to delete all boxes from the index"""
-        all_fences = GeoFence.objects.all()
-        for fence_idx, fence in enumerate(all_fences):
-            fence_idx_str = str(fence.id)
-            fence_id = int(hashlib.sha256(fence_idx_str.encode("utf-8")).hexdigest(), 16) % 10**8
-            fence_bounds = fence.bounds
-            view = [float(i) for i in fence_bounds.split(",")]
-
-            self.delete_from_index(enumerated_id=fence_id, view=view)
-
-    def check_box_intersection(self, view_box: List[float]):
-        intersections = [n.object for n in self.idx.intersection((view_box[0], view_box[1], view_box[2], view_box[3]), objects=True)]
+        enumerated_id = self.next_enumerated_id
+        self.next_enumerated_id += 1
+        self.idx.insert(id=enumerated_id, coordinates=(view[0], view[1], view[2], view[3]), obj=metadata)
+        self.entries[geo_fence_id] = (enumerated_id, view, metadata)
+
+    def _remove(self, geo_fence_id: str) -> None:
+        existing = self.entries.pop(geo_fence_id, None)
+        if existing:
+            enumerated_id, view, _ = existing
+            self.idx.delete(id=enumerated_id, coordinates=(view[0], view[1], view[2], view[3]))
+
+    def get_geo_fences(self):
+        return GeoFence.objects.only(
+            "id", "bounds", "start_datetime", "end_datetime", "is_test_dataset", "updated_at", "upper_limit", "lower_limit", "altitude_ref", "status"
+        )
+
+    def _apply_geo_fence(self, geo_fence: GeoFence) -> None:
+        self._insert(
+            geo_fence_id=str(geo_fence.id),
+            bounds=geo_fence.bounds,
+            start_datetime=geo_fence.start_datetime,
+            end_datetime=geo_fence.end_datetime,
+            is_test_dataset=geo_fence.is_test_dataset,
+            updated_at=geo_fence.updated_at,
+            upper_limit=geo_fence.upper_limit,
+            lower_limit=geo_fence.lower_limit,
+            altitude_ref=geo_fence.altitude_ref,
+            status=geo_fence.status,
+        )
+
+    def _reload(self) -> None:
+        self.idx = index.Index()
+        self.entries = {}
+        self.next_enumerated_id = 0
+        for geo_fence in self.get_geo_fences().iterator():
+            self._apply_geo_fence(geo_fence)
+        logger.info("Loaded {num_fences} GeoFences in to the index".format(num_fences=len(self.entries)))
+
+    def _apply_changes(self, geo_fence_ids: List[str]) -> None:
+        """Read the changed GeoFences from the database, the ones that no longer exist have been deleted"""
+        changed_geo_fences = {str(geo_fence.id): geo_fence for geo_fence in self.get_geo_fences().filter(id__in=geo_fence_ids)}
+        for geo_fence_id in geo_fence_ids:
+            if geo_fence_id in changed_geo_fences:
+                self._apply_geo_fence(changed_geo_fences[geo_fence_id])
+            else:
+                self._remove(geo_fence_id)
+
+    def sync(self) -> None:
+        """Apply the GeoFences changed by any process since the index was last brought up to date"""
+        with self.lock:
+            self.change_stream.sync(reload=self._reload, apply_changes=self._apply_changes)
+
+    def upsert_geo_fence(self, geo_fence: GeoFence) -> None:
+        """Record a created or updated GeoFence, this is called from the post_save signal once the transaction has been committed"""
+        self.change_stream.record_changes([str(geo_fence.id)])
+
+    def upsert_geo_fences(self, geo_fence_ids: List[str]) -> None:
+        """Record several created or updated GeoFences, use this after bulk_create which does not send the save signals"""
+        self.change_stream.record_changes([str(geo_fence_id) for geo_fence_id in geo_fence_ids])
+
+    def remove_geo_fence(self, geo_fence_id: str) -> None:
+        """Record a deleted GeoFence, this is called from the post_delete signal once the transaction has been committed"""
+        self.change_stream.record_changes([str(geo_fence_id)])
+
+    def invalidate(self) -> None:
+        """Force all processes to rebuild their index, use after GeoFences are changed in bulk without signals (e.g. QuerySet.update)"""
+        self.change_stream.record_reload()
+
+    def check_box_intersection(self, view_box: List[float], is_test_dataset: Optional[bool] = None) -> List[dict]:
+        """Returns the metadata of the GeoFences whose bounds intersect the view box, optionally only test / non-test datasets"""
+        self.sync()
+        with self.lock:
+            intersections = [n.object for n in self.idx.intersection((view_box[0], view_box[1], view_box[2], view_box[3]), objects=True)]
+        if is_test_dataset is not None:
+            intersections = [i for i in intersections if i["is_test_dataset"] == is_test_dataset]
         return intersections
+
+    def get_geo_fences_active_during(self, view_box: List[float], start_datetime: DateLike, end_datetime: DateLike) -> List[dict]:
+        """Returns the GeoFences in the view box that are active for the whole of the period i.e. start before it and end after it"""
+        start_timestamp = arrow.get(start_datetime).timestamp()
+        end_timestamp = arrow.get(end_datetime).timestamp()
+        return [
+            i
+            for i in self.check_box_intersection(view_box=view_box)
+            if i["start_timestamp"] <= start_timestamp and i["end_timestamp"] >= end_timestamp
+        ]
+
+    def get_breached_geo_fences(self, lng: float, lat: float, altitude_m_wgs_84: float, at: DateLike) -> List[dict]:
+        """Returns the Ready GeoFences that contain the position and are active at the time, this is answered from the index and the cached prepared
+        geometries so it does not query the database once the geometries are cached. The altitude limits are only compared for GeoFences referenced to WGS84,
+        limits relative to the ground or mean sea level cannot be compared with the WGS84 altitude of telemetry so the whole column of those GeoFences is a
+        breach"""
+        timestamp = arrow.get(at).timestamp()
+        candidates = [
+            i
+            for i in self.check_box_intersection(view_box=[lng, lat, lng, lat], is_test_dataset=False)
+            if i["status"] == GeoFence.READY
+            and i["start_timestamp"] <= timestamp <= i["end_timestamp"]
+            and (i["altitude_ref"] != 0 or i["lower_limit"] <= altitude_m_wgs_84 <= i["upper_limit"])
+        ]
+        return self.filter_intersecting_geo_fences(candidates=candidates, geometry=Point(lng, lat))
+
+    def load_geometries(self, geo_fence_ids: List[str]) -> Dict[str, Tuple[str, BaseGeometry]]:
+        all_fences = GeoFence.objects.filter(id__in=geo_fence_ids).only("id", "raw_geo_fence", "bounds", "updated_at")
+        return {
+            str(fence.id): (arrow.get(fence.updated_at).isoformat(), geo_json_to_shape(fence.raw_geo_fence, bounds=fence.bounds))
+            for fence in all_fences
+        }
+
+    def filter_intersecting_geo_fences(self, candidates: List[dict], geometry: BaseGeometry) -> List[dict]:
+        """Refine the bounding box candidates returned by the index to the GeoFences whose geometry intersects the given geometry, the prepared geometries of the
+        GeoFences are cached until the GeoFence is updated"""
+        if not candidates:
+            return []
+        prepared_geometries = self.geometry_cache.get_prepared_geometries(
+            versions={c["geo_fence_id"]: c["updated_at"] for c in candidates}, load_geometries=self.load_geometries
+        )
+        return [c for c in candidates if c["geo_fence_id"] in prepared_geometries and prepared_geometries[c["geo_fence_id"]].intersects(geometry)]
+
+
+_geo_fence_index = None
+_geo_fence_index_lock = threading.Lock()
+
+
+def get_geo_fence_index() -> GeoFenceIndex:
+    """Returns the GeoFence index of this process"""
+    global _geo_fence_index
+    if _geo_fence_index is None:
+        with _geo_fence_index_lock:
+            if _geo_fence_index is None:
+                _geo_fence_index = GeoFenceIndex()
+    return _geo_fence_index
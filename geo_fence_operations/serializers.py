@@ -2,6 +2,8 @@ import json
 
 from rest_framework import serializers
 
+from common.simplification_helper import select_level_of_detail
+
 from .models import GeoFence
 
 
@@ -39,6 +41,11 @@ class GeoFenceSerializer(serializers.ModelSerializer):
     geozone = serializers.SerializerMethodField()
 
     def get_raw_geo_fence(self, obj):
+        level_of_detail = self.context.get("level_of_detail")
+        if level_of_detail:
+            simplified_geo_fence = select_level_of_detail(obj.simplified_geo_fence, level_of_detail)
+            if simplified_geo_fence is not None:
+                return simplified_geo_fence
         raw_geo_fence = json.loads(obj.raw_geo_fence)
         return raw_geo_fence
 
@@ -51,7 +58,34 @@ class GeoFenceSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = GeoFence
-        fields = "__all__"
+        exclude = ("simplified_geo_fence",)
+
+    def get_altitude_ref(self, obj):
+        return obj.get_altitude_ref_display()
+
+
+class GeoFenceSummarySerializer(serializers.ModelSerializer):
+    """A lightweight representation of a GeoFence for list views, it has no GeoJSON or GeoZone so the list queryset only loads these fields"""
+
+    altitude_ref = serializers.SerializerMethodField()
+
+    class Meta:
+        model = GeoFence
+        fields = (
+            "id",
+            "name",
+            "upper_limit",
+            "lower_limit",
+            "altitude_ref",
+            "bounds",
+            "status",
+            "message",
+            "is_test_dataset",
+            "start_datetime",
+            "end_datetime",
+            "created_at",
+            "updated_at",
+        )
 
     def get_altitude_ref(self, obj):
         return obj.get_altitude_ref_display()
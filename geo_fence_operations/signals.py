@@ -0,0 +1,59 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from common.bounds_helper import get_geo_json_bounds, set_bbox_from_bounds
+from common.delta_sync_helper import record_changes
+from common.vector_tile_helper import invalidate_tiles
+
+from .common import set_simplified_geo_fence
+from .models import GeoFence, GeoFenceChange
+from .rtree_geo_fence_helper import get_geo_fence_index
+
+
+@receiver(pre_save, sender=GeoFence)
+def update_geo_fence_bbox(sender, instance: GeoFence, **kwargs):
+    """Keep the bounding box columns used by the viewport filters in sync with the bounds of the GeoFence"""
+    set_bbox_from_bounds(instance)
+
+
+@receiver(pre_save, sender=GeoFence)
+def update_simplified_geo_fence(sender, instance: GeoFence, **kwargs):
+    """Compute the simplified versions of the GeoJSON when it changes so that zoomed out viewers do not get the full GeoJSON"""
+    set_simplified_geo_fence(instance)
+
+
+@receiver(post_save, sender=GeoFence)
+def update_geo_fence_index(sender, instance: GeoFence, **kwargs):
+    """Update the GeoFence index and remove the cached vector tiles under the old and new location of the GeoFence once the transaction that saved the
+    GeoFence has been committed"""
+    all_bounds = [instance.bounds, getattr(instance, "_stored_bounds", None), get_geo_json_bounds(instance.raw_geo_fence)]
+    instance._stored_bounds = instance.bounds
+    transaction.on_commit(lambda: get_geo_fence_index().upsert_geo_fence(geo_fence=instance))
+    transaction.on_commit(lambda: invalidate_tiles(all_bounds))
+
+
+@receiver(post_delete, sender=GeoFence)
+def remove_from_geo_fence_index(sender, instance: GeoFence, **kwargs):
+    """Remove a deleted GeoFence from the GeoFence index and the vector tile cache once the transaction has been committed"""
+    geo_fence_id = str(instance.id)
+    all_bounds = [instance.bounds, get_geo_json_bounds(instance.raw_geo_fence)]
+    transaction.on_commit(lambda: get_geo_fence_index().remove_geo_fence(geo_fence_id=geo_fence_id))
+    transaction.on_commit(lambda: invalidate_tiles(all_bounds))
+
+
+@receiver(post_save, sender=GeoFence)
+def record_geo_fence_change(sender, instance: GeoFence, created: bool, **kwargs):
+    """Add the GeoFence to the change log read by the delta sync in the transaction that saved it, test datasets are not sent by the delta sync and are
+    left out"""
+    if instance.is_test_dataset:
+        return
+    record_changes(GeoFenceChange, [instance.id], is_new=created)
+
+
+@receiver(post_delete, sender=GeoFence)
+def record_geo_fence_deletion(sender, instance: GeoFence, **kwargs):
+    """Replace the change log entry of a deleted GeoFence with a tombstone in the transaction that deleted it, deleted test datasets leave no tombstone"""
+    if instance.is_test_dataset:
+        return
+    record_changes(GeoFenceChange, [instance.id], is_deleted=True)
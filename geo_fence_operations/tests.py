@@ -1 +1,465 @@
-# Create your tests here.
+import json
+import os
+from os import environ as env
+import threading
+import time
+import unittest
+import uuid
+from typing import List
+from unittest import mock
+
+import arrow
+import billiard
+import jwt
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase
+
+from auth_helper.common import get_redis
+from common.bounds_helper import parse_bounds
+from common.data_definitions import VECTOR_TILE_GENERATION_KEY, VECTOR_TILE_KEY, VECTOR_TILE_ZOOM_KEYS_KEY
+from common.delta_sync_helper import get_changes_since, record_changes
+from common.vector_tile_helper import VECTOR_TILE_CACHE_TTL_SECS, VECTOR_TILE_MAX_CACHED_ZOOM, VectorTileRenderer, get_tile_range, invalidate_tiles
+
+from . import geozone_import_helper
+from .common import prepare_geo_zone_features
+from .models import GeoFence, GeoFenceChange
+from .rtree_geo_fence_helper import GeoFenceIndex, get_geo_fence_index
+
+
+def get_raw_geo_fence(min_lon: float, min_lat: float, max_lon: float, max_lat: float) -> str:
+    return json.dumps(
+        {
+            "type": "FeatureCollection",
+            "features": [
+                {
+                    "type": "Feature",
+                    "properties": {},
+                    "geometry": {
+                        "type": "Polygon",
+                        "coordinates": [[[min_lon, min_lat], [max_lon, min_lat], [max_lon, max_lat], [min_lon, max_lat], [min_lon, min_lat]]],
+                    },
+                }
+            ],
+        }
+    )
+
+
+def create_geo_fence(min_lon: float = 7.47, min_lat: float = 46.97, max_lon: float = 7.48, max_lat: float = 46.98, **kwargs) -> GeoFence:
+    now = arrow.now()
+    geo_fence = GeoFence(
+        raw_geo_fence=get_raw_geo_fence(min_lon, min_lat, max_lon, max_lat),
+        upper_limit=kwargs.pop("upper_limit", 500),
+        lower_limit=kwargs.pop("lower_limit", 0),
+        bounds=",".join(str(i) for i in [min_lon, min_lat, max_lon, max_lat]),
+        name="Test GeoFence",
+        status=kwargs.pop("status", GeoFence.READY),
+        start_datetime=now.shift(hours=-1).isoformat(),
+        end_datetime=now.shift(hours=1).isoformat(),
+        **kwargs,
+    )
+    geo_fence.save()
+    return geo_fence
+
+
+def get_ed_269_geometry(
+    min_lon: float, min_lat: float, max_lon: float, max_lat: float, lower_limit: float, upper_limit: float, uom_dimensions: str = "M", **kwargs
+) -> dict:
+    return {
+        "uomDimensions": uom_dimensions,
+        "lowerLimit": lower_limit,
+        "lowerVerticalReference": kwargs.pop("lower_vertical_reference", "WGS84"),
+        "upperLimit": upper_limit,
+        "upperVerticalReference": kwargs.pop("upper_vertical_reference", "WGS84"),
+        "horizontalProjection": {
+            "type": "Polygon",
+            "coordinates": [[[min_lon, min_lat], [max_lon, min_lat], [max_lon, max_lat], [min_lon, max_lat], [min_lon, min_lat]]],
+        },
+    }
+
+
+def get_ed_269_feature(all_geometries: List[dict]) -> dict:
+    return {
+        "identifier": "1",
+        "country": "CHE",
+        "name": "Test GeoZone",
+        "type": "COMMON",
+        "restriction": "PROHIBITED",
+        "restrictionConditions": "",
+        "region": 0,
+        "reason": ["OTHER"],
+        "otherReasonInfo": "",
+        "regulationExemption": "",
+        "uSpaceClass": "",
+        "message": "",
+        "applicability": [{"permanent": "YES"}],
+        "zoneAuthority": [
+            {"name": "", "service": "", "email": "", "contactName": "", "siteURL": "", "phone": "", "purpose": "", "intervalBefore": ""}
+        ],
+        "geometry": all_geometries,
+    }
+
+
+def prepare_with_process_id(raw_features_chunk):
+    return [(raw_feature, os.getpid()) for raw_feature in raw_features_chunk]
+
+
+def prepare_chunks_in_daemonic_process(results):
+    # Celery prefork workers are daemonic, the import runs in one of them
+    all_prepared = [feature for chunk in geozone_import_helper.iterate_prepared_geo_zone_chunks(range(20)) for feature in chunk]
+    results.put(([raw_feature for raw_feature, _ in all_prepared], {process_id for _, process_id in all_prepared}, os.getpid()))
+
+
+@mock.patch.object(geozone_import_helper, "GEOZONE_IMPORT_CHUNK_SIZE", 2)
+@mock.patch.object(geozone_import_helper, "GEOZONE_IMPORT_PROCESSES", 3)
+@mock.patch.object(geozone_import_helper, "prepare_geo_zone_features", prepare_with_process_id)
+class GeoZoneChunkPreparationTests(TestCase):
+    def test_chunks_are_prepared_in_worker_processes_in_order(self):
+        all_prepared = [feature for chunk in geozone_import_helper.iterate_prepared_geo_zone_chunks(range(20)) for feature in chunk]
+        self.assertEqual([raw_feature for raw_feature, _ in all_prepared], list(range(20)))
+        self.assertNotIn(os.getpid(), {process_id for _, process_id in all_prepared})
+
+    def test_pool_starts_from_a_daemonic_process(self):
+        results = billiard.Queue()
+        daemonic_process = billiard.Process(target=prepare_chunks_in_daemonic_process, args=(results,), daemon=True)
+        daemonic_process.start()
+        all_raw_features, all_process_ids, daemonic_process_id = results.get(timeout=60)
+        daemonic_process.join(timeout=10)
+        self.assertEqual(all_raw_features, list(range(20)))
+        self.assertNotIn(daemonic_process_id, all_process_ids)
+
+    def test_single_process_prepares_chunks_in_this_process(self):
+        with mock.patch.object(geozone_import_helper, "GEOZONE_IMPORT_PROCESSES", 1):
+            all_prepared = [feature for chunk in geozone_import_helper.iterate_prepared_geo_zone_chunks(range(5)) for feature in chunk]
+        self.assertEqual({process_id for _, process_id in all_prepared}, {os.getpid()})
+
+
+class GeoZoneLimitsTests(TestCase):
+    def prepare_geo_zone_feature(self, all_geometries: List[dict]) -> dict:
+        return prepare_geo_zone_features([get_ed_269_feature(all_geometries)])[0]
+
+    def test_limits_are_read_from_the_geometries(self):
+        prepared_feature = self.prepare_geo_zone_feature([get_ed_269_geometry(7.47, 46.97, 7.48, 46.98, lower_limit=50, upper_limit=150)])
+        self.assertEqual((prepared_feature["lower_limit"], prepared_feature["upper_limit"], prepared_feature["altitude_ref"]), (50, 150, 0))
+
+    def test_limits_in_feet_are_converted_to_metres(self):
+        prepared_feature = self.prepare_geo_zone_feature(
+            [get_ed_269_geometry(7.47, 46.97, 7.48, 46.98, lower_limit=100, upper_limit=400, uom_dimensions="FT")]
+        )
+        self.assertEqual((prepared_feature["lower_limit"], prepared_feature["upper_limit"]), (30.48, 121.92))
+
+    def test_limits_are_the_envelope_of_the_geometries(self):
+        prepared_feature = self.prepare_geo_zone_feature(
+            [
+                get_ed_269_geometry(7.47, 46.97, 7.48, 46.98, lower_limit=50, upper_limit=150),
+                get_ed_269_geometry(7.48, 46.97, 7.49, 46.98, lower_limit=20, upper_limit=100),
+            ]
+        )
+        self.assertEqual((prepared_feature["lower_limit"], prepared_feature["upper_limit"]), (20, 150))
+        all_feature_limits = [
+            (feature["properties"]["lower_limit"], feature["properties"]["upper_limit"])
+            for feature in json.loads(prepared_feature["raw_geo_fence"])["features"]
+        ]
+        self.assertEqual(all_feature_limits, [(50, 150), (20, 100)])
+
+    def test_limits_that_are_not_referenced_to_wgs84_cannot_be_compared(self):
+        prepared_feature = self.prepare_geo_zone_feature(
+            [
+                get_ed_269_geometry(7.47, 46.97, 7.48, 46.98, lower_limit=0, upper_limit=150),
+                get_ed_269_geometry(7.48, 46.97, 7.49, 46.98, lower_limit=0, upper_limit=30765.67, upper_vertical_reference="AMSL"),
+            ]
+        )
+        self.assertEqual(prepared_feature["altitude_ref"], 2)
+        self.assertEqual(prepared_feature["upper_limit"], 9999.99)
+
+
+class GeoFenceIndexTests(TestCase):
+    def setUp(self):
+        # The index of this process records the changes from the signals, a second index stands in for another process that replays them
+        self.reader_index = GeoFenceIndex()
+        self.reader_index.sync()
+
+    def create_geo_fence(self, **kwargs) -> GeoFence:
+        with self.captureOnCommitCallbacks(execute=True):
+            return create_geo_fence(**kwargs)
+
+    def get_intersecting_ids(self, view_box: List[float] = [7.4, 46.9, 7.5, 47.0]) -> set:
+        return {geo_fence["geo_fence_id"] for geo_fence in self.reader_index.check_box_intersection(view_box=view_box)}
+
+    def test_created_geo_fence_is_replayed_by_another_process(self):
+        geo_fence = self.create_geo_fence()
+        with mock.patch.object(self.reader_index, "_reload", wraps=self.reader_index._reload) as reload:
+            self.assertEqual(self.get_intersecting_ids(), {str(geo_fence.id)})
+        reload.assert_not_called()
+
+    def test_updated_geo_fence_is_moved(self):
+        geo_fence = self.create_geo_fence()
+        self.assertEqual(self.get_intersecting_ids(), {str(geo_fence.id)})
+        geo_fence.bounds = "8.54,47.37,8.55,47.38"
+        with self.captureOnCommitCallbacks(execute=True):
+            geo_fence.save()
+        with mock.patch.object(self.reader_index, "_reload", wraps=self.reader_index._reload) as reload:
+            self.assertEqual(self.get_intersecting_ids(), set())
+            self.assertEqual(self.get_intersecting_ids(view_box=[8.5, 47.3, 8.6, 47.4]), {str(geo_fence.id)})
+        reload.assert_not_called()
+
+    def test_deleted_geo_fence_is_removed(self):
+        geo_fence = self.create_geo_fence()
+        self.assertEqual(self.get_intersecting_ids(), {str(geo_fence.id)})
+        with self.captureOnCommitCallbacks(execute=True):
+            geo_fence.delete()
+        with mock.patch.object(self.reader_index, "_reload", wraps=self.reader_index._reload) as reload:
+            self.assertEqual(self.get_intersecting_ids(), set())
+        reload.assert_not_called()
+
+    def test_imported_geo_fences_are_replayed(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            geozone_import_helper.import_geo_zone_features(
+                [get_ed_269_feature([get_ed_269_geometry(7.47, 46.97, 7.48, 46.98, lower_limit=0, upper_limit=120)])], is_test_dataset=False
+            )
+        with mock.patch.object(self.reader_index, "_reload", wraps=self.reader_index._reload) as reload:
+            self.assertEqual(self.get_intersecting_ids(), {str(geo_fence.id) for geo_fence in GeoFence.objects.all()})
+        reload.assert_not_called()
+        self.assertEqual(len(self.get_intersecting_ids()), 1)
+
+    def test_index_is_reloaded_when_asked_to(self):
+        geo_fence = self.create_geo_fence()
+        get_geo_fence_index().invalidate()
+        with mock.patch.object(self.reader_index, "_reload", wraps=self.reader_index._reload) as reload:
+            self.assertEqual(self.get_intersecting_ids(), {str(geo_fence.id)})
+        reload.assert_called_once()
+
+    def test_index_is_reloaded_when_the_change_stream_was_trimmed(self):
+        geo_fence = self.create_geo_fence()
+        with mock.patch.object(self.reader_index.change_stream, "is_change_stream_trimmed", return_value=True):
+            with mock.patch.object(self.reader_index, "_reload", wraps=self.reader_index._reload) as reload:
+                self.assertEqual(self.get_intersecting_ids(), {str(geo_fence.id)})
+        reload.assert_called_once()
+
+
+class GeoFenceChangeLogTests(TestCase):
+    def test_changes_are_returned_after_the_cursor(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            first_geo_fence = create_geo_fence()
+        all_changes, cursor, has_more = get_changes_since(GeoFenceChange, 0)
+        self.assertEqual([change.record_id for change in all_changes], [first_geo_fence.id])
+        self.assertFalse(has_more)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second_geo_fence = create_geo_fence()
+        all_changes, next_cursor, has_more = get_changes_since(GeoFenceChange, cursor)
+        self.assertEqual([change.record_id for change in all_changes], [second_geo_fence.id])
+        self.assertGreater(next_cursor, cursor)
+
+    def test_updated_geo_fence_moves_to_the_head_of_the_log(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            geo_fence = create_geo_fence()
+            create_geo_fence()
+        _, cursor, _ = get_changes_since(GeoFenceChange, 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            geo_fence.name = "Renamed GeoFence"
+            geo_fence.save()
+        all_changes, _, _ = get_changes_since(GeoFenceChange, cursor)
+        self.assertEqual([change.record_id for change in all_changes], [geo_fence.id])
+        self.assertEqual(GeoFenceChange.objects.filter(record_id=geo_fence.id).count(), 1)
+
+    def test_deleted_geo_fence_leaves_a_tombstone(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            geo_fence = create_geo_fence()
+        geo_fence_id = geo_fence.id
+        _, cursor, _ = get_changes_since(GeoFenceChange, 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            geo_fence.delete()
+        all_changes, _, _ = get_changes_since(GeoFenceChange, cursor)
+        self.assertEqual([(change.record_id, change.is_deleted) for change in all_changes], [(geo_fence_id, True)])
+
+    def test_change_is_rolled_back_with_the_geo_fence(self):
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                geo_fence = create_geo_fence()
+                self.assertTrue(GeoFenceChange.objects.filter(record_id=geo_fence.id).exists())
+                raise RuntimeError
+        self.assertFalse(GeoFenceChange.objects.filter(record_id=geo_fence.id).exists())
+
+    def test_test_datasets_are_left_out_of_the_log(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            geo_fence = create_geo_fence(is_test_dataset=True)
+        self.assertFalse(GeoFenceChange.objects.filter(record_id=geo_fence.id).exists())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            geo_fence.delete()
+        self.assertFalse(GeoFenceChange.objects.exists())
+
+    @mock.patch.dict(env, {"BYPASS_AUTH_TOKEN_VERIFICATION": "1"})
+    def test_deleted_test_datasets_are_not_sent(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            test_geo_fence = create_geo_fence(is_test_dataset=True)
+            geo_fence = create_geo_fence()
+        geo_fence_id = geo_fence.id
+        with self.captureOnCommitCallbacks(execute=True):
+            test_geo_fence.delete()
+            geo_fence.delete()
+
+        token = jwt.encode({"aud": "testflight.argonserver.com", "scope": "argonserver.read"}, "secret", algorithm="HS256")
+        response = self.client.get("/geo_fence_ops/geo_fence/changes", HTTP_AUTHORIZATION="Bearer {token}".format(token=token))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["deleted"], [str(geo_fence_id)])
+
+    def test_pages_are_limited(self):
+        record_changes(GeoFenceChange, [uuid.uuid4() for _ in range(3)], is_new=True)
+        all_changes, cursor, has_more = get_changes_since(GeoFenceChange, 0, limit=2)
+        self.assertEqual(len(all_changes), 2)
+        self.assertTrue(has_more)
+        all_changes, _, has_more = get_changes_since(GeoFenceChange, cursor, limit=2)
+        self.assertEqual(len(all_changes), 1)
+        self.assertFalse(has_more)
+
+    def test_change_log_is_locked_before_entries_are_inserted(self):
+        all_lock_calls = []
+
+        def lock_change_log(change_model):
+            all_lock_calls.append((change_model, connection.in_atomic_block, change_model.objects.count()))
+
+        with mock.patch("common.delta_sync_helper.lock_change_log", side_effect=lock_change_log):
+            record_changes(GeoFenceChange, [uuid.uuid4()], is_new=True)
+        self.assertEqual(all_lock_calls, [(GeoFenceChange, True, 0)])
+
+
+class GeoFenceTileInvalidationTests(TestCase):
+    zoom = VECTOR_TILE_MAX_CACHED_ZOOM
+
+    def setUp(self):
+        self.r = get_redis()
+        self.all_tiles = []
+
+    def tearDown(self):
+        for tile in self.all_tiles:
+            self.r.delete(VECTOR_TILE_KEY + "{z}/{tile}".format(z=self.zoom, tile=tile))
+            self.r.delete(VECTOR_TILE_GENERATION_KEY + "{z}/{tile}".format(z=self.zoom, tile=tile))
+            self.r.srem(VECTOR_TILE_ZOOM_KEYS_KEY + str(self.zoom), tile)
+
+    def cache_tile(self, bounds: str) -> str:
+        x, y, _, _ = get_tile_range(parse_bounds(bounds), self.zoom)
+        tile = "{x}/{y}".format(x=x, y=y)
+        self.r.set(VECTOR_TILE_KEY + "{z}/{tile}".format(z=self.zoom, tile=tile), b"cached")
+        self.r.sadd(VECTOR_TILE_ZOOM_KEYS_KEY + str(self.zoom), tile)
+        self.all_tiles.append(tile)
+        return tile
+
+    def is_tile_cached(self, tile: str) -> bool:
+        return bool(self.r.exists(VECTOR_TILE_KEY + "{z}/{tile}".format(z=self.zoom, tile=tile)))
+
+    def test_moving_a_geo_fence_drops_the_tiles_at_the_old_and_new_location(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            geo_fence = create_geo_fence()
+        old_tile = self.cache_tile(geo_fence.bounds)
+        new_bounds = [8.54, 47.37, 8.541, 47.371]
+        new_tile = self.cache_tile(",".join(str(i) for i in new_bounds))
+        unrelated_tile = self.cache_tile("9.5,47.0,9.501,47.001")
+
+        moved_geo_fence = GeoFence.objects.get(id=geo_fence.id)
+        moved_geo_fence.raw_geo_fence = get_raw_geo_fence(*new_bounds)
+        moved_geo_fence.bounds = ",".join(str(i) for i in new_bounds)
+        with self.captureOnCommitCallbacks(execute=True):
+            moved_geo_fence.save()
+
+        self.assertFalse(self.is_tile_cached(old_tile))
+        self.assertFalse(self.is_tile_cached(new_tile))
+        self.assertTrue(self.is_tile_cached(unrelated_tile))
+
+    def test_deleting_a_geo_fence_drops_its_tiles(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            geo_fence = create_geo_fence()
+        tile = self.cache_tile(geo_fence.bounds)
+        with self.captureOnCommitCallbacks(execute=True):
+            GeoFence.objects.get(id=geo_fence.id).delete()
+        self.assertFalse(self.is_tile_cached(tile))
+
+    def render_tile(self, bounds: str, during_render=None) -> str:
+        """Render the airspace layers of the tile under the bounds, during_render is called after the objects under the tile have been read"""
+        x, y, _, _ = get_tile_range(parse_bounds(bounds), self.zoom)
+        self.all_tiles.append("{x}/{y}".format(x=x, y=y))
+        get_operational_intent_features = VectorTileRenderer.get_operational_intent_features
+
+        def read_operational_intent_features(renderer):
+            all_features = get_operational_intent_features(renderer)
+            if during_render:
+                during_render()
+            return all_features
+
+        # mapbox-vector-tile is optional, the number of encoded features stands in for the tile
+        with mock.patch.object(VectorTileRenderer, "encode", lambda renderer, layers: str(sum(len(layer["features"]) for layer in layers)).encode()):
+            with mock.patch.object(
+                VectorTileRenderer, "get_operational_intent_features", autospec=True, side_effect=read_operational_intent_features
+            ):
+                VectorTileRenderer(z=self.zoom, x=x, y=y).render_airspace_layers()
+        return self.all_tiles[-1]
+
+    def test_rendered_tile_is_cached(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            geo_fence = create_geo_fence()
+        tile = self.render_tile(geo_fence.bounds)
+        self.assertEqual(self.r.get(VECTOR_TILE_KEY + "{z}/{tile}".format(z=self.zoom, tile=tile)), "1")
+
+    def test_tile_changed_while_it_is_rendered_is_not_cached(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            geo_fence = create_geo_fence()
+        tile = self.render_tile(geo_fence.bounds, during_render=lambda: invalidate_tiles([geo_fence.bounds]))
+        self.assertFalse(self.is_tile_cached(tile))
+        # The next render is cached again
+        self.render_tile(geo_fence.bounds)
+        self.assertTrue(self.is_tile_cached(tile))
+
+    def test_tile_is_cached_until_the_first_object_under_it_ends(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            geo_fence = create_geo_fence()
+            GeoFence.objects.filter(id=geo_fence.id).update(end_datetime=arrow.now().shift(minutes=10).isoformat())
+        tile = self.render_tile(geo_fence.bounds)
+        self.assertLessEqual(self.r.ttl(VECTOR_TILE_KEY + "{z}/{tile}".format(z=self.zoom, tile=tile)), 600)
+
+        unrelated_tile = self.render_tile("9.5,47.0,9.501,47.001")
+        self.assertGreater(self.r.ttl(VECTOR_TILE_KEY + "{z}/{tile}".format(z=self.zoom, tile=unrelated_tile)), VECTOR_TILE_CACHE_TTL_SECS - 10)
+
+
+@unittest.skipUnless(connection.vendor == "postgresql", "SQLite serializes writing transactions, the change log lock is only taken on PostgreSQL")
+class GeoFenceChangeLogConcurrencyTests(TransactionTestCase):
+    def test_cursor_does_not_pass_a_change_that_is_still_being_written(self):
+        import_inserted = threading.Event()
+        import_release = threading.Event()
+        import_record_ids = [uuid.uuid4() for _ in range(100)]
+        small_write_record_id = uuid.uuid4()
+
+        def run_import():
+            # A long import transaction that has inserted its entries but not committed yet
+            try:
+                with transaction.atomic():
+                    record_changes(GeoFenceChange, import_record_ids, is_new=True)
+                    import_inserted.set()
+                    import_release.wait(timeout=10)
+            finally:
+                connection.close()
+
+        def run_small_write():
+            try:
+                record_changes(GeoFenceChange, [small_write_record_id], is_new=True)
+            finally:
+                connection.close()
+
+        import_thread = threading.Thread(target=run_import)
+        import_thread.start()
+        self.assertTrue(import_inserted.wait(timeout=10))
+        small_write_thread = threading.Thread(target=run_small_write)
+        small_write_thread.start()
+        time.sleep(0.5)
+
+        # A client syncing now must not get a cursor past the entries of the import
+        all_changes, cursor, _ = get_changes_since(GeoFenceChange, 0)
+        self.assertEqual(all_changes, [])
+        self.assertEqual(cursor, 0)
+
+        import_release.set()
+        import_thread.join(timeout=10)
+        small_write_thread.join(timeout=10)
+        all_changes, _, _ = get_changes_since(GeoFenceChange, cursor, limit=1000)
+        self.assertEqual([change.record_id for change in all_changes], import_record_ids + [small_write_record_id])
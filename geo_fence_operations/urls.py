@@ -22,6 +22,8 @@ urlpatterns = [
     path("set_geo_fence", geo_fence_views.set_geo_fence, name="set_geo_fence"),
     path("set_geozone", geo_fence_views.set_geozone),
     path("geo_fence", geo_fence_views.GeoFenceList.as_view()),
+    path("geo_fence/export", geo_fence_views.GeoFenceExport.as_view()),
+    path("geo_fence/changes", geo_fence_views.GeoFenceChanges.as_view()),
     path("geo_fence/<uuid:pk>", geo_fence_views.GeoFenceDetail.as_view()),
     # End points for automated testing interface
     path("geo_awareness/status", geo_fence_views.GeoZoneTestHarnessStatus.as_view()),
@@ -7,10 +7,9 @@ import logging
 import uuid
 from dataclasses import asdict
 from decimal import Decimal
-from typing import List
+from typing import List, Optional
 
 import arrow
-import pyproj
 from django.core.exceptions import ValidationError
 from django.core.validators import URLValidator
 from django.http import HttpRequest, HttpResponse, JsonResponse
@@ -25,12 +24,21 @@ from shapely.ops import unary_union
 
 from auth_helper.common import get_redis
 from auth_helper.utils import requires_scopes
+from common.bounds_helper import view_box_filter
 from common.data_definitions import ARGONSERVER_READ_SCOPE, ARGONSERVER_WRITE_SCOPE
-from common.utils import EnhancedJSONEncoder
-from flight_declaration_operations.pagination import StandardResultsSetPagination
+from common.delta_sync_helper import get_delta_sync_response
+from common.projection_helper import buffer_point_in_meters
+from common.simplification_helper import LevelOfDetailMixin, select_level_of_detail
+from common.utils import (
+    FEATURE_COLLECTION_PREFIX,
+    FEATURE_COLLECTION_SUFFIX,
+    STREAMING_QUERYSET_CHUNK_SIZE,
+    DataclassJsonResponse,
+    StreamingJsonResponse,
+)
+from flight_declaration_operations.pagination import KeysetResultsSetPagination
 
 from . import rtree_geo_fence_helper
-from .buffer_helper import toFromUTM
 from .common import validate_geo_zone
 from .data_definitions import (
     GeoAwarenessTestStatus,
@@ -41,10 +49,11 @@ from .data_definitions import (
     GeoZoneFilterPosition,
     GeoZoneHttpsSource,
 )
-from .models import GeoFence
+from .models import GeoFence, GeoFenceChange
 from .serializers import (
     GeoFenceRequestSerializer,
     GeoFenceSerializer,
+    GeoFenceSummarySerializer,
     GeoSpatialMapListSerializer,
 )
 from .tasks import download_geozone_source, write_geo_zone
@@ -107,6 +116,7 @@ def set_geo_fence(request: HttpRequest):
         lower_limit=lower_limit,
         bounds=bounds,
         name=name,
+        status=GeoFence.READY,
     )
     geo_f.save()
 
@@ -157,10 +167,18 @@ class GeoFenceDetail(mixins.RetrieveModelMixin, generics.GenericAPIView):
 
 
 @method_decorator(requires_scopes([ARGONSERVER_READ_SCOPE]), name="dispatch")
-class GeoFenceList(mixins.ListModelMixin, generics.GenericAPIView):
+class GeoFenceList(LevelOfDetailMixin, mixins.ListModelMixin, generics.GenericAPIView):
     queryset = GeoFence.objects.filter(is_test_dataset=False)
     serializer_class = GeoFenceSerializer
-    pagination_class = StandardResultsSetPagination
+    pagination_class = KeysetResultsSetPagination
+
+    def is_summary_requested(self) -> bool:
+        return self.request.query_params.get("summary", "").lower() in ["1", "true"]
+
+    def get_serializer_class(self):
+        if self.is_summary_requested():
+            return GeoFenceSummarySerializer
+        return self.serializer_class
 
     def get_relevant_geo_fence(self, start_date, end_date, view_port: List[float]):
         present = arrow.now()
@@ -172,23 +190,9 @@ class GeoFenceList(mixins.ListModelMixin, generics.GenericAPIView):
             s_date = present.shift(days=-1)
             e_date = present.shift(days=1)
 
-        all_fences_within_timelimits = GeoFence.objects.filter(start_datetime__gte=s_date.isoformat(), end_datetime__lte=e_date.isoformat())
-        logger.info("Found %s geofences" % len(all_fences_within_timelimits))
-
+        filtered_relevant_fences = GeoFence.objects.filter(start_datetime__gte=s_date.isoformat(), end_datetime__lte=e_date.isoformat())
         if view_port:
-            INDEX_NAME = "geofence_idx"
-            my_rtree_helper = rtree_geo_fence_helper.GeoFenceRTreeIndexFactory(index_name=INDEX_NAME)
-            my_rtree_helper.generate_geo_fence_index(all_fences=all_fences_within_timelimits)
-            all_relevant_fences = my_rtree_helper.check_box_intersection(view_box=view_port)
-            relevant_id_set = []
-            for i in all_relevant_fences:
-                relevant_id_set.append(i["geo_fence_id"])
-
-            my_rtree_helper.clear_rtree_index()
-            filtered_relevant_fences = GeoFence.objects.filter(id__in=relevant_id_set)
-
-        else:
-            filtered_relevant_fences = all_fences_within_timelimits
+            filtered_relevant_fences = filtered_relevant_fences.filter(view_box_filter(view_port))
 
         return filtered_relevant_fences
 
@@ -202,6 +206,9 @@ class GeoFenceList(mixins.ListModelMixin, generics.GenericAPIView):
             view_port = [float(i) for i in view.split(",")]
 
         responses = self.get_relevant_geo_fence(view_port=view_port, start_date=start_date, end_date=end_date)
+        if self.is_summary_requested():
+            # The GeoJSON and GeoZone columns are large and not part of the summary
+            responses = responses.only(*GeoFenceSummarySerializer.Meta.fields)
         return responses
 
     def get(self, request, *args, **kwargs):
@@ -223,23 +230,9 @@ class GeospatialMapList(mixins.ListModelMixin, generics.GenericAPIView):
             s_date = present.shift(days=-1)
             e_date = present.shift(days=1)
 
-        all_fences_within_timelimits = GeoFence.objects.filter(start_datetime__gte=s_date.isoformat(), end_datetime__lte=e_date.isoformat())
-        logger.info("Found %s geofences" % len(all_fences_within_timelimits))
-
+        filtered_relevant_fences = GeoFence.objects.filter(start_datetime__gte=s_date.isoformat(), end_datetime__lte=e_date.isoformat())
         if view_port:
-            INDEX_NAME = "geofence_idx"
-            my_rtree_helper = rtree_geo_fence_helper.GeoFenceRTreeIndexFactory(index_name=INDEX_NAME)
-            my_rtree_helper.generate_geo_fence_index(all_fences=all_fences_within_timelimits)
-            all_relevant_fences = my_rtree_helper.check_box_intersection(view_box=view_port)
-            relevant_id_set = []
-            for i in all_relevant_fences:
-                relevant_id_set.append(i["geo_fence_id"])
-
-            my_rtree_helper.clear_rtree_index()
-            filtered_relevant_fences = GeoFence.objects.filter(id__in=relevant_id_set)
-
-        else:
-            filtered_relevant_fences = all_fences_within_timelimits
+            filtered_relevant_fences = filtered_relevant_fences.filter(view_box_filter(view_port))
 
         return filtered_relevant_fences
 
@@ -256,14 +249,60 @@ class GeospatialMapList(mixins.ListModelMixin, generics.GenericAPIView):
         return responses
 
     def get(self, request, *args, **kwargs):
-        return self.list(request, *args, **kwargs)
+        # This list is not paginated, the rows are read in chunks and written as they are serialized
+        all_geo_fences = self.get_queryset().only(*GeoSpatialMapListSerializer.Meta.fields).iterator(chunk_size=STREAMING_QUERYSET_CHUNK_SIZE)
+        return StreamingJsonResponse((GeoSpatialMapListSerializer(geo_fence).data for geo_fence in all_geo_fences), status=200)
+
+
+def iterate_geo_fence_features(all_geo_fences, level_of_detail: Optional[str] = None):
+    """Yield the GeoJSON features of each GeoFence at the level of detail with the id and name of the GeoFence added to their properties"""
+    for geo_fence in all_geo_fences:
+        try:
+            geo_json = select_level_of_detail(geo_fence.simplified_geo_fence, level_of_detail) if level_of_detail else None
+            all_features = (geo_json or json.loads(geo_fence.raw_geo_fence))["features"]
+        except (TypeError, KeyError, ValueError):
+            logger.info("GeoFence {geo_fence_id} has no valid GeoJSON, it is not exported".format(geo_fence_id=geo_fence.id))
+            continue
+        for feature in all_features:
+            feature["properties"] = {**(feature.get("properties") or {}), "geo_fence_id": str(geo_fence.id), "name": geo_fence.name}
+            yield feature
+
+
+@method_decorator(requires_scopes([ARGONSERVER_READ_SCOPE]), name="dispatch")
+class GeoFenceExport(GeoFenceList):
+    """Export the GeoFences matching the list filters as one GeoJSON FeatureCollection, the rows are read in chunks and the features are written as they are
+    encoded"""
+
+    def get(self, request, *args, **kwargs):
+        level_of_detail = self.get_requested_level_of_detail()
+        all_geo_fences = (
+            self.get_queryset().only("id", "name", "raw_geo_fence", "simplified_geo_fence").iterator(chunk_size=STREAMING_QUERYSET_CHUNK_SIZE)
+        )
+        return StreamingJsonResponse(
+            iterate_geo_fence_features(all_geo_fences, level_of_detail=level_of_detail),
+            prefix=FEATURE_COLLECTION_PREFIX,
+            suffix=FEATURE_COLLECTION_SUFFIX,
+            status=200,
+        )
+
+
+@method_decorator(requires_scopes([ARGONSERVER_READ_SCOPE]), name="dispatch")
+class GeoFenceChanges(GeoFenceList):
+    """Return the GeoFences created, updated or deleted after the change cursor of the client, a client without a cursor gets every GeoFence. The response
+    carries the cursor for the next request so a client that refreshes often only transfers what has changed"""
+
+    def get(self, request, *args, **kwargs):
+        all_geo_fences = GeoFence.objects.filter(is_test_dataset=False)
+        if self.is_summary_requested():
+            all_geo_fences = all_geo_fences.only(*GeoFenceSummarySerializer.Meta.fields)
+        return get_delta_sync_response(request, GeoFenceChange, all_geo_fences, self.get_serializer_class(), self.get_serializer_context())
 
 
 @method_decorator(requires_scopes(["geo-awareness.test"]), name="dispatch")
 class GeoZoneTestHarnessStatus(generics.GenericAPIView):
     def get(self, request, *args, **kwargs):
         status = GeoSpatialMapTestHarnessStatus(status="Ready", api_version="latest")
-        return JsonResponse(json.loads(json.dumps(status, cls=EnhancedJSONEncoder)), status=200)
+        return DataclassJsonResponse(status, status=200)
 
 
 @method_decorator(requires_scopes(["geo-awareness.test"]), name="dispatch")
@@ -277,8 +316,8 @@ class GeoZoneSourcesOperations(generics.GenericAPIView):
                 result="Rejected",
                 message="There was an error in processing the request payload, a url and format key is required for successful processing",
             )
-            return JsonResponse(
-                json.loads(json.dumps(ga_import_response, cls=EnhancedJSONEncoder)),
+            return DataclassJsonResponse(
+                ga_import_response,
                 status=200,
             )
 
@@ -287,8 +326,8 @@ class GeoZoneSourcesOperations(generics.GenericAPIView):
             url_validator(geo_zone_url_details.https_source.url)
         except ValidationError:
             ga_import_response = GeoAwarenessTestStatus(result="Unsupported", message="There was an error in the url provided")
-            return JsonResponse(
-                json.loads(json.dumps(ga_import_response, cls=EnhancedJSONEncoder)),
+            return DataclassJsonResponse(
+                ga_import_response,
                 status=200,
             )
 
@@ -303,8 +342,8 @@ class GeoZoneSourcesOperations(generics.GenericAPIView):
         r.set(geoawareness_test_data_store, json.dumps(asdict(ga_import_response)))
         r.expire(name=geoawareness_test_data_store, time=3000)
 
-        return JsonResponse(
-            json.loads(json.dumps(ga_import_response, cls=EnhancedJSONEncoder)),
+        return DataclassJsonResponse(
+            ga_import_response,
             status=200,
         )
 
@@ -316,8 +355,8 @@ class GeoZoneSourcesOperations(generics.GenericAPIView):
             test_data_status = r.get(geoawareness_test_data_store)
             test_status = json.loads(test_data_status)
             ga_test_status = GeoAwarenessTestStatus(result=test_status["result"], message="")
-            return JsonResponse(
-                json.loads(json.dumps(ga_test_status, cls=EnhancedJSONEncoder)),
+            return DataclassJsonResponse(
+                ga_test_status,
                 status=200,
             )
         else:
@@ -336,8 +375,8 @@ class GeoZoneSourcesOperations(generics.GenericAPIView):
                 message="Test data has been scheduled to be deleted",
             )
             r.set(geoawareness_test_data_store, json.dumps(asdict(deletion_status)))
-            return JsonResponse(
-                json.loads(json.dumps(deletion_status, cls=EnhancedJSONEncoder)),
+            return DataclassJsonResponse(
+                deletion_status,
                 status=200,
             )
 
@@ -347,71 +386,42 @@ class GeoZoneSourcesOperations(generics.GenericAPIView):
 
 @method_decorator(requires_scopes(["geo-awareness.test"]), name="dispatch")
 class GeoZoneCheck(generics.GenericAPIView):
-    def post(self, request, *args, **kwargs):
-        proj = pyproj.Proj("+proj=utm +zone=24 +south +datum=WGS84 +units=m +no_defs ")
+    def is_filter_set_matched(self, filter_set: dict) -> bool:
+        """Each filter of the set is a single lookup on the shared GeoFence index or on the indexed columns of the test dataset"""
+        all_test_geo_zones = GeoFence.objects.filter(is_test_dataset=True)
+        if "position" in filter_set:
+            filter_position = ImplicitDict.parse(filter_set["position"], GeoZoneFilterPosition)
+            my_geo_fence_index = rtree_geo_fence_helper.get_geo_fence_index()
+            # Buffer the point by a meter to get a small view port / bounds
+            buffer_shape_lonlat = buffer_point_in_meters(Point(filter_position.longitude, filter_position.latitude), radius=1)
+            all_candidate_fences = my_geo_fence_index.check_box_intersection(view_box=buffer_shape_lonlat.bounds, is_test_dataset=True)
+            if my_geo_fence_index.filter_intersecting_geo_fences(candidates=all_candidate_fences, geometry=buffer_shape_lonlat):
+                return True
+
+        if "after" in filter_set:
+            if all_test_geo_zones.filter(start_datetime__gte=arrow.get(filter_set["after"]).isoformat()).exists():
+                return True
+        if "before" in filter_set:
+            if all_test_geo_zones.filter(end_datetime__lte=arrow.get(filter_set["before"]).isoformat()).exists():
+                return True
+        if "ed269" in filter_set:
+            ed269_filter_set = filter_set["ed269"]
+            if "uSpaceClass" in ed269_filter_set:
+                if all_test_geo_zones.filter(u_space_class=ed269_filter_set["uSpaceClass"]).exists():
+                    return True
+            if "acceptableRestrictions" in ed269_filter_set:
+                acceptable_restrictions = ed269_filter_set["acceptableRestrictions"]
+                if isinstance(acceptable_restrictions, str):
+                    acceptable_restrictions = [acceptable_restrictions]
+                if all_test_geo_zones.filter(restriction__in=acceptable_restrictions).exists():
+                    return True
+        return False
 
+    def post(self, request, *args, **kwargs):
         geo_zone_body = ImplicitDict.parse(request.data, GeoZoneCheckRequestBody)
-        geo_zones_of_interest = False
-        geo_zone_checks = geo_zone_body.checks
-
-        for geo_zone_check in geo_zone_checks:
-            for filter_set in geo_zone_check["filter_sets"]:
-                if "position" in filter_set:
-                    filter_position = ImplicitDict.parse(filter_set["position"], GeoZoneFilterPosition)
-                    relevant_geo_fences = GeoFence.objects.filter(is_test_dataset=1)
-                    INDEX_NAME = "geofence_idx"
-                    my_rtree_helper = rtree_geo_fence_helper.GeoFenceRTreeIndexFactory(index_name=INDEX_NAME)
-                    # Buffer the point to get a small view port / bounds
-                    init_point = Point(filter_position)
-                    init_shape_utm = toFromUTM(init_point, proj)
-                    buffer_shape_utm = init_shape_utm.buffer(1)
-                    buffer_shape_lonlat = toFromUTM(buffer_shape_utm, proj, inv=True)
-                    view_port = buffer_shape_lonlat.bounds
-
-                    my_rtree_helper.generate_geo_fence_index(all_fences=relevant_geo_fences)
-                    all_relevant_fences = my_rtree_helper.check_box_intersection(view_box=view_port)
-                    my_rtree_helper.clear_rtree_index()
-                    if all_relevant_fences:
-                        geo_zones_of_interest = True
-
-                if "after" in filter_set:
-                    after_query = arrow.get(filter_set["after"])
-                    geo_zones_exist = GeoFence.objects.filter(start_datetime__gte=after_query, is_test_dataset=1).exists()
-                    if geo_zones_exist:
-                        geo_zones_of_interest = True
-                if "before" in filter_set:
-                    before_query = arrow.get(filter_set["before"])
-                    geo_zones_exist = GeoFence.objects.filter(before_datetime__lte=before_query, is_test_dataset=1).exists()
-                    if geo_zones_exist:
-                        geo_zones_of_interest = True
-                if "ed269" in filter_set:
-                    ed269_filter_set = filter_set["ed269"]
-                    if "uSpaceClass" in ed269_filter_set:
-                        uSpace_class_to_query = ed269_filter_set["uSpaceClass"]
-                        # Iterate over Geofences to see if there is a uSpace class
-                        geo_zones_exist = False
-                        all_geo_zones = GeoFence.objects.filter(is_test_dataset=1)
-                        for current_geo_zone in all_geo_zones:
-                            current_geo_zone_uSpace_class = current_geo_zone["uSpaceClass"]
-                            if uSpace_class_to_query == current_geo_zone_uSpace_class:
-                                geo_zones_exist = True
-                                break
-
-                        if geo_zones_exist:
-                            geo_zones_of_interest = True
-
-                    if "acceptableRestrictions" in ed269_filter_set:
-                        acceptable_restrictions = ed269_filter_set["acceptableRestrictions"]
-                        geo_zones_exist = False
-                        all_geo_zones = GeoFence.objects.filter(is_test_dataset=1)
-                        for current_geo_zone in all_geo_zones:
-                            current_geo_zone_restriction = current_geo_zone["restriction"]
-                            if current_geo_zone_restriction in acceptable_restrictions:
-                                geo_zones_exist = True
-                                break
-
-                        if geo_zones_exist:
-                            geo_zones_of_interest = True
+        geo_zones_of_interest = any(
+            self.is_filter_set_matched(filter_set) for geo_zone_check in geo_zone_body.checks for filter_set in geo_zone_check["filter_sets"]
+        )
 
         if geo_zones_of_interest:
             geo_zone_check_result = GeoZoneCheckResult(geozone="Present")
@@ -419,7 +429,7 @@ class GeoZoneCheck(generics.GenericAPIView):
             geo_zone_check_result = GeoZoneCheckResult(geozone="Absent")
 
         geo_zone_response = GeoZoneChecksResponse(applicableGeozone=geo_zone_check_result, message="Test")
-        return JsonResponse(
-            json.loads(json.dumps(geo_zone_response, cls=EnhancedJSONEncoder)),
+        return DataclassJsonResponse(
+            geo_zone_response,
             status=200,
         )
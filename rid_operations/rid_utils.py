@@ -1,6 +1,6 @@
 import enum
 from dataclasses import asdict, dataclass, field
-from typing import List, Literal, NamedTuple, Optional, Union
+from typing import List, Literal, Optional, Union
 
 from implicitdict import StringBasedDateTime
 
@@ -21,7 +21,8 @@ class LatLngPoint:
     lng: float
 
 
-class Position(NamedTuple):
+@dataclass
+class Position:
     """A class to hold most recent position for remote id data"""
 
     lat: float
@@ -29,25 +30,29 @@ class Position(NamedTuple):
     alt: float
 
 
-class RIDPositions(NamedTuple):
+@dataclass
+class RIDPositions:
     """A list of positions for RID"""
 
     positions: List[Position]
 
 
-class RIDFlight(NamedTuple):
+@dataclass
+class RIDFlight:
     id: str
     most_recent_position: Position
     recent_paths: List[RIDPositions]
 
 
-class ClusterDetails(NamedTuple):
+@dataclass
+class ClusterDetails:
     corners: List[Position]
     area_sqm: float
     number_of_flights: float
 
 
-class RIDDisplayDataResponse(NamedTuple):
+@dataclass
+class RIDDisplayDataResponse:
     flights: List[RIDFlight]
     clusters: List[ClusterDetails]
 
@@ -128,7 +133,8 @@ class ISACreationResponse:
     service_area: IdentificationServiceArea
 
 
-class CreateSubscriptionResponse(NamedTuple):
+@dataclass
+class CreateSubscriptionResponse:
     """Output of a request to create subscription"""
 
     message: str
@@ -1,17 +1,92 @@
-import hashlib
 import json
 import logging
+import threading
+from datetime import timedelta
 from auth_helper.common import get_redis
-from scd_operations.scd_data_definitions import Altitude, OpInttoCheckDetails, Time
-from typing import List
+from common.data_definitions import FLIGHT_OPINT_INDEX_CHANGES_KEY, FLIGHT_OPINT_INDEX_KEY, FLIGHT_OPINT_INDEX_VERSION_KEY
+from scd_operations.scd_data_definitions import Altitude, OpInttoCheckDetails, Time, Volume4D
+from typing import List, Optional, Tuple, Union
 
+import arrow
 from rtree import index
 from shapely.geometry import Polygon
+from shapely.prepared import prep
 
 
 logger = logging.getLogger("django")
 
 
+# Number of changes retained in the change stream, a worker that falls further behind reloads the index from the hash
+FLIGHT_OPINT_INDEX_MAX_CHANGES = 10000
+
+# Open ended altitude and time extents are indexed with these bounds, libspatialindex does not accept infinite coordinates
+MIN_ALTITUDE, MAX_ALTITUDE = -1.0e6, 1.0e6
+MIN_TIMESTAMP, MAX_TIMESTAMP = 0.0, 1.0e11
+
+# Altitude extents are indexed in metres above the WGS84 ellipsoid, volumes with altitudes against another reference are not pruned on altitude
+ALTITUDE_INDEX_REFERENCE = "W84"
+ALTITUDE_UNITS_TO_METRES = {"M": 1.0, "FT": 0.3048}
+
+
+def get_field(obj: Union[dict, object], field_name: str):
+    """Volumes are either dataclasses or (implicit) dictionaries depending on where they were parsed, this returns the field in both cases"""
+    return obj[field_name] if isinstance(obj, dict) else getattr(obj, field_name)
+
+
+def get_time_value(time: Union[Time, dict, str]) -> str:
+    return str(time if isinstance(time, str) else get_field(time, "value"))
+
+
+def get_altitude_value(altitude: Union[Altitude, dict]) -> float:
+    return float(get_field(altitude, "value"))
+
+
+def get_indexed_altitude(altitude: Union[Altitude, dict]) -> Optional[float]:
+    """Returns the altitude in metres above the WGS84 ellipsoid, None if it uses another reference or unknown units and cannot be compared"""
+    if str(get_field(altitude, "reference")).upper() != ALTITUDE_INDEX_REFERENCE:
+        return None
+    units_to_metres = ALTITUDE_UNITS_TO_METRES.get(str(get_field(altitude, "units")).upper())
+    if units_to_metres is None:
+        return None
+    return get_altitude_value(altitude) * units_to_metres
+
+
+def get_volumes_altitude_time_extents(
+    volumes: List[Volume4D],
+) -> Tuple[Optional[float], Optional[float], Optional[float], Optional[float]]:
+    """Returns the altitude_lower, altitude_upper (metres above the WGS84 ellipsoid), time_start and time_end (Unix timestamps) envelope of the volumes, None
+    if not available. The altitude envelope is None if any altitude cannot be converted so that the volumes are not pruned on altitude"""
+    altitude_lower = altitude_upper = time_start = time_end = None
+    is_altitude_comparable = True
+    for volume in volumes:
+        volume_3d = get_field(volume, "volume")
+        cur_altitude_lower = get_field(volume_3d, "altitude_lower")
+        cur_altitude_upper = get_field(volume_3d, "altitude_upper")
+        cur_time_start = get_field(volume, "time_start")
+        cur_time_end = get_field(volume, "time_end")
+        if cur_altitude_lower:
+            value = get_indexed_altitude(cur_altitude_lower)
+            if value is None:
+                is_altitude_comparable = False
+            else:
+                altitude_lower = value if altitude_lower is None else min(altitude_lower, value)
+        if cur_altitude_upper:
+            value = get_indexed_altitude(cur_altitude_upper)
+            if value is None:
+                is_altitude_comparable = False
+            else:
+                altitude_upper = value if altitude_upper is None else max(altitude_upper, value)
+        if cur_time_start:
+            value = arrow.get(get_time_value(cur_time_start)).timestamp()
+            time_start = value if time_start is None else min(time_start, value)
+        if cur_time_end:
+            value = arrow.get(get_time_value(cur_time_end)).timestamp()
+            time_end = value if time_end is None else max(time_end, value)
+    if not is_altitude_comparable:
+        return None, None, time_start, time_end
+    return altitude_lower, altitude_upper, time_start, time_end
+
+
 class OperationalIntentComparisonFactory:
     """A method to check if two operational intents are same in geometry / time and altitude."""
 
@@ -19,114 +94,248 @@ class OperationalIntentComparisonFactory:
         return polygon_a.equals(polygon_b)  # Also has exact_equals and almost_equals method
 
     def check_volume_start_end_time_same(self, time_a: Time, time_b: Time) -> bool:
-        # TODO: Implement checking of two times
-        return True
+        return arrow.get(get_time_value(time_a)) == arrow.get(get_time_value(time_b))
+
+    def check_volume_altitude_same(self, altitude_a: Altitude, altitude_b: Altitude) -> bool:
+        return (
+            float(get_altitude_value(altitude_a)) == float(get_altitude_value(altitude_b))
+            and get_field(altitude_a, "reference") == get_field(altitude_b, "reference")
+            and get_field(altitude_a, "units") == get_field(altitude_b, "units")
+        )
 
-    def check_volume_(self, altitude_a: Altitude, altitude_b: Altitude) -> bool:
-        # TODO: Implement checking of two altitudes
-        return True
 
+class LocalOperationalIntentsIndex:
+    """A per-process in memory index of the operational intents stored in Argon Server. Writers record every create / update / delete in Redis
+    (a hash of the extents, a version counter and a change stream), before a query each process compares the version counter with the version it
+    has applied and replays only the changes it has not yet seen. Expired operational intents are dropped lazily when they are encountered."""
 
-class OperationalIntentsIndexFactory:
-    def __init__(self, index_name: str):
-        self.idx = index.Index(index_name)
+    def __init__(self):
         self.r = get_redis()
+        self.idx = index.Index()
+        self.lock = threading.Lock()
+        self.entries = {}  # operation_id -> (enumerated_id, bounds, metadata)
+        self.next_enumerated_id = 0
+        self.applied_version = None
+        self.last_change_id = "0-0"
 
-    def add_box_to_index(
-        self,
-        enumerated_id: int,
-        flight_id: str,
-        view: List[float],
-        start_time: str,
-        end_time: str,
-    ):
-        metadata = {
+    def upsert_operational_intent(self, operation_id: str, bounds: str, start_time: str, end_time: str, expires_in: timedelta) -> None:
+        """Record a created or updated operational intent, this should be called whenever a flight_opint key is written"""
+        entry = {
+            "bounds": bounds,
             "start_time": start_time,
             "end_time": end_time,
-            "flight_id": flight_id,
+            "expires_at": arrow.now().shift(seconds=expires_in.total_seconds()).timestamp(),
         }
-        self.idx.insert(
-            id=enumerated_id,
-            coordinates=(view[0], view[1], view[2], view[3]),
-            obj=metadata,
-        )
+        pipe = self.r.pipeline(transaction=True)
+        pipe.hset(FLIGHT_OPINT_INDEX_KEY, operation_id, json.dumps(entry))
+        pipe.xadd(FLIGHT_OPINT_INDEX_CHANGES_KEY, {"operation_id": operation_id}, maxlen=FLIGHT_OPINT_INDEX_MAX_CHANGES, approximate=True)
+        pipe.incr(FLIGHT_OPINT_INDEX_VERSION_KEY)
+        pipe.execute()
 
-    def delete_from_index(self, enumerated_id: int, view: List[float]):
-        self.idx.delete(id=enumerated_id, coordinates=(view[0], view[1], view[2], view[3]))
+    def remove_operational_intent(self, operation_id: str) -> None:
+        """Record a deleted or expired operational intent"""
+        pipe = self.r.pipeline(transaction=True)
+        self.remove_operational_intents(operation_ids=[operation_id], pipe=pipe)
+        pipe.execute()
 
-    def check_op_ints_exist(self, pattern: str = None) -> bool:
-        """This method generates a rTree index of currently active operational indexes"""
-        pattern = pattern if pattern else "flight_opint.*"
+    def remove_operational_intents(self, operation_ids: List[str], pipe) -> None:
+        """Queue the removal of several operational intents on a Redis pipeline, the caller executes the pipeline so that the removal can be
+        committed together with other changes e.g. deleting the flight_opint keys"""
+        if not operation_ids:
+            return
+        pipe.hdel(FLIGHT_OPINT_INDEX_KEY, *operation_ids)
+        for operation_id in operation_ids:
+            pipe.xadd(FLIGHT_OPINT_INDEX_CHANGES_KEY, {"operation_id": operation_id}, maxlen=FLIGHT_OPINT_INDEX_MAX_CHANGES, approximate=True)
+        pipe.incr(FLIGHT_OPINT_INDEX_VERSION_KEY)
 
-        all_op_ints = self.r.keys(pattern=pattern)
-        if all_op_ints:
-            return True
-        else:
-            return False
+    def get_all_operation_ids(self) -> List[str]:
+        self.sync()
+        now = arrow.now().timestamp()
+        return [operation_id for operation_id, (_, _, metadata) in self.entries.items() if metadata["expires_at"] > now]
 
-    def generate_operational_intents_index(self, pattern: str = None) -> None:
-        """This method generates a rTree index of currently active operational indexes"""
-        pattern = pattern if pattern else "flight_opint.*"
-
-        all_op_ints = self.r.keys(pattern=pattern)
-        for flight_idx, flight_id in enumerate(all_op_ints):
-            flight_id_str = flight_id.split(".")[1]
-            enumerated_flight_id = int(hashlib.sha256(flight_id_str.encode("utf-8")).hexdigest(), 16) % 10**8
-            operational_intent_view_raw = self.r.get(flight_id)
-            operational_intent_view = json.loads(operational_intent_view_raw)
-            split_view = operational_intent_view["bounds"].split(",")
-            start_time = operational_intent_view["start_time"]
-            end_time = operational_intent_view["end_time"]
-            view = [float(i) for i in split_view]
-
-            self.add_box_to_index(
-                enumerated_id=enumerated_flight_id,
-                flight_id=flight_id_str,
-                view=view,
-                start_time=start_time,
-                end_time=end_time,
-            )
+    def _apply_entry(self, operation_id: str, entry_raw: Optional[str]) -> None:
+        existing = self.entries.pop(operation_id, None)
+        if existing:
+            enumerated_id, bounds, _ = existing
+            self.idx.delete(enumerated_id, bounds)
+        if entry_raw is None:
+            return
+        entry = json.loads(entry_raw)
+        bounds = tuple(float(i) for i in entry["bounds"].split(","))
+        metadata = {
+            "start_time": entry["start_time"],
+            "end_time": entry["end_time"],
+            "flight_id": operation_id,
+            "expires_at": entry["expires_at"],
+        }
+        enumerated_id = self.next_enumerated_id
+        self.next_enumerated_id += 1
+        self.idx.insert(id=enumerated_id, coordinates=bounds, obj=metadata)
+        self.entries[operation_id] = (enumerated_id, bounds, metadata)
 
-    def clear_rtree_index(self, pattern: str):
-        """Method to delete all boxes from the index"""
-        pattern = pattern if pattern else "flight_opint.*"
+    def _reload(self) -> None:
+        for operation_id in list(self.entries.keys()):
+            self._apply_entry(operation_id, None)
+        # Read the last change id before the hash so that changes made in between are replayed (applying a change twice is harmless)
+        last_change = self.r.xrevrange(FLIGHT_OPINT_INDEX_CHANGES_KEY, count=1)
+        self.last_change_id = last_change[0][0] if last_change else "0-0"
+        for operation_id, entry_raw in self.r.hgetall(FLIGHT_OPINT_INDEX_KEY).items():
+            self._apply_entry(operation_id, entry_raw)
 
-        all_op_ints = self.r.keys(pattern=pattern)
-        for flight_idx, flight_id in enumerate(all_op_ints):
-            flight_id_str = flight_id.split(".")[1]
+    def parse_change_id(self, change_id: str) -> Tuple[int, int]:
+        ms, seq = change_id.split("-")
+        return int(ms), int(seq)
 
-            enumerated_flight_id = int(hashlib.sha256(flight_id_str.encode("utf-8")).hexdigest(), 16) % 10**8
-            operational_intent_view_raw = self.r.get(flight_id)
-            operational_intent_view = json.loads(operational_intent_view_raw)
-            split_view = operational_intent_view["bounds"].split(",")
-            view = [float(i) for i in split_view]
-            self.delete_from_index(enumerated_id=enumerated_flight_id, view=view)
+    def is_change_stream_trimmed(self) -> bool:
+        """Check if changes this process has not applied yet have already been trimmed from the change stream"""
+        first_change = self.r.xrange(FLIGHT_OPINT_INDEX_CHANGES_KEY, count=1)
+        if not first_change:
+            return True
+        return self.parse_change_id(first_change[0][0]) > self.parse_change_id(self.last_change_id)
 
-    def close_index(self):
-        """Method to delete / close index"""
-        self.idx.close()
+    def sync(self) -> None:
+        """Bring the index up to date with the changes recorded in Redis"""
+        with self.lock:
+            current_version = int(self.r.get(FLIGHT_OPINT_INDEX_VERSION_KEY) or 0)
+            if current_version == self.applied_version:
+                return
+            if self.applied_version is None or current_version < self.applied_version or self.is_change_stream_trimmed():
+                # First use in this process, Redis was flushed or this process fell too far behind
+                self._reload()
+            else:
+                ms, seq = self.parse_change_id(self.last_change_id)
+                all_changes = self.r.xrange(FLIGHT_OPINT_INDEX_CHANGES_KEY, min="%d-%d" % (ms, seq + 1))
+                changed_operation_ids = list({change["operation_id"] for _, change in all_changes})
+                if changed_operation_ids:
+                    all_entries_raw = self.r.hmget(FLIGHT_OPINT_INDEX_KEY, changed_operation_ids)
+                    for operation_id, entry_raw in zip(changed_operation_ids, all_entries_raw):
+                        self._apply_entry(operation_id, entry_raw)
+                if all_changes:
+                    self.last_change_id = all_changes[-1][0]
+            self.applied_version = current_version
 
-    def check_box_intersection(self, view_box: List[float]):
-        intersections = [n.object for n in self.idx.intersection((view_box[0], view_box[1], view_box[2], view_box[3]), objects=True)]
+    def check_box_intersection(self, view_box: List[float]) -> List[dict]:
+        self.sync()
+        now = arrow.now().timestamp()
+        intersections = []
+        for n in self.idx.intersection((view_box[0], view_box[1], view_box[2], view_box[3]), objects=True):
+            if n.object["expires_at"] > now:
+                intersections.append(n.object)
+            else:
+                self.remove_operational_intent(operation_id=n.object["flight_id"])
         return intersections
 
 
-def check_polygon_intersection(op_int_details: List[OpInttoCheckDetails], polygon_to_check: Polygon) -> bool:
-    idx = index.Index()
-    for pos, op_int_detail in enumerate(op_int_details):
-        idx.insert(pos, op_int_detail.shape.bounds)
+_local_operational_intents_index = None
+_local_operational_intents_index_lock = threading.Lock()
+
+
+def get_local_operational_intents_index() -> LocalOperationalIntentsIndex:
+    """Returns the index of local operational intents for this process"""
+    global _local_operational_intents_index
+    with _local_operational_intents_index_lock:
+        if _local_operational_intents_index is None:
+            _local_operational_intents_index = LocalOperationalIntentsIndex()
+    return _local_operational_intents_index
+
+
+class OperationalIntentsConflictIndex:
+    """A in memory 4D (lng, lat, altitude, time) index of operational intents to check, candidates are pruned on all four dimensions
+    before the exact intersection with a prepared geometry is computed"""
+
+    def __init__(self, op_int_details: List[OpInttoCheckDetails]):
+        properties = index.Property()
+        properties.dimension = 4
+        self.idx = index.Index(properties=properties)
+        self.op_int_details = op_int_details
+        for pos, op_int_detail in enumerate(op_int_details):
+            self.idx.insert(
+                pos,
+                self.get_4d_bounds(
+                    shape=op_int_detail.shape,
+                    altitude_lower=op_int_detail.altitude_lower,
+                    altitude_upper=op_int_detail.altitude_upper,
+                    time_start=op_int_detail.time_start,
+                    time_end=op_int_detail.time_end,
+                ),
+            )
+
+    def get_4d_bounds(
+        self,
+        shape: Polygon,
+        altitude_lower: Optional[float],
+        altitude_upper: Optional[float],
+        time_start: Optional[float],
+        time_end: Optional[float],
+    ) -> Tuple[float, ...]:
+        min_x, min_y, max_x, max_y = shape.bounds
+        return (
+            min_x,
+            min_y,
+            MIN_ALTITUDE if altitude_lower is None else altitude_lower,
+            MIN_TIMESTAMP if time_start is None else time_start,
+            max_x,
+            max_y,
+            MAX_ALTITUDE if altitude_upper is None else altitude_upper,
+            MAX_TIMESTAMP if time_end is None else time_end,
+        )
+
+    def get_candidates(
+        self,
+        shape: Polygon,
+        altitude_lower: Optional[float] = None,
+        altitude_upper: Optional[float] = None,
+        time_start: Optional[float] = None,
+        time_end: Optional[float] = None,
+    ) -> List[OpInttoCheckDetails]:
+        """Returns the operational intents whose 4D bounding boxes overlap the given extents"""
+        bounds = self.get_4d_bounds(
+            shape=shape,
+            altitude_lower=altitude_lower,
+            altitude_upper=altitude_upper,
+            time_start=time_start,
+            time_end=time_end,
+        )
+        return [self.op_int_details[pos] for pos in self.idx.intersection(bounds)]
+
+    def check_conflict(
+        self,
+        polygon_to_check: Polygon,
+        altitude_lower: Optional[float] = None,
+        altitude_upper: Optional[float] = None,
+        time_start: Optional[float] = None,
+        time_end: Optional[float] = None,
+    ) -> bool:
+        candidates = self.get_candidates(
+            shape=polygon_to_check,
+            altitude_lower=altitude_lower,
+            altitude_upper=altitude_upper,
+            time_start=time_start,
+            time_end=time_end,
+        )
+        if not candidates:
+            return False
+        prepared_polygon_to_check = prep(polygon_to_check)
+        return any(prepared_polygon_to_check.intersects(candidate.shape) for candidate in candidates)
 
-    op_ints_of_interest_ids = list(idx.intersection(polygon_to_check.bounds))
-    does_intersect = []
-    if op_ints_of_interest_ids:
-        for op_ints_of_interest_id in op_ints_of_interest_ids:
-            existing_op_int = op_int_details[op_ints_of_interest_id]
-            intersects = polygon_to_check.intersects(existing_op_int.shape)
-            if intersects:
-                does_intersect.append(True)
-            else:
-                does_intersect.append(False)
 
-        return all(does_intersect)
-    else:
+def check_polygon_intersection(
+    op_int_details: List[OpInttoCheckDetails],
+    polygon_to_check: Polygon,
+    altitude_lower: Optional[float] = None,
+    altitude_upper: Optional[float] = None,
+    time_start: Optional[float] = None,
+    time_end: Optional[float] = None,
+) -> bool:
+    """Checks if the polygon conflicts with any of the operational intents, if altitude and time extents are provided only operational intents
+    that also overlap in altitude and time are considered"""
+    if not op_int_details:
         return False
+    my_conflict_index = OperationalIntentsConflictIndex(op_int_details=op_int_details)
+    return my_conflict_index.check_conflict(
+        polygon_to_check=polygon_to_check,
+        altitude_lower=altitude_lower,
+        altitude_upper=altitude_upper,
+        time_start=time_start,
+        time_end=time_end,
+    )
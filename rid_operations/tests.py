@@ -1 +1,107 @@
-# Create your tests here.
+import uuid
+from datetime import timedelta
+from unittest import mock
+
+from django.test import TestCase
+from shapely.geometry import box
+
+from common.data_definitions import FLIGHT_OPINT_INDEX_KEY
+from scd_operations.scd_data_definitions import OpInttoCheckDetails
+
+from .rtree_helper import LocalOperationalIntentsIndex, check_polygon_intersection, get_volumes_altitude_time_extents
+
+
+class LocalOperationalIntentsIndexTests(TestCase):
+    def setUp(self):
+        # Two indexes stand in for two processes, one records the changes and the other replays them
+        self.writer_index = LocalOperationalIntentsIndex()
+        self.reader_index = LocalOperationalIntentsIndex()
+        self.all_operation_ids = []
+        # The change stream is not empty when the reader loads the index, otherwise its first change cannot be told apart from a trimmed stream
+        self.upsert("0.0,0.0,0.001,0.001")
+        self.reader_index.sync()
+
+    def tearDown(self):
+        pipe = self.writer_index.r.pipeline(transaction=True)
+        self.writer_index.remove_operational_intents(operation_ids=self.all_operation_ids, pipe=pipe)
+        pipe.execute()
+
+    def upsert(self, bounds: str, operation_id: str = None, expires_in: timedelta = timedelta(hours=1)) -> str:
+        operation_id = operation_id or str(uuid.uuid4())
+        if operation_id not in self.all_operation_ids:
+            self.all_operation_ids.append(operation_id)
+        self.writer_index.upsert_operational_intent(
+            operation_id=operation_id, bounds=bounds, start_time="2026-10-19T10:00:00Z", end_time="2026-10-19T11:00:00Z", expires_in=expires_in
+        )
+        return operation_id
+
+    def get_intersecting_operation_ids(self, view_box):
+        return {n["flight_id"] for n in self.reader_index.check_box_intersection(view_box)} & set(self.all_operation_ids)
+
+    def test_created_operational_intent_is_replayed_by_another_process(self):
+        operation_id = self.upsert("7.47,46.97,7.48,46.98")
+        with mock.patch.object(self.reader_index, "_reload", wraps=self.reader_index._reload) as reload:
+            self.assertEqual(self.get_intersecting_operation_ids([7.4, 46.9, 7.5, 47.0]), {operation_id})
+        reload.assert_not_called()
+        self.assertEqual(self.get_intersecting_operation_ids([8.5, 47.3, 8.6, 47.4]), set())
+
+    def test_updated_operational_intent_is_moved(self):
+        operation_id = self.upsert("7.47,46.97,7.48,46.98")
+        self.assertEqual(self.get_intersecting_operation_ids([7.4, 46.9, 7.5, 47.0]), {operation_id})
+        self.upsert("8.54,47.37,8.55,47.38", operation_id=operation_id)
+        self.assertEqual(self.get_intersecting_operation_ids([7.4, 46.9, 7.5, 47.0]), set())
+        self.assertEqual(self.get_intersecting_operation_ids([8.5, 47.3, 8.6, 47.4]), {operation_id})
+
+    def test_removed_operational_intent_is_dropped(self):
+        operation_id = self.upsert("7.47,46.97,7.48,46.98")
+        self.assertIn(operation_id, self.reader_index.get_all_operation_ids())
+        self.writer_index.remove_operational_intent(operation_id=operation_id)
+        self.assertNotIn(operation_id, self.reader_index.get_all_operation_ids())
+        self.assertEqual(self.get_intersecting_operation_ids([7.4, 46.9, 7.5, 47.0]), set())
+
+    def test_expired_operational_intent_is_not_returned(self):
+        operation_id = self.upsert("7.47,46.97,7.48,46.98", expires_in=timedelta(seconds=-1))
+        self.assertNotIn(operation_id, self.reader_index.get_all_operation_ids())
+        self.assertEqual(self.get_intersecting_operation_ids([7.4, 46.9, 7.5, 47.0]), set())
+        self.assertIsNone(self.writer_index.r.hget(FLIGHT_OPINT_INDEX_KEY, operation_id))
+
+    def test_index_is_reloaded_when_the_change_stream_was_trimmed(self):
+        operation_id = self.upsert("7.47,46.97,7.48,46.98")
+        with mock.patch.object(self.reader_index, "is_change_stream_trimmed", return_value=True):
+            with mock.patch.object(self.reader_index, "_reload", wraps=self.reader_index._reload) as reload:
+                self.assertEqual(self.get_intersecting_operation_ids([7.4, 46.9, 7.5, 47.0]), {operation_id})
+        reload.assert_called_once()
+
+
+def get_volume(altitude_lower: float, altitude_upper: float, reference: str = "W84", units: str = "M") -> dict:
+    return {
+        "volume": {
+            "outline_polygon": None,
+            "altitude_lower": {"value": altitude_lower, "reference": reference, "units": units},
+            "altitude_upper": {"value": altitude_upper, "reference": reference, "units": units},
+        },
+        "time_start": {"format": "RFC3339", "value": "2026-10-19T10:00:00Z"},
+        "time_end": {"format": "RFC3339", "value": "2026-10-19T11:00:00Z"},
+    }
+
+
+class VolumesAltitudeTimeExtentsTests(TestCase):
+    def test_altitudes_are_converted_to_metres(self):
+        altitude_lower, altitude_upper, _, _ = get_volumes_altitude_time_extents([get_volume(100, 200), get_volume(500, 1000, units="FT")])
+        self.assertEqual(altitude_lower, 100)
+        self.assertAlmostEqual(altitude_upper, 304.8)
+
+    def test_altitudes_against_another_reference_are_not_pruned(self):
+        altitude_lower, altitude_upper, time_start, time_end = get_volumes_altitude_time_extents(
+            [get_volume(100, 200), get_volume(0, 50, reference="SFC")]
+        )
+        self.assertIsNone(altitude_lower)
+        self.assertIsNone(altitude_upper)
+        self.assertIsNotNone(time_start)
+        self.assertIsNotNone(time_end)
+
+    def test_conflict_in_feet_is_found(self):
+        # 1000 ft (304.8 m) overlaps a operational intent between 250 and 400 m
+        op_int_details = [OpInttoCheckDetails(ovn="ovn", shape=box(0, 0, 1, 1), id="id", altitude_lower=250, altitude_upper=400)]
+        altitude_lower, altitude_upper, _, _ = get_volumes_altitude_time_extents([get_volume(900, 1000, units="FT")])
+        self.assertTrue(check_polygon_intersection(op_int_details, box(0.5, 0.5, 2, 2), altitude_lower=altitude_lower, altitude_upper=altitude_upper))
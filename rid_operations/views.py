@@ -5,7 +5,6 @@ import time
 import uuid
 from dataclasses import asdict
 from datetime import timedelta
-from typing import Any
 from uuid import UUID
 
 import arrow
@@ -21,7 +20,7 @@ from common.data_definitions import (
     ARGONSERVER_WRITE_SCOPE,
     RESPONSE_CONTENT_TYPE,
 )
-from common.utils import EnhancedJSONEncoder
+from common.utils import DataclassJsonResponse
 from flight_feed_operations import flight_stream_helper
 from uss_operations.uss_data_definitions import (
     FlightDetailsNotFoundMessage,
@@ -47,29 +46,12 @@ load_dotenv(find_dotenv())
 logger = logging.getLogger("django")
 
 
-class RIDOutputHelper:
-    def make_json_compatible(self, struct: Any) -> Any:
-        if isinstance(struct, tuple) and hasattr(struct, "_asdict"):
-            return {k: self.make_json_compatible(v) for k, v in struct._asdict().items()}
-        elif isinstance(struct, dict):
-            return {k: self.make_json_compatible(v) for k, v in struct.items()}
-        elif isinstance(struct, str):
-            return struct
-        try:
-            return [self.make_json_compatible(v) for v in struct]
-        except TypeError:
-            return struct
-
-
 class SubscriptionHelper:
     """
     A class to help with DSS subscriptions, check if a subscription exists or create a new one
 
     """
 
-    def __init__(self):
-        self.my_rid_output_helper = RIDOutputHelper()
-
     def check_subscription_exists(self, view) -> bool:
         r = get_redis()
         subscription_found = 0
@@ -87,8 +69,7 @@ class SubscriptionHelper:
             request_uuid=request_id,
             subscription_time_delta=subscription_time_delta,
         )
-        subscription_response = self.my_rid_output_helper.make_json_compatible(subscription_r)
-        return subscription_response
+        return subscription_r
 
     def start_ussp_polling(self):
         """
@@ -101,7 +82,7 @@ class SubscriptionHelper:
 @requires_scopes([ARGONSERVER_READ_SCOPE])
 def get_rid_capabilities(request):
     status = RIDCapabilitiesResponse(capabilities=["ASTMRID2022"])
-    return JsonResponse(json.loads(json.dumps(status, cls=EnhancedJSONEncoder)), status=200)
+    return DataclassJsonResponse(status, status=200)
 
 
 @api_view(["PUT"])
@@ -109,7 +90,6 @@ def get_rid_capabilities(request):
 def create_dss_subscription(request, *args, **kwargs):
     """This module takes a lat, lng box from Flight Spotlight and puts in a subscription to the DSS for the ISA"""
 
-    my_rid_output_helper = RIDOutputHelper()
     try:
         view = request.query_params["view"]
         view_port = [float(i) for i in view.split(",")]
@@ -161,8 +141,7 @@ def create_dss_subscription(request, *args, **kwargs):
             "id": request_id,
         }
         status = 400
-    msg = my_rid_output_helper.make_json_compatible(m)
-    return HttpResponse(json.dumps(msg), status=status, content_type=RESPONSE_CONTENT_TYPE)
+    return DataclassJsonResponse(m, status=status)
 
 
 @api_view(["GET"])
@@ -263,14 +242,10 @@ def get_flight_data(request, flight_id):
             registration_number=flight_details["registration_number"],
         )
         flight_details_full = OperatorDetailsSuccessResponse(details=flight_detail)
-        return JsonResponse(
-            json.loads(json.dumps(asdict(flight_details_full))),
-            status=200,
-            mimetype=RESPONSE_CONTENT_TYPE,
-        )
+        return DataclassJsonResponse(flight_details_full, status=200)
     else:
         fd = FlightDetailsNotFoundMessage(message="The requested flight could not be found")
-        return JsonResponse(json.loads(json.dumps(asdict(fd))), status=404, mimetype="application/json")
+        return DataclassJsonResponse(fd, status=404)
 
 
 @api_view(["GET"])
@@ -281,7 +256,6 @@ def get_display_data(request):
     # get the view bounding box
     # get the existing subscription id , if no subscription exists, then reject
     request_id = str(uuid.uuid4())
-    my_rid_output_helper = RIDOutputHelper()
     try:
         view = request.query_params["view"]
         view_port = [float(i) for i in view.split(",")]
@@ -390,16 +364,7 @@ def get_display_data(request):
             rid_flights.append(current_flight)
 
         rid_display_data = RIDDisplayDataResponse(flights=rid_flights, clusters=[])
-        rid_flights_dict = my_rid_output_helper.make_json_compatible(rid_display_data)
-
-        return JsonResponse(
-            {
-                "flights": rid_flights_dict["flights"],
-                "clusters": rid_flights_dict["clusters"],
-            },
-            status=200,
-            content_type=RESPONSE_CONTENT_TYPE,
-        )
+        return DataclassJsonResponse(rid_display_data, status=200)
     else:
         view_port_error = {"message": "A incorrect view port bbox was provided"}
         return JsonResponse(view_port_error, status=400, content_type=RESPONSE_CONTENT_TYPE)
@@ -109,3 +109,18 @@ class FlightDeclarationOperationalIntentStorageDetails:
 # class OperationalIntent(ImplicitDict):
 #     reference: OperationalIntentReference
 #     details: OperationalIntentDetails
+
+
+@dataclass
+class PeerUSSNotificationDeliveryMetrics:
+    """A class to hold the counters and the delivery lag (time between the notification being enqueued and the peer USS accepting it) of peer USS notifications"""
+
+    enqueued: int
+    delivered: int
+    retried: int
+    superseded: int
+    expired: int
+    failed: int
+    mean_lag_ms: Optional[float]
+    p95_lag_ms: Optional[float]
+    max_lag_ms: Optional[float]
@@ -1,8 +1,11 @@
 import json
 import logging
+import time
 import uuid
-from dataclasses import asdict
+from concurrent.futures import ThreadPoolExecutor, wait
+from dataclasses import asdict, replace
 from datetime import datetime
+from functools import partial
 from os import environ as env
 from typing import List, Optional, Union
 
@@ -12,17 +15,23 @@ import shapely.geometry
 import tldextract
 import urllib3
 from dotenv import find_dotenv, load_dotenv
-from pyproj import Proj
 from shapely.geometry import Point, Polygon
 from shapely.ops import unary_union
 
 from auth_helper import dss_auth_helper
 from auth_helper.common import get_redis
 from common.auth_token_audience_helper import generate_audience_from_base_url
-from common.data_definitions import FLIGHT_OPINT_KEY, VALID_OPERATIONAL_INTENT_STATES
+from common.data_definitions import (
+    PEER_OPINT_DETAILS_KEY,
+    VALID_OPERATIONAL_INTENT_STATES,
+)
+from common.projection_helper import buffer_point_in_meters
+from common.simplification_helper import DSS_MAX_POLYGON_VERTICES, cap_polygon_vertices
 from rid_operations import rtree_helper
 
 from .flight_planning_data_definitions import FlightPlanningInjectionData
+from .opint_repository import OperationalIntentsRepository
+from .peer_notification_queue import PeerUSSNotificationQueue
 from .scd_data_definitions import (
     Altitude,
     Circle,
@@ -74,11 +83,43 @@ if ENV_FILE:
 
 logger = logging.getLogger("django")
 
+PEER_USS_QUERY_CONCURRENCY = int(env.get("PEER_USS_QUERY_CONCURRENCY", 8))
+PEER_USS_QUERY_DEADLINE_SECS = float(env.get("PEER_USS_QUERY_DEADLINE_SECS", 10))
+PEER_OPINT_DETAILS_CACHE_TTL_SECS = int(env.get("PEER_OPINT_DETAILS_CACHE_TTL_SECS", 3600))
+# Areas of interest sent to the DSS are buffered by this amount (roughly 10 m) before they are simplified
+AREA_OF_INTEREST_TOLERANCE_DEGREES = 0.0001
+
 
 def is_time_within_time_period(start_time: datetime, end_time: datetime, time_to_check: datetime):
     return time_to_check >= start_time or time_to_check <= end_time
 
 
+def cap_extents_vertices(volumes: List[Union[Volume4D, dict]]) -> List[Union[Volume4D, dict]]:
+    """The extents of a operational intent reference sent to the DSS, a volume whose outline polygon has more than DSS_MAX_POLYGON_VERTICES vertices is replaced
+    by volumes with the same altitudes and times whose outlines cover it. Only the payload is changed, the stored operational intent keeps the exact volumes
+    """
+    all_extents = []
+    for volume in volumes:
+        volume_3d = rtree_helper.get_field(volume, "volume")
+        outline_polygon = rtree_helper.get_field(volume_3d, "outline_polygon")
+        if not outline_polygon or len(rtree_helper.get_field(outline_polygon, "vertices")) <= DSS_MAX_POLYGON_VERTICES:
+            all_extents.append(volume)
+            continue
+        outline = Polygon(
+            [(rtree_helper.get_field(v, "lng"), rtree_helper.get_field(v, "lat")) for v in rtree_helper.get_field(outline_polygon, "vertices")]
+        )
+        for part in cap_polygon_vertices(outline):
+            # The closing vertex is not sent
+            all_coordinates = list(part.exterior.coords)[:-1]
+            if isinstance(volume, dict):
+                part_polygon = {"vertices": [{"lat": lat, "lng": lng} for lng, lat in all_coordinates]}
+                all_extents.append({**volume, "volume": {**volume_3d, "outline_polygon": part_polygon}})
+            else:
+                part_polygon = Plgn(vertices=[LatLngPoint(lat=lat, lng=lng) for lng, lat in all_coordinates])
+                all_extents.append(replace(volume, volume=replace(volume_3d, outline_polygon=part_polygon)))
+    return all_extents
+
+
 class FlightPlanningDataValidator:
     def __init__(self, incoming_flight_planning_data: FlightPlanningInjectionData):
         self.flight_planning_data = incoming_flight_planning_data
@@ -236,26 +277,8 @@ class VolumesConverter:
 
     def __init__(self):
         self.geo_json = {"type": "FeatureCollection", "features": []}
-        self.utm_zone = env.get("UTM_ZONE", "54N")
         self.all_volume_features = []
 
-    def utm_converter(self, shapely_shape: shapely.geometry, inverse: bool = False) -> shapely.geometry.shape:
-        """A helper function to convert from lat / lon to UTM coordinates for buffering. tracks. This is the UTM projection (https://en.wikipedia.org/wiki/Universal_Transverse_Mercator_coordinate_system), we use Zone 54N which encompasses Japan, this zone has to be set for each locale / city. Adapted from https://gis.stackexchange.com/questions/325926/buffering-geometry-with-points-in-wgs84-using-shapely"""
-
-        proj = Proj(proj="utm", zone=self.utm_zone, ellps="WGS84", datum="WGS84")
-
-        geo_interface = shapely_shape.__geo_interface__
-        point_or_polygon = geo_interface["type"]
-        coordinates = geo_interface["coordinates"]
-        if point_or_polygon == "Polygon":
-            new_coordinates = [[proj(*point, inverse=inverse) for point in linring] for linring in coordinates]
-        elif point_or_polygon == "Point":
-            new_coordinates = proj(*coordinates, inverse=inverse)
-        else:
-            raise RuntimeError("Unexpected geo_interface type: {}".format(point_or_polygon))
-
-        return shapely.geometry.shape({"type": point_or_polygon, "coordinates": tuple(new_coordinates)})
-
     def convert_volumes_to_geojson(self, volumes: List[Volume4D]) -> None:
         for volume in volumes:
             geo_json_features = self._convert_volume_to_geojson_feature(volume)
@@ -306,9 +329,7 @@ class VolumesConverter:
             if outline_circle:
                 circle_radius = outline_circle["radius"]["value"]
                 center_point = Point(outline_circle["center"]["lng"], outline_circle["center"]["lat"])
-                utm_center = self.utm_converter(shapely_shape=center_point)
-                buffered_cicle = utm_center.buffer(circle_radius)
-                converted_circle = self.utm_converter(buffered_cicle, inverse=True)
+                converted_circle = buffer_point_in_meters(point=center_point, radius=circle_radius)
                 self.all_volume_features.append(converted_circle)
                 outline_c = shapely.geometry.mapping(converted_circle)
 
@@ -329,11 +350,8 @@ class OperationalIntentReferenceHelper:
     """
 
     def parse_stored_operational_intent_details(self, operation_id: str) -> OperationalIntentStorage:
-        r = get_redis()
-        flight_opint = FLIGHT_OPINT_KEY + str(operation_id)
-
-        op_int_details_raw = r.get(flight_opint)
-        existing_op_int_details_raw = json.loads(op_int_details_raw)
+        my_operational_intents_repository = OperationalIntentsRepository()
+        existing_op_int_details_raw = my_operational_intents_repository.get_operational_intent(operation_id=operation_id)
 
         all_subscribers = existing_op_int_details_raw["success_response"]["subscribers"]
         subscribers = []
@@ -409,11 +427,9 @@ class OperationalIntentReferenceHelper:
         """
         Given a stored flight operational intent, get the details of the operational intent
         """
-        r = get_redis()
-        flight_opint = FLIGHT_OPINT_KEY + str(operation_id)
-        if r.exists(flight_opint):
-            op_int_details_raw = r.get(flight_opint)
-            op_int_details = json.loads(op_int_details_raw)
+        my_operational_intents_repository = OperationalIntentsRepository()
+        op_int_details = my_operational_intents_repository.get_operational_intent(operation_id=operation_id)
+        if op_int_details:
             reference_full = op_int_details["success_response"]["operational_intent_reference"]
             # dss_response_subscribers = op_int_details["success_response"]["subscribers"]
             # argon_server_base_url = env.get("ARGONSERVER_FQDN", "http://localhost:8000")
@@ -568,14 +584,222 @@ class OperationalIntentReferenceHelper:
         return op_int_reference
 
 
+class PeerOperationalIntentDetailsCache:
+    """A shared cache of the operational intent details received from peer USSes, a entry is only returned if it was stored with the OVN that the DSS currently reports"""
+
+    def __init__(self):
+        self.r = get_redis()
+
+    def get_cache_key(self, operational_intent_id: str) -> str:
+        return PEER_OPINT_DETAILS_KEY + str(operational_intent_id)
+
+    def get_operational_intent(self, operational_intent_id: str, ovn: str) -> Optional[dict]:
+        cached_operational_intent_raw = self.r.get(self.get_cache_key(operational_intent_id))
+        if not cached_operational_intent_raw:
+            return None
+        cached_operational_intent = json.loads(cached_operational_intent_raw)
+        if cached_operational_intent["ovn"] != ovn:
+            return None
+        return cached_operational_intent["operational_intent"]
+
+    def set_operational_intent(self, operational_intent_id: str, ovn: str, operational_intent: dict) -> None:
+        if not ovn:
+            return
+        self.r.set(
+            self.get_cache_key(operational_intent_id),
+            json.dumps({"ovn": ovn, "operational_intent": operational_intent}),
+            ex=PEER_OPINT_DETAILS_CACHE_TTL_SECS,
+        )
+
+    def delete_operational_intent(self, operational_intent_id: str) -> None:
+        self.r.delete(self.get_cache_key(operational_intent_id))
+
+
 class SCDOperations:
     def __init__(self):
         self.dss_base_url = env.get("DSS_BASE_URL", "0")
         self.r = get_redis()
 
+    def run_concurrently(self, task, all_arguments: list, deadline: float) -> list:
+        """This method runs the task for every argument in a bounded thread pool and returns the results in the order of the arguments, exceptions raised by a task are re-raised here.
+        If the deadline (a time.monotonic() value) passes before all tasks are done a TimeoutError is raised"""
+        if not all_arguments:
+            return []
+        executor = ThreadPoolExecutor(max_workers=min(PEER_USS_QUERY_CONCURRENCY, len(all_arguments)))
+        try:
+            all_futures = [executor.submit(task, argument) for argument in all_arguments]
+            _, not_done = wait(all_futures, timeout=max(deadline - time.monotonic(), 0))
+            if not_done:
+                raise TimeoutError(
+                    "{num_pending} of {num_tasks} requests did not complete before the deadline".format(
+                        num_pending=len(not_done), num_tasks=len(all_futures)
+                    )
+                )
+            return [future.result() for future in all_futures]
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def get_operational_intent_reference_from_dss(
+        self, operational_intent_id: str, headers: dict, deadline: float
+    ) -> Optional[OperationalIntentReferenceDSSResponse]:
+        """This method gets the details of a single operational intent reference from the DSS"""
+        dss_op_int_details_url = self.dss_base_url + "dss/v1/operational_intent_references/" + operational_intent_id
+        try:
+            op_int_uss_details = requests.get(dss_op_int_details_url, headers=headers, timeout=max(deadline - time.monotonic(), 0.1))
+        except Exception as e:
+            logger.error("Error in getting operational intent details %s" % e)
+            return None
+
+        operational_intent_reference = op_int_uss_details.json()
+        o_i_r = operational_intent_reference["operational_intent_reference"]
+        return OperationalIntentReferenceDSSResponse(
+            id=o_i_r["id"],
+            manager=o_i_r["manager"],
+            uss_availability=o_i_r["uss_availability"],
+            version=o_i_r["version"],
+            state=o_i_r["state"],
+            ovn=o_i_r["ovn"],
+            time_start=o_i_r["time_start"],
+            time_end=o_i_r["time_end"],
+            uss_base_url=o_i_r["uss_base_url"],
+            subscription_id=o_i_r["subscription_id"],
+        )
+
+    def get_operational_intent_details_from_peer_uss(
+        self, operational_intent_reference: OperationalIntentReferenceDSSResponse, uss_headers: dict, deadline: float
+    ) -> Optional[dict]:
+        """This method queries the managing USS for the details of a operational intent, it returns the raw operational intent or None if the USS returned an error"""
+        current_uss_base_url = operational_intent_reference.uss_base_url
+        uss_operational_intent_url = current_uss_base_url + "/uss/v1/operational_intents/" + operational_intent_reference.id
+
+        logger.debug("Querying USS: {current_uss_base_url}".format(current_uss_base_url=current_uss_base_url))
+        try:
+            uss_operational_intent_request = requests.get(
+                uss_operational_intent_url, headers=uss_headers, timeout=max(deadline - time.monotonic(), 0.1)
+            )
+        except urllib3.exceptions.NameResolutionError:
+            logger.info("URLLIB error")
+            raise ConnectionError("Could not reach peer USS.. ")
+
+        except (
+            requests.exceptions.ConnectTimeout,
+            requests.exceptions.HTTPError,
+            requests.exceptions.ReadTimeout,
+            requests.exceptions.Timeout,
+            requests.exceptions.ConnectionError,
+        ) as e:
+            logger.error("Connection error details..")
+            logger.error(e)
+            logger.error(
+                "Error in getting operational intent id {uss_op_int_id} details from uss with base url {uss_base_url}".format(
+                    uss_op_int_id=operational_intent_reference.id,
+                    uss_base_url=current_uss_base_url,
+                )
+            )
+            logger.info("Raising connection Error 1")
+            raise ConnectionError("Could not reach peer USS..")
+
+        # Verify status of the response from the USS
+        if uss_operational_intent_request.status_code == 200:
+            # Request was successful
+            operational_intent_details_json = uss_operational_intent_request.json()
+            return operational_intent_details_json["operational_intent"]
+        # The attempt to get data from the USS in the network failed
+        elif uss_operational_intent_request.status_code in [
+            401,
+            400,
+            404,
+            500,
+        ]:
+            logger.error(
+                "Error in querying peer USS about operational intent (ID: {uss_op_int_id}) details from uss with base url {uss_base_url}".format(
+                    uss_op_int_id=operational_intent_reference.id,
+                    uss_base_url=current_uss_base_url,
+                )
+            )
+        return None
+
+    def parse_uss_operational_intent_details(self, op_int_ref: dict, op_int_det: dict) -> OperationalIntentDetailsUSSResponse:
+        my_op_int_ref_helper = OperationalIntentReferenceHelper()
+        op_int_reference: OperationalIntentReferenceDSSResponse = my_op_int_ref_helper.parse_operational_intent_reference_from_dss(
+            operational_intent_reference=op_int_ref
+        )
+        all_volumes = op_int_det["volumes"]
+        all_v4d = []
+        for cur_volume in all_volumes:
+            cur_v4d = my_op_int_ref_helper.parse_volume_to_volume4D(volume=cur_volume)
+            all_v4d.append(cur_v4d)
+
+        all_off_nominal_volumes = op_int_det["off_nominal_volumes"]
+        all_off_nominal_v4d = []
+        for cur_off_nominal_volume in all_off_nominal_volumes:
+            cur_off_nominal_v4d = my_op_int_ref_helper.parse_volume_to_volume4D(volume=cur_off_nominal_volume)
+            all_off_nominal_v4d.append(cur_off_nominal_v4d)
+
+        op_int_detail = OperationalIntentUSSDetails(
+            volumes=all_v4d,
+            priority=op_int_det["priority"],
+            off_nominal_volumes=all_off_nominal_v4d,
+        )
+
+        return OperationalIntentDetailsUSSResponse(reference=op_int_reference, details=op_int_detail)
+
+    def get_areas_of_interest(self, volumes: List[Volume4D]) -> List[Volume4D]:
+        """This method computes a small set of volumes that cover all the volumes of a operational intent so that the DSS can be queried once per set rather than
+        once per volume. Volumes that touch or overlap are merged, each area of interest is the (slightly buffered and simplified) outline of the merged shape
+        with the altitude and time envelope of the volumes in it"""
+        all_volume_shapes = []
+        for volume in volumes:
+            my_volume_converter = VolumesConverter()
+            my_volume_converter.convert_volumes_to_geojson(volumes=[volume])
+            all_volume_shapes.append(my_volume_converter.get_minimum_rotated_rectangle())
+
+        # Buffer before merging so that consecutive segments that only touch end up in the same area and the simplified outline still covers the volumes
+        union = unary_union([volume_shape.buffer(AREA_OF_INTEREST_TOLERANCE_DEGREES) for volume_shape in all_volume_shapes])
+        all_parts = list(union.geoms) if hasattr(union, "geoms") else [union]
+
+        all_areas_of_interest = []
+        for part in all_parts:
+            outline = part.simplify(AREA_OF_INTEREST_TOLERANCE_DEGREES / 2, preserve_topology=True)
+            part_volumes = [volume for volume, volume_shape in zip(volumes, all_volume_shapes) if part.intersects(volume_shape)]
+
+            part_volumes_3d = [rtree_helper.get_field(volume, "volume") for volume in part_volumes]
+
+            altitude_lower = min((rtree_helper.get_field(v, "altitude_lower") for v in part_volumes_3d), key=rtree_helper.get_altitude_value)
+            altitude_upper = max((rtree_helper.get_field(v, "altitude_upper") for v in part_volumes_3d), key=rtree_helper.get_altitude_value)
+            time_start = min((rtree_helper.get_field(v, "time_start") for v in part_volumes), key=lambda t: arrow.get(rtree_helper.get_time_value(t)))
+            time_end = max((rtree_helper.get_field(v, "time_end") for v in part_volumes), key=lambda t: arrow.get(rtree_helper.get_time_value(t)))
+
+            # Drop the closing vertex, the DSS expects an open ring
+            vertices = [LatLngPoint(lat=lat, lng=lng) for lng, lat in list(outline.exterior.coords)[:-1]]
+            volume3D = Volume3D(
+                outline_polygon=Plgn(vertices=vertices),
+                altitude_lower=Altitude(
+                    value=rtree_helper.get_altitude_value(altitude_lower),
+                    reference=rtree_helper.get_field(altitude_lower, "reference"),
+                    units=rtree_helper.get_field(altitude_lower, "units"),
+                ),
+                altitude_upper=Altitude(
+                    value=rtree_helper.get_altitude_value(altitude_upper),
+                    reference=rtree_helper.get_field(altitude_upper, "reference"),
+                    units=rtree_helper.get_field(altitude_upper, "units"),
+                ),
+            )
+            all_areas_of_interest.append(
+                Volume4D(
+                    volume=volume3D,
+                    time_start=Time(format="RFC3339", value=rtree_helper.get_time_value(time_start)),
+                    time_end=Time(format="RFC3339", value=rtree_helper.get_time_value(time_end)),
+                )
+            )
+
+        return all_areas_of_interest
+
     def get_nearby_operational_intents(self, volumes: List[Volume4D]) -> List[OperationalIntentDetailsUSSResponse]:
         # This method checks the USS network for any other volume in the airspace and queries the individual USS for data
+        # The reference lookups in the DSS and the detail requests to peer USSes are run concurrently, bounded by PEER_USS_QUERY_CONCURRENCY and PEER_USS_QUERY_DEADLINE_SECS
 
+        deadline = time.monotonic() + PEER_USS_QUERY_DEADLINE_SECS
         all_uss_op_int_details = []
         auth_token = self.get_auth_token()
         # Query the DSS for operational intentns
@@ -586,13 +810,16 @@ class SCDOperations:
         }
 
         argon_server_base_url = env.get("ARGONSERVER_FQDN", "http://localhost:8000")
-        my_op_int_ref_helper = OperationalIntentReferenceHelper()
-        all_uss_operational_intent_details = []
+        operational_intent_references = []
+        all_areas_of_interest = self.get_areas_of_interest(volumes=volumes)
+        logger.info(
+            "Querying {num_areas} area(s) of interest covering {num_volumes} volume(s)".format(
+                num_areas=len(all_areas_of_interest), num_volumes=len(volumes)
+            )
+        )
 
-        for volume in volumes:
-            op_int_details_retrieved = False
-            operational_intent_references = []
-            area_of_interest = QueryOperationalIntentPayload(area_of_interest=volume)
+        for area_of_interest_volume in all_areas_of_interest:
+            area_of_interest = QueryOperationalIntentPayload(area_of_interest=area_of_interest_volume)
             logger.info("Querying DSS for operational intents in the area..")
             logger.debug("Area of interest {area_of_interest}".format(area_of_interest=area_of_interest))
             try:
@@ -600,6 +827,7 @@ class SCDOperations:
                     query_op_int_url,
                     json=json.loads(json.dumps(asdict(area_of_interest))),
                     headers=headers,
+                    timeout=max(deadline - time.monotonic(), 0.1),
                 )
             except Exception as re:
                 logger.error("Error in getting operational intent for the volume %s " % re)
@@ -609,145 +837,106 @@ class SCDOperations:
                 logger.debug(
                     "DSS Response {dss_operational_intent_references}".format(dss_operational_intent_references=dss_operational_intent_references)
                 )
-                operational_intent_references = dss_operational_intent_references["operational_intent_references"]
-
-            # Query the operational intent reference details
-            for operational_intent_reference_detail in operational_intent_references:
-                # Get the USS URL endpoint
-                dss_op_int_details_url = self.dss_base_url + "dss/v1/operational_intent_references/" + operational_intent_reference_detail["id"]
-                # get new auth token for USS
-                try:
-                    op_int_uss_details = requests.get(dss_op_int_details_url, headers=headers)
-                except Exception as e:
-                    logger.error("Error in getting operational intent details %s" % e)
-                else:
-                    operational_intent_reference = op_int_uss_details.json()
-                    o_i_r = operational_intent_reference["operational_intent_reference"]
-                    o_i_r_formatted = OperationalIntentReferenceDSSResponse(
-                        id=o_i_r["id"],
-                        manager=o_i_r["manager"],
-                        uss_availability=o_i_r["uss_availability"],
-                        version=o_i_r["version"],
-                        state=o_i_r["state"],
-                        ovn=o_i_r["ovn"],
-                        time_start=o_i_r["time_start"],
-                        time_end=o_i_r["time_end"],
-                        uss_base_url=o_i_r["uss_base_url"],
-                        subscription_id=o_i_r["subscription_id"],
-                    )
-                    # if o_i_r_formatted.uss_base_url != argon_server_base_url:
-                    all_uss_operational_intent_details.append(o_i_r_formatted)
-
-            for current_uss_operational_intent_detail in all_uss_operational_intent_details:
-                # check the USS for flight volume by using the URL to see if this is stored in Argon Server, DSS will return all intent details including our own
-                current_uss_base_url = current_uss_operational_intent_detail.uss_base_url
-                if current_uss_base_url == argon_server_base_url:
-                    # The opint is from Argon Server itself
-                    # No need to query peer USS, just update the ovn and process the volume locally
-                    r = get_redis()
-                    opint_flightref = "opint_flightref." + str(current_uss_operational_intent_detail.id)
-                    opint_ref_raw = r.get(opint_flightref)
-                    opint_ref = json.loads(opint_ref_raw)
-                    opint_id = opint_ref["operation_id"]
-                    flight_opint = FLIGHT_OPINT_KEY + opint_id
-
-                    if r.exists(flight_opint):
-                        op_int_details_raw = r.get(flight_opint)
-                        op_int_details = json.loads(op_int_details_raw)
-                        op_int_ref = op_int_details["success_response"]["operational_intent_reference"]
-                        op_int_det = op_int_details["operational_intent_details"]
-                        # Update the ovn
-                        op_int_ref["ovn"] = current_uss_operational_intent_detail.ovn
-
-                    op_int_details_retrieved = True
-
-                else:  # This operational intent details is from a peer uss, need to query peer USS
-                    uss_audience = generate_audience_from_base_url(base_url=current_uss_base_url)
-
-                    uss_auth_token = self.get_auth_token(audience=uss_audience)
-                    logger.debug("Auth Token {uss_auth_token}".format(uss_auth_token=uss_auth_token))
-                    uss_headers = {
-                        "Content-Type": "application/json",
-                        "Authorization": "Bearer " + uss_auth_token["access_token"],
-                    }
-                    uss_operational_intent_url = current_uss_base_url + "/uss/v1/operational_intents/" + current_uss_operational_intent_detail.id
-
-                    logger.debug("Querying USS: {current_uss_base_url}".format(current_uss_base_url=current_uss_base_url))
-                    try:
-                        uss_operational_intent_request = requests.get(uss_operational_intent_url, headers=uss_headers)
-                    except urllib3.exceptions.NameResolutionError:
-                        logger.info("URLLIB error")
-                        raise ConnectionError("Could not reach peer USS.. ")
-
-                    except (
-                        requests.exceptions.ConnectTimeout,
-                        requests.exceptions.HTTPError,
-                        requests.exceptions.ReadTimeout,
-                        requests.exceptions.Timeout,
-                        requests.exceptions.ConnectionError,
-                    ) as e:
-                        logger.error("Connection error details..")
-                        logger.error(e)
-                        logger.error(
-                            "Error in getting operational intent id {uss_op_int_id} details from uss with base url {uss_base_url}".format(
-                                uss_op_int_id=current_uss_operational_intent_detail.id,
-                                uss_base_url=current_uss_base_url,
-                            )
-                        )
-                        op_int_details_retrieved = False
-                        logger.info("Raising connection Error 1")
-                        raise ConnectionError("Could not reach peer USS..")
-
-                    else:
-                        # Verify status of the response from the USS
-                        if uss_operational_intent_request.status_code == 200:
-                            # Request was successful
-                            operational_intent_details_json = uss_operational_intent_request.json()
-                            op_int_details_retrieved = True
-                            # outline_polygon = None
-                            # outline_circle = None
-
-                            op_int_det = operational_intent_details_json["operational_intent"]["details"]
-                            op_int_ref = operational_intent_details_json["operational_intent"]["reference"]
-                        # The attempt to get data from the USS in the network failed
-                        elif uss_operational_intent_request.status_code in [
-                            401,
-                            400,
-                            404,
-                            500,
-                        ]:
-                            logger.error(
-                                "Error in querying peer USS about operational intent (ID: {uss_op_int_id}) details from uss with base url {uss_base_url}".format(
-                                    uss_op_int_id=current_uss_operational_intent_detail.id,
-                                    uss_base_url=current_uss_base_url,
-                                )
-                            )
-
-                if op_int_details_retrieved:
-                    op_int_reference: OperationalIntentReferenceDSSResponse = my_op_int_ref_helper.parse_operational_intent_reference_from_dss(
-                        operational_intent_reference=op_int_ref
-                    )
-                    my_opint_ref_helper = OperationalIntentReferenceHelper()
-                    all_volumes = op_int_det["volumes"]
-                    all_v4d = []
-                    for cur_volume in all_volumes:
-                        cur_v4d = my_opint_ref_helper.parse_volume_to_volume4D(volume=cur_volume)
-                        all_v4d.append(cur_v4d)
-
-                    all_off_nominal_volumes = op_int_det["off_nominal_volumes"]
-                    all_off_nominal_v4d = []
-                    for cur_off_nominal_volume in all_off_nominal_volumes:
-                        cur_off_nominal_v4d = my_opint_ref_helper.parse_volume_to_volume4D(volume=cur_off_nominal_volume)
-                        all_off_nominal_v4d.append(cur_off_nominal_v4d)
-
-                    op_int_detail = OperationalIntentUSSDetails(
-                        volumes=all_v4d,
-                        priority=op_int_det["priority"],
-                        off_nominal_volumes=all_off_nominal_v4d,
-                    )
+                operational_intent_references.extend(dss_operational_intent_references["operational_intent_references"])
+
+        # The same operational intent is returned for every area of interest it intersects, only retrieve it once
+        unique_operational_intent_reference_ids = list(
+            dict.fromkeys(operational_intent_reference_detail["id"] for operational_intent_reference_detail in operational_intent_references)
+        )
+
+        # Query the operational intent reference details
+        try:
+            all_uss_operational_intent_details = self.run_concurrently(
+                task=partial(self.get_operational_intent_reference_from_dss, headers=headers, deadline=deadline),
+                all_arguments=unique_operational_intent_reference_ids,
+                deadline=deadline,
+            )
+        except TimeoutError as te:
+            logger.error("Error in getting operational intent details from the DSS %s" % te)
+            raise ConnectionError("Could not retrieve operational intent references from the DSS in time")
+        all_uss_operational_intent_details = [o_i_r for o_i_r in all_uss_operational_intent_details if o_i_r is not None]
+
+        my_operational_intents_repository = OperationalIntentsRepository()
+        peer_uss_operational_intent_details = []
+        for current_uss_operational_intent_detail in all_uss_operational_intent_details:
+            # check the USS for flight volume by using the URL to see if this is stored in Argon Server, DSS will return all intent details including our own
+            if current_uss_operational_intent_detail.uss_base_url == argon_server_base_url:
+                # The opint is from Argon Server itself
+                # No need to query peer USS, just update the ovn and process the volume locally
+                operation_id = my_operational_intents_repository.get_operation_id(operational_intent_id=current_uss_operational_intent_detail.id)
+                op_int_details = my_operational_intents_repository.get_operational_intent(operation_id=operation_id) if operation_id else None
+
+                if op_int_details:
+                    op_int_ref = op_int_details["success_response"]["operational_intent_reference"]
+                    op_int_det = op_int_details["operational_intent_details"]
+                    # Update the ovn
+                    op_int_ref["ovn"] = current_uss_operational_intent_detail.ovn
+                    all_uss_op_int_details.append(self.parse_uss_operational_intent_details(op_int_ref=op_int_ref, op_int_det=op_int_det))
+            else:  # This operational intent details is from a peer uss, need to query peer USS
+                peer_uss_operational_intent_details.append(current_uss_operational_intent_detail)
+
+        # Peer operational intents whose OVN has not changed since they were last retrieved are served from the cache
+        my_peer_opint_details_cache = PeerOperationalIntentDetailsCache()
+        all_peer_operational_intents = []
+        operational_intent_references_to_fetch = []
+        for current_uss_operational_intent_detail in peer_uss_operational_intent_details:
+            cached_operational_intent = my_peer_opint_details_cache.get_operational_intent(
+                operational_intent_id=current_uss_operational_intent_detail.id, ovn=current_uss_operational_intent_detail.ovn
+            )
+            if cached_operational_intent:
+                all_peer_operational_intents.append(cached_operational_intent)
+            else:
+                operational_intent_references_to_fetch.append(current_uss_operational_intent_detail)
+        logger.info(
+            "{num_cached} peer operational intents served from cache, {num_to_fetch} to be queried".format(
+                num_cached=len(all_peer_operational_intents), num_to_fetch=len(operational_intent_references_to_fetch)
+            )
+        )
+
+        # Get one token per peer USS rather than one per operational intent
+        all_uss_headers = {}
+        for current_uss_operational_intent_detail in operational_intent_references_to_fetch:
+            current_uss_base_url = current_uss_operational_intent_detail.uss_base_url
+            if current_uss_base_url in all_uss_headers:
+                continue
+            uss_audience = generate_audience_from_base_url(base_url=current_uss_base_url)
+            uss_auth_token = self.get_auth_token(audience=uss_audience)
+            logger.debug("Auth Token {uss_auth_token}".format(uss_auth_token=uss_auth_token))
+            all_uss_headers[current_uss_base_url] = {
+                "Content-Type": "application/json",
+                "Authorization": "Bearer " + uss_auth_token["access_token"],
+            }
 
-                    uss_op_int_details = OperationalIntentDetailsUSSResponse(reference=op_int_reference, details=op_int_detail)
-                    all_uss_op_int_details.append(uss_op_int_details)
+        try:
+            all_fetched_operational_intents = self.run_concurrently(
+                task=lambda operational_intent_reference: self.get_operational_intent_details_from_peer_uss(
+                    operational_intent_reference=operational_intent_reference,
+                    uss_headers=all_uss_headers[operational_intent_reference.uss_base_url],
+                    deadline=deadline,
+                ),
+                all_arguments=operational_intent_references_to_fetch,
+                deadline=deadline,
+            )
+        except TimeoutError as te:
+            logger.error("Error in getting operational intent details from peer USS %s" % te)
+            raise ConnectionError("Could not reach peer USS..")
+
+        for operational_intent_reference, fetched_operational_intent in zip(operational_intent_references_to_fetch, all_fetched_operational_intents):
+            if fetched_operational_intent:
+                my_peer_opint_details_cache.set_operational_intent(
+                    operational_intent_id=operational_intent_reference.id,
+                    ovn=operational_intent_reference.ovn,
+                    operational_intent=fetched_operational_intent,
+                )
+                all_peer_operational_intents.append(fetched_operational_intent)
+
+        for peer_operational_intent in all_peer_operational_intents:
+            all_uss_op_int_details.append(
+                self.parse_uss_operational_intent_details(
+                    op_int_ref=peer_operational_intent["reference"],
+                    op_int_det=peer_operational_intent["details"],
+                )
+            )
 
         return all_uss_op_int_details
 
@@ -773,7 +962,7 @@ class SCDOperations:
 
         return auth_token
 
-    def delete_operational_intent(self, dss_operational_intent_ref_id: str, ovn: str) -> DeleteOperationalIntentResponse:
+    def delete_operational_intent(self, dss_operational_intent_ref_id: str, ovn: str, timeout: float = None) -> DeleteOperationalIntentResponse:
         auth_token = self.get_auth_token()
 
         dss_opint_delete_url = self.dss_base_url + "dss/v1/operational_intent_references/" + dss_operational_intent_ref_id + "/" + ovn
@@ -789,6 +978,7 @@ class SCDOperations:
             dss_opint_delete_url,
             json=json.loads(json.dumps(asdict(delete_payload))),
             headers=headers,
+            timeout=timeout,
         )
 
         dss_response = dss_r.json()
@@ -877,10 +1067,15 @@ class SCDOperations:
             my_volume_converter = VolumesConverter()
             my_volume_converter.convert_volumes_to_geojson(volumes=operational_intent_volumes)
             minimum_rotated_rect = my_volume_converter.get_minimum_rotated_rectangle()
+            altitude_lower, altitude_upper, time_start, time_end = rtree_helper.get_volumes_altitude_time_extents(volumes=operational_intent_volumes)
             cur_op_int_details = OpInttoCheckDetails(
                 shape=minimum_rotated_rect,
                 ovn=uss_op_int_detail.reference.ovn,
                 id=uss_op_int_detail.reference.id,
+                altitude_lower=altitude_lower,
+                altitude_upper=altitude_upper,
+                time_start=time_start,
+                time_end=time_end,
             )
             all_opints_to_check.append(cur_op_int_details)
 
@@ -889,23 +1084,30 @@ class SCDOperations:
     def notify_peer_uss_of_created_updated_operational_intent(
         self,
         uss_base_url: str,
-        notification_payload: NotifyPeerUSSPostPayload,
+        notification_payload: dict,
         audience: str,
-    ):
-        """This method posts operational intent details to peer USS via a POST request to /uss/v1/operational_intents"""
+        timeout: float = None,
+    ) -> USSNotificationResponse:
+        """This method posts operational intent details (a NotifyPeerUSSPostPayload as a dictionary) to peer USS via a POST request to /uss/v1/operational_intents, it is called by the
+        deliver_peer_uss_notification task. If the peer cannot be reached or does not respond within the timeout a status of 0 is returned"""
         auth_token = self.get_auth_token(audience=audience)
 
         notification_url = uss_base_url + "/uss/v1/operational_intents"
         headers = {
             "Content-Type": "application/json",
-            "Authorization": "Bearer " + auth_token["access_token"],
+            "Authorization": "Bearer " + auth_token.get("access_token", ""),
         }
 
-        uss_r = requests.post(
-            notification_url,
-            json=json.loads(json.dumps(asdict(notification_payload))),
-            headers=headers,
-        )
+        try:
+            uss_r = requests.post(
+                notification_url,
+                json=notification_payload,
+                headers=headers,
+                timeout=timeout,
+            )
+        except requests.exceptions.RequestException as e:
+            logger.info("Error in notifying peer USS at {endpoint}: {error}".format(endpoint=notification_url, error=e))
+            return USSNotificationResponse(status=0, message=CommonDSS4xxResponse(message="Error in notification"))
 
         uss_r_status_code = uss_r.status_code
 
@@ -931,7 +1133,9 @@ class SCDOperations:
         operational_intent_reference: OperationalIntentReferenceDSSResponse,
         operational_intent_id: str,
     ):
-        """This method sends a notification to all the subscribers of the operational intent reference in the DSS"""
+        """This method queues a notification to all the subscribers of the operational intent reference in the DSS, the notifications are delivered asynchronously so that the response to the
+        caller is not held up by slow or unavailable peers"""
+        my_notification_queue = PeerUSSNotificationQueue()
         for subscriber in all_subscribers:
             domain_to_check = tldextract.extract(subscriber.uss_base_url)
             if domain_to_check.subdomain != "dummy" and domain_to_check.domain != "uss":
@@ -943,7 +1147,7 @@ class SCDOperations:
                 audience = generate_audience_from_base_url(base_url=subscriber.uss_base_url)
 
                 if audience != "host.docker.internal":
-                    self.notify_peer_uss_of_created_updated_operational_intent(
+                    my_notification_queue.enqueue_notification(
                         uss_base_url=subscriber.uss_base_url, notification_payload=notification_payload, audience=audience
                     )
 
@@ -990,9 +1194,14 @@ class SCDOperations:
         my_ind_volumes_converter = VolumesConverter()
         my_ind_volumes_converter.convert_volumes_to_geojson(volumes=extents)
         ind_volumes_polygon = my_ind_volumes_converter.get_minimum_rotated_rectangle()
+        altitude_lower, altitude_upper, time_start, time_end = rtree_helper.get_volumes_altitude_time_extents(volumes=extents)
         is_conflicted = rtree_helper.check_polygon_intersection(
             op_int_details=all_existing_operational_intent_details,
             polygon_to_check=ind_volumes_polygon,
+            altitude_lower=altitude_lower,
+            altitude_upper=altitude_upper,
+            time_start=time_start,
+            time_end=time_end,
         )
 
         return is_conflicted
@@ -1057,7 +1266,7 @@ class SCDOperations:
 
         # Initialize the update request with empty airspace key
         operational_intent_update_payload = OperationalIntentUpdateRequest(
-            extents=extents,
+            extents=cap_extents_vertices(extents),
             state=new_state,
             uss_base_url=argon_server_base_url,
             subscription_id=subscription_id,
@@ -1193,7 +1402,7 @@ class SCDOperations:
         argon_server_base_url = env.get("ARGONSERVER_FQDN", "http://localhost:8000")
         implicit_subscription_parameters = ImplicitSubscriptionParameters(uss_base_url=argon_server_base_url)
         operational_intent_reference = OperationalIntentReference(
-            extents=volumes,
+            extents=cap_extents_vertices(volumes),
             key=airspace_keys,
             state=state,
             uss_base_url=argon_server_base_url,
@@ -1259,9 +1468,14 @@ class SCDOperations:
                 deconflicted = True
             else:
                 airspace_keys.append(management_key)
+                altitude_lower, altitude_upper, time_start, time_end = rtree_helper.get_volumes_altitude_time_extents(volumes=volumes)
                 is_conflicted = rtree_helper.check_polygon_intersection(
                     op_int_details=all_existing_operational_intent_details,
                     polygon_to_check=ind_volumes_polygon,
+                    altitude_lower=altitude_lower,
+                    altitude_upper=altitude_upper,
+                    time_start=time_start,
+                    time_end=time_end,
                 )
                 deconflicted = False if is_conflicted else True
         else:
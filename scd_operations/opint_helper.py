@@ -13,6 +13,7 @@ from common.database_operations import (
 
 from . import dss_scd_helper
 from .data_definitions import FlightDeclarationOperationalIntentStorageDetails
+from .peer_notification_queue import PeerUSSNotificationQueue
 from .scd_data_definitions import (
     NotifyPeerUSSPostPayload,
     OperationalIntentSubmissionStatus,
@@ -142,10 +143,9 @@ class DSSOperationalIntentsCreator:
         return op_int_submission
 
     def notify_peer_uss(self, uss_base_url: str, notification_payload: NotifyPeerUSSPostPayload):
-        """This method submits a flight declaration as a operational intent to the DSS"""
-        # Get the Flight Declaration object
+        """This method queues a notification of the created / updated operational intent for delivery to a peer USS"""
 
-        my_scd_dss_helper = dss_scd_helper.SCDOperations()
+        my_notification_queue = PeerUSSNotificationQueue()
 
         try:
             ext = tldextract.extract(uss_base_url)
@@ -162,7 +162,7 @@ class DSSOperationalIntentsCreator:
 
         if ext.subdomain != "dummy" and ext.domain != "uss":
             # Do not notify dummy.uss
-            my_scd_dss_helper.notify_peer_uss_of_created_updated_operational_intent(
+            my_notification_queue.enqueue_notification(
                 uss_base_url=uss_base_url,
                 notification_payload=notification_payload,
                 audience=uss_audience,
@@ -0,0 +1,295 @@
+import json
+import logging
+import zlib
+from dataclasses import asdict, dataclass, is_dataclass
+from datetime import timedelta
+from typing import Dict, List, Optional, Union
+
+from redis.exceptions import ResponseError
+
+from auth_helper.common import get_redis
+from common.data_definitions import FLIGHT_OPINT_KEY, OPINT_FLIGHTREF_KEY
+from rid_operations import rtree_helper
+
+from .scd_data_definitions import OperationalIntentStorage
+
+logger = logging.getLogger("django")
+
+# The scalar fields that are kept in the hash next to the compressed details, these are read without decompressing the details and take precedence over the values in them
+SUMMARY_FIELDS = [
+    "operational_intent_id",
+    "ovn",
+    "version",
+    "state",
+    "bounds",
+    "start_time",
+    "end_time",
+    "alt_max",
+    "alt_min",
+]
+DETAILS_FIELD = "details"
+# Legacy operational intents were written with the end of the subscription as their expiry, this is used for the ones that were stored without one
+LEGACY_OPERATIONAL_INTENT_EXPIRES_IN = timedelta(hours=3)
+
+
+@dataclass
+class OperationalIntentStorageSummary:
+    """The frequently read fields of a operational intent stored in Argon Server, these are stored uncompressed and can be read without loading the full details"""
+
+    operation_id: str
+    operational_intent_id: str
+    ovn: str
+    version: int
+    state: str
+    bounds: str
+    start_time: str
+    end_time: str
+    alt_max: float
+    alt_min: float
+
+
+class OperationalIntentsRepository:
+    """This class stores the operational intents created by Argon Server. Every operational intent is a Redis hash at flight_opint.<operation_id> holding the
+    frequently read scalar fields (see OperationalIntentStorageSummary) and the full OperationalIntentStorage as zlib compressed JSON. The mapping from the DSS
+    operational intent id to the operation id is kept at opint_flightref.<operational_intent_id>. Writes and deletes also update the local operational intents index.
+    Keys written in the legacy layout are converted when they are read or with the migrate_legacy_operational_intents command.
+    """
+
+    def __init__(self):
+        self.r = get_redis()
+        self.r_binary = get_redis(decode_responses=False)
+
+    def get_key(self, operation_id: str) -> str:
+        return FLIGHT_OPINT_KEY + str(operation_id)
+
+    def compress_details(self, details: dict) -> bytes:
+        return zlib.compress(json.dumps(details, separators=(",", ":")).encode("utf-8"))
+
+    def decompress_details(self, details_compressed: bytes) -> dict:
+        return json.loads(zlib.decompress(details_compressed))
+
+    def operational_intent_exists(self, operation_id: str) -> bool:
+        return bool(self.r.exists(self.get_key(operation_id)))
+
+    def set_operational_intent(
+        self,
+        operation_id: str,
+        operational_intent: Union[OperationalIntentStorage, dict],
+        expires_in: timedelta,
+    ) -> None:
+        """Store a created or updated operational intent, the OperationalIntentStorage (or a dictionary with the same structure) is stored in full and the summary fields are extracted from it"""
+        details = asdict(operational_intent) if is_dataclass(operational_intent) else operational_intent
+        operational_intent_reference = details["success_response"]["operational_intent_reference"]
+        mapping = {
+            "operational_intent_id": operational_intent_reference["id"],
+            "ovn": operational_intent_reference["ovn"] or "",
+            "version": operational_intent_reference["version"] or 0,
+            "state": operational_intent_reference["state"],
+            "bounds": details["bounds"],
+            "start_time": details["start_time"],
+            "end_time": details["end_time"],
+            "alt_max": details["alt_max"],
+            "alt_min": details["alt_min"],
+            DETAILS_FIELD: self.compress_details(details),
+        }
+        flight_opint = self.get_key(operation_id)
+        pipe = self.r.pipeline(transaction=True)
+        pipe.delete(flight_opint)
+        pipe.hset(flight_opint, mapping=mapping)
+        pipe.expire(flight_opint, expires_in)
+        pipe.execute()
+
+        rtree_helper.get_local_operational_intents_index().upsert_operational_intent(
+            operation_id=str(operation_id),
+            bounds=details["bounds"],
+            start_time=details["start_time"],
+            end_time=details["end_time"],
+            expires_in=expires_in,
+        )
+
+    def parse_summary(self, operation_id: str, summary_raw: List[Optional[str]]) -> Optional[OperationalIntentStorageSummary]:
+        summary = dict(zip(SUMMARY_FIELDS, summary_raw))
+        if summary["operational_intent_id"] is None:
+            return None
+        return OperationalIntentStorageSummary(
+            operation_id=str(operation_id),
+            operational_intent_id=summary["operational_intent_id"],
+            ovn=summary["ovn"] or None,
+            version=int(summary["version"]),
+            state=summary["state"],
+            bounds=summary["bounds"],
+            start_time=summary["start_time"],
+            end_time=summary["end_time"],
+            alt_max=float(summary["alt_max"]),
+            alt_min=float(summary["alt_min"]),
+        )
+
+    def get_operational_intent_summary(self, operation_id: str) -> Optional[OperationalIntentStorageSummary]:
+        """Get the summary fields of a operational intent without reading the details, None is returned if the operational intent does not exist"""
+        try:
+            summary_raw = self.r.hmget(self.get_key(operation_id), SUMMARY_FIELDS)
+        except ResponseError:
+            if not self.migrate_legacy_operational_intent(operation_id=operation_id):
+                raise
+            summary_raw = self.r.hmget(self.get_key(operation_id), SUMMARY_FIELDS)
+        return self.parse_summary(operation_id=operation_id, summary_raw=summary_raw)
+
+    def get_operational_intent_summaries(self, operation_ids: List[str]) -> Dict[str, OperationalIntentStorageSummary]:
+        """Get the summaries of several operational intents in a single round trip, operational intents that do not exist are left out"""
+        pipe = self.r.pipeline(transaction=False)
+        for operation_id in operation_ids:
+            pipe.hmget(self.get_key(operation_id), SUMMARY_FIELDS)
+        all_summaries = {}
+        for operation_id, summary_raw in zip(operation_ids, pipe.execute(raise_on_error=False)):
+            if isinstance(summary_raw, ResponseError):
+                summary = self.get_operational_intent_summary(operation_id=operation_id)
+            else:
+                summary = self.parse_summary(operation_id=operation_id, summary_raw=summary_raw)
+            if summary:
+                all_summaries[operation_id] = summary
+        return all_summaries
+
+    def get_operational_intent(self, operation_id: str) -> Optional[dict]:
+        """Get the full stored operational intent as a dictionary with the structure of OperationalIntentStorage, the summary fields in the hash are applied
+        over the decompressed details so that updates made with update_operational_intent_reference are reflected"""
+        try:
+            summary_raw = self.r_binary.hmget(self.get_key(operation_id), SUMMARY_FIELDS + [DETAILS_FIELD])
+        except ResponseError:
+            if not self.migrate_legacy_operational_intent(operation_id=operation_id):
+                raise
+            summary_raw = self.r_binary.hmget(self.get_key(operation_id), SUMMARY_FIELDS + [DETAILS_FIELD])
+        details_compressed = summary_raw.pop()
+        if details_compressed is None:
+            return None
+        summary = self.parse_summary(
+            operation_id=operation_id, summary_raw=[value.decode("utf-8") if value is not None else None for value in summary_raw]
+        )
+        details = self.decompress_details(details_compressed)
+        operational_intent_reference = details["success_response"]["operational_intent_reference"]
+        operational_intent_reference["ovn"] = summary.ovn
+        operational_intent_reference["version"] = summary.version
+        operational_intent_reference["state"] = summary.state
+        return details
+
+    def update_operational_intent_reference(
+        self, operation_id: str, ovn: str = None, version: int = None, state: str = None, expires_in: timedelta = None
+    ) -> bool:
+        """Update the OVN, version and / or state of a stored operational intent after the reference has been updated in the DSS, only the changed fields of the hash
+        are written and the compressed details are left as they are. If expires_in is provided the expiry of the operational intent is extended. Returns False if the
+        operational intent does not exist"""
+        summary = self.get_operational_intent_summary(operation_id=operation_id)
+        if summary is None:
+            return False
+        changed_fields = {field_name: value for field_name, value in (("ovn", ovn), ("version", version), ("state", state)) if value is not None}
+        flight_opint = self.get_key(operation_id)
+        pipe = self.r.pipeline(transaction=True)
+        if changed_fields:
+            pipe.hset(flight_opint, mapping=changed_fields)
+        if expires_in is not None:
+            pipe.expire(flight_opint, expires_in)
+        pipe.execute()
+
+        if expires_in is not None:
+            rtree_helper.get_local_operational_intents_index().upsert_operational_intent(
+                operation_id=str(operation_id),
+                bounds=summary.bounds,
+                start_time=summary.start_time,
+                end_time=summary.end_time,
+                expires_in=expires_in,
+            )
+        return True
+
+    def delete_operational_intents(self, operation_ids: List[str], pipe=None) -> None:
+        """Delete stored operational intents and remove them from the local operational intents index, if a pipeline is provided the deletion is queued on it and the caller executes it"""
+        if not operation_ids:
+            return
+        execute = pipe is None
+        pipe = pipe if pipe is not None else self.r.pipeline(transaction=True)
+        pipe.delete(*[self.get_key(operation_id) for operation_id in operation_ids])
+        rtree_helper.get_local_operational_intents_index().remove_operational_intents(operation_ids=[str(o) for o in operation_ids], pipe=pipe)
+        if execute:
+            pipe.execute()
+
+    def delete_operational_intent(self, operation_id: str) -> None:
+        self.delete_operational_intents(operation_ids=[operation_id])
+
+    def set_operation_id(self, operational_intent_id: str, operation_id: str, expires_in: timedelta) -> None:
+        """Store the operation id (the flight declaration id in Argon Server) of a operational intent reference in the DSS"""
+        self.r.set(OPINT_FLIGHTREF_KEY + str(operational_intent_id), str(operation_id), ex=expires_in)
+
+    def get_operation_id(self, operational_intent_id: str) -> Optional[str]:
+        operation_id = self.r.get(OPINT_FLIGHTREF_KEY + str(operational_intent_id))
+        if operation_id and operation_id.lstrip().startswith("{"):
+            return self.migrate_legacy_operation_id(operational_intent_id=operational_intent_id, legacy_raw=operation_id)
+        return operation_id
+
+    def migrate_legacy_operational_intent(self, operation_id: str) -> bool:
+        """Convert a operational intent written before operational intents were stored as hashes, flight_opint.<operation_id> held the OperationalIntentStorage as
+        a JSON string. It is stored again in the hash layout with its remaining expiry, operational intents that cannot be parsed are deleted. Returns False if the
+        key is not a legacy operational intent"""
+        flight_opint = self.get_key(operation_id)
+        if self.r.type(flight_opint) != "string":
+            return False
+        pipe = self.r.pipeline(transaction=True)
+        pipe.get(flight_opint)
+        pipe.ttl(flight_opint)
+        try:
+            legacy_raw, ttl = pipe.execute()
+        except ResponseError:
+            return True  # Converted by another process in the meantime
+        if legacy_raw is None:
+            return True  # Expired in the meantime
+        try:
+            self.set_operational_intent(
+                operation_id=operation_id,
+                operational_intent=json.loads(legacy_raw),
+                expires_in=timedelta(seconds=ttl) if ttl > 0 else LEGACY_OPERATIONAL_INTENT_EXPIRES_IN,
+            )
+        except (ValueError, KeyError, TypeError) as e:
+            logger.error(
+                "Could not convert the legacy operational intent {operation_id} ({error}), it is deleted".format(operation_id=operation_id, error=e)
+            )
+            self.r.delete(flight_opint)
+        return True
+
+    def migrate_legacy_operation_id(self, operational_intent_id: str, legacy_raw: str) -> Optional[str]:
+        """opint_flightref.<operational_intent_id> held a SuccessfulOperationalIntentFlightIDStorage as JSON instead of the operation id, the operation id is
+        stored in its place keeping the expiry. Returns the operation id"""
+        flightref = OPINT_FLIGHTREF_KEY + str(operational_intent_id)
+        try:
+            operation_id = str(json.loads(legacy_raw)["operation_id"])
+        except (ValueError, KeyError, TypeError) as e:
+            logger.error(
+                "Could not convert the legacy operation id of {operational_intent_id} ({error}), it is deleted".format(
+                    operational_intent_id=operational_intent_id, error=e
+                )
+            )
+            self.r.delete(flightref)
+            return None
+        self.r.set(flightref, operation_id, keepttl=True)
+        return operation_id
+
+    def get_legacy_keys(self) -> List[str]:
+        """The keys written before operational intents were stored as hashes, these are converted when they are read or with the
+        migrate_legacy_operational_intents command"""
+        all_legacy_keys = []
+        for key in self.r.scan_iter(match=FLIGHT_OPINT_KEY + "*", count=1000):
+            if self.r.type(key) == "string":
+                all_legacy_keys.append(key)
+        for key in self.r.scan_iter(match=OPINT_FLIGHTREF_KEY + "*", count=1000):
+            value = self.r.get(key)
+            if value and value.lstrip().startswith("{"):
+                all_legacy_keys.append(key)
+        return all_legacy_keys
+
+    def migrate_legacy_keys(self) -> int:
+        """Convert all the legacy keys to the current layout, returns the number of keys converted"""
+        all_legacy_keys = self.get_legacy_keys()
+        for key in all_legacy_keys:
+            if key.startswith(FLIGHT_OPINT_KEY):
+                self.migrate_legacy_operational_intent(operation_id=key[len(FLIGHT_OPINT_KEY) :])
+            else:
+                legacy_raw = self.r.get(key)
+                if legacy_raw:
+                    self.migrate_legacy_operation_id(operational_intent_id=key[len(OPINT_FLIGHTREF_KEY) :], legacy_raw=legacy_raw)
+        return len(all_legacy_keys)
@@ -0,0 +1,179 @@
+import logging
+import random
+import time
+import uuid
+from dataclasses import asdict
+from os import environ as env
+from typing import Optional
+from urllib.parse import urlparse
+
+from dotenv import find_dotenv, load_dotenv
+
+from argon_server.celery import app
+from auth_helper.common import get_redis
+from common.data_definitions import (
+    PEER_USS_NOTIFICATION_DELIVERY_LOCK_KEY,
+    PEER_USS_NOTIFICATION_HOST_SLOTS_KEY,
+    PEER_USS_NOTIFICATION_LAG_KEY,
+    PEER_USS_NOTIFICATION_METRICS_KEY,
+    PEER_USS_NOTIFICATION_SEQUENCE_KEY,
+)
+
+from .data_definitions import PeerUSSNotificationDeliveryMetrics
+from .scd_data_definitions import NotifyPeerUSSPostPayload
+
+load_dotenv(find_dotenv())
+
+logger = logging.getLogger("django")
+
+PEER_USS_NOTIFICATION_CONCURRENCY_PER_HOST = int(env.get("PEER_USS_NOTIFICATION_CONCURRENCY_PER_HOST", 4))
+PEER_USS_NOTIFICATION_TIMEOUT_SECS = int(env.get("PEER_USS_NOTIFICATION_TIMEOUT_SECS", 10))
+PEER_USS_NOTIFICATION_DEADLINE_SECS = int(env.get("PEER_USS_NOTIFICATION_DEADLINE_SECS", 300))
+PEER_USS_NOTIFICATION_BACKOFF_BASE_SECS = float(env.get("PEER_USS_NOTIFICATION_BACKOFF_BASE_SECS", 2))
+PEER_USS_NOTIFICATION_BACKOFF_MAX_SECS = float(env.get("PEER_USS_NOTIFICATION_BACKOFF_MAX_SECS", 60))
+PEER_USS_NOTIFICATION_MAX_ATTEMPTS = int(env.get("PEER_USS_NOTIFICATION_MAX_ATTEMPTS", 8))
+
+# Connection errors and timeouts are reported with a status of 0, these and the following transient responses from the peer are retried
+RETRYABLE_NOTIFICATION_STATUS_CODES = [0, 408, 425, 429, 500, 502, 503, 504]
+# Only the most recent delivery lags are kept for computing the metrics
+MAX_LAG_SAMPLES = 1000
+
+
+class PeerUSSNotificationQueue:
+    """This class enqueues notifications to peer USSes for asynchronous delivery by the deliver_peer_uss_notification task and keeps the bookkeeping (ordering, per subscriber and operational
+    intent serialisation, per host concurrency and delivery metrics) for it in Redis"""
+
+    def __init__(self):
+        self.r = get_redis()
+
+    def get_sequence_key(self, uss_base_url: str, operational_intent_id: str) -> str:
+        return PEER_USS_NOTIFICATION_SEQUENCE_KEY + uss_base_url + "." + operational_intent_id
+
+    def get_host(self, uss_base_url: str) -> str:
+        return urlparse(uss_base_url).netloc or uss_base_url
+
+    def get_delivery_lock_key(self, uss_base_url: str, operational_intent_id: str) -> str:
+        return PEER_USS_NOTIFICATION_DELIVERY_LOCK_KEY + uss_base_url + "." + operational_intent_id
+
+    def record_latest_version(self, uss_base_url: str, operational_intent_id: str, version: int):
+        """The latest version is only ever raised, a notification for a older version that is enqueued late (e.g. by a slow request) does not make the newer one look superseded"""
+        sequence_key = self.get_sequence_key(uss_base_url=uss_base_url, operational_intent_id=operational_intent_id)
+
+        def set_latest_version(pipe):
+            latest_version = pipe.get(sequence_key)
+            pipe.multi()
+            if latest_version is None or int(latest_version) < version:
+                pipe.set(sequence_key, version)
+            pipe.expire(sequence_key, PEER_USS_NOTIFICATION_DEADLINE_SECS * 2)
+
+        self.r.transaction(set_latest_version, sequence_key)
+
+    def enqueue_notification(self, uss_base_url: str, notification_payload: NotifyPeerUSSPostPayload, audience: str) -> int:
+        """This method queues a notification for delivery once the DSS has accepted the change. Notifications are ordered by the version of the operational intent reference assigned by the
+        DSS, a notification is only delivered while no notification for a newer version has been queued for the same subscriber so that a peer never receives a older state after a newer one
+        """
+        operational_intent_id = notification_payload.operational_intent_id
+        version = notification_payload.operational_intent.reference.version
+        enqueued_at = time.time()
+
+        self.record_latest_version(uss_base_url=uss_base_url, operational_intent_id=operational_intent_id, version=version)
+        self.r.hincrby(PEER_USS_NOTIFICATION_METRICS_KEY, "enqueued", 1)
+
+        app.send_task(
+            "deliver_peer_uss_notification",
+            kwargs={
+                "uss_base_url": uss_base_url,
+                "notification_payload": asdict(notification_payload),
+                "audience": audience,
+                "version": version,
+                "enqueued_at": enqueued_at,
+                "deadline": enqueued_at + PEER_USS_NOTIFICATION_DEADLINE_SECS,
+                "attempt": 0,
+            },
+        )
+        logger.info(
+            "Queued notification for operational intent {operational_intent_id} to {uss_base_url}, version {version}".format(
+                operational_intent_id=operational_intent_id, uss_base_url=uss_base_url, version=version
+            )
+        )
+        return version
+
+    def is_superseded(self, uss_base_url: str, operational_intent_id: str, version: int) -> bool:
+        latest_version = self.r.get(self.get_sequence_key(uss_base_url=uss_base_url, operational_intent_id=operational_intent_id))
+        return latest_version is not None and int(latest_version) > version
+
+    def acquire_delivery_lock(self, uss_base_url: str, operational_intent_id: str) -> Optional[str]:
+        """Only one notification for a subscriber and operational intent is delivered at a time so that a older notification that is still in flight cannot arrive after a newer one, the lock
+        expires after twice the request timeout in case the worker holding it died. Returns a token to release the lock with or None if another delivery holds it
+        """
+        token = str(uuid.uuid4())
+        lock_key = self.get_delivery_lock_key(uss_base_url=uss_base_url, operational_intent_id=operational_intent_id)
+        if self.r.set(lock_key, token, nx=True, ex=PEER_USS_NOTIFICATION_TIMEOUT_SECS * 2):
+            return token
+        return None
+
+    def release_delivery_lock(self, uss_base_url: str, operational_intent_id: str, token: str):
+        lock_key = self.get_delivery_lock_key(uss_base_url=uss_base_url, operational_intent_id=operational_intent_id)
+
+        def delete_own_lock(pipe):
+            current_token = pipe.get(lock_key)
+            pipe.multi()
+            if current_token == token:
+                pipe.delete(lock_key)
+
+        self.r.transaction(delete_own_lock, lock_key)
+
+    def get_backoff(self, attempt: int) -> float:
+        """Exponential backoff with jitter so that notifications that failed together are not all retried at the same time"""
+        backoff = min(PEER_USS_NOTIFICATION_BACKOFF_MAX_SECS, PEER_USS_NOTIFICATION_BACKOFF_BASE_SECS * (2**attempt))
+        return backoff * random.uniform(0.5, 1.0)
+
+    def acquire_host_slot(self, uss_base_url: str) -> Optional[str]:
+        """This method takes one of the PEER_USS_NOTIFICATION_CONCURRENCY_PER_HOST slots of the host across all workers, slots held longer than the request timeout (e.g. by a worker that died) are reclaimed.
+        Returns a token to release the slot with or None if all the slots are taken"""
+        slots_key = PEER_USS_NOTIFICATION_HOST_SLOTS_KEY + self.get_host(uss_base_url=uss_base_url)
+        token = str(uuid.uuid4())
+        now = time.time()
+        with self.r.pipeline() as p:
+            p.zremrangebyscore(slots_key, "-inf", now - (PEER_USS_NOTIFICATION_TIMEOUT_SECS * 2))
+            p.zadd(slots_key, {token: now})
+            p.zrank(slots_key, token)
+            p.expire(slots_key, PEER_USS_NOTIFICATION_TIMEOUT_SECS * 2)
+            _, _, rank, _ = p.execute()
+        if rank is not None and rank < PEER_USS_NOTIFICATION_CONCURRENCY_PER_HOST:
+            return token
+        self.r.zrem(slots_key, token)
+        return None
+
+    def release_host_slot(self, uss_base_url: str, token: str):
+        self.r.zrem(PEER_USS_NOTIFICATION_HOST_SLOTS_KEY + self.get_host(uss_base_url=uss_base_url), token)
+
+    def record_outcome(self, outcome: str, enqueued_at: float = None):
+        """Outcomes are one of delivered, retried, superseded, expired or failed, for delivered notifications the lag since it was enqueued is also recorded"""
+        with self.r.pipeline() as p:
+            p.hincrby(PEER_USS_NOTIFICATION_METRICS_KEY, outcome, 1)
+            if outcome == "delivered" and enqueued_at is not None:
+                p.lpush(PEER_USS_NOTIFICATION_LAG_KEY, round((time.time() - enqueued_at) * 1000, 1))
+                p.ltrim(PEER_USS_NOTIFICATION_LAG_KEY, 0, MAX_LAG_SAMPLES - 1)
+            p.execute()
+
+    def get_delivery_metrics(self) -> PeerUSSNotificationDeliveryMetrics:
+        counters = self.r.hgetall(PEER_USS_NOTIFICATION_METRICS_KEY)
+        all_lags = sorted(float(lag) for lag in self.r.lrange(PEER_USS_NOTIFICATION_LAG_KEY, 0, -1))
+        mean_lag_ms = p95_lag_ms = max_lag_ms = None
+        if all_lags:
+            mean_lag_ms = round(sum(all_lags) / len(all_lags), 1)
+            p95_lag_ms = all_lags[min(len(all_lags) - 1, int(len(all_lags) * 0.95))]
+            max_lag_ms = all_lags[-1]
+
+        return PeerUSSNotificationDeliveryMetrics(
+            enqueued=int(counters.get("enqueued", 0)),
+            delivered=int(counters.get("delivered", 0)),
+            retried=int(counters.get("retried", 0)),
+            superseded=int(counters.get("superseded", 0)),
+            expired=int(counters.get("expired", 0)),
+            failed=int(counters.get("failed", 0)),
+            mean_lag_ms=mean_lag_ms,
+            p95_lag_ms=p95_lag_ms,
+            max_lag_ms=max_lag_ms,
+        )
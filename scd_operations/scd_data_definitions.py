@@ -1,5 +1,5 @@
 import enum
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import List, Literal, Optional, Union
 
 from implicitdict import StringBasedDateTime
@@ -228,6 +228,16 @@ class DeleteFlightResponse:
     notes: str
 
 
+@dataclass
+class ClearAreaOperationalIntentOutcome:
+    """The result of removing a single operational intent while clearing a area"""
+
+    operation_id: str
+    operational_intent_id: Optional[str]
+    success: bool
+    message: str
+
+
 @dataclass
 class ClearAreaResponseOutcome:
     """Response after clearing flights in an area"""
@@ -235,6 +245,7 @@ class ClearAreaResponseOutcome:
     success: bool
     message: str
     timestamp: StringBasedDateTime
+    operational_intents: List[ClearAreaOperationalIntentOutcome] = field(default_factory=list)
 
 
 @dataclass
@@ -515,3 +526,7 @@ class OpInttoCheckDetails:
     ovn: str
     shape: Plgn
     id: str
+    altitude_lower: Optional[float] = None
+    altitude_upper: Optional[float] = None
+    time_start: Optional[float] = None  # Unix timestamp of the earliest volume start
+    time_end: Optional[float] = None  # Unix timestamp of the latest volume end
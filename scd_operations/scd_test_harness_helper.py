@@ -1,4 +1,3 @@
-import json
 import logging
 from enum import Enum
 from typing import List
@@ -6,7 +5,6 @@ from typing import List
 import dacite
 from dacite import from_dict
 
-from auth_helper.common import get_redis
 from rid_operations import rtree_helper
 
 from .dss_scd_helper import OperationalIntentReferenceHelper, VolumesConverter
@@ -23,6 +21,7 @@ from .flight_planning_data_definitions import (
     RPAS26FlightDetails,
     UpsertFlightPlanResponse,
 )
+from .opint_repository import OperationalIntentsRepository
 from .scd_data_definitions import (
     TestInjectionResult,
     TestInjectionResultState,
@@ -145,17 +144,12 @@ class SCDTestHarnessHelper:
 
     def __init__(self):
         self.my_operational_intent_helper = OperationalIntentReferenceHelper()
-        self.r = get_redis()
+        self.my_operational_intents_repository = OperationalIntentsRepository()
         self.my_volumes_converter = VolumesConverter()
         self.my_operational_intent_comparator = rtree_helper.OperationalIntentComparisonFactory()
 
     def check_if_same_flight_id_exists(self, operation_id: str) -> bool:
-        r = get_redis()
-        flight_opint = "flight_opint." + operation_id
-        if r.exists(flight_opint):
-            return True
-        else:
-            return False
+        return self.my_operational_intents_repository.operational_intent_exists(operation_id=operation_id)
 
     def check_if_same_operational_intent_exists_in_argon_server(self, volumes: List[Volume4D]) -> bool:
         all_checks: List[bool] = []
@@ -163,11 +157,12 @@ class SCDTestHarnessHelper:
         polygon_to_check = self.my_volumes_converter.get_minimum_rotated_rectangle()
 
         # Get the volume to check
-        all_opints = self.r.keys(pattern="flight_opint.*")
-        for flight_opint in all_opints:
+        all_operation_ids = rtree_helper.get_local_operational_intents_index().get_all_operation_ids()
+        for operation_id in all_operation_ids:
             stored_opint_volumes_converter = VolumesConverter()
-            op_int_details_raw = self.r.get(flight_opint)
-            op_int_details = json.loads(op_int_details_raw)
+            op_int_details = self.my_operational_intents_repository.get_operational_intent(operation_id=operation_id)
+            if not op_int_details:
+                continue
 
             details_full = op_int_details["operational_intent_details"]
             # Load existing opint details
@@ -0,0 +1,115 @@
+import logging
+import time
+
+from argon_server.celery import app
+
+from . import dss_scd_helper
+from .peer_notification_queue import (
+    PEER_USS_NOTIFICATION_MAX_ATTEMPTS,
+    PEER_USS_NOTIFICATION_TIMEOUT_SECS,
+    RETRYABLE_NOTIFICATION_STATUS_CODES,
+    PeerUSSNotificationQueue,
+)
+
+logger = logging.getLogger("django")
+
+
+def record_superseded(my_notification_queue: PeerUSSNotificationQueue, uss_base_url: str, operational_intent_id: str):
+    logger.info(
+        "Notification for operational intent {operational_intent_id} to {uss_base_url} is superseded by a newer one".format(
+            operational_intent_id=operational_intent_id, uss_base_url=uss_base_url
+        )
+    )
+    my_notification_queue.record_outcome(outcome="superseded")
+
+
+@app.task(name="deliver_peer_uss_notification", bind=True, max_retries=None)
+def deliver_peer_uss_notification(
+    self,
+    uss_base_url: str,
+    notification_payload: dict,
+    audience: str,
+    version: int,
+    enqueued_at: float,
+    deadline: float,
+    attempt: int = 0,
+):
+    """This task delivers a notification queued by PeerUSSNotificationQueue, transient failures are retried with exponential backoff until the deadline or the maximum number of attempts is reached"""
+    my_notification_queue = PeerUSSNotificationQueue()
+    operational_intent_id = notification_payload["operational_intent_id"]
+    task_kwargs = {
+        "uss_base_url": uss_base_url,
+        "notification_payload": notification_payload,
+        "audience": audience,
+        "version": version,
+        "enqueued_at": enqueued_at,
+        "deadline": deadline,
+        "attempt": attempt,
+    }
+
+    if time.time() > deadline:
+        logger.info(
+            "Notification for operational intent {operational_intent_id} to {uss_base_url} has expired".format(
+                operational_intent_id=operational_intent_id, uss_base_url=uss_base_url
+            )
+        )
+        my_notification_queue.record_outcome(outcome="expired")
+        return
+
+    if my_notification_queue.is_superseded(uss_base_url=uss_base_url, operational_intent_id=operational_intent_id, version=version):
+        record_superseded(my_notification_queue=my_notification_queue, uss_base_url=uss_base_url, operational_intent_id=operational_intent_id)
+        return
+
+    lock_token = my_notification_queue.acquire_delivery_lock(uss_base_url=uss_base_url, operational_intent_id=operational_intent_id)
+    if lock_token is None:
+        # Another notification for the same subscriber and operational intent is being delivered, try again shortly, this does not count as a attempt
+        raise self.retry(kwargs=task_kwargs, countdown=my_notification_queue.get_backoff(attempt=0))
+
+    try:
+        slot_token = my_notification_queue.acquire_host_slot(uss_base_url=uss_base_url)
+        if slot_token is None:
+            # All the slots for the host are taken, try again shortly, this does not count as a attempt
+            raise self.retry(kwargs=task_kwargs, countdown=my_notification_queue.get_backoff(attempt=0))
+
+        try:
+            # A newer notification may have been queued while this one waited for the lock and the slot
+            if my_notification_queue.is_superseded(uss_base_url=uss_base_url, operational_intent_id=operational_intent_id, version=version):
+                record_superseded(my_notification_queue=my_notification_queue, uss_base_url=uss_base_url, operational_intent_id=operational_intent_id)
+                return
+
+            my_scd_dss_helper = dss_scd_helper.SCDOperations()
+            notification_result = my_scd_dss_helper.notify_peer_uss_of_created_updated_operational_intent(
+                uss_base_url=uss_base_url,
+                notification_payload=notification_payload,
+                audience=audience,
+                timeout=max(1, min(PEER_USS_NOTIFICATION_TIMEOUT_SECS, deadline - time.time())),
+            )
+        finally:
+            my_notification_queue.release_host_slot(uss_base_url=uss_base_url, token=slot_token)
+    finally:
+        my_notification_queue.release_delivery_lock(uss_base_url=uss_base_url, operational_intent_id=operational_intent_id, token=lock_token)
+
+    if notification_result.status == 204:
+        my_notification_queue.record_outcome(outcome="delivered", enqueued_at=enqueued_at)
+        return
+
+    countdown = my_notification_queue.get_backoff(attempt=attempt)
+    if (
+        notification_result.status in RETRYABLE_NOTIFICATION_STATUS_CODES
+        and attempt + 1 < PEER_USS_NOTIFICATION_MAX_ATTEMPTS
+        and time.time() + countdown < deadline
+    ):
+        # There is no point retrying a notification that a newer one has replaced in the meantime
+        if my_notification_queue.is_superseded(uss_base_url=uss_base_url, operational_intent_id=operational_intent_id, version=version):
+            record_superseded(my_notification_queue=my_notification_queue, uss_base_url=uss_base_url, operational_intent_id=operational_intent_id)
+            return
+        my_notification_queue.record_outcome(outcome="retried")
+        task_kwargs["attempt"] = attempt + 1
+        raise self.retry(kwargs=task_kwargs, countdown=countdown)
+
+    logger.error(
+        "Giving up notifying {uss_base_url} of operational intent {operational_intent_id} after {attempts} attempt(s), last status {status}".format(
+            uss_base_url=uss_base_url, operational_intent_id=operational_intent_id, attempts=attempt + 1, status=notification_result.status
+        )
+    )
+    my_notification_queue.record_outcome(outcome="failed")
@@ -1 +1,387 @@
-# Create your tests here.
+import json
+import math
+import uuid
+from dataclasses import asdict
+from datetime import timedelta
+from unittest import mock
+
+from celery.exceptions import Retry
+from django.test import TestCase
+from shapely.geometry import LineString, Point, Polygon
+from shapely.ops import unary_union
+
+from auth_helper.common import get_redis
+from common.data_definitions import (
+    FLIGHT_OPINT_KEY,
+    OPINT_FLIGHTREF_KEY,
+    PEER_USS_NOTIFICATION_DELIVERY_LOCK_KEY,
+    PEER_USS_NOTIFICATION_METRICS_KEY,
+    PEER_USS_NOTIFICATION_SEQUENCE_KEY,
+)
+from common.simplification_helper import DSS_MAX_OUTLINE_GROWTH, cap_polygon_vertices, count_vertices, simplify_containing
+
+from .dss_scd_helper import cap_extents_vertices
+from .opint_repository import OperationalIntentsRepository
+from .peer_notification_queue import PEER_USS_NOTIFICATION_MAX_ATTEMPTS, PeerUSSNotificationQueue
+from .scd_data_definitions import (
+    Altitude,
+    LatLngPoint,
+    NotifyPeerUSSPostPayload,
+    OperationalIntentDetailsUSSResponse,
+    OperationalIntentReferenceDSSResponse,
+    OperationalIntentUSSDetails,
+    Time,
+    USSNotificationResponse,
+    Volume3D,
+    Volume4D,
+)
+from .scd_data_definitions import Polygon as Plgn
+from .tasks import deliver_peer_uss_notification
+
+
+def get_corridor(num_points: int = 2000) -> Polygon:
+    """A long winding corridor, its buffered outline has thousands of vertices"""
+    return LineString([(7.4 + i * 0.0002, 46.9 + 0.01 * math.sin(i / 15)) for i in range(num_points)]).buffer(0.0005)
+
+
+def get_volume(outline: Polygon) -> Volume4D:
+    return Volume4D(
+        volume=Volume3D(
+            outline_polygon=Plgn(vertices=[LatLngPoint(lat=lat, lng=lng) for lng, lat in list(outline.exterior.coords)[:-1]]),
+            altitude_lower=Altitude(value=0, reference="W84", units="M"),
+            altitude_upper=Altitude(value=120, reference="W84", units="M"),
+        ),
+        time_start=Time(format="RFC3339", value="2026-10-19T10:00:00Z"),
+        time_end=Time(format="RFC3339", value="2026-10-19T11:00:00Z"),
+    )
+
+
+def get_outline(volume) -> Polygon:
+    all_vertices = volume["volume"]["outline_polygon"]["vertices"] if isinstance(volume, dict) else volume.volume.outline_polygon.vertices
+    return Polygon([(v["lng"], v["lat"]) if isinstance(v, dict) else (v.lng, v.lat) for v in all_vertices])
+
+
+class PolygonSimplificationTests(TestCase):
+    def test_simplified_outline_covers_the_original(self):
+        corridor = get_corridor(num_points=500)
+        for tolerance in [0.0001, 0.001]:
+            simplified = simplify_containing(corridor, tolerance)
+            self.assertTrue(simplified.covers(corridor))
+            self.assertLess(count_vertices(simplified), count_vertices(corridor))
+
+    def test_small_outlines_are_not_changed(self):
+        outline = Point(7.47, 46.97).buffer(0.001, 8)
+        self.assertEqual(cap_polygon_vertices(outline, max_vertices=100), [outline])
+
+    def test_capped_outline_covers_the_original_within_the_growth(self):
+        circle = Point(7.47, 46.97).buffer(0.01, 64)
+        all_parts = cap_polygon_vertices(circle, max_vertices=20)
+        self.assertTrue(all(count_vertices(part) <= 20 for part in all_parts))
+        self.assertTrue(unary_union(all_parts).covers(circle))
+        self.assertLessEqual(unary_union(all_parts).hausdorff_distance(circle), DSS_MAX_OUTLINE_GROWTH)
+
+    def test_long_corridor_is_split_instead_of_replaced_by_a_rectangle(self):
+        corridor = get_corridor()
+        all_parts = cap_polygon_vertices(corridor, max_vertices=100)
+        self.assertGreater(len(all_parts), 1)
+        self.assertTrue(all(count_vertices(part) <= 100 for part in all_parts))
+        self.assertTrue(unary_union(all_parts).covers(corridor))
+        self.assertLessEqual(unary_union(all_parts).hausdorff_distance(corridor), DSS_MAX_OUTLINE_GROWTH)
+        self.assertLess(unary_union(all_parts).area, corridor.minimum_rotated_rectangle.area / 2)
+
+
+class CapExtentsVerticesTests(TestCase):
+    def test_large_volumes_are_replaced_by_covering_volumes(self):
+        corridor = get_corridor()
+        volume = get_volume(corridor)
+        all_extents = cap_extents_vertices([volume])
+        self.assertGreater(len(all_extents), 1)
+        for extent in all_extents:
+            self.assertLessEqual(len(extent.volume.outline_polygon.vertices), 100)
+            self.assertEqual(
+                (extent.volume.altitude_lower, extent.volume.altitude_upper), (volume.volume.altitude_lower, volume.volume.altitude_upper)
+            )
+            self.assertEqual((extent.time_start, extent.time_end), (volume.time_start, volume.time_end))
+        self.assertTrue(unary_union([get_outline(extent) for extent in all_extents]).buffer(1e-9).covers(corridor))
+        # The volume itself is not changed
+        self.assertEqual(len(volume.volume.outline_polygon.vertices), count_vertices(corridor))
+
+    def test_stored_volumes_are_capped(self):
+        corridor = get_corridor()
+        stored_volume = json.loads(json.dumps(asdict(get_volume(corridor))))
+        all_extents = cap_extents_vertices([stored_volume])
+        self.assertGreater(len(all_extents), 1)
+        self.assertTrue(all(len(extent["volume"]["outline_polygon"]["vertices"]) <= 100 for extent in all_extents))
+        self.assertTrue(unary_union([get_outline(extent) for extent in all_extents]).buffer(1e-9).covers(corridor))
+
+    def test_small_volumes_are_sent_as_they_are(self):
+        volume = get_volume(Point(7.47, 46.97).buffer(0.001, 8))
+        self.assertEqual(cap_extents_vertices([volume]), [volume])
+
+
+class OperationalIntentsRepositoryLegacyKeysTests(TestCase):
+    def setUp(self):
+        self.r = get_redis()
+        self.my_operational_intents_repository = OperationalIntentsRepository()
+        self.operation_id = str(uuid.uuid4())
+        self.operational_intent_id = str(uuid.uuid4())
+        self.all_keys = []
+
+    def tearDown(self):
+        self.my_operational_intents_repository.delete_operational_intent(operation_id=self.operation_id)
+        if self.all_keys:
+            self.r.delete(*self.all_keys)
+
+    def add_key(self, key: str) -> str:
+        self.all_keys.append(key)
+        return key
+
+    def get_legacy_operational_intent(self) -> str:
+        return json.dumps(
+            {
+                "bounds": "7.47,46.97,7.48,46.98",
+                "start_time": "2026-10-19T10:00:00+00:00",
+                "end_time": "2026-10-19T11:00:00+00:00",
+                "alt_max": 120,
+                "alt_min": 0,
+                "success_response": {
+                    "subscribers": [],
+                    "operational_intent_reference": {"id": self.operational_intent_id, "ovn": "legacy-ovn", "version": 2, "state": "Accepted"},
+                },
+                "operational_intent_details": {},
+            }
+        )
+
+    def set_legacy_keys(self):
+        legacy_opint_key = self.add_key(FLIGHT_OPINT_KEY + self.operation_id)
+        legacy_flightref_key = self.add_key(OPINT_FLIGHTREF_KEY + self.operational_intent_id)
+        self.r.set(legacy_opint_key, self.get_legacy_operational_intent(), ex=600)
+        self.r.set(legacy_flightref_key, json.dumps({"operation_id": self.operation_id, "operational_intent_id": self.operational_intent_id}), ex=600)
+        return legacy_opint_key, legacy_flightref_key
+
+    def assert_migrated(self, legacy_opint_key: str, legacy_flightref_key: str):
+        summary = self.my_operational_intents_repository.get_operational_intent_summary(operation_id=self.operation_id)
+        self.assertEqual(
+            (summary.operational_intent_id, summary.ovn, summary.version, summary.bounds),
+            (self.operational_intent_id, "legacy-ovn", 2, "7.47,46.97,7.48,46.98"),
+        )
+        self.assertEqual(self.r.type(legacy_opint_key), "hash")
+        self.assertEqual(self.r.get(legacy_flightref_key), self.operation_id)
+        # The expiry of the legacy keys is kept
+        self.assertTrue(0 < self.r.ttl(legacy_opint_key) <= 600)
+        self.assertTrue(0 < self.r.ttl(legacy_flightref_key) <= 600)
+
+    def test_legacy_keys_are_converted(self):
+        legacy_opint_key, legacy_flightref_key = self.set_legacy_keys()
+        self.assertEqual(set(self.my_operational_intents_repository.get_legacy_keys()) & set(self.all_keys), {legacy_opint_key, legacy_flightref_key})
+        self.assertGreaterEqual(self.my_operational_intents_repository.migrate_legacy_keys(), 2)
+        self.assert_migrated(legacy_opint_key, legacy_flightref_key)
+        self.assertEqual(
+            self.my_operational_intents_repository.get_operational_intent(operation_id=self.operation_id)["operational_intent_details"], {}
+        )
+
+    def test_legacy_keys_are_converted_when_they_are_read(self):
+        legacy_opint_key, legacy_flightref_key = self.set_legacy_keys()
+        self.assertEqual(self.my_operational_intents_repository.get_operation_id(operational_intent_id=self.operational_intent_id), self.operation_id)
+        all_summaries = self.my_operational_intents_repository.get_operational_intent_summaries(operation_ids=[self.operation_id])
+        self.assertEqual(all_summaries[self.operation_id].ovn, "legacy-ovn")
+        self.assert_migrated(legacy_opint_key, legacy_flightref_key)
+
+    def test_legacy_operational_intent_is_converted_when_the_details_are_read(self):
+        self.set_legacy_keys()
+        operational_intent = self.my_operational_intents_repository.get_operational_intent(operation_id=self.operation_id)
+        self.assertEqual(operational_intent["success_response"]["operational_intent_reference"]["ovn"], "legacy-ovn")
+
+    def test_unparseable_legacy_keys_are_deleted(self):
+        legacy_opint_key = self.add_key(FLIGHT_OPINT_KEY + self.operation_id)
+        self.r.set(legacy_opint_key, "not json")
+        self.assertIsNone(self.my_operational_intents_repository.get_operational_intent_summary(operation_id=self.operation_id))
+        self.assertFalse(self.r.exists(legacy_opint_key))
+
+    def test_current_keys_are_kept(self):
+        opint_key = self.add_key(FLIGHT_OPINT_KEY + self.operation_id)
+        self.add_key(OPINT_FLIGHTREF_KEY + self.operational_intent_id)
+        self.r.hset(opint_key, mapping={"operational_intent_id": self.operational_intent_id, "ovn": ""})
+        self.my_operational_intents_repository.set_operation_id(
+            operational_intent_id=self.operational_intent_id, operation_id=self.operation_id, expires_in=timedelta(minutes=5)
+        )
+
+        self.assertFalse(set(self.my_operational_intents_repository.get_legacy_keys()) & set(self.all_keys))
+        self.my_operational_intents_repository.migrate_legacy_keys()
+        self.assertTrue(self.r.exists(opint_key))
+        self.assertEqual(self.my_operational_intents_repository.get_operation_id(operational_intent_id=self.operational_intent_id), self.operation_id)
+
+
+def get_notification_payload(operational_intent_id: str, uss_base_url: str, version: int) -> NotifyPeerUSSPostPayload:
+    reference = OperationalIntentReferenceDSSResponse(
+        id=operational_intent_id,
+        manager="flight_blender",
+        uss_availability="Normal",
+        version=version,
+        state="Accepted",
+        ovn="ovn-{version}".format(version=version),
+        time_start=Time(format="RFC3339", value="2026-10-19T10:00:00Z"),
+        time_end=Time(format="RFC3339", value="2026-10-19T11:00:00Z"),
+        uss_base_url=uss_base_url,
+        subscription_id=str(uuid.uuid4()),
+    )
+    operational_intent = OperationalIntentDetailsUSSResponse(
+        reference=reference, details=OperationalIntentUSSDetails(volumes=[], priority=0, off_nominal_volumes=[])
+    )
+    return NotifyPeerUSSPostPayload(operational_intent_id=operational_intent_id, operational_intent=operational_intent, subscriptions=[])
+
+
+class PeerUSSNotificationTestCase(TestCase):
+    def setUp(self):
+        self.r = get_redis()
+        self.my_notification_queue = PeerUSSNotificationQueue()
+        self.uss_base_url = "https://peer.example.com"
+        self.operational_intent_id = str(uuid.uuid4())
+        send_task_patcher = mock.patch("scd_operations.peer_notification_queue.app.send_task")
+        self.send_task = send_task_patcher.start()
+        self.addCleanup(send_task_patcher.stop)
+
+    def tearDown(self):
+        self.r.delete(
+            PEER_USS_NOTIFICATION_SEQUENCE_KEY + self.uss_base_url + "." + self.operational_intent_id,
+            PEER_USS_NOTIFICATION_DELIVERY_LOCK_KEY + self.uss_base_url + "." + self.operational_intent_id,
+        )
+
+    def enqueue(self, version: int) -> int:
+        return self.my_notification_queue.enqueue_notification(
+            uss_base_url=self.uss_base_url,
+            notification_payload=get_notification_payload(
+                operational_intent_id=self.operational_intent_id, uss_base_url=self.uss_base_url, version=version
+            ),
+            audience="peer.example.com",
+        )
+
+    def is_superseded(self, version: int) -> bool:
+        return self.my_notification_queue.is_superseded(
+            uss_base_url=self.uss_base_url, operational_intent_id=self.operational_intent_id, version=version
+        )
+
+
+class PeerUSSNotificationQueueTests(PeerUSSNotificationTestCase):
+    def test_notifications_are_ordered_by_version(self):
+        self.assertEqual(self.enqueue(version=2), 2)
+        self.assertFalse(self.is_superseded(version=2))
+        self.enqueue(version=3)
+        self.assertTrue(self.is_superseded(version=2))
+        self.assertFalse(self.is_superseded(version=3))
+        self.assertEqual([call.kwargs["kwargs"]["version"] for call in self.send_task.call_args_list], [2, 3])
+
+    def test_late_older_notification_does_not_supersede_newer_one(self):
+        self.enqueue(version=3)
+        self.enqueue(version=2)
+        self.assertFalse(self.is_superseded(version=3))
+        self.assertTrue(self.is_superseded(version=2))
+
+    def test_delivery_lock_is_exclusive(self):
+        token = self.my_notification_queue.acquire_delivery_lock(uss_base_url=self.uss_base_url, operational_intent_id=self.operational_intent_id)
+        self.assertIsNotNone(token)
+        self.assertIsNone(
+            self.my_notification_queue.acquire_delivery_lock(uss_base_url=self.uss_base_url, operational_intent_id=self.operational_intent_id)
+        )
+        # A token that does not hold the lock does not release it
+        self.my_notification_queue.release_delivery_lock(
+            uss_base_url=self.uss_base_url, operational_intent_id=self.operational_intent_id, token="other"
+        )
+        self.assertIsNone(
+            self.my_notification_queue.acquire_delivery_lock(uss_base_url=self.uss_base_url, operational_intent_id=self.operational_intent_id)
+        )
+        self.my_notification_queue.release_delivery_lock(
+            uss_base_url=self.uss_base_url, operational_intent_id=self.operational_intent_id, token=token
+        )
+        self.assertIsNotNone(
+            self.my_notification_queue.acquire_delivery_lock(uss_base_url=self.uss_base_url, operational_intent_id=self.operational_intent_id)
+        )
+
+
+class DeliverPeerUSSNotificationTests(PeerUSSNotificationTestCase):
+    def setUp(self):
+        super().setUp()
+        notify_patcher = mock.patch("scd_operations.dss_scd_helper.SCDOperations.notify_peer_uss_of_created_updated_operational_intent")
+        self.notify = notify_patcher.start()
+        self.addCleanup(notify_patcher.stop)
+        self.notify.return_value = USSNotificationResponse(status=204, message="")
+        retry_patcher = mock.patch.object(deliver_peer_uss_notification, "retry", side_effect=Retry())
+        self.retry = retry_patcher.start()
+        self.addCleanup(retry_patcher.stop)
+
+    def get_outcome_count(self, outcome: str) -> int:
+        return int(self.r.hget(PEER_USS_NOTIFICATION_METRICS_KEY, outcome) or 0)
+
+    def deliver(self, version: int, attempt: int = 0):
+        self.enqueue(version=version)
+        deliver_peer_uss_notification(**{**self.send_task.call_args.kwargs["kwargs"], "attempt": attempt})
+
+    def test_notification_is_delivered(self):
+        delivered = self.get_outcome_count("delivered")
+        self.deliver(version=1)
+        self.notify.assert_called_once()
+        self.assertEqual(self.notify.call_args.kwargs["notification_payload"]["operational_intent"]["reference"]["version"], 1)
+        self.assertEqual(self.get_outcome_count("delivered"), delivered + 1)
+        # The lock is released after the delivery
+        self.assertIsNotNone(
+            self.my_notification_queue.acquire_delivery_lock(uss_base_url=self.uss_base_url, operational_intent_id=self.operational_intent_id)
+        )
+
+    def test_superseded_notification_is_not_delivered(self):
+        self.enqueue(version=1)
+        task_kwargs = self.send_task.call_args.kwargs["kwargs"]
+        self.enqueue(version=2)
+        superseded = self.get_outcome_count("superseded")
+        deliver_peer_uss_notification(**task_kwargs)
+        self.notify.assert_not_called()
+        self.assertEqual(self.get_outcome_count("superseded"), superseded + 1)
+
+    def test_notification_superseded_while_waiting_for_a_slot_is_not_delivered(self):
+        acquire_host_slot = PeerUSSNotificationQueue.acquire_host_slot
+
+        def enqueue_newer_version(queue, uss_base_url):
+            self.my_notification_queue.record_latest_version(
+                uss_base_url=self.uss_base_url, operational_intent_id=self.operational_intent_id, version=2
+            )
+            return acquire_host_slot(queue, uss_base_url=uss_base_url)
+
+        with mock.patch.object(PeerUSSNotificationQueue, "acquire_host_slot", autospec=True, side_effect=enqueue_newer_version):
+            self.deliver(version=1)
+        self.notify.assert_not_called()
+
+    def test_notification_is_retried_while_another_one_is_delivered(self):
+        self.my_notification_queue.acquire_delivery_lock(uss_base_url=self.uss_base_url, operational_intent_id=self.operational_intent_id)
+        with self.assertRaises(Retry):
+            self.deliver(version=1)
+        self.notify.assert_not_called()
+        self.assertEqual(self.retry.call_args.kwargs["kwargs"]["attempt"], 0)
+
+    def test_transient_failure_is_retried_with_backoff(self):
+        self.notify.return_value = USSNotificationResponse(status=503, message="")
+        retried = self.get_outcome_count("retried")
+        with self.assertRaises(Retry):
+            self.deliver(version=1, attempt=2)
+        self.assertEqual(self.retry.call_args.kwargs["kwargs"]["attempt"], 3)
+        self.assertGreater(self.retry.call_args.kwargs["countdown"], 0)
+        self.assertEqual(self.get_outcome_count("retried"), retried + 1)
+
+    def test_notification_superseded_during_delivery_is_not_retried(self):
+        def enqueue_newer_version(**kwargs):
+            self.my_notification_queue.record_latest_version(
+                uss_base_url=self.uss_base_url, operational_intent_id=self.operational_intent_id, version=2
+            )
+            return USSNotificationResponse(status=503, message="")
+
+        self.notify.side_effect = enqueue_newer_version
+        superseded = self.get_outcome_count("superseded")
+        self.deliver(version=1)
+        self.retry.assert_not_called()
+        self.assertEqual(self.get_outcome_count("superseded"), superseded + 1)
+
+    def test_permanent_failure_is_not_retried(self):
+        for status, attempt in [(400, 0), (503, PEER_USS_NOTIFICATION_MAX_ATTEMPTS - 1)]:
+            self.notify.return_value = USSNotificationResponse(status=status, message="")
+            failed = self.get_outcome_count("failed")
+            self.deliver(version=1, attempt=attempt)
+            self.retry.assert_not_called()
+            self.assertEqual(self.get_outcome_count("failed"), failed + 1)
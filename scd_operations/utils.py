@@ -1,18 +1,31 @@
-import json
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from itertools import cycle
+from os import environ as env
+from typing import Optional
 
 import arrow
+from dotenv import find_dotenv, load_dotenv
 
-from auth_helper.common import get_redis
 from rid_operations import rtree_helper
 
 from . import dss_scd_helper
-from .scd_data_definitions import ClearAreaResponse, ClearAreaResponseOutcome
+from .opint_repository import (
+    OperationalIntentsRepository,
+    OperationalIntentStorageSummary,
+)
+from .scd_data_definitions import (
+    ClearAreaOperationalIntentOutcome,
+    ClearAreaResponse,
+    ClearAreaResponseOutcome,
+)
+
+load_dotenv(find_dotenv())
 
 logger = logging.getLogger("django")
 
-INDEX_NAME = "opint_proc"
+DSS_CLEAR_AREA_CONCURRENCY = int(env.get("DSS_CLEAR_AREA_CONCURRENCY", 16))
+DSS_CLEAR_AREA_REQUEST_TIMEOUT_SECS = int(env.get("DSS_CLEAR_AREA_REQUEST_TIMEOUT_SECS", 10))
 
 
 class UAVSerialNumberValidator:
@@ -190,11 +203,52 @@ class OperatorRegistrationNumberValidator:
 
 
 class DSSAreaClearHandler:
+    """This class removes all the operational intents managed by Argon Server in a area, the targets are resolved from the local operational intents index and deleted
+    from the DSS concurrently"""
+
     def __init__(self, request_id):
         self.request_id = request_id
+        self.my_operational_intents_repository = OperationalIntentsRepository()
+        self.my_scd_dss_helper = dss_scd_helper.SCDOperations()
+
+    def delete_operational_intent_from_dss(
+        self, operation_id: str, op_int_summary: Optional[OperationalIntentStorageSummary]
+    ) -> ClearAreaOperationalIntentOutcome:
+        """This method deletes a single operational intent from the DSS, it never raises so that one failure does not stop the others from being cleared"""
+        if op_int_summary is None:
+            # The details have expired, only the entry in the index remains
+            return ClearAreaOperationalIntentOutcome(
+                operation_id=operation_id, operational_intent_id=None, success=True, message="Operational intent details have expired"
+            )
+        ovn = op_int_summary.ovn
+        opint_id = op_int_summary.operational_intent_id
+        ovn_opint = {"ovn_id": ovn, "opint_id": opint_id}
+        logger.info("Deleting operational intent {opint_id} with ovn {ovn_id}".format(**ovn_opint))
+        try:
+            deletion_request = self.my_scd_dss_helper.delete_operational_intent(
+                dss_operational_intent_ref_id=opint_id, ovn=ovn, timeout=DSS_CLEAR_AREA_REQUEST_TIMEOUT_SECS
+            )
+        except Exception as e:
+            logger.error("Error in deleting operational intent {opint_id}: {error}".format(opint_id=opint_id, error=e))
+            return ClearAreaOperationalIntentOutcome(
+                operation_id=operation_id, operational_intent_id=opint_id, success=False, message="Error in deleting operational intent: %s" % e
+            )
+
+        if deletion_request.status == 200:
+            logger.info("Success in deleting operational intent {opint_id} with ovn {ovn_id}".format(**ovn_opint))
+            return ClearAreaOperationalIntentOutcome(
+                operation_id=operation_id, operational_intent_id=opint_id, success=True, message=deletion_request.message.message
+            )
+        elif deletion_request.status == 404:
+            # The operational intent is no longer in the DSS, the local copy can be removed
+            return ClearAreaOperationalIntentOutcome(
+                operation_id=operation_id, operational_intent_id=opint_id, success=True, message="Operational intent not found in the DSS"
+            )
+        return ClearAreaOperationalIntentOutcome(
+            operation_id=operation_id, operational_intent_id=opint_id, success=False, message=deletion_request.message.message
+        )
 
     def clear_area_request(self, extent_raw) -> ClearAreaResponse:
-        r = get_redis()
         # Create a list of Volume4D objects
         my_operational_intent_parser = dss_scd_helper.OperationalIntentReferenceHelper()
         volume4D = my_operational_intent_parser.parse_volume_to_volume4D(volume=extent_raw)
@@ -202,49 +256,39 @@ class DSSAreaClearHandler:
 
         my_geo_json_converter.convert_volumes_to_geojson(volumes=[volume4D])
         view_rect_bounds = my_geo_json_converter.get_bounds()
-        my_rtree_helper = rtree_helper.OperationalIntentsIndexFactory(index_name=INDEX_NAME)
-        my_rtree_helper.generate_operational_intents_index(pattern="flight_opint.*")
-        op_ints_exist = my_rtree_helper.check_op_ints_exist()
-        all_existing_op_ints_in_area = []
-        if op_ints_exist:
-            all_existing_op_ints_in_area = my_rtree_helper.check_box_intersection(view_box=view_rect_bounds)
-
-        all_deletion_requests_status = []
-        if all_existing_op_ints_in_area:
-            for flight_details in all_existing_op_ints_in_area:
-                if flight_details:
-                    deletion_success = False
-                    operation_id = flight_details["flight_id"]
-                    op_int_details_key = "flight_opint." + operation_id
-                    if r.exists(op_int_details_key):
-                        op_int_detail_raw = r.get(op_int_details_key)
-                        my_scd_dss_helper = dss_scd_helper.SCDOperations()
-                        # op_int_detail_raw = op_int_details.decode()
-                        op_int_detail = json.loads(op_int_detail_raw)
-                        ovn = op_int_detail["success_response"]["operational_intent_reference"]["ovn"]
-                        opint_id = op_int_detail["success_response"]["operational_intent_reference"]["id"]
-                        ovn_opint = {"ovn_id": ovn, "opint_id": opint_id}
-                        logger.info("Deleting operational intent {opint_id} with ovn {ovn_id}".format(**ovn_opint))
-
-                        deletion_request = my_scd_dss_helper.delete_operational_intent(dss_operational_intent_ref_id=opint_id, ovn=ovn)
-
-                        if deletion_request.status == 200:
-                            logger.info("Success in deleting operational intent {opint_id} with ovn {ovn_id}".format(**ovn_opint))
-                            deletion_success = True
-                        all_deletion_requests_status.append(deletion_success)
-            clear_area_status = ClearAreaResponseOutcome(
-                success=all(all_deletion_requests_status),
-                message="All operational intents in the area cleared successfully",
-                timestamp=arrow.now().isoformat(),
+        my_local_opints_index = rtree_helper.get_local_operational_intents_index()
+        all_existing_op_ints_in_area = my_local_opints_index.check_box_intersection(view_box=view_rect_bounds)
+        all_operation_ids = list(dict.fromkeys(flight_details["flight_id"] for flight_details in all_existing_op_ints_in_area if flight_details))
+
+        all_outcomes = []
+        if all_operation_ids:
+            all_op_int_summaries = self.my_operational_intents_repository.get_operational_intent_summaries(operation_ids=all_operation_ids)
+            with ThreadPoolExecutor(max_workers=min(DSS_CLEAR_AREA_CONCURRENCY, len(all_operation_ids))) as executor:
+                all_outcomes = list(
+                    executor.map(
+                        self.delete_operational_intent_from_dss,
+                        all_operation_ids,
+                        [all_op_int_summaries.get(operation_id) for operation_id in all_operation_ids],
+                    )
+                )
+
+            # Remove the local state of all the cleared operational intents in one go
+            all_cleared_operation_ids = [outcome.operation_id for outcome in all_outcomes if outcome.success]
+            self.my_operational_intents_repository.delete_operational_intents(operation_ids=all_cleared_operation_ids)
+
+        num_failed = len([outcome for outcome in all_outcomes if not outcome.success])
+        if num_failed:
+            message = "{num_failed} of {num_total} operational intents in the area could not be cleared".format(
+                num_failed=num_failed, num_total=len(all_outcomes)
             )
-
         else:
-            clear_area_status = ClearAreaResponseOutcome(
-                success=True,
-                message="All operational intents in the area cleared successfully",
-                timestamp=arrow.now().isoformat(),
-            )
-        my_rtree_helper.clear_rtree_index(pattern="flight_opint.*")
+            message = "All operational intents in the area cleared successfully"
+        clear_area_status = ClearAreaResponseOutcome(
+            success=num_failed == 0,
+            message=message,
+            timestamp=arrow.now().isoformat(),
+            operational_intents=all_outcomes,
+        )
         clear_area_response = ClearAreaResponse(outcome=clear_area_status)
 
         return clear_area_response
@@ -4,18 +4,15 @@ from dataclasses import asdict
 from datetime import timedelta
 from uuid import UUID
 
-from django.http import JsonResponse
 from django.shortcuts import redirect
 from dotenv import find_dotenv, load_dotenv
 from rest_framework import status
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 
-from auth_helper.common import get_redis
 from auth_helper.utils import requires_scopes
 from common.data_definitions import (
     ARGONSERVER_READ_SCOPE,
-    FLIGHT_OPINT_KEY,
     OPERATION_STATES,
     OPERATION_STATES_LOOKUP,
 )
@@ -23,7 +20,7 @@ from common.database_operations import (
     ArgonServerDatabaseReader,
     ArgonServerDatabaseWriter,
 )
-from common.utils import EnhancedJSONEncoder
+from common.utils import DataclassJsonResponse, EnhancedJSONEncoder
 from scd_operations.data_definitions import FlightDeclarationCreationPayload
 
 from . import dss_scd_helper
@@ -32,6 +29,7 @@ from .flight_planning_data_definitions import (
     FlightPlanningStatusResponse,
     FlightPlanningTestStatus,
 )
+from .opint_repository import OperationalIntentsRepository
 from .scd_data_definitions import (
     CapabilitiesResponse,
     OperationalIntentState,
@@ -39,7 +37,6 @@ from .scd_data_definitions import (
     OperationalIntentStorageVolumes,
     OperationalIntentSubmissionStatus,
     SCDTestStatusResponse,
-    SuccessfulOperationalIntentFlightIDStorage,
     USSCapabilitiesResponseEnum,
 )
 from .scd_test_harness_helper import (
@@ -82,7 +79,7 @@ def is_valid_uuid(uuid_to_test, version=4):
 @requires_scopes(["utm.inject_test_data"])
 def scd_test_status(request):
     status = SCDTestStatusResponse(status="Ready", version="latest")
-    return JsonResponse(json.loads(json.dumps(status, cls=EnhancedJSONEncoder)), status=200)
+    return DataclassJsonResponse(status, status=200)
 
 
 @api_view(["GET"])
@@ -95,7 +92,7 @@ def scd_test_capabilities(request):
             USSCapabilitiesResponseEnum.HighPriorityFlights,
         ]
     )
-    return JsonResponse(json.loads(json.dumps(status, cls=EnhancedJSONEncoder)), status=200)
+    return DataclassJsonResponse(status, status=200)
 
 
 @api_view(["GET"])
@@ -111,8 +108,8 @@ def upsert_close_flight_plan(request, flight_plan_id):
     # Parse the incoming flight planning data
     # view_name = request.resolver_match.view_name
     # uspace_test = True if "u-space" in view_name else False
-    r = get_redis()
     # flight_details_storage = "flight_details:" + str(flight_plan_id)
+    my_operational_intents_repository = OperationalIntentsRepository()
     my_operational_intent_parser = dss_scd_helper.OperationalIntentReferenceHelper()
     my_scd_dss_helper = dss_scd_helper.SCDOperations()
     my_geo_json_converter = dss_scd_helper.VolumesConverter()
@@ -256,8 +253,6 @@ def upsert_close_flight_plan(request, flight_plan_id):
                 priority=scd_test_data.intended_flight.astm_f3548_21.priority,
             )
 
-            flight_opint_key = FLIGHT_OPINT_KEY + operation_id_str
-
             if operational_intent_update_job.status == 200:
                 # The operational intent update in the DSS is successful, update storage
                 # Update the redis storage for operational intent details so that when the USS endpoint is queried it will reflect the most updated state.
@@ -308,11 +303,11 @@ def upsert_close_flight_plan(request, flight_plan_id):
                         status=status.HTTP_200_OK,
                     )
 
-                r.set(
-                    flight_opint_key,
-                    json.dumps(asdict(new_updated_operational_intent_full_details)),
+                my_operational_intents_repository.set_operational_intent(
+                    operation_id=operation_id_str,
+                    operational_intent=new_updated_operational_intent_full_details,
+                    expires_in=opint_subscription_end_time,
                 )
-                r.expire(name=flight_opint_key, time=opint_subscription_end_time)
 
                 return update_operational_intent_response
 
@@ -410,20 +405,19 @@ def upsert_close_flight_plan(request, flight_plan_id):
                     operational_intent_details=flight_planning_data,
                 )
                 # Store flight DSS response and operational intent reference
-                flight_opint = FLIGHT_OPINT_KEY + operation_id_str
                 logger.info("Flight with operational intent id {flight_opint} created".format(flight_opint=operation_id_str))
-                r.set(flight_opint, json.dumps(asdict(operational_intent_full_details)))
-                r.expire(name=flight_opint, time=opint_subscription_end_time)
+                my_operational_intents_repository.set_operational_intent(
+                    operation_id=operation_id_str,
+                    operational_intent=operational_intent_full_details,
+                    expires_in=opint_subscription_end_time,
+                )
 
                 # Store the details of the operational intent reference
-                flight_op_int_storage = SuccessfulOperationalIntentFlightIDStorage(
-                    operation_id=operation_id_str,
+                my_operational_intents_repository.set_operation_id(
                     operational_intent_id=flight_planning_submission.operational_intent_id,
+                    operation_id=operation_id_str,
+                    expires_in=opint_subscription_end_time,
                 )
-                opint_flightref = "opint_flightref." + flight_planning_submission.operational_intent_id
-
-                r.set(opint_flightref, json.dumps(asdict(flight_op_int_storage)))
-                r.expire(name=opint_flightref, time=opint_subscription_end_time)
                 # End store flight DSS
                 planned_test_injection_response.operational_intent_id = flight_planning_submission.operational_intent_id
                 # Create a flight declaration with operation id
@@ -488,18 +482,15 @@ def upsert_close_flight_plan(request, flight_plan_id):
                 )
 
     elif request.method == "DELETE":
-        op_int_details_key = FLIGHT_OPINT_KEY + operation_id_str
-        op_int_detail_raw = r.get(op_int_details_key)
-
-        if op_int_detail_raw:
-            op_int_detail = json.loads(op_int_detail_raw)
+        op_int_summary = my_operational_intents_repository.get_operational_intent_summary(operation_id=operation_id_str)
 
-            ovn = op_int_detail["success_response"]["operational_intent_reference"]["ovn"]
-            opint_id = op_int_detail["success_response"]["operational_intent_reference"]["id"]
+        if op_int_summary:
+            ovn = op_int_summary.ovn
+            opint_id = op_int_summary.operational_intent_id
             ovn_opint = {"ovn_id": ovn, "opint_id": opint_id}
             logger.info("Deleting operational intent {opint_id} with ovn {ovn_id}".format(**ovn_opint))
             my_scd_dss_helper.delete_operational_intent(dss_operational_intent_ref_id=opint_id, ovn=ovn)
-            r.delete(op_int_details_key)
+            my_operational_intents_repository.delete_operational_intent(operation_id=operation_id_str)
             my_database_writer.delete_flight_declaration(flight_declaration_id=operation_id_str)
 
             flight_planning_deletion_response = flight_planning_deletion_success_response
@@ -523,7 +514,7 @@ def flight_planning_status(request):
         api_name="Flight Planning Automated Testing Interface",
         api_version="latest",
     )
-    return JsonResponse(json.loads(json.dumps(status, cls=EnhancedJSONEncoder)), status=200)
+    return DataclassJsonResponse(status, status=200)
 
 
 @api_view(["POST"])
@@ -542,4 +533,4 @@ def flight_planning_clear_area_request(request):
         )
     my_flight_plan_clear_area_handler = DSSAreaClearHandler(request_id=request_id)
     clear_area_response = my_flight_plan_clear_area_handler.clear_area_request(extent_raw=extent_raw)
-    return JsonResponse(json.loads(json.dumps(clear_area_response, cls=EnhancedJSONEncoder)), status=200)
+    return DataclassJsonResponse(clear_area_response, status=200)
@@ -0,0 +1,98 @@
+import json
+import timeit
+
+import arrow
+from django.core.management.base import BaseCommand
+from django.http import HttpResponse, JsonResponse
+
+from common.data_definitions import RESPONSE_CONTENT_TYPE
+from common.utils import DataclassJsonResponse, EnhancedJSONEncoder, orjson, render_json
+from scd_operations.scd_data_definitions import (
+    Altitude,
+    LatLngPoint,
+    OperationalIntentDetailsUSSResponse,
+    OperationalIntentReferenceDSSResponse,
+    OperationalIntentState,
+    OperationalIntentUSSDetails,
+    Polygon,
+    Time,
+    Volume3D,
+    Volume4D,
+)
+
+
+class Command(BaseCommand):
+    help = "This command compares the legacy dump / load / dump JsonResponse rendering of a operational intent details response with the single pass DataclassJsonResponse"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--volumes",
+            dest="volumes",
+            metavar="Number of volumes in the operational intent",
+            default=20,
+            type=int,
+            help="Set the number of volumes in the sample operational intent",
+        )
+
+        parser.add_argument(
+            "-n",
+            "--iterations",
+            dest="iterations",
+            metavar="Number of iterations",
+            default=500,
+            type=int,
+            help="Set the number of responses to render per renderer",
+        )
+
+    def build_operational_intent_details(self, num_volumes: int) -> OperationalIntentDetailsUSSResponse:
+        now = arrow.now()
+        start = Time(format="RFC3339", value=now.isoformat())
+        end = Time(format="RFC3339", value=now.shift(minutes=30).isoformat())
+        volumes = []
+        for i in range(num_volumes):
+            vertices = [LatLngPoint(lat=46.97 + (i * 0.001) + (j * 0.0001), lng=7.47 + (j * 0.0001)) for j in range(12)]
+            volume3D = Volume3D(
+                outline_polygon=Polygon(vertices=vertices),
+                altitude_lower=Altitude(value=50, reference="W84", units="M"),
+                altitude_upper=Altitude(value=120, reference="W84", units="M"),
+            )
+            volumes.append(Volume4D(volume=volume3D, time_start=start, time_end=end))
+
+        reference = OperationalIntentReferenceDSSResponse(
+            id="a6b3b5b6-8e02-4b0d-bd6b-0ad5d63e2c3c",
+            manager="argon_server",
+            uss_availability="Unknown",
+            version=1,
+            state=OperationalIntentState.Accepted,
+            ovn="b9b6b5b4-1b0d-4b0d-8d6b-0ad5d63e2c3c",
+            time_start=start,
+            time_end=end,
+            uss_base_url="http://localhost:8000",
+            subscription_id="c4b2b5a6-8e02-4b0d-bd6b-0ad5d63e2c3c",
+        )
+        details = OperationalIntentUSSDetails(volumes=volumes, priority=0, off_nominal_volumes=[])
+        return OperationalIntentDetailsUSSResponse(reference=reference, details=details)
+
+    def handle(self, *args, **options):
+        num_volumes = options["volumes"]
+        iterations = options["iterations"]
+
+        operational_intent = self.build_operational_intent_details(num_volumes=num_volumes)
+
+        legacy_response = JsonResponse(json.loads(json.dumps(operational_intent, cls=EnhancedJSONEncoder)))
+        single_pass_response = DataclassJsonResponse(operational_intent)
+        assert legacy_response.content == single_pass_response.content, "Single pass rendering does not match the legacy output"
+
+        renderers = {
+            "legacy JsonResponse": lambda: JsonResponse(json.loads(json.dumps(operational_intent, cls=EnhancedJSONEncoder))),
+            "DataclassJsonResponse (json)": lambda: DataclassJsonResponse(operational_intent),
+        }
+        if orjson is not None:
+            renderers["DataclassJsonResponse (orjson)"] = lambda: HttpResponse(
+                render_json(operational_intent, backend="orjson"), content_type=RESPONSE_CONTENT_TYPE
+            )
+
+        print("Rendering a operational intent with %s volumes (%s bytes), %s iterations" % (num_volumes, len(legacy_response.content), iterations))
+        for renderer_name, renderer in renderers.items():
+            elapsed = timeit.timeit(renderer, number=iterations)
+            print("%s: %.1f µs per response" % (renderer_name, (elapsed / iterations) * 1e6))
@@ -0,0 +1,15 @@
+import json
+from dataclasses import asdict
+
+from django.core.management.base import BaseCommand
+
+from scd_operations.peer_notification_queue import PeerUSSNotificationQueue
+
+
+class Command(BaseCommand):
+    help = "This command prints the delivery counters and the delivery lag of the notifications sent to peer USSes"
+
+    def handle(self, *args, **options):
+        my_notification_queue = PeerUSSNotificationQueue()
+        delivery_metrics = my_notification_queue.get_delivery_metrics()
+        print(json.dumps(asdict(delivery_metrics), indent=2))
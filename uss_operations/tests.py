@@ -1 +1,40 @@
-# Create your tests here.
+import json
+import uuid
+from os import environ as env
+from unittest import mock
+
+import jwt
+from django.test import TestCase
+
+from scd_operations.dss_scd_helper import PeerOperationalIntentDetailsCache
+
+
+@mock.patch.dict(env, {"BYPASS_AUTH_TOKEN_VERIFICATION": "1"})
+class USSUpdateOperationalIntentDetailsTests(TestCase):
+    def setUp(self):
+        token = jwt.encode({"aud": "testflight.argonserver.com", "scope": "utm.strategic_coordination"}, "secret", algorithm="HS256")
+        self.headers = {"HTTP_AUTHORIZATION": "Bearer {token}".format(token=token)}
+        self.operational_intent_id = str(uuid.uuid4())
+        self.peer_opint_details_cache = PeerOperationalIntentDetailsCache()
+        self.addCleanup(self.peer_opint_details_cache.delete_operational_intent, operational_intent_id=self.operational_intent_id)
+
+    def post_update(self, operational_intent):
+        return self.client.post(
+            "/uss/v1/operational_intents",
+            data=json.dumps({"operational_intent_id": self.operational_intent_id, "operational_intent": operational_intent, "subscriptions": []}),
+            content_type="application/json",
+            **self.headers,
+        )
+
+    def test_operational_intent_is_cached_with_its_ovn(self):
+        operational_intent = {"reference": {"id": self.operational_intent_id, "ovn": "ovn-1"}, "details": {"volumes": []}}
+        response = self.post_update(operational_intent)
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(
+            self.peer_opint_details_cache.get_operational_intent(operational_intent_id=self.operational_intent_id, ovn="ovn-1"), operational_intent
+        )
+
+    def test_operational_intent_without_reference_is_rejected(self):
+        response = self.post_update({"details": {"volumes": []}})
+        self.assertEqual(response.status_code, 400)
+        self.assertIsNone(self.peer_opint_details_cache.get_operational_intent(operational_intent_id=self.operational_intent_id, ovn="ovn-1"))
@@ -1,11 +1,9 @@
 import json
 import logging
 import time
-from dataclasses import asdict
 from uuid import UUID
 
 import arrow
-from django.http import JsonResponse
 from dotenv import find_dotenv, load_dotenv
 from rest_framework.decorators import api_view
 from shapely.geometry import Point
@@ -13,7 +11,7 @@ from shapely.geometry import Point
 import rid_operations.view_port_ops as view_port_ops
 from auth_helper.common import get_redis
 from auth_helper.utils import requires_scopes
-from common.utils import EnhancedJSONEncoder
+from common.utils import DataclassJsonResponse
 from flight_feed_operations import flight_stream_helper
 from rid_operations.data_definitions import (
     UASID,
@@ -32,6 +30,8 @@ from rid_operations.rid_utils import (
     RIDOperatorDetails,
     TelemetryFlightDetails,
 )
+from scd_operations.dss_scd_helper import PeerOperationalIntentDetailsCache
+from scd_operations.opint_repository import OperationalIntentsRepository
 
 from .uss_data_definitions import (
     FlightDetailsNotFoundMessage,
@@ -77,6 +77,24 @@ def uss_update_opint_details(request):
     # operation_id_str = op_int_update_detail.operational_intent_id
     # op_int_details_key = "flight_opint." + operation_id_str
     logger.info("incoming...")
+    # Keep the peer operational intent details cache up to date so that the next planning attempt does not have to query the peer USS
+    op_int_update_details_data = request.data
+    my_peer_opint_details_cache = PeerOperationalIntentDetailsCache()
+    operational_intent_id = op_int_update_details_data.get("operational_intent_id")
+    operational_intent = op_int_update_details_data.get("operational_intent")
+    if operational_intent and not (isinstance(operational_intent, dict) and isinstance(operational_intent.get("reference"), dict)):
+        incorrect_parameters = {"message": "The operational intent must have a reference"}
+        return DataclassJsonResponse(incorrect_parameters, status=400)
+    if operational_intent_id:
+        if operational_intent:
+            my_peer_opint_details_cache.set_operational_intent(
+                operational_intent_id=operational_intent_id,
+                ovn=operational_intent["reference"].get("ovn"),
+                operational_intent=operational_intent,
+            )
+        else:
+            # The operational intent has been removed
+            my_peer_opint_details_cache.delete_operational_intent(operational_intent_id=operational_intent_id)
     # logger.info(op_int_update_detail)
     # operational_intent_reference = op_int_update_detail.operational_intent.reference
     # operational_intent_details = op_int_update_detail.operational_intent.details
@@ -107,7 +125,7 @@ def uss_update_opint_details(request):
     # Store the opint, see what other operations conflict the opint
 
     updated_success = UpdateOperationalIntent(message="New or updated full operational intent information received successfully ")
-    return JsonResponse(json.loads(json.dumps(updated_success, cls=EnhancedJSONEncoder)), status=204)
+    return DataclassJsonResponse(updated_success, status=204)
 
 
 @api_view(["GET"])
@@ -127,25 +145,19 @@ def USSOpIntDetailTelemetry(request, opint_id):
         telemetry=VehicleTelemetry(time_measured=Time(format="RFC3339", value=arrow.now().isoformat()), position=None, velocity=None),
         next_telemetry_opportunity=Time(format="RFC3339", value=five_seconds_from_now.isoformat()),
     )
-    return JsonResponse(json.loads(json.dumps(asdict(telemetry_response), cls=EnhancedJSONEncoder)), status=200)
+    return DataclassJsonResponse(telemetry_response, status=200)
 
 
 @api_view(["GET"])
 @requires_scopes(["utm.strategic_coordination"])
 def USSOpIntDetails(request, opint_id):
-    r = get_redis()
-    opint_flightref = "opint_flightref." + str(opint_id)
-
-    if r.exists(opint_flightref):
-        opint_ref_raw = r.get(opint_flightref)
-        opint_ref = json.loads(opint_ref_raw)
-        opint_id = opint_ref["operation_id"]
-        flight_opint = "flight_opint." + opint_id
+    my_operational_intents_repository = OperationalIntentsRepository()
+    operation_id = my_operational_intents_repository.get_operation_id(operational_intent_id=str(opint_id))
 
-        if r.exists(flight_opint):
-            op_int_details_raw = r.get(flight_opint)
-            op_int_details = json.loads(op_int_details_raw)
+    if operation_id:
+        op_int_details = my_operational_intents_repository.get_operational_intent(operation_id=operation_id)
 
+        if op_int_details:
             reference_full = op_int_details["success_response"]["operational_intent_reference"]
             details_full = op_int_details["operational_intent_details"]
             # Load existing opint details
@@ -200,24 +212,24 @@ def USSOpIntDetails(request, opint_id):
             operational_intent = OperationalIntentDetailsUSSResponse(reference=reference, details=details)
             operational_intent_response = OperationalIntentDetails(operational_intent=operational_intent)
 
-            return JsonResponse(
-                json.loads(json.dumps(operational_intent_response, cls=EnhancedJSONEncoder)),
+            return DataclassJsonResponse(
+                operational_intent_response,
                 status=200,
             )
 
         else:
             not_found_response = OperationalIntentNotFoundResponse(message="Requested Operational intent with id %s not found" % str(opint_id))
 
-            return JsonResponse(
-                json.loads(json.dumps(not_found_response, cls=EnhancedJSONEncoder)),
+            return DataclassJsonResponse(
+                not_found_response,
                 status=404,
             )
 
     else:
         not_found_response = OperationalIntentNotFoundResponse(message="Requested Operational intent with id %s not found" % str(opint_id))
 
-        return JsonResponse(
-            json.loads(json.dumps(not_found_response, cls=EnhancedJSONEncoder)),
+        return DataclassJsonResponse(
+            not_found_response,
             status=404,
         )
 
@@ -236,22 +248,22 @@ def get_uss_flights(request):
         view_port = [float(i) for i in view.split(",")]
     except Exception:
         incorrect_parameters = {"message": "A view bbox is necessary with four values: minx, miny, maxx and maxy"}
-        return JsonResponse(json.loads(json.dumps(incorrect_parameters)), status=400)
+        return DataclassJsonResponse(incorrect_parameters, status=400)
     view_port_valid = view_port_ops.check_view_port(view_port_coords=view_port)
     view_port_area = 0
     if not view_port_valid:
         view_port_not_ok = GenericErrorResponseMessage(message="The requested view %s rectangle is not valid format: lat1,lng1,lat2,lng2" % view)
-        return JsonResponse(json.loads(json.dumps(asdict(view_port_not_ok))), status=419)
+        return DataclassJsonResponse(view_port_not_ok, status=419)
     view_box = view_port_ops.build_view_port_box(view_port_coords=view_port)
     view_port_area = view_port_ops.get_view_port_area(view_box=view_box)
     view_port_diagonal = view_port_ops.get_view_port_diagonal_length_kms(view_port_coords=view_port)
     if (view_port_diagonal) > 7:
         view_port_too_large_msg = GenericErrorResponseMessage(message="The requested view %s rectangle is too large" % view)
-        return JsonResponse(json.loads(json.dumps(asdict(view_port_too_large_msg))), status=413)
+        return DataclassJsonResponse(view_port_too_large_msg, status=413)
 
     if (view_port_area) < 250000 and (view_port_area) > 90000:
         view_port_too_large_msg = GenericErrorResponseMessage(message="The requested view %s rectangle is too large" % view)
-        return JsonResponse(json.loads(json.dumps(asdict(view_port_too_large_msg))), status=419)
+        return DataclassJsonResponse(view_port_too_large_msg, status=419)
 
     time.sleep(0.5)
 
@@ -294,12 +306,12 @@ def get_uss_flights(request):
         # except KeyError as ke:
         #     logger.error("Error in sorting distinct messages, key %s name not found" % ke)
         #     error_msg = GenericErrorResponseMessage(message="Error in retrieving flight data")
-        #     return JsonResponse(json.loads(json.dumps(asdict(error_msg))), status=500)
+        #     return DataclassJsonResponse(error_msg, status=500)
 
         for all_observations_messages in distinct_messages:
             # if summary_information_only:
             #     summary = SummaryFlightsOnly(number_of_flights=len(distinct_messages), timestamp=now)
-            #     return JsonResponse(json.loads(json.dumps(asdict(summary))), status=200)
+            #     return DataclassJsonResponse(summary, status=200)
             # else:
             rid_flights = []
             observation_data_dict = {}
@@ -378,13 +390,13 @@ def get_uss_flights(request):
                 # show / add metadata it if it does
                 rid_response = RIDFlightResponse(timestamp=Time(value=now, format="RFC3339"), flights=rid_flights)
 
-                return JsonResponse(json.loads(json.dumps(asdict(rid_response))), status=200)
+                return DataclassJsonResponse(rid_response, status=200)
 
     else:
         # show / add metadata it if it does
         rid_response = RIDFlightResponse(timestamp=now, flights=[])
 
-        return JsonResponse(json.loads(json.dumps(asdict(rid_response))), status=200)
+        return DataclassJsonResponse(rid_response, status=200)
 
 
 @api_view(["GET"])
@@ -431,7 +443,7 @@ def get_uss_flight_details(request, flight_id):
 
         flight_details_full = OperatorDetailsSuccessResponse(details=f_detail)
 
-        return JsonResponse(json.loads(json.dumps(asdict(flight_details_full))), status=200)
+        return DataclassJsonResponse(flight_details_full, status=200)
     else:
         fd = FlightDetailsNotFoundMessage(message="The requested flight could not be found")
-        return JsonResponse(json.loads(json.dumps(asdict(fd))), status=404)
+        return DataclassJsonResponse(fd, status=404)